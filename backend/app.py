@@ -1,24 +1,80 @@
+import asyncio
+import importlib
 import os
+import time
+from contextlib import asynccontextmanager
 
-from dotenv import load_dotenv
 from fastapi import FastAPI
 
-from backend.routes.bot_call_router import call_router
+from backend.core.active_calls import active_calls
+from backend.core.call_manager import call_manager
+from backend.core.event_pipeline import event_pipeline
+from backend.core.loop_watchdog import LOOP_WATCHDOG_ENABLED, loop_watchdog
+from backend.core.number_pool import bot_number_pool
+from backend.core.session_affinity import SessionAffinityMiddleware
+from backend.core.session_lifecycle import session_lifecycle
+from backend.core.session_store import call_store
+from backend.routes.bot_call_router import bot_call_router
 from backend.routes.conference_router import conference_router
 from backend.routes.media_router import media_router
+from backend.routes.metrics_router import metrics_router
 from backend.routes.user_call_router import user_call_router
-
-load_dotenv('../env/.env')
+from backend.services.answer_cache import answer_cache
+from backend.services.twilio_rest import twilio_rest
+from backend.utils.utils import logger
 
 PORT = int(os.getenv('PORT', 5050))
+# Imported on first use by the modules that need them, so a worker starts serving
+# without them; the lifespan then loads them off the event loop, before the first
+# call gets far enough to need one
+DEFERRED_MODULES = ('openai', 'deepgram', 'pydub')
+PRELOAD_DEFERRED = os.getenv('PRELOAD_DEFERRED', '1') != '0'
+
+
+def preload_deferred_modules():
+    start = time.perf_counter()
+    for name in DEFERRED_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.error(f"Error preloading {name}: {e}")
+    logger.info(f"Preloaded {', '.join(DEFERRED_MODULES)} in {time.perf_counter() - start:.2f}s")
+
+
+async def owns_call(call_sid: str) -> bool:
+    return await call_store(call_manager.get_session_by_call_sid, call_sid) is not None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    preloading = asyncio.create_task(asyncio.to_thread(preload_deferred_modules)) if PRELOAD_DEFERRED else None
+    if LOOP_WATCHDOG_ENABLED:
+        loop_watchdog.start()
+    call_manager.restore()
+    session_lifecycle.start()
+    answer_cache.start()
+    active_calls.start(twilio_rest, bot_number_pool.numbers, owns_call)
+    yield
+    if preloading is not None:
+        await preloading
+    await active_calls.stop()
+    await event_pipeline.drain()
+    await session_lifecycle.stop()
+    await twilio_rest.aclose()
+    call_manager.close()
+    await asyncio.to_thread(answer_cache.close)
+    await loop_watchdog.stop()
+    await logger.complete()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI()
-    app.include_router(call_router, prefix="/calls", tags=["calls"])
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(SessionAffinityMiddleware)
+    app.include_router(bot_call_router, prefix="/calls", tags=["calls"])
     app.include_router(conference_router, prefix="/conference", tags=["conference"])
     app.include_router(media_router, prefix="/media", tags=["media"])
     app.include_router(user_call_router, prefix="/user_calls", tags=["user_calls"])
+    app.include_router(metrics_router, tags=["metrics"])
     return app
 
 
@@ -0,0 +1 @@
+"""Microbenchmarks for hot paths."""
\ No newline at end of file
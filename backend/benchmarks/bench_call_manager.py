@@ -0,0 +1,54 @@
+"""
+CallManager create/link/lookup/delete with many concurrent sessions.
+
+    python -m backend.benchmarks.bench_call_manager --sessions 10000
+"""
+import argparse
+import json
+import time
+
+from backend.core.call_manager import CallManager
+from backend.core.constants import CallType
+from backend.utils.utils import logger
+
+
+def run(sessions: int) -> dict:
+    """Return microseconds per operation for each phase."""
+    logger.disable("backend")
+    call_manager = CallManager()
+    timings = {}
+
+    def phase(name, count, fn):
+        start = time.perf_counter()
+        fn()
+        timings[name] = (time.perf_counter() - start) / count * 1e6
+
+    session_ids = []
+    phase('create', sessions, lambda: session_ids.extend(call_manager.create_new_session() for _ in range(sessions)))
+
+    def link():
+        for i, session_id in enumerate(session_ids):
+            call_manager.link_call_to_session(f"CA{i}b", f"+1{i:010d}", session_id, CallType.CONFERENCE, is_outbound=True)
+            call_manager.link_call_to_session(f"CA{i}s", f"+1{i:010d}", session_id, CallType.STREAM, is_outbound=False)
+            call_manager.link_call_to_session(f"CA{i}c", f"+2{i:010d}", session_id, CallType.CUSTOMER_SERVICE)
+    phase('link', sessions * 3, link)
+
+    def lookup():
+        for i, session_id in enumerate(session_ids):
+            call_manager.get_session_by_id(session_id)
+            call_manager.get_session_by_call_sid(f"CA{i}c")
+            call_manager.get_session_by_number(f"+1{i:010d}")
+            call_manager.check_session_exists([f"+2{i:010d}"])
+    phase('lookup', sessions * 4, lookup)
+
+    # Delete while everything else is still live, as happens when one call ends mid-load
+    phase('delete', sessions, lambda: [call_manager.delete_session(session_id) for session_id in session_ids])
+    logger.enable("backend")
+    return {'sessions': sessions, 'us_per_op': timings}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=10000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sessions), indent=2))
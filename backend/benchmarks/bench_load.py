@@ -0,0 +1,302 @@
+"""
+End-to-end load: concurrent simulated calls through the real app, ramped to find
+how many one process holds before turn latency degrades.
+
+Twilio, Deepgram and the LLM are replaced by local stand-ins with configurable
+latency: TwilioSimulator places the calls and streams the agent's speech, DeepgramStub
+transcribes and speaks, and llm_stub_server answers over ASGI. Everything in between,
+including routes, the session store, webhooks, the media loop, the parser and the
+transcode, is the app's own code.
+
+    python -m backend.benchmarks.bench_load --levels 1,10,25,50 --duration 20 \\
+        --llm-ttft lognormal:-1.2,0.4 --output load.json
+
+Each level holds that many calls for --duration seconds and then hangs them up. A level
+reports p50/p95/p99 in milliseconds for each stage of a turn, from the app's own turn
+traces (see backend.core.turn_trace):
+
+    stt                   last voiced frame reaching STT -> final transcript
+    llm_first_token       final transcript -> first LLM chunk
+    llm                   final transcript -> LLM reply complete
+    first_tts_complete    final transcript -> first sentence's speech synthesized
+    tts                   final transcript -> last sentence's speech
+    transcode             the first sentence's MP3 -> μ-law conversion
+    first_outbound_frame  final transcript -> first outbound media frame
+    last_outbound_frame   final transcript -> last outbound media frame
+    turn                  last voiced frame -> first outbound media frame
+
+It also reports event-loop lag, CPU (percent of one core) and RSS. The ramp stops
+early once turn p95 exceeds --max-turn-p95-ms.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+import httpx
+from openai import AsyncOpenAI
+from pydub.utils import which
+
+from backend.app import create_app
+from backend.core.call_manager import call_manager
+from backend.core.event_pipeline import event_pipeline
+from backend.core.number_pool import bot_number_pool
+from backend.core.turn_trace import STAGES, TurnTrace, on_finish, remove_finish_listener
+from backend.routes import media_router
+from backend.services import openai_utils
+from backend.services.answer_cache import AnswerCache
+from backend.services.llm_backend import OpenAIBackend, llm_backends
+from backend.services.twilio_rest import twilio_rest
+from backend.simulators.deepgram_stub import DeepgramStub, tone
+from backend.simulators.llm_stub_server import LatencyDistribution, create_stub_app
+from backend.simulators.twilio_simulator import CallTiming, TwilioSimulator
+from backend.utils.utils import logger
+
+
+APP_HOST = "bot.loadtest"
+LAG_INTERVAL = 0.05
+TEST_CASES = Path(__file__).resolve().parent.parent / "test" / "test_cases.json"
+
+
+def percentiles(samples: List[float], scale: float = 1e3) -> Optional[dict]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(pct * len(ordered)))] * scale
+    return {'count': len(ordered), 'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': ordered[-1] * scale}
+
+
+def rss_mb() -> float:
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Peak rather than current, where /proc isn't available (KiB on Linux, bytes on macOS)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StageRecorder:
+    """Swaps in the STT/TTS stub and collects the stages of every turn the app traces."""
+
+    def __init__(self, deepgram: DeepgramStub, transcode: bool):
+        self.deepgram = deepgram
+        self.transcode = transcode
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self.turns = 0
+
+    def reset(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.turns = 0
+
+    def patches(self):
+        patches = [
+            patch.object(media_router, 'create_deepgram_stt_connection', self.deepgram.create_stt_connection),
+            patch.object(media_router, 'close_deepgram_stt_connection', self.deepgram.close_stt_connection),
+            patch.object(media_router, 'synthesize_speech', self.deepgram.synthesize_speech),
+        ]
+        if not self.transcode:
+            # Already μ-law from the stub
+            patches.append(patch.object(media_router, 'convert_mp3_to_mulaw', lambda audio: audio))
+        return patches
+
+    def record(self, trace: TurnTrace):
+        self.turns += 1
+        for stage, seconds in trace.stages().items():
+            if stage != 'transcode' or self.transcode:
+                self.samples[stage].append(seconds)
+
+
+class LoopLagMonitor:
+    """How late a short sleep wakes up: time the loop spent on something else."""
+
+    def __init__(self, interval: float = LAG_INTERVAL):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+async def run_level(concurrency: int, duration: float, client: httpx.AsyncClient, simulator: TwilioSimulator,
+                    recorder: StageRecorder, case: dict, settle_timeout: float) -> dict:
+    recorder.reset()
+    lag = LoopLagMonitor()
+    lag.start()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+
+    async def start_call(index: int):
+        response = await client.post("/calls/initiate-call", json={
+            'cs_number': f"+1800{concurrency:03d}{index:04d}",
+            'user_number': f"+1900{concurrency:03d}{index:04d}",
+            'user_info': case['user_info'],
+        })
+        return response.status_code == 200
+
+    started = await asyncio.gather(*(start_call(index) for index in range(concurrency)))
+    await asyncio.sleep(duration)
+
+    await asyncio.gather(*(simulator.hangup(call) for call in list(simulator.calls.values())))
+    deadline = time.perf_counter() + settle_timeout
+    while (call_manager.session_count() or event_pipeline.snapshot()['pending']) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.1)
+    await event_pipeline.drain()
+
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    await lag.stop()
+    result = {
+        'concurrency': concurrency,
+        'calls_started': sum(started),
+        'calls_failed': concurrency - sum(started),
+        'sessions_left': call_manager.session_count(),
+        'turns': recorder.turns,
+        'stages_ms': {stage: percentiles(samples) for stage, samples in recorder.samples.items()},
+        'loop_lag_ms': percentiles(lag.samples),
+        'cpu_percent': cpu / wall * 100,
+        'rss_mb': rss_mb(),
+        'simulator': simulator.snapshot(),
+    }
+    simulator.calls.clear()
+    simulator.streams.clear()
+    simulator.webhooks.clear()
+    return result
+
+
+async def run_async(levels: List[int], duration: float, llm_ttft: LatencyDistribution, llm_inter_token: LatencyDistribution,
+                    stt_latency: LatencyDistribution, tts_ttfb: LatencyDistribution, answer: LatencyDistribution,
+                    max_turn_p95_ms: Optional[float], settle_timeout: float, seed: int) -> dict:
+    case = json.loads(TEST_CASES.read_text())['spotify_double_charge']
+    transcode = which('ffmpeg') is not None
+    deepgram = DeepgramStub(transcripts=case['agent_turns'], stt_latency=stt_latency, tts_ttfb=tts_ttfb,
+                            audio_format='mp3' if transcode else 'mulaw', seed=seed)
+    deepgram.warm()
+    recorder = StageRecorder(deepgram, transcode)
+
+    app = create_app()
+    numbers = [f"+1555{index:07d}" for index in range(max(levels))]
+    # Speech with a second of silence before it, so the first turn isn't cut into by stream setup
+    utterance = b'\xff' * 8000 + tone(1.5)
+    simulator = TwilioSimulator(
+        app=app,
+        numbers={number: f"https://{APP_HOST}/calls/incoming-call" for number in numbers},
+        audio=[utterance] * len(case['agent_turns']),
+        timing=CallTiming(answer=answer, gap=LatencyDistribution('fixed', (2.0,))),
+        seed=seed,
+    )
+    llm_app = create_stub_app(llm_ttft, llm_inter_token, seed)
+    llm_http = httpx.AsyncClient(transport=httpx.ASGITransport(app=llm_app))
+    stub_backend = OpenAIBackend('stub', lambda: AsyncOpenAI(base_url="http://llm.stub/v1", api_key='stub', http_client=llm_http))
+    routes = {route: openai_utils.RouteConfig(f"stub:{config.model}", config.max_tokens)
+              for route, config in openai_utils.ROUTES.items()}
+
+    for number in numbers:
+        if number not in bot_number_pool:
+            bot_number_pool.add(number)
+
+    results = []
+    patches = recorder.patches() + [
+        patch.object(openai_utils, 'ROUTES', routes),
+        patch.object(openai_utils, 'HEDGE_MODEL', None),
+        patch.object(openai_utils, 'answer_cache', AnswerCache(path=None)),
+        patch.dict(llm_backends._backends, {'stub': stub_backend}),
+        patch.object(twilio_rest, 'base_url', "http://twilio.loadtest"),
+        patch.object(twilio_rest, '_transport', httpx.ASGITransport(app=simulator.rest_app)),
+    ]
+    for active in patches:
+        active.start()
+    on_finish(recorder.record)
+    try:
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url=f"https://{APP_HOST}",
+                                         timeout=60) as client:
+                for concurrency in levels:
+                    result = await run_level(concurrency, duration, client, simulator, recorder, case, settle_timeout)
+                    results.append(result)
+                    turn = result['stages_ms']['turn']
+                    if max_turn_p95_ms is not None and turn and turn['p95'] > max_turn_p95_ms:
+                        break
+            await simulator.aclose()
+    finally:
+        remove_finish_listener(recorder.record)
+        for active in reversed(patches):
+            active.stop()
+        await llm_http.aclose()
+
+    within_budget = [
+        result['concurrency'] for result in results
+        if max_turn_p95_ms is None or (result['stages_ms']['turn'] and result['stages_ms']['turn']['p95'] <= max_turn_p95_ms)
+    ]
+    return {
+        'config': {
+            'levels': levels, 'duration': duration, 'llm_ttft': vars(llm_ttft), 'llm_inter_token': vars(llm_inter_token),
+            'stt_latency': vars(stt_latency), 'tts_ttfb': vars(tts_ttfb), 'answer': vars(answer),
+            'max_turn_p95_ms': max_turn_p95_ms, 'transcode': 'mp3' if transcode else 'skipped (no ffmpeg)',
+            'seed': seed, 'pid': os.getpid(),
+        },
+        'levels': results,
+        'capacity': max(within_budget) if within_budget else None,
+    }
+
+
+def run(levels: List[int], duration: float, llm_ttft: LatencyDistribution = None, llm_inter_token: LatencyDistribution = None,
+        stt_latency: LatencyDistribution = None, tts_ttfb: LatencyDistribution = None, answer: LatencyDistribution = None,
+        max_turn_p95_ms: Optional[float] = None, settle_timeout: float = 10.0, seed: int = 0) -> dict:
+    logger.disable("backend")
+    try:
+        return asyncio.run(run_async(
+            levels, duration,
+            llm_ttft or LatencyDistribution('fixed', (0.3,)),
+            llm_inter_token or LatencyDistribution('fixed', (0.01,)),
+            stt_latency or LatencyDistribution('fixed', (0.15,)),
+            tts_ttfb or LatencyDistribution('fixed', (0.2,)),
+            answer or LatencyDistribution('uniform', (1.0, 2.0)),
+            max_turn_p95_ms, settle_timeout, seed,
+        ))
+    finally:
+        logger.enable("backend")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--levels', default='1,5,10,25', help='Concurrent calls at each step of the ramp')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds each level holds its calls')
+    parser.add_argument('--llm-ttft', default='fixed:0.3')
+    parser.add_argument('--llm-inter-token', default='fixed:0.01')
+    parser.add_argument('--stt-latency', default='fixed:0.15', help='Endpoint to final transcript')
+    parser.add_argument('--tts-ttfb', default='fixed:0.2')
+    parser.add_argument('--answer', default='uniform:1,2', help='Ringing until the agent picks up')
+    parser.add_argument('--max-turn-p95-ms', type=float, default=None, help='Stop the ramp past this turn p95')
+    parser.add_argument('--settle-timeout', type=float, default=10.0, help='Wait for sessions to end between levels')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Also write the JSON here')
+    args = parser.parse_args()
+
+    result = run(
+        [int(level) for level in args.levels.split(',')], args.duration,
+        LatencyDistribution.parse(args.llm_ttft), LatencyDistribution.parse(args.llm_inter_token),
+        LatencyDistribution.parse(args.stt_latency), LatencyDistribution.parse(args.tts_ttfb),
+        LatencyDistribution.parse(args.answer), args.max_turn_p95_ms, args.settle_timeout, args.seed,
+    )
+    print(json.dumps(result, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
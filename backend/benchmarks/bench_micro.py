@@ -0,0 +1,231 @@
+"""
+Microbenchmarks for the per-call and per-frame hot paths, compared against a saved
+baseline so a change can show its numbers:
+
+    convert_mp3_to_mulaw      2s of TTS speech, MP3 -> μ-law (needs ffmpeg)
+    generate_system_prompt    the spotify_double_charge test case
+    call_manager.*            create/link/lookup/delete with --sessions live sessions
+    media_inbound             parse a Twilio media message and decode its payload
+    media_outbound_frame      encode 20ms of μ-law into a media message
+    media_outbound_utterance  the same for a 2s sentence, as the bot sends replies
+    twiml.*                   render each TwiML template
+
+Inputs are fixed, so runs only differ by the machine and the code. Each case is timed
+like timeit: enough iterations for a round to take --min-time, --repeat rounds, with
+the GC off. Results are microseconds per operation.
+
+    python -m backend.benchmarks.bench_micro                # compare with baseline.json
+    python -m backend.benchmarks.bench_micro --save         # make this run the baseline
+    python -m backend.benchmarks.bench_micro --check --filter media
+
+A case is a regression when its median is more than --tolerance slower than the
+baseline's; --check exits non-zero if any case regressed. Baselines only compare
+across runs on the same machine.
+"""
+import argparse
+import audioop
+import base64
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from pydub import AudioSegment
+from pydub.utils import which
+
+from backend.benchmarks import bench_call_manager
+from backend.benchmarks.bench_twiml import VALUES
+from backend.services.deepgram_handler import convert_mp3_to_mulaw
+from backend.services.prompts import generate_system_prompt
+from backend.services.twiml_templates import TEMPLATES
+from backend.simulators.deepgram_stub import tone
+from backend.utils.utils import logger
+
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+TEST_CASES = Path(__file__).resolve().parent.parent / "test" / "test_cases.json"
+STREAM_SID = "MZ18ad3ab5a668481ce02b83e7395059f0"
+FRAME_BYTES = 160  # 20ms of 8kHz μ-law
+
+
+def measure(fn: Callable[[], Any], repeat: int, min_time: float) -> dict:
+    """Microseconds per call of fn: the median and best of `repeat` rounds."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_time:
+            break
+        number *= 2
+
+    rounds = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            rounds.append((time.perf_counter() - start) / number * 1e6)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {'median_us': statistics.median(rounds), 'best_us': min(rounds), 'number': number}
+
+
+# --- Fixtures ---
+def user_info() -> dict:
+    return json.loads(TEST_CASES.read_text())['spotify_double_charge']['user_info']
+
+
+def speech_mp3(seconds: float = 2.0) -> bytes:
+    mulaw = tone(seconds)
+    segment = AudioSegment(audioop.ulaw2lin(mulaw, 2), sample_width=2, frame_rate=8000, channels=1)
+    return segment.export(io.BytesIO(), format='mp3').getvalue()
+
+
+def media_message(payload: bytes) -> str:
+    """A media message as Twilio sends it."""
+    return json.dumps({
+        'event': 'media',
+        'sequenceNumber': '42',
+        'media': {'track': 'inbound', 'chunk': '41', 'timestamp': '820', 'payload': base64.b64encode(payload).decode()},
+        'streamSid': STREAM_SID,
+    })
+
+
+# --- Cases ---
+def parse_media(message_text: str) -> bytes:
+    # As handle_media_stream reads each frame
+    data = json.loads(message_text)
+    if data.get("event", "") == "media":
+        return base64.b64decode(data["media"]["payload"])
+
+
+def encode_media(mulaw: bytes) -> str:
+    # As handle_voice_response and send_websocket_message build a reply; the
+    # json.dumps call is the one Starlette's send_json makes
+    message = {
+        "event": "media",
+        "streamSid": STREAM_SID,
+        "media": {"payload": base64.b64encode(mulaw).decode("ascii")},
+    }
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+def cases(skipped: Dict[str, str]) -> Dict[str, Callable[[], Any]]:
+    speech = tone(2.0)
+    frame = speech[:FRAME_BYTES]
+    inbound = media_message(frame)
+    info = user_info()
+
+    found = {}
+    if which('ffmpeg'):
+        mp3 = speech_mp3()
+        found['convert_mp3_to_mulaw'] = lambda: convert_mp3_to_mulaw(mp3)
+    else:
+        skipped['convert_mp3_to_mulaw'] = 'ffmpeg not found'
+    found['generate_system_prompt'] = lambda: generate_system_prompt(info)
+    found['media_inbound'] = lambda: parse_media(inbound)
+    found['media_outbound_frame'] = lambda: encode_media(frame)
+    found['media_outbound_utterance'] = lambda: encode_media(speech)
+    for name, template in TEMPLATES.items():
+        values = {field: VALUES[field] for field in template.fields}
+        found[f'twiml.{name}'] = lambda template=template, values=values: template.render(**values)
+    return found
+
+
+def call_manager_cases(sessions: int, repeat: int) -> Dict[str, dict]:
+    """One round is a full create/link/lookup/delete cycle, so phases are timed per round."""
+    rounds: Dict[str, List[float]] = {}
+    for _ in range(repeat):
+        for phase, us in bench_call_manager.run(sessions)['us_per_op'].items():
+            rounds.setdefault(phase, []).append(us)
+    return {
+        f'call_manager.{phase}': {'median_us': statistics.median(samples), 'best_us': min(samples), 'number': sessions}
+        for phase, samples in rounds.items()
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> Dict[str, dict]:
+    comparison = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['median_us'] / baseline[name]['median_us']
+        comparison[name] = {
+            'baseline_us': baseline[name]['median_us'],
+            'ratio': ratio,
+            'regressed': ratio > 1 + tolerance,
+        }
+    return comparison
+
+
+def environment() -> dict:
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run(repeat: int = 7, min_time: float = 0.05, sessions: int = 10000, only: Optional[str] = None,
+        baseline_path: Path = BASELINE, tolerance: float = 0.25) -> dict:
+    logger.disable("backend")
+    skipped: Dict[str, str] = {}
+    results: Dict[str, dict] = {}
+    try:
+        for name, fn in cases(skipped).items():
+            if only is None or only in name:
+                results[name] = measure(fn, repeat, min_time)
+        if only is None or only in 'call_manager' or only.startswith('call_manager'):
+            results.update((name, result) for name, result in call_manager_cases(sessions, repeat).items()
+                           if only is None or only in name)
+    finally:
+        logger.enable("backend")
+
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+    comparison = compare(results, baseline['results'], tolerance) if baseline else {}
+    return {
+        'environment': environment(),
+        'config': {'repeat': repeat, 'min_time': min_time, 'sessions': sessions, 'tolerance': tolerance},
+        'results': results,
+        'skipped': skipped,
+        'comparison': comparison,
+        'regressions': sorted(name for name, item in comparison.items() if item['regressed']),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=7, help='Timed rounds per case')
+    parser.add_argument('--min-time', type=float, default=0.05, help='Seconds each round runs for at least')
+    parser.add_argument('--sessions', type=int, default=10000, help='Live sessions for the call_manager cases')
+    parser.add_argument('--filter', help='Only run cases whose name contains this')
+    parser.add_argument('--baseline', type=Path, default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Slowdown allowed before a case regresses')
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='Exit non-zero on any regression')
+    args = parser.parse_args()
+
+    result = run(args.repeat, args.min_time, args.sessions, args.filter, args.baseline, args.tolerance)
+    print(json.dumps(result, indent=2))
+    if args.save:
+        # A filtered run only replaces the cases it ran
+        saved = json.loads(args.baseline.read_text())['results'] if args.baseline.exists() else {}
+        args.baseline.write_text(json.dumps({
+            'environment': result['environment'],
+            'config': result['config'],
+            'results': dict(sorted({**saved, **result['results']}.items())),
+        }, indent=2) + '\n')
+    if args.check and result['regressions']:
+        sys.exit(1)
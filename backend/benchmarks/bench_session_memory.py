@@ -0,0 +1,71 @@
+"""
+Memory held per session with realistic contents: user info, four call legs, stream
+and conference SIDs, and a ten-message chat history.
+
+    python -m backend.benchmarks.bench_session_memory --sessions 50000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from backend.core.call_manager import CallManager
+from backend.core.constants import CallType
+from backend.models.models import UserInformation
+from backend.utils.utils import logger
+
+
+def fill(call_manager: CallManager, i: int) -> str:
+    session_id = call_manager.create_new_session()
+    call_manager.link_call_to_session(f"CA{i:032d}", "+15550001111", session_id, CallType.CONFERENCE, is_outbound=True)
+    call_manager.link_call_to_session(f"CB{i:032d}", "+15550001111", session_id, CallType.STREAM, is_outbound=False)
+    call_manager.link_call_to_session(f"CC{i:032d}", f"+1666{i:07d}", session_id, CallType.CUSTOMER_SERVICE)
+    call_manager.link_call_to_session(f"CD{i:032d}", f"+1777{i:07d}", session_id, CallType.USER)
+
+    session_data = call_manager.get_session_by_id(session_id)
+    session_data.set_bot_number("+15550001111")
+    session_data.set_cs_number(f"+1666{i:07d}")
+    session_data.set_user_number(f"+1777{i:07d}")
+    session_data.set_user_info(UserInformation(
+        user_name="John Smith",
+        user_email=f"user{i}@example.com",
+        reason_for_call="Double charge on my last statement",
+        account_number=f"{i:010d}",
+    ))
+    session_data.set_twilio_stream_sid(f"MZ{i:032d}")
+    session_data.set_conference_sid(f"CF{i:032d}")
+    for turn in range(5):
+        session_data.add_to_chat_history("user", f"Agent line {turn} for call {i}")
+        session_data.add_to_chat_history("assistant", '{"response_method": "noop", "response_content": ""}')
+    return session_id
+
+
+def run(sessions: int) -> dict:
+    logger.disable("backend")
+    call_manager = CallManager()
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    session_ids = [fill(call_manager, i) for i in range(sessions)]
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    session_data = call_manager.get_session_by_id(session_ids[-1])
+    logger.enable("backend")
+    return {
+        'sessions': sessions,
+        # Includes the call manager's indexes, which are the same for any session layout
+        'traced_bytes_per_session': traced / sessions,
+        'approx_bytes_per_session': session_data.approx_bytes(),
+        'us_per_session_built': elapsed / sessions * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=50000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sessions), indent=2))
@@ -0,0 +1,106 @@
+"""
+TwiML rendering: precompiled templates against building the twilio library's
+VoiceResponse, both on their own and as caller_join_conference webhook latency
+under concurrent load.
+
+    python -m backend.benchmarks.bench_twiml --renders 20000 --requests 4000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+import httpx
+from fastapi import FastAPI
+
+from backend.core.call_manager import CallManager
+from backend.routes import conference_router as router
+from backend.services.twiml_templates import TEMPLATES
+from backend.utils.utils import logger
+
+
+VALUES = {
+    'name': "John Smith",
+    'stream_url': "wss://bot.example.com/w/w1/media/media-stream/0f8fad5b-d9cb-469f-a165-70867728950e",
+    'conference_name': "7c9e6679-7425-40de-944b-e07fc1f90ae7",
+    'events_url': "https://bot.example.com/w/w1/conference/conference_events/0f8fad5b-d9cb-469f-a165-70867728950e",
+    'digits': "1",
+}
+
+
+class LibraryRender:
+    """Stands in for a template, building the VoiceResponse on every render."""
+
+    def __init__(self, template):
+        self.builder = template.builder
+
+    def render(self, **values):
+        return str(self.builder(**values))
+
+
+def render_us(renders: int) -> dict:
+    timings = {}
+    for name, template in TEMPLATES.items():
+        values = {field: VALUES[field] for field in template.fields}
+        for label, renderer in (('library', LibraryRender(template)), ('template', template)):
+            start = time.perf_counter()
+            for _ in range(renders):
+                renderer.render(**values)
+            timings.setdefault(name, {})[label] = (time.perf_counter() - start) / renders * 1e6
+    return timings
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+async def webhook_latency(requests: int, concurrency: int, renderer) -> dict:
+    call_manager = CallManager()
+    session_ids = [call_manager.create_new_session() for _ in range(concurrency)]
+    app = FastAPI()
+    app.include_router(router.conference_router, prefix="/conference")
+
+    latencies = []
+    with patch.object(router, "call_manager", call_manager), patch.object(router, "JOIN_CONFERENCE", renderer):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="https://bot.example.com") as client:
+            async def caller(session_id, count):
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = await client.post(f"/conference/caller_join_conference/{session_id}")
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200
+
+            start = time.perf_counter()
+            await asyncio.gather(*(caller(session_id, requests // concurrency) for session_id in session_ids))
+            elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    return {
+        'requests_per_second': len(ordered) / elapsed,
+        'p50_ms': percentile(ordered, 0.50) * 1e3,
+        'p99_ms': percentile(ordered, 0.99) * 1e3,
+    }
+
+
+def run(renders: int, requests: int, concurrency: int) -> dict:
+    logger.disable("backend")
+    template = TEMPLATES['join_conference']
+    result = {
+        'render_us': render_us(renders),
+        'caller_join_conference': {
+            'library': asyncio.run(webhook_latency(requests, concurrency, LibraryRender(template))),
+            'template': asyncio.run(webhook_latency(requests, concurrency, template)),
+        },
+    }
+    logger.enable("backend")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--renders', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    args = parser.parse_args()
+    print(json.dumps(run(args.renders, args.requests, args.concurrency), indent=2))
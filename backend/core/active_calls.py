@@ -0,0 +1,148 @@
+"""
+Live calls per phone number, kept locally from status callbacks instead of asking
+Twilio with `calls.list` on every request.
+
+`call_events` feeds every status change in. A background task reconciles the index
+with Twilio every ACTIVE_CALL_RECONCILE_INTERVAL seconds for the pool's bot numbers.
+It fixes drift from lost callbacks. With ACTIVE_CALL_END_ORPHANS=1 it also hangs up
+calls that no session owns once they have been seen on two consecutive reconciles.
+That is off by default: a call this worker doesn't know may belong to another worker
+sharing the number, or be a leg that was never linked on purpose, so only turn it on
+when the session store is shared and every call on these numbers has a session.
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from backend.core.constants import TwilioCallStatus
+from backend.utils.utils import logger
+
+
+ACTIVE_CALL_RECONCILE_INTERVAL = float(os.getenv('ACTIVE_CALL_RECONCILE_INTERVAL', 60))
+ACTIVE_CALL_END_ORPHANS = os.getenv('ACTIVE_CALL_END_ORPHANS', '0') == '1'
+# Statuses Twilio is asked about when reconciling
+LIVE_STATUSES = (TwilioCallStatus.QUEUED, TwilioCallStatus.RINGING, TwilioCallStatus.IN_PROGRESS)
+
+
+class ActiveCallIndex:
+    def __init__(self, reconcile_interval: float = ACTIVE_CALL_RECONCILE_INTERVAL,
+                 end_orphans: bool = ACTIVE_CALL_END_ORPHANS):
+        self.reconcile_interval = reconcile_interval
+        self.end_orphans = end_orphans
+        self._calls: Dict[str, Tuple[str, ...]] = {}
+        self._by_number: Dict[str, Set[str]] = {}
+        # Unowned calls seen on the last reconcile; hung up if still there on the next
+        self._suspects: Set[str] = set()
+        self._reconciler: Optional[asyncio.Task] = None
+        self.reconciles = 0
+        self.drift = 0
+        self.orphans_ended = 0
+
+    def update(self, call_sid: str, status: str, *numbers: Optional[str]):
+        """Record a status callback for a call between `numbers`."""
+        try:
+            final = TwilioCallStatus(status).is_final
+        except ValueError:
+            return
+        if final:
+            self._remove(call_sid)
+        elif call_sid not in self._calls:
+            self._add(call_sid, tuple(number for number in numbers if number))
+
+    def _add(self, call_sid: str, numbers: Tuple[str, ...]):
+        self._calls[call_sid] = numbers
+        for number in numbers:
+            self._by_number.setdefault(number, set()).add(call_sid)
+
+    def _remove(self, call_sid: str):
+        for number in self._calls.pop(call_sid, ()):
+            calls = self._by_number.get(number)
+            if calls is not None:
+                calls.discard(call_sid)
+                if not calls:
+                    del self._by_number[number]
+
+    def active(self, number: str) -> Set[str]:
+        return set(self._by_number.get(number, ()))
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    # --- Reconciliation ---
+    async def reconcile(self, twilio_client, numbers: Iterable[str], owned: Callable[[str], Awaitable[bool]]) -> int:
+        """
+        Replace the view of `numbers` with what Twilio reports and, if enabled, hang up
+        orphans. Returns how many calls the index had wrong.
+        """
+        numbers = list(numbers)
+        queries = [(number, status) for number in numbers for status in LIVE_STATUSES]
+        pages = await asyncio.gather(*(
+            twilio_client.calls.list(from_=number, status=status.value) for number, status in queries
+        ))
+        live: Dict[str, Tuple[str, ...]] = {}
+        for calls in pages:
+            for call in calls:
+                live[call.sid] = tuple(number for number in (call.from_, call.to) if number)
+
+        known = set().union(*(self._by_number.get(number, ()) for number in numbers))
+        drift = len(known ^ live.keys())
+        for call_sid in known - live.keys():
+            self._remove(call_sid)
+        for call_sid, call_numbers in live.items():
+            if call_sid not in self._calls:
+                self._add(call_sid, call_numbers)
+
+        if self.end_orphans:
+            await self._end_orphans(twilio_client, live, owned)
+
+        self.reconciles += 1
+        self.drift += drift
+        return drift
+
+    async def _end_orphans(self, twilio_client, live: Iterable[str], owned: Callable[[str], Awaitable[bool]]):
+        unowned = {call_sid for call_sid in live if not await owned(call_sid)}
+        orphans = unowned & self._suspects
+        self._suspects = unowned - orphans
+        if orphans:
+            results = await asyncio.gather(*(
+                twilio_client.calls(call_sid).update(status=TwilioCallStatus.COMPLETED.value) for call_sid in orphans
+            ), return_exceptions=True)
+            for call_sid, result in zip(orphans, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error ending orphaned call {call_sid}: {result}")
+                else:
+                    logger.info(f"Ended orphaned call {call_sid}")
+                    self.orphans_ended += 1
+                    self._remove(call_sid)
+
+    async def _reconcile_forever(self, twilio_client, numbers: Callable[[], Iterable[str]], owned: Callable[[str], Awaitable[bool]]):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                drift = await self.reconcile(twilio_client, numbers(), owned)
+                if drift:
+                    logger.info(f"Active call index was off by {drift} calls")
+            except Exception as e:
+                logger.error(f"Error reconciling active calls: {e}")
+
+    def start(self, twilio_client, numbers: Callable[[], Iterable[str]], owned: Callable[[str], Awaitable[bool]]):
+        if self._reconciler is None or self._reconciler.done():
+            self._reconciler = asyncio.create_task(self._reconcile_forever(twilio_client, numbers, owned))
+
+    async def stop(self):
+        if self._reconciler is not None:
+            self._reconciler.cancel()
+            await asyncio.gather(self._reconciler, return_exceptions=True)
+            self._reconciler = None
+
+    def snapshot(self) -> dict:
+        return {
+            'active_calls': len(self._calls),
+            'reconciles': self.reconciles,
+            'drift': self.drift,
+            'orphans_ended': self.orphans_ended,
+        }
+
+
+# Singleton
+active_calls = ActiveCallIndex()
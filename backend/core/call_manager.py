@@ -1,122 +1,372 @@
+import asyncio
+import os
 import threading
 import uuid
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional, Set
 
 from backend.core.constants import CallType
+from backend.core.redis_session_store import RedisSessionStore
+from backend.core.session_journal import SessionJournal
+from backend.core.session_store import SessionStore
 from backend.models.session_data import SessionData
-from backend.models.models import CallSids
+from backend.models.models import CallSids, ChatMessage
 from backend.utils.utils import logger
 
 
-class CallManager:
+SESSION_SHARDS = int(os.getenv('SESSION_SHARDS', 16))
+# e.g. redis://localhost:6379/0 to share sessions between workers
+SESSION_STORE_URL = os.getenv('SESSION_STORE_URL')
+# Directory for the in-memory store's journal, so sessions survive a restart
+SESSION_JOURNAL_DIR = os.getenv('SESSION_JOURNAL_DIR')
+
+
+class _Shard:
+    """The sessions whose id hashes to this shard, and the lock guarding their mutations."""
+    __slots__ = ('lock', 'sessions', 'session_calls', 'session_numbers', 'session_user', 'finished_calls', 'turn_locks',
+                 'journaled_chat')
+
     def __init__(self):
-        self._lock = threading.Lock()
-        self._sessions: Dict[str, SessionData] = {}
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, SessionData] = {}
+        # Reverse indexes so a session can be removed without scanning every call
+        self.session_calls: Dict[str, Set[str]] = {}
+        self.session_numbers: Dict[str, Set[str]] = {}
+        # The user number each session is indexed under
+        self.session_user: Dict[str, str] = {}
+        self.finished_calls: Dict[str, Set[str]] = {}
+        self.turn_locks: Dict[str, asyncio.Lock] = {}
+        # Chat messages already in the journal, so saves only append the new ones
+        self.journaled_chat: Dict[str, int] = {}
+
+
+class CallManager(SessionStore):
+    """
+    In-memory session store, the default for a single worker.
+
+    Sessions are sharded by session id and each shard has its own lock, so mutations of
+    unrelated sessions never wait on each other. Lookups by session id or call SID are
+    single dict reads and take no lock. The number and call SID indexes are guarded by
+    striped locks keyed on the number or SID. Locks are only held for a few dict
+    operations and never across an await. On the event loop they are uncontended; they
+    exist for the SDK callback threads. Updates that span an await (a chat turn) use
+    the per-session asyncio lock from `session_lock`.
+
+    With a journal, every mutation is also appended to it (under the shard lock, so
+    a session's records are in order) and `restore` rebuilds the sessions on startup.
+    """
+
+    def __init__(self, shards: int = SESSION_SHARDS, journal: Optional[SessionJournal] = None):
+        self._journal = journal
+        self._shards = [_Shard() for _ in range(shards)]
+        self._index_locks = [threading.Lock() for _ in range(shards)]
         self._call_to_session: Dict[str, str] = {}
-        self._number_to_session: Dict[str, str] = {}
+        # number -> session_id -> call SIDs linked on that number, in link order
+        self._number_to_session: Dict[str, Dict[str, List[str]]] = {}
+        # user number -> sessions calling on that user's behalf
+        self._user_sessions: Dict[str, Set[str]] = {}
+
+    def _shard(self, session_id: str) -> _Shard:
+        return self._shards[hash(session_id) % len(self._shards)]
+
+    def _index_lock(self, key: str) -> threading.Lock:
+        # Always taken after a shard lock, never while holding another index lock
+        return self._index_locks[hash(key) % len(self._index_locks)]
 
-    def create_new_session(self) -> str:
+    def create_new_session(self, session_id: Optional[str] = None) -> str:
         """Create a new session_id and store an empty session."""
-        with self._lock:
-            session_id = str(uuid.uuid4())
-            conference_name = str(uuid.uuid4())
-            
-            session_data = SessionData(
-                session_id=session_id,
-                conference_name=conference_name,
-            )
-            
-            self._sessions[session_id] = session_data
-            return session_id
-        
+        session_id = session_id or str(uuid.uuid4())
+        conference_name = str(uuid.uuid4())
+
+        session_data = SessionData(
+            session_id=session_id,
+            conference_name=conference_name,
+        )
+
+        shard = self._shard(session_id)
+        with shard.lock:
+            self._insert(shard, session_data)
+            if self._journal is not None:
+                self._journal.append(['c', _full_record(session_data)])
+        return session_id
+
+    def _insert(self, shard: _Shard, session_data: SessionData):
+        session_id = session_data.session_id
+        shard.session_calls[session_id] = set()
+        shard.session_numbers[session_id] = set()
+        shard.sessions[session_id] = session_data
+
     def check_session_exists(self, call_numbers: list[str]) -> Optional[str]:
-        """Check if a session exists for the given call number."""
-        with self._lock:
-            for call_number in call_numbers:
-                if call_number in self._number_to_session:
-                    return call_number, self._number_to_session[call_number]
-            return None
+        """
+        Check if a session exists for the given call number.
+        Returns (number, [(session_id, call_sid), ...]) for the first number in use.
+        """
+        for call_number in call_numbers:
+            with self._index_lock(call_number):
+                sessions = self._number_to_session.get(call_number)
+                if sessions:
+                    return call_number, [(session_id, call_sid) for session_id, call_sids in sessions.items() for call_sid in call_sids]
+        return None
 
     def link_call_to_session(self, call_sid: str, call_number: str, session_id: str, call_type: CallType, is_outbound: Optional[bool] = None):
         """
         Associate a callSid with an existing session and set appropriate session values.
-        
+
         Args:
             call_sid: The Twilio call SID
             session_id: The session to link to
             call_type: The type of call (from CallType enum)
             is_outbound: For bot calls, specify if outbound. Must be set if call_type is a bot call.
         """
-        with self._lock:
-            logger.info(f"Linking call {call_sid} to session {session_id}")
-            if session_id not in self._sessions:
+        logger.info(f"Linking call {call_sid} to session {session_id}")
+        shard = self._shard(session_id)
+        with shard.lock:
+            session_data = shard.sessions.get(session_id)
+            if session_data is None:
                 logger.error(f"Session {session_id} not found")
                 return
-            
-            # Link call to session
+
+            session_data.set_call_sid(call_type, call_sid, is_outbound)
+            self._index_call(shard, call_sid, call_number, session_id)
+            if self._journal is not None:
+                self._journal.append(['l', call_sid, call_number, session_id, call_type.value, is_outbound])
+
+    def _index_call(self, shard: _Shard, call_sid: str, call_number: str, session_id: str):
+        shard.session_calls[session_id].add(call_sid)
+        shard.session_numbers[session_id].add(call_number)
+        # Link call to session
+        with self._index_lock(call_sid):
             self._call_to_session[call_sid] = session_id
-            self._sessions[session_id].set_call_sid(call_type, call_sid, is_outbound)
-            # Need to have multiple sessions for the same number because of the bot
-            if call_number in self._number_to_session:
-                self._number_to_session[call_number].append((session_id, call_sid))
-            else:
-                self._number_to_session[call_number] = [(session_id, call_sid)]
-            
+        # Need to have multiple sessions for the same number because of the bot
+        with self._index_lock(call_number):
+            self._number_to_session.setdefault(call_number, {}).setdefault(session_id, []).append(call_sid)
+
+    def _index_user(self, shard: _Shard, session_data: SessionData):
+        session_id, number = session_data.session_id, session_data.user_number
+        previous = shard.session_user.get(session_id)
+        if previous == number:
+            return
+        if previous is not None:
+            self._unindex_user(shard, session_id)
+        if number:
+            shard.session_user[session_id] = number
+            with self._index_lock(number):
+                self._user_sessions.setdefault(number, set()).add(session_id)
+
+    def _unindex_user(self, shard: _Shard, session_id: str):
+        number = shard.session_user.pop(session_id, None)
+        if number is None:
+            return
+        with self._index_lock(number):
+            sessions = self._user_sessions[number]
+            sessions.discard(session_id)
+            if not sessions:
+                del self._user_sessions[number]
+
+    def get_sessions_by_user_number(self, user_number: str) -> List[str]:
+        with self._index_lock(user_number):
+            return sorted(self._user_sessions.get(user_number, ()))
+
     def get_session_by_call_sid(self, call_sid: str) -> Optional[SessionData]:
         """Given a callSid, return the session it belongs to, or None."""
-        with self._lock:
-            session_id = self._call_to_session.get(call_sid)
-            if not session_id:
-                logger.error(f"CallSid {call_sid} not found in any session")
-                return None
+        session_id = self._call_to_session.get(call_sid)
+        if not session_id:
+            logger.error(f"CallSid {call_sid} not found in any session")
+            return None
 
-            return self._sessions.get(session_id)
+        return self._shard(session_id).sessions.get(session_id)
 
     def get_session_by_id(self, session_id: str) -> Optional[SessionData]:
-        with self._lock:
-            if session_id not in self._sessions:
-                logger.error(f"Session {session_id} not found")
-                return None
-            return self._sessions.get(session_id)
+        session_data = self._shard(session_id).sessions.get(session_id)
+        if session_data is None:
+            logger.error(f"Session {session_id} not found")
+        return session_data
 
     def get_session_by_number(self, bot_number: str) -> Optional[SessionData]:
         """Get session using the bot number."""
-        with self._lock:
-            session_id_pairs = self._number_to_session.get(bot_number)
+        with self._index_lock(bot_number):
+            sessions = self._number_to_session.get(bot_number)
             # TODO: have check for multiple sessions in the caller
-            if not session_id_pairs:
+            if not sessions:
                 logger.error(f"Bot number {bot_number} not found in any session")
                 return None
-            
-            unique_session_ids = {session_id for session_id, _ in session_id_pairs}
-            if len(unique_session_ids) > 1:
+
+            if len(sessions) > 1:
                 logger.error(f"Multiple sessions found for bot number {bot_number}")
                 return None
 
-            assert len(unique_session_ids) == 1
-            session_id = next(iter(unique_session_ids))
-            return self._sessions.get(session_id)
+            session_id = next(iter(sessions))
+        return self._shard(session_id).sessions.get(session_id)
+
+    def get_call_sids(self, session_id: str) -> Set[str]:
+        """Every call SID linked to the session."""
+        shard = self._shard(session_id)
+        with shard.lock:
+            return set(shard.session_calls.get(session_id, ()))
+
+    def finish_call(self, session_id: str, call_sid: str) -> Set[str]:
+        shard = self._shard(session_id)
+        with shard.lock:
+            if call_sid not in shard.session_calls.get(session_id, ()):
+                return set()
+            finished = shard.finished_calls.setdefault(session_id, set())
+            if call_sid not in finished and self._journal is not None:
+                self._journal.append(['f', session_id, call_sid])
+            finished.add(call_sid)
+            return set(finished)
+
+    def list_sessions(self) -> List[SessionData]:
+        """Snapshot of all live sessions."""
+        sessions = []
+        for shard in self._shards:
+            with shard.lock:
+                sessions.extend(shard.sessions.values())
+        return sessions
+
+    def session_lock(self, session_id: str) -> asyncio.Lock:
+        """
+        Lock serializing async updates to one session, e.g. a chat turn that writes the
+        user message, awaits the model and then writes the reply.
+        """
+        shard = self._shard(session_id)
+        with shard.lock:
+            if session_id not in shard.sessions:
+                return asyncio.Lock()
+            return shard.turn_locks.setdefault(session_id, asyncio.Lock())
+
+    def session_count(self) -> int:
+        return sum(len(shard.sessions) for shard in self._shards)
+
+    @property
+    def journal(self) -> Optional[SessionJournal]:
+        return self._journal
+
+    def save_session(self, session_data: SessionData, *fields: str):
+        """Sessions are live objects, so this only indexes the user number and journals the change."""
+        fields = fields or tuple(name for name in SessionData.__slots__ if name != 'session_id')
+        if self._journal is None and 'user_number' not in fields:
+            return
+        session_id = session_data.session_id
+        shard = self._shard(session_id)
+        with shard.lock:
+            if session_id not in shard.sessions:
+                return
+            if 'user_number' in fields:
+                self._index_user(shard, session_data)
+            if self._journal is None:
+                return
+            if 'chat_history' in fields:
+                journaled = shard.journaled_chat.get(session_id, 0)
+                for message in session_data.chat_history[journaled:]:
+                    self._journal.append(['m', session_id, message.role, message.content])
+                shard.journaled_chat[session_id] = len(session_data.chat_history)
+            record = session_data.to_record([name for name in fields if name != 'chat_history'])
+            if record:
+                self._journal.append(['s', session_id, record])
+
+    # --- Journal ---
+    def apply(self, op: list):
+        """Apply one journal record, without journaling it again."""
+        kind = op[0]
+        if kind == 'c':
+            session_data = SessionData.from_record(op[1])
+            shard = self._shard(session_data.session_id)
+            with shard.lock:
+                self._insert(shard, session_data)
+                self._index_user(shard, session_data)
+                shard.journaled_chat[session_data.session_id] = len(session_data.chat_history)
+            return
+
+        session_id = op[3] if kind in ('l', 'i') else op[1]
+        shard = self._shard(session_id)
+        with shard.lock:
+            session_data = shard.sessions.get(session_id)
+            if session_data is None:
+                return
+            if kind == 'l':
+                session_data.set_call_sid(CallType(op[4]), op[1], op[5])
+                self._index_call(shard, op[1], op[2], session_id)
+            elif kind == 'i':
+                self._index_call(shard, op[1], op[2], session_id)
+            elif kind == 's':
+                session_data.apply_record(op[2])
+                self._index_user(shard, session_data)
+            elif kind == 'm':
+                session_data.chat_history.append(ChatMessage(op[2], op[3]))
+                shard.journaled_chat[session_id] = shard.journaled_chat.get(session_id, 0) + 1
+            elif kind == 'f':
+                shard.finished_calls.setdefault(session_id, set()).add(op[2])
+        if kind == 'd':
+            self.delete_session(session_id)
+
+    def snapshot_ops(self) -> Iterator[list]:
+        """The live state as journal records, for compaction."""
+        for shard in self._shards:
+            with shard.lock:
+                sessions = list(shard.sessions.values())
+            for session_data in sessions:
+                session_id = session_data.session_id
+                yield ['c', _full_record(session_data)]
+                for number in sorted(shard.session_numbers.get(session_id, ())):
+                    for call_sid in self._number_to_session.get(number, {}).get(session_id, ()):
+                        yield ['i', call_sid, number, session_id]
+                for call_sid in sorted(shard.finished_calls.get(session_id, ())):
+                    yield ['f', session_id, call_sid]
+
+    def restore(self) -> int:
+        """Rebuild sessions from the journal on startup; returns the records applied."""
+        if self._journal is None:
+            return 0
+        journal, self._journal = self._journal, None
+        try:
+            applied = journal.replay(self)
+        finally:
+            self._journal = journal
+        journal.start()
+        logger.info(f"Restored {self.session_count()} sessions from {applied} journal records")
+        return applied
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
 
     def delete_session(self, session_id: str):
         """Clean up session data once it's no longer needed."""
-        with self._lock:
-            if session_id in self._sessions:
-                # 1. Remove references to this session in _number_to_session
-                for number, tuples in list(self._number_to_session.items()):
-                    new_tuples = [(sid, c_sid) for (sid, c_sid) in tuples if sid != session_id]
-                    if not new_tuples:
-                        # If no pairs remain, remove the number entirely
+        shard = self._shard(session_id)
+        with shard.lock:
+            if session_id not in shard.sessions:
+                return
+            if self._journal is not None:
+                self._journal.append(['d', session_id])
+
+            # 1. Remove references to this session in _number_to_session
+            for number in shard.session_numbers.pop(session_id):
+                with self._index_lock(number):
+                    sessions = self._number_to_session[number]
+                    del sessions[session_id]
+                    if not sessions:
+                        # If no sessions remain, remove the number entirely
                         del self._number_to_session[number]
-                    else:
-                        self._number_to_session[number] = new_tuples
 
-                # 2. Remove call_sid -> session_id mappings
-                for call_sid, sid in list(self._call_to_session.items()):
-                    if sid == session_id:
+            # 2. Remove call_sid -> session_id mappings
+            for call_sid in shard.session_calls.pop(session_id):
+                with self._index_lock(call_sid):
+                    # A SID relinked to a newer session belongs to that session now
+                    if self._call_to_session.get(call_sid) == session_id:
                         del self._call_to_session[call_sid]
 
-                # 3. Remove the session object
-                del self._sessions[session_id]
-    
+            # 3. Remove the session object
+            self._unindex_user(shard, session_id)
+            shard.finished_calls.pop(session_id, None)
+            shard.journaled_chat.pop(session_id, None)
+            shard.turn_locks.pop(session_id, None)
+            del shard.sessions[session_id]
+
+def _full_record(session_data: SessionData) -> dict:
+    return {key: value for key, value in session_data.to_record().items() if value}
+
+
 # Singleton
-call_manager = CallManager()
+if SESSION_STORE_URL:
+    call_manager: SessionStore = RedisSessionStore.from_url(SESSION_STORE_URL)
+else:
+    call_manager = CallManager(journal=SessionJournal(SESSION_JOURNAL_DIR) if SESSION_JOURNAL_DIR else None)
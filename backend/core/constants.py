@@ -10,10 +10,25 @@ class UserInformationKeys(Enum):
 
 
 class TwilioCallStatus(Enum):
+    QUEUED = 'queued'
     INITIATED = 'initiated'
     RINGING = 'ringing'
     IN_PROGRESS = 'in-progress'
     COMPLETED = 'completed'
+    BUSY = 'busy'
+    FAILED = 'failed'
+    NO_ANSWER = 'no-answer'
+    CANCELED = 'canceled'
+
+    @property
+    def is_final(self) -> bool:
+        return self in {
+            TwilioCallStatus.COMPLETED,
+            TwilioCallStatus.BUSY,
+            TwilioCallStatus.FAILED,
+            TwilioCallStatus.NO_ANSWER,
+            TwilioCallStatus.CANCELED
+        }
 
 class ResponseMethod(Enum):
     NOOP = 'noop'
@@ -60,3 +75,24 @@ class CallType(Enum):
 class CallDirection(Enum):
     INBOUND = "inbound"
     OUTBOUND = "outbound"
+
+
+class LLMPriority(Enum):
+    # Lower value is served first
+    LIVE_TURN = 0
+    SPECULATIVE = 1
+    BACKGROUND = 2  # Summaries, warm-ups and other housekeeping
+
+
+class ModelRoute(Enum):
+    FAST = 'fast'
+    STRONG = 'strong'
+    CACHED = 'cached'  # Served from the answer cache without a model call
+
+
+class EvictionReason(Enum):
+    COMPLETED = 'completed'  # Every call leg reported a final status
+    IDLE = 'idle'
+    EXPIRED = 'expired'  # Older than the maximum session age
+    REPLACED = 'replaced'  # The same user initiated a new call
+    FAILED = 'failed'  # Setting up the calls failed
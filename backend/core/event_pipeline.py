@@ -0,0 +1,106 @@
+"""
+Acknowledge-then-process for Twilio's status webhooks.
+
+The webhooks only validate the callback, queue a typed event and reply. Each session
+gets its own consumer task that applies the session's events one at a time, in
+arrival order. So a burst of participant joins across many conferences costs the
+webhooks nothing, and one session's events never race each other. A consumer exits
+when its queue is empty and is started again by the next event.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from backend.utils.utils import logger
+
+
+EVENT_PIPELINE_MAX_PENDING = int(os.getenv('EVENT_PIPELINE_MAX_PENDING', 10000))
+LAG_WINDOW = 1000
+
+Handler = Callable[[Any], Awaitable[None]]
+
+
+class EventPipeline:
+    def __init__(self, max_pending: int = EVENT_PIPELINE_MAX_PENDING):
+        self.max_pending = max_pending
+        self._queues: Dict[str, Deque[Tuple[Handler, Any, float]]] = {}
+        self._consumers: Dict[str, asyncio.Task] = {}
+        self._pending = 0
+        # Seconds from enqueue to the handler starting, and spent in the handler
+        self._lag: Deque[float] = deque(maxlen=LAG_WINDOW)
+        self._handle: Deque[float] = deque(maxlen=LAG_WINDOW)
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, key: str, handler: Handler, event: Any) -> bool:
+        """
+        Queue `handler(event)` behind the other events for `key` (a session id).
+        Returns False, without queueing, when the pipeline is full.
+        """
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning(f"Event pipeline full, rejecting {type(event).__name__} for {key}")
+            return False
+        self._queues.setdefault(key, deque()).append((handler, event, time.perf_counter()))
+        self._pending += 1
+        if key not in self._consumers:
+            self._consumers[key] = asyncio.create_task(self._consume(key))
+        return True
+
+    async def _consume(self, key: str):
+        queue = self._queues[key]
+        try:
+            while queue:
+                handler, event, enqueued_at = queue.popleft()
+                self._pending -= 1
+                start = time.perf_counter()
+                self._lag.append(start - enqueued_at)
+                # Webhook events carry the session and call they're about; tag their logs
+                fields = {name: getattr(event, name, None) for name in ('session_id', 'call_sid')}
+                try:
+                    with logger.contextualize(**fields):
+                        await handler(event)
+                    self.processed += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Error handling {type(event).__name__} for {key}: {e}")
+                self._handle.append(time.perf_counter() - start)
+        finally:
+            # No await since the last check, so nothing was queued in between
+            self._pending -= len(queue)
+            del self._queues[key]
+            del self._consumers[key]
+
+    async def drain(self):
+        """Wait until every queued event has been handled."""
+        while self._consumers:
+            await asyncio.gather(*list(self._consumers.values()), return_exceptions=True)
+
+    @staticmethod
+    def _percentiles(samples: Deque[float]) -> Optional[dict]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return {
+            'p50': ordered[len(ordered) // 2],
+            'p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+            'max': ordered[-1],
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            'pending': self._pending,
+            'consumers': len(self._consumers),
+            'processed': self.processed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'lag_seconds': self._percentiles(self._lag),
+            'handle_seconds': self._percentiles(self._handle),
+        }
+
+
+# Singleton
+event_pipeline = EventPipeline()
@@ -0,0 +1,193 @@
+"""
+Event-loop lag watchdog.
+
+A heartbeat task on the loop wakes every `interval` and records how late it woke into
+the `event_loop_lag_seconds` histogram. A helper thread watches the heartbeat: once it
+is more than `threshold` overdue, the loop is stuck in something that doesn't await,
+and the thread captures the loop thread's stack right then, while the blocking frame
+is still on it. When the loop comes back, the stall is logged with that stack, how
+long it lasted, and the session/call it was working for, and counted by blocking site
+in `event_loop_stalls_total`.
+
+The session comes from the locals of the blocked frames (session_id, call_sid,
+stream_sid), since another thread can't read the task's context variables. Reading
+them is safe: the loop thread can't run Python code while the watchdog holds the GIL.
+
+Overhead is a timer and a thread wakeup per interval, so it stays on in production.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from backend.core.metrics import metrics
+from backend.utils.utils import logger
+
+
+LOOP_WATCHDOG_ENABLED = os.getenv('LOOP_WATCHDOG', '1') != '0'
+LOOP_WATCHDOG_INTERVAL = float(os.getenv('LOOP_WATCHDOG_INTERVAL', 0.1))
+# Lag that counts as a stall and gets its stack captured
+LOOP_WATCHDOG_THRESHOLD = float(os.getenv('LOOP_WATCHDOG_THRESHOLD', 0.25))
+# Still blocked after this long: report from the watchdog thread without waiting
+LOOP_WATCHDOG_STUCK_SECONDS = float(os.getenv('LOOP_WATCHDOG_STUCK_SECONDS', 5.0))
+
+CONTEXT_FIELDS = ('session_id', 'call_sid', 'stream_sid')
+# Where the loop hands control to a callback or task step; frames above it are the loop's own
+_LOOP_DISPATCH = asyncio.events.Handle._run.__code__
+STACK_LIMIT = 25
+BACKEND_DIR = str(Path(__file__).resolve().parent.parent)
+
+loop_lag_seconds = metrics.histogram(
+    'event_loop_lag_seconds', 'How late the event loop heartbeat woke up',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+loop_stalls_total = metrics.counter(
+    'event_loop_stalls', 'Times the event loop was blocked past the watchdog threshold, by blocking site',
+    labelnames=('site',),
+)
+
+
+@dataclass
+class Stall:
+    """What the loop thread was doing when the heartbeat went overdue."""
+    beat: float
+    site: str
+    stack: List[str]
+    task: Optional[str] = None
+    context: Dict[str, str] = field(default_factory=dict)
+    reported: bool = False
+
+
+def _site(frames: List) -> str:
+    """The innermost frame in the app's own code, as module.function."""
+    for frame in frames:
+        if frame.f_code.co_filename.startswith(BACKEND_DIR):
+            break
+    else:
+        frame = frames[0]
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+
+def _context(frames: List) -> Dict[str, str]:
+    found = {}
+    for frame in frames:
+        values = frame.f_locals
+        for name in CONTEXT_FIELDS:
+            if name not in found and isinstance(values.get(name), str):
+                found[name] = values[name]
+        if len(found) == len(CONTEXT_FIELDS):
+            break
+    return found
+
+
+class LoopWatchdog:
+    def __init__(self, interval: float = LOOP_WATCHDOG_INTERVAL, threshold: float = LOOP_WATCHDOG_THRESHOLD,
+                 stuck_seconds: float = LOOP_WATCHDOG_STUCK_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.interval = interval
+        self.threshold = threshold
+        self.stuck_seconds = stuck_seconds
+        self._clock = clock
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._last_beat = 0.0
+        # Set by the watchdog thread, consumed by the heartbeat
+        self._stall: Optional[Stall] = None
+        self.stalls = 0
+        self.max_lag = 0.0
+
+    def start(self):
+        """Start watching the running loop."""
+        if self._heartbeat is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = self._clock()
+        self._stopping.clear()
+        self._heartbeat = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._heartbeat is None:
+            return
+        self._stopping.set()
+        self._heartbeat.cancel()
+        await asyncio.gather(self._heartbeat, return_exceptions=True)
+        await asyncio.to_thread(self._thread.join)
+        self._heartbeat = self._thread = None
+
+    # --- On the loop ---
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            beat, now = self._last_beat, self._clock()
+            lag = max(0.0, now - beat - self.interval)
+            self._last_beat = now
+            loop_lag_seconds.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                stall, self._stall = self._stall, None
+                self._report(lag, stall if stall is not None and stall.beat == beat else None)
+
+    def _report(self, lag: float, stall: Optional[Stall]):
+        self.stalls += 1
+        if stall is None:
+            # Over and done with between two watchdog checks, so no stack
+            loop_stalls_total.inc('unknown')
+            logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms")
+            return
+        loop_stalls_total.inc(stall.site)
+        logger.bind(**stall.context).warning(
+            f"Event loop blocked for {lag * 1000:.0f}ms in {stall.site}"
+            f"{f' (task {stall.task})' if stall.task else ''}:\n" + ''.join(stall.stack)
+        )
+
+    # --- On the watchdog thread ---
+    def _watch(self):
+        while not self._stopping.wait(self.interval):
+            beat = self._last_beat
+            blocked = self._clock() - beat - self.interval
+            if blocked < self.threshold:
+                continue
+            stall = self._stall
+            if stall is None or stall.beat != beat:
+                self._stall = stall = self._capture(beat)
+            if stall is not None and not stall.reported and blocked >= self.stuck_seconds:
+                stall.reported = True
+                logger.bind(**stall.context).error(
+                    f"Event loop still blocked after {blocked:.1f}s in {stall.site}:\n" + ''.join(stall.stack)
+                )
+
+    def _capture(self, beat: float) -> Optional[Stall]:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return None
+        frames = []
+        while frame is not None and frame.f_code is not _LOOP_DISPATCH:
+            frames.append(frame)
+            frame = frame.f_back
+        if not frames:
+            return None
+        task = asyncio.current_task(self._loop)
+        return Stall(
+            beat=beat,
+            site=_site(frames),
+            stack=traceback.format_list(traceback.extract_stack(frames[0], limit=min(len(frames), STACK_LIMIT))),
+            task=task.get_name() if task is not None else None,
+            context=_context(frames),
+        )
+
+    def snapshot(self) -> dict:
+        return {'running': self._heartbeat is not None, 'stalls': self.stalls, 'max_lag_seconds': self.max_lag}
+
+
+# Singleton
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,176 @@
+"""
+Prometheus-compatible metrics, without a client library.
+
+Histograms and counters are updated in place where things happen; an observation is
+a bisect and a few additions. Gauges aren't tracked at all: collectors read them from
+the components' own snapshot()s when /metrics is scraped. render() produces the text
+exposition format (version 0.0.4).
+
+    turn_seconds = metrics.histogram('turn_seconds', 'Turn latency', labelnames=('stage',))
+    turn_seconds.observe(0.42, 'llm')
+
+    @metrics.collector
+    def sessions():
+        yield gauge('live_sessions', 'Sessions in memory', session_lifecycle.snapshot()['live_sessions'])
+"""
+import bisect
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+from backend.utils.utils import logger
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+Labels = Mapping[str, str]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+@dataclass
+class MetricFamily:
+    """One metric as exposed: its samples are (suffix, labels, value)."""
+    name: str
+    type: str
+    help: str
+    samples: List[Tuple[str, Labels, float]] = field(default_factory=list)
+
+    def render(self) -> List[str]:
+        help = self.help.replace('\\', '\\\\').replace('\n', '\\n')
+        lines = [f"# HELP {self.name} {help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{self.name}{suffix}{_labels(labels)} {_value(value)}" for suffix, labels, value in self.samples)
+        return lines
+
+
+def gauge(name: str, help: str, value: Union[float, Mapping[str, float]], label: Optional[str] = None) -> MetricFamily:
+    """A gauge family: one value, or one value per label value when `label` is given."""
+    if label is None:
+        return MetricFamily(name, 'gauge', help, [('', {}, value)])
+    return MetricFamily(name, 'gauge', help, [('', {label: key}, item) for key, item in value.items()])
+
+
+def counter(name: str, help: str, value: Union[float, Mapping[str, float]], label: Optional[str] = None) -> MetricFamily:
+    """A counter read from a snapshot; same shape as gauge()."""
+    family = gauge(name, help, value, label)
+    family.type = 'counter'
+    return family
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def family(self) -> MetricFamily:
+        family = MetricFamily(self.name, 'histogram', self.help)
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for labelvalues, (counts, total, count) in sorted(series.items()):
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                family.samples.append(('_bucket', {**labels, 'le': _value(bound)}, cumulative))
+            family.samples.append(('_sum', labels, total))
+            family.samples.append(('_count', labels, count))
+        return family
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Unlabelled counters are exposed from zero
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def family(self) -> MetricFamily:
+        with self._lock:
+            values = dict(self._values)
+        return MetricFamily(f"{self.name}_total", 'counter', self.help, [
+            ('', dict(zip(self.labelnames, labelvalues)), value) for labelvalues, value in sorted(values.items())
+        ])
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = 'callbot_'):
+        self.prefix = prefix
+        self._metrics: List[Union[Histogram, Counter]] = []
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS,
+                  labelnames: Sequence[str] = ()) -> Histogram:
+        metric = Histogram(self.prefix + name, help, buckets, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(self.prefix + name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[MetricFamily]]):
+        """Register fn, called on every scrape for gauges read from current state."""
+        self._collectors.append(fn)
+        return fn
+
+    def families(self) -> List[MetricFamily]:
+        families = [metric.family() for metric in self._metrics]
+        for collect in self._collectors:
+            try:
+                for family in collect():
+                    family.name = self.prefix + family.name
+                    families.append(family)
+            except Exception as e:
+                # One broken collector shouldn't take the whole endpoint down
+                logger.error(f"Metrics collector {collect.__name__} failed: {e}")
+        return families
+
+    def render(self) -> str:
+        lines = []
+        for family in self.families():
+            lines.extend(family.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Singleton
+metrics = MetricsRegistry()
@@ -0,0 +1,207 @@
+"""
+Pool of bot numbers, so concurrent calls scale with the numbers we own instead of
+one session per number.
+
+Each number carries up to BOT_NUMBER_CAPACITY sessions. Idle capacity is kept in
+one bucket per load level, and each bucket is ordered least recently used first, so
+a reservation takes the least-loaded number and, among those, the one that has been
+idle longest. Reserve and release touch one bucket each and are O(1) for a fixed
+capacity.
+
+The bot dials its number to open the media stream, and the inbound webhook carries
+nothing but the From/To pair and a new CallSid. So each session on a number dials it
+from a caller no other session on that number is using: the number itself for the
+first, then other pool numbers. The (caller, number) pair names exactly one waiting
+session, whatever order the legs come in; once a CallSid is claimed, Twilio retries
+of the same webhook resolve to the same session. A number can therefore carry at
+most as many sessions as the pool has numbers.
+
+Tearing a session down hangs up its calls, but that can fail. So the pool remembers
+the calls its sessions placed or took in on a number, and hands them back as possibly
+leaked the next time that number is reserved, so the caller can end any still live.
+
+The pool is per worker: give each worker its own BOT_NUMBERS (run.py's launcher
+deals them out).
+"""
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from backend.utils.utils import logger
+
+
+BOT_NUMBERS = [number.strip() for number in os.getenv('BOT_NUMBERS', '').split(',') if number.strip()]
+BOT_NUMBER_CAPACITY = int(os.getenv('BOT_NUMBER_CAPACITY', 1))
+
+
+class NumberPoolExhausted(Exception):
+    """Every bot number is carrying as many calls as it can."""
+
+
+class NumberPool:
+    def __init__(self, numbers: Optional[List[str]] = None, capacity: int = BOT_NUMBER_CAPACITY):
+        if capacity < 1:
+            raise ValueError(f"Bot number capacity must be at least 1, got {capacity}")
+        self.capacity = capacity
+        # _idle[load] holds the numbers carrying `load` sessions, least recently used first
+        self._idle: List["OrderedDict[str, None]"] = [OrderedDict() for _ in range(capacity)]
+        self._load: Dict[str, int] = {}
+        self._session_number: Dict[str, str] = {}
+        # number -> callers its sessions are dialling it from
+        self._callers: Dict[str, Set[str]] = {}
+        self._session_caller: Dict[str, str] = {}
+        # (caller, number) -> session waiting for that inbound stream leg
+        self._awaiting_inbound: Dict[Tuple[str, str], str] = {}
+        self._inbound_calls: Dict[str, str] = {}
+        self._session_inbound: Dict[str, List[str]] = {}
+        # Calls on each session's number, and those left behind by released sessions
+        self._session_calls: Dict[str, List[str]] = {}
+        self._leaked: Dict[str, Set[str]] = {}
+        self.exhausted = 0
+        for number in numbers if numbers is not None else BOT_NUMBERS:
+            self.add(number)
+
+    def add(self, number: str):
+        if number not in self._load:
+            self._load[number] = 0
+            self._idle[0][number] = None
+
+    def __contains__(self, number: str) -> bool:
+        return number in self._load
+
+    def __len__(self) -> int:
+        return len(self._load)
+
+    # --- Reservation ---
+    def reserve(self, session_id: str, number: Optional[str] = None) -> str:
+        """
+        Give the session a bot number: the requested one, which joins the pool if it is
+        new, or else the least-loaded, least recently used number.
+        Raises NumberPoolExhausted when no capacity is left.
+        """
+        if session_id in self._session_number:
+            return self._session_number[session_id]
+
+        if number is not None:
+            self.add(number)
+            load = self._load[number]
+            caller = self._free_caller(number)
+            if load >= self.capacity or caller is None:
+                self.exhausted += 1
+                raise NumberPoolExhausted(f"Bot number {number} is already carrying {load} calls")
+            del self._idle[load][number]
+        else:
+            bucket = next((bucket for bucket in self._idle if bucket), None)
+            if bucket is None:
+                self.exhausted += 1
+                raise NumberPoolExhausted(f"All {len(self)} bot numbers are busy")
+            number = next(iter(bucket))
+            caller = self._free_caller(number)
+            if caller is None:
+                self.exhausted += 1
+                raise NumberPoolExhausted(f"No free caller for bot number {number}; "
+                                          f"capacity {self.capacity} exceeds the {len(self)} numbers in the pool")
+            del bucket[number]
+            load = self._load[number]
+
+        load += 1
+        self._load[number] = load
+        if load < self.capacity:
+            self._idle[load][number] = None
+        self._session_number[session_id] = number
+        self._callers.setdefault(number, set()).add(caller)
+        self._session_caller[session_id] = caller
+        return number
+
+    def _free_caller(self, number: str) -> Optional[str]:
+        """A number to dial `number` from that none of its sessions is using, itself first."""
+        in_use = self._callers.get(number, ())
+        if number not in in_use:
+            return number
+        return next((caller for caller in self._load if caller not in in_use), None)
+
+    def release(self, session_id: str) -> Optional[str]:
+        """Return the session's number to the pool; a no-op for unknown sessions."""
+        number = self._session_number.pop(session_id, None)
+        if number is None:
+            return None
+
+        load = self._load[number]
+        if load < self.capacity:
+            del self._idle[load][number]
+        load -= 1
+        self._load[number] = load
+        # Goes to the back of its bucket: the most recently used number there
+        self._idle[load][number] = None
+
+        caller = self._session_caller.pop(session_id)
+        callers = self._callers[number]
+        callers.discard(caller)
+        if not callers:
+            del self._callers[number]
+        if self._awaiting_inbound.get((caller, number)) == session_id:
+            del self._awaiting_inbound[caller, number]
+        for call_sid in self._session_inbound.pop(session_id, ()):
+            del self._inbound_calls[call_sid]
+        calls = self._session_calls.pop(session_id, ())
+        if calls:
+            self._leaked.setdefault(number, set()).update(calls)
+        return number
+
+    def numbers(self) -> List[str]:
+        return list(self._load)
+
+    def load(self, number: str) -> int:
+        return self._load.get(number, 0)
+
+    def number_for(self, session_id: str) -> Optional[str]:
+        return self._session_number.get(session_id)
+
+    def caller_for(self, session_id: str) -> Optional[str]:
+        """The number the session dials its bot number from."""
+        return self._session_caller.get(session_id)
+
+    def record_call(self, session_id: str, call_sid: str):
+        """Remember a call the session placed on its number."""
+        if session_id in self._session_number:
+            self._session_calls.setdefault(session_id, []).append(call_sid)
+
+    def take_leaked(self, number: str) -> Set[str]:
+        """Calls on `number` from released sessions, which may still be live; each is handed out once."""
+        return self._leaked.pop(number, set())
+
+    # --- Inbound routing ---
+    def expect_inbound(self, number: str, session_id: str):
+        """The session has dialled `number` from its caller and waits for that call to come in."""
+        self._awaiting_inbound[self._session_caller.get(session_id, number), number] = session_id
+
+    def claim_inbound(self, number: str, call_sid: str, caller: Optional[str] = None) -> Optional[str]:
+        """
+        Session for an inbound call to `number` from `caller` (the number itself when
+        omitted), bound to its CallSid on first sight.
+        """
+        session_id = self._inbound_calls.get(call_sid)
+        if session_id is not None:
+            return session_id
+
+        session_id = self._awaiting_inbound.pop((caller or number, number), None)
+        if session_id is None:
+            return None
+        self._inbound_calls[call_sid] = session_id
+        self._session_inbound.setdefault(session_id, []).append(call_sid)
+        self.record_call(session_id, call_sid)
+        logger.info(f"Inbound call {call_sid} to {number} from {caller or number} claimed by session {session_id}")
+        return session_id
+
+    def snapshot(self) -> dict:
+        return {
+            'numbers': len(self),
+            'capacity': len(self) * self.capacity,
+            'reserved': len(self._session_number),
+            'awaiting_inbound': len(self._awaiting_inbound),
+            'exhausted': self.exhausted,
+        }
+
+
+# Singleton
+bot_number_pool = NumberPool()
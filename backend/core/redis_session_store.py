@@ -0,0 +1,264 @@
+import asyncio
+import json
+import os
+import uuid
+from typing import Dict, List, Optional, Set
+
+from backend.core.constants import CallType
+from backend.core.session_store import SessionStore
+from backend.models.models import ChatMessage
+from backend.models.session_data import RECORD_KEYS, SessionData
+from backend.utils.utils import logger
+
+
+# Longest a turn can hold a session's lock; a worker that dies mid-turn frees it after this
+SESSION_TURN_LOCK_SECONDS = float(os.getenv('SESSION_TURN_LOCK_SECONDS', 60))
+CHAT_KEY = RECORD_KEYS['chat_history']
+USER_NUMBER_KEY = RECORD_KEYS['user_number']
+
+
+class _TurnLock:
+    """
+    A session's turn lock across workers: the local asyncio lock queues this worker's
+    turns without touching Redis, then the Redis lock waits out the other workers'.
+    """
+
+    def __init__(self, local: asyncio.Lock, shared):
+        self._local = local
+        self._shared = shared
+
+    async def __aenter__(self):
+        await self._local.acquire()
+        try:
+            await asyncio.to_thread(self._shared.acquire)
+        except BaseException:
+            self._local.release()
+            raise
+
+    async def __aexit__(self, *exc_info):
+        try:
+            await asyncio.to_thread(self._shared.release)
+        except Exception as e:
+            # Held past SESSION_TURN_LOCK_SECONDS, so it already expired
+            logger.error(f"Error releasing session turn lock: {e}")
+        finally:
+            self._local.release()
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Session store shared by every worker through Redis, so any worker can serve any
+    webhook for any call.
+
+    Each session is a hash of its compact record (see `SessionData.to_record`), with
+    the call SID and number indexes as plain keys and sets next to it. Chat history
+    is a list that saves append to, so a turn doesn't rewrite the whole conversation.
+    Every operation is one pipelined round trip, plus a read first where it has to
+    look something up. `client` is a redis-py client created with
+    decode_responses=True, or anything exposing the same commands (the tests use
+    `LocalRedis`).
+
+    The client is synchronous, so async code calls the store through `call_store`.
+    """
+    blocking = True
+
+    def __init__(self, client, prefix: str = 'callbot:', turn_lock_seconds: float = SESSION_TURN_LOCK_SECONDS):
+        self._client = client
+        self._prefix = prefix
+        self._turn_lock_seconds = turn_lock_seconds
+        self._turn_locks: Dict[str, asyncio.Lock] = {}
+        # Chat messages already in Redis for sessions loaded here, so saves only append the new ones
+        self._saved_chat: Dict[str, int] = {}
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisSessionStore":
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("SESSION_STORE_URL needs the redis package (pip install redis)") from e
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    def _key(self, *parts: str) -> str:
+        return self._prefix + ':'.join(parts)
+
+    def _load(self, session_id: str) -> Optional[SessionData]:
+        pipe = self._client.pipeline()
+        pipe.hgetall(self._key('session', session_id))
+        pipe.lrange(self._key('chat', session_id), 0, -1)
+        record, chat = pipe.execute()
+        if not record:
+            # Deleted by another worker (or never here); drop what this one kept for it
+            self._forget(session_id)
+            return None
+        return self._session(record, chat)
+
+    def _session(self, record: Dict[str, str], chat: List[str]) -> SessionData:
+        session_data = SessionData.from_record(record)
+        session_data.chat_history = [ChatMessage(*json.loads(message)) for message in chat]
+        self._saved_chat[session_data.session_id] = len(chat)
+        return session_data
+
+    def _forget(self, session_id: str):
+        lock = self._turn_locks.get(session_id)
+        if lock is not None and not lock.locked():
+            del self._turn_locks[session_id]
+        self._saved_chat.pop(session_id, None)
+
+    def create_new_session(self, session_id: Optional[str] = None) -> str:
+        session_id = session_id or str(uuid.uuid4())
+        session_data = SessionData(session_id=session_id, conference_name=str(uuid.uuid4()))
+        record = {key: value for key, value in session_data.to_record().items() if value and key != CHAT_KEY}
+
+        pipe = self._client.pipeline()
+        pipe.hset(self._key('session', session_id), mapping=record)
+        pipe.sadd(self._key('sessions'), session_id)
+        pipe.execute()
+        return session_id
+
+    def check_session_exists(self, call_numbers: list[str]) -> Optional[tuple]:
+        for call_number in call_numbers:
+            session_ids = sorted(self._client.smembers(self._key('number', call_number)))
+            if session_ids:
+                pipe = self._client.pipeline()
+                for session_id in session_ids:
+                    pipe.lrange(self._key('number_calls', call_number, session_id), 0, -1)
+                call_sids = pipe.execute()
+                return call_number, [(session_id, call_sid) for session_id, sids in zip(session_ids, call_sids) for call_sid in sids]
+        return None
+
+    def link_call_to_session(self, call_sid: str, call_number: str, session_id: str, call_type: CallType, is_outbound: Optional[bool] = None):
+        logger.info(f"Linking call {call_sid} to session {session_id}")
+        if not self._client.exists(self._key('session', session_id)):
+            logger.error(f"Session {session_id} not found")
+            return
+
+        # Validates the call type/direction the same way the in-memory store does
+        leg = SessionData(session_id=session_id, conference_name='')
+        leg.set_call_sid(call_type, call_sid, is_outbound)
+
+        pipe = self._client.pipeline()
+        pipe.hset(self._key('session', session_id), mapping=leg.to_record(['call_sids']))
+        pipe.set(self._key('call', call_sid), session_id)
+        pipe.sadd(self._key('session_calls', session_id), call_sid)
+        pipe.sadd(self._key('session_numbers', session_id), call_number)
+        pipe.sadd(self._key('number', call_number), session_id)
+        pipe.rpush(self._key('number_calls', call_number, session_id), call_sid)
+        pipe.execute()
+
+    def get_session_by_call_sid(self, call_sid: str) -> Optional[SessionData]:
+        session_id = self._client.get(self._key('call', call_sid))
+        if not session_id:
+            logger.error(f"CallSid {call_sid} not found in any session")
+            return None
+        return self._load(session_id)
+
+    def get_session_by_id(self, session_id: str) -> Optional[SessionData]:
+        session_data = self._load(session_id)
+        if session_data is None:
+            logger.error(f"Session {session_id} not found")
+        return session_data
+
+    def get_session_by_number(self, bot_number: str) -> Optional[SessionData]:
+        session_ids = self._client.smembers(self._key('number', bot_number))
+        if not session_ids:
+            logger.error(f"Bot number {bot_number} not found in any session")
+            return None
+
+        if len(session_ids) > 1:
+            logger.error(f"Multiple sessions found for bot number {bot_number}")
+            return None
+
+        return self._load(next(iter(session_ids)))
+
+    def get_sessions_by_user_number(self, user_number: str) -> List[str]:
+        return sorted(self._client.smembers(self._key('user', user_number)))
+
+    def get_call_sids(self, session_id: str) -> Set[str]:
+        return set(self._client.smembers(self._key('session_calls', session_id)))
+
+    def finish_call(self, session_id: str, call_sid: str) -> Set[str]:
+        if call_sid not in self.get_call_sids(session_id):
+            return set()
+        pipe = self._client.pipeline()
+        pipe.sadd(self._key('finished_calls', session_id), call_sid)
+        pipe.smembers(self._key('finished_calls', session_id))
+        return set(pipe.execute()[1])
+
+    def list_sessions(self) -> List[SessionData]:
+        session_ids = list(self._client.smembers(self._key('sessions')))
+        pipe = self._client.pipeline()
+        for session_id in session_ids:
+            pipe.hgetall(self._key('session', session_id))
+            pipe.lrange(self._key('chat', session_id), 0, -1)
+        results = pipe.execute()
+        sessions = [self._session(record, chat) for record, chat in zip(results[::2], results[1::2]) if record]
+        # The sweep lists sessions regularly, which bounds the per-session state kept here
+        # by the live sessions even when other workers delete them
+        live = {session_data.session_id for session_data in sessions}
+        for session_id in (self._turn_locks.keys() | self._saved_chat.keys()) - live:
+            self._forget(session_id)
+        return sessions
+
+    def session_count(self) -> int:
+        return self._client.scard(self._key('sessions'))
+
+    def save_session(self, session_data: SessionData, *fields: str):
+        session_id = session_data.session_id
+        record = session_data.to_record(fields or None)
+        key = self._key('session', session_id)
+        # The user number index is a set per number, so a changed number leaves the old one
+        previous_user = self._client.hget(key, USER_NUMBER_KEY) if USER_NUMBER_KEY in record else None
+        pipe = self._client.pipeline()
+        if record.pop(CHAT_KEY, None) is not None:
+            # Turns hold the session lock, so nothing else appended since this copy was loaded
+            saved = self._saved_chat.get(session_id, 0)
+            new = [json.dumps([message.role, message.content], separators=(',', ':'))
+                   for message in session_data.chat_history[saved:]]
+            if new:
+                pipe.rpush(self._key('chat', session_id), *new)
+            self._saved_chat[session_id] = len(session_data.chat_history)
+        if previous_user and previous_user != record[USER_NUMBER_KEY]:
+            pipe.srem(self._key('user', previous_user), session_id)
+        if record.get(USER_NUMBER_KEY):
+            pipe.sadd(self._key('user', record[USER_NUMBER_KEY]), session_id)
+        values = {name: value for name, value in record.items() if value}
+        if values:
+            pipe.hset(key, mapping=values)
+        unset = [name for name, value in record.items() if not value]
+        if unset:
+            pipe.hdel(key, *unset)
+        pipe.execute()
+
+    def session_lock(self, session_id: str) -> _TurnLock:
+        # Not thread-local, since acquire and release run on different worker threads
+        shared = self._client.lock(self._key('turn_lock', session_id), timeout=self._turn_lock_seconds, thread_local=False)
+        return _TurnLock(self._turn_locks.setdefault(session_id, asyncio.Lock()), shared)
+
+    def delete_session(self, session_id: str):
+        pipe = self._client.pipeline()
+        pipe.smembers(self._key('session_numbers', session_id))
+        pipe.smembers(self._key('session_calls', session_id))
+        pipe.hgetall(self._key('session', session_id))
+        numbers, call_sids, record = pipe.execute()
+        call_sids = list(call_sids)
+
+        pipe = self._client.pipeline()
+        for call_sid in call_sids:
+            pipe.get(self._key('call', call_sid))
+        owners = pipe.execute()
+
+        pipe = self._client.pipeline()
+        for number in numbers:
+            pipe.srem(self._key('number', number), session_id)
+            pipe.delete(self._key('number_calls', number, session_id))
+        if record.get(USER_NUMBER_KEY):
+            pipe.srem(self._key('user', record[USER_NUMBER_KEY]), session_id)
+        for call_sid, owner in zip(call_sids, owners):
+            # A SID relinked to a newer session belongs to that session now
+            if owner == session_id:
+                pipe.delete(self._key('call', call_sid))
+        pipe.delete(self._key('session', session_id), self._key('chat', session_id), self._key('session_calls', session_id),
+                    self._key('session_numbers', session_id), self._key('finished_calls', session_id))
+        pipe.srem(self._key('sessions'), session_id)
+        pipe.execute()
+        self._forget(session_id)
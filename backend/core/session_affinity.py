@@ -0,0 +1,122 @@
+"""
+Session affinity across workers.
+
+Every worker knows the full worker list (WORKER_IDS) and its own id (WORKER_ID).
+Session ids are placed on a consistent-hash ring of the workers, and the webhook and
+media URLs handed to Twilio carry the owning worker as a /w/<worker_id> path prefix.
+The front proxy (backend/core/worker_proxy.py, started by `WORKERS=N python run.py`)
+routes that prefix to the worker, so every callback for a call lands on the process
+that holds its media stream and local state. A worker refuses requests prefixed for
+another one rather than serve them without that state. Adding or removing a worker
+only moves the sessions that hashed to it.
+
+New sessions get ids owned by the worker that creates them, so a plain in-memory
+store keeps working behind the proxy.
+"""
+import bisect
+import hashlib
+import os
+import uuid
+from typing import Dict, List, Optional
+
+from starlette.responses import JSONResponse
+from starlette.websockets import WebSocketClose
+
+from backend.utils.utils import logger
+
+
+WORKER_ID = os.getenv('WORKER_ID', 'w0')
+WORKER_IDS = [worker.strip() for worker in os.getenv('WORKER_IDS', WORKER_ID).split(',') if worker.strip()]
+RING_REPLICAS = int(os.getenv('RING_REPLICAS', 100))
+WORKER_PREFIX = '/w/'
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes so load stays even as workers change."""
+
+    def __init__(self, workers: List[str], replicas: int = RING_REPLICAS):
+        if not workers:
+            raise ValueError("A hash ring needs at least one worker")
+        self.workers = list(workers)
+        points = sorted((_hash(f"{worker}#{replica}"), worker) for worker in self.workers for replica in range(replicas))
+        self._points = [point for point, _ in points]
+        self._owners = [worker for _, worker in points]
+
+    def owner(self, key: str) -> str:
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class SessionAffinity:
+    def __init__(self, worker_id: str = WORKER_ID, workers: Optional[List[str]] = None, replicas: int = RING_REPLICAS):
+        self.worker_id = worker_id
+        self.ring = HashRing(workers or WORKER_IDS, replicas)
+        if worker_id not in self.ring.workers:
+            raise ValueError(f"Worker {worker_id} is not in the worker list {self.ring.workers}")
+        self.misrouted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.ring.workers) > 1
+
+    def owner(self, session_id: str) -> str:
+        return self.ring.owner(session_id)
+
+    def new_session_id(self) -> str:
+        """A fresh session id that this worker owns (about len(workers) tries)."""
+        while True:
+            session_id = str(uuid.uuid4())
+            if not self.enabled or self.owner(session_id) == self.worker_id:
+                return session_id
+
+    def path(self, session_id: str, path: str) -> str:
+        """Prefix the path with the session's owner so the proxy routes it there."""
+        if not self.enabled:
+            return path
+        return f"{WORKER_PREFIX}{self.owner(session_id)}{path}"
+
+    def url(self, host: str, session_id: str, path: str, scheme: str = 'https') -> str:
+        return f"{scheme}://{host}{self.path(session_id, path)}"
+
+    def split(self, path: str) -> tuple:
+        """Return (worker_id, path without the prefix); worker_id is None if absent."""
+        if not path.startswith(WORKER_PREFIX):
+            return None, path
+        worker_id, _, rest = path[len(WORKER_PREFIX):].partition('/')
+        return worker_id, '/' + rest
+
+
+class SessionAffinityMiddleware:
+    """
+    Strips the worker prefix before routing. A request meant for another worker is
+    refused (409, or a closed websocket) and counted, since this worker doesn't hold
+    the call's media stream or local state; it means the proxy and WORKER_IDS disagree.
+    """
+
+    def __init__(self, app, affinity: Optional[SessionAffinity] = None):
+        self.app = app
+        self.affinity = affinity or session_affinity
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] in ('http', 'websocket'):
+            worker_id, path = self.affinity.split(scope['path'])
+            if worker_id is not None:
+                if worker_id != self.affinity.worker_id:
+                    self.affinity.misrouted += 1
+                    logger.warning(f"Refused request for worker {worker_id} on {self.affinity.worker_id}: {path}")
+                    if scope['type'] == 'http':
+                        response = JSONResponse(status_code=409, content={"error": f"Session belongs to worker {worker_id}"})
+                    else:
+                        response = WebSocketClose(code=1008, reason=f"Session belongs to worker {worker_id}")
+                    await response(scope, receive, send)
+                    return
+                scope = dict(scope, path=path, raw_path=path.encode())
+        await self.app(scope, receive, send)
+
+
+# Singleton
+session_affinity = SessionAffinity()
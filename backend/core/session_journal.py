@@ -0,0 +1,200 @@
+"""
+Append-only journal of CallManager mutations, so sessions survive a restart.
+
+Each mutation is one compact JSON line:
+
+    ["c", record]                               create (full SessionData record)
+    ["l", call_sid, number, session_id, call_type, is_outbound]
+    ["i", call_sid, number, session_id]         index-only link, used in snapshots
+    ["s", session_id, partial record]           save_session of some attributes
+    ["m", session_id, role, content]            chat message appended
+    ["f", session_id, call_sid]                 call leg finished
+    ["d", session_id]                           delete
+
+Appends only buffer the line; a writer thread writes each batch and fsyncs it, so
+the event loop never waits on the disk (unless fsync is 'always'). When a segment
+grows past the compaction size it is sealed and a background thread folds the
+sealed segments into a snapshot, which is itself a journal of the live state.
+Startup loads the snapshot and replays the segments written after it.
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from backend.utils.utils import logger
+
+
+JOURNAL_FSYNC_MODES = ('always', 'batch', 'never')
+SESSION_JOURNAL_FSYNC = os.getenv('SESSION_JOURNAL_FSYNC', 'batch')
+SESSION_JOURNAL_FLUSH_INTERVAL = float(os.getenv('SESSION_JOURNAL_FLUSH_INTERVAL', 0.05))
+SESSION_JOURNAL_COMPACT_BYTES = int(os.getenv('SESSION_JOURNAL_COMPACT_BYTES', 16 * 1024 * 1024))
+
+SNAPSHOT_FILE = 'snapshot.jsonl'
+_SEGMENT = re.compile(r'^journal\.(\d{8})\.jsonl$')
+
+
+class SessionJournal:
+    def __init__(self, directory: str, fsync: str = SESSION_JOURNAL_FSYNC,
+                 flush_interval: float = SESSION_JOURNAL_FLUSH_INTERVAL, compact_bytes: int = SESSION_JOURNAL_COMPACT_BYTES):
+        if fsync not in JOURNAL_FSYNC_MODES:
+            raise ValueError(f"fsync must be one of {JOURNAL_FSYNC_MODES}, got {fsync}")
+        self.directory = directory
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.compact_bytes = compact_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()  # Guards the pending batch
+        self._write_lock = threading.Lock()  # One writer at a time
+        self._pending: List[str] = []
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._compactor: Optional[threading.Thread] = None
+
+        self._segment = max(self._segments(), default=0) + 1
+        self._file = open(self._segment_path(self._segment), 'ab')
+        self._segment_bytes = 0
+
+        self.records = 0
+        self.batches = 0
+        self.snapshots = 0
+
+    # --- Files ---
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f'journal.{number:08d}.jsonl')
+
+    def _segments(self) -> List[int]:
+        return sorted(int(match.group(1)) for match in map(_SEGMENT.match, os.listdir(self.directory)) if match)
+
+    # --- Writing ---
+    def append(self, op: list):
+        line = json.dumps(op, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._pending.append(line)
+        if self.fsync == 'always':
+            self.flush()
+
+    def flush(self):
+        """Write and (unless fsync is 'never') sync everything appended so far."""
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            data = ''.join(batch).encode()
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync != 'never':
+                os.fsync(self._file.fileno())
+            self._segment_bytes += len(data)
+            self.records += len(batch)
+            self.batches += 1
+            if self._segment_bytes >= self.compact_bytes:
+                self._seal_segment()
+
+    def _seal_segment(self):
+        """Start a new segment and compact the sealed ones in the background."""
+        sealed = self._segment
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._segment_path(self._segment), 'ab')
+        self._segment_bytes = 0
+        if self._compactor is None or not self._compactor.is_alive():
+            self._compactor = threading.Thread(target=self.compact, args=(sealed,), name='session-journal-compactor', daemon=True)
+            self._compactor.start()
+
+    def _write_forever(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing session journal: {e}")
+
+    def start(self):
+        if self._writer is None:
+            self._stop.clear()
+            self._writer = threading.Thread(target=self._write_forever, name='session-journal-writer', daemon=True)
+            self._writer.start()
+
+    def close(self):
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        self.flush()
+        if self._compactor is not None:
+            self._compactor.join()
+        self._file.close()
+
+    # --- Reading ---
+    def _read(self, path: str) -> Iterator[list]:
+        with open(path, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A line torn by a crash mid-write
+                    logger.error(f"Skipping unreadable journal line {line_number} in {path}")
+
+    def _snapshot(self) -> tuple:
+        """(last segment folded into the snapshot, its ops) or (0, [])."""
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if not os.path.exists(path):
+            return 0, iter(())
+        ops = self._read(path)
+        header = next(ops, None)
+        return (header[1] if header else 0), ops
+
+    def replay(self, store, through: Optional[int] = None) -> int:
+        """Apply the snapshot and the newer segments (up to `through`) to the store."""
+        applied = 0
+        covered, ops = self._snapshot()
+        for op in ops:
+            store.apply(op)
+            applied += 1
+        for number in self._segments():
+            if number <= covered or (through is not None and number > through):
+                continue
+            for op in self._read(self._segment_path(number)):
+                store.apply(op)
+                applied += 1
+        return applied
+
+    # --- Compaction ---
+    def compact(self, through: int):
+        """Fold the snapshot and segments up to `through` into a new snapshot."""
+        from backend.core.call_manager import CallManager
+
+        try:
+            start = time.perf_counter()
+            store = CallManager()
+            self.replay(store, through=through)
+            path = os.path.join(self.directory, SNAPSHOT_FILE)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(json.dumps(['snapshot', through], separators=(',', ':')).encode() + b'\n')
+                for op in store.snapshot_ops():
+                    f.write(json.dumps(op, separators=(',', ':')).encode() + b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            for number in self._segments():
+                if number <= through:
+                    os.remove(self._segment_path(number))
+            self.snapshots += 1
+            logger.info(f"Compacted session journal through segment {through} in {time.perf_counter() - start:.3f}s")
+        except Exception as e:
+            logger.error(f"Error compacting session journal: {e}")
+
+    def stats(self) -> dict:
+        return {
+            'records': self.records,
+            'batches': self.batches,
+            'snapshots': self.snapshots,
+            'segment': self._segment,
+            'segment_bytes': self._segment_bytes,
+            'pending': len(self._pending),
+        }
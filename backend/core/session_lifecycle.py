@@ -0,0 +1,189 @@
+import asyncio
+import inspect
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from backend.core.call_manager import call_manager
+from backend.core.session_store import SessionStore, call_store
+from backend.core.constants import EvictionReason
+from backend.models.session_data import SessionData
+from backend.utils.utils import logger
+
+
+SESSION_IDLE_SECONDS = float(os.getenv('SESSION_IDLE_SECONDS', 15 * 60))
+SESSION_MAX_AGE_SECONDS = float(os.getenv('SESSION_MAX_AGE_SECONDS', 4 * 3600))
+SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', 60))
+
+Closer = Callable[[], Awaitable[None]]
+TeardownListener = Callable[[str, EvictionReason], Optional[Awaitable[None]]]
+
+
+class SessionLifecycle:
+    """
+    Decides when a session is over and releases everything attached to it.
+
+    A session is torn down as soon as every call leg linked to it has reported a final
+    status. A background sweeper evicts sessions past the maximum age, and sessions
+    idle for too long with no open media stream. Teardown runs the closers attached
+    to the session (STT connections, websockets), cancels its transcript tasks and
+    removes it from the call manager.
+    """
+
+    def __init__(self, call_manager: SessionStore, idle_seconds: float = SESSION_IDLE_SECONDS,
+                 max_age_seconds: float = SESSION_MAX_AGE_SECONDS, sweep_interval: float = SESSION_SWEEP_INTERVAL):
+        self.call_manager = call_manager
+        self.idle_seconds = idle_seconds
+        self.max_age_seconds = max_age_seconds
+        self.sweep_interval = sweep_interval
+        self._closers: Dict[str, List[Closer]] = {}
+        self._tasks: Dict[str, Set[asyncio.Task]] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        self._teardown_listeners: List[TeardownListener] = []
+        self.evicted: Dict[str, int] = {reason.value: 0 for reason in EvictionReason}
+        # Totals over every session, taken by the sweep since it lists them anyway
+        self._swept = {'live_sessions': 0, 'live_chat_messages': 0, 'live_session_bytes': 0}
+
+    # --- Attached resources ---
+    def attach(self, session_id: str, closer: Closer) -> Closer:
+        """Register an async callable that releases a resource held for the session."""
+        self._closers.setdefault(session_id, []).append(closer)
+        return closer
+
+    def detach(self, session_id: str, closer: Closer):
+        """Forget a closer whose resource the owner has already released."""
+        closers = self._closers.get(session_id)
+        if closers and closer in closers:
+            closers.remove(closer)
+            if not closers:
+                del self._closers[session_id]
+
+    def track_task(self, session_id: str, task: asyncio.Task):
+        """Cancel this task if the session is torn down before it finishes."""
+        tasks = self._tasks.setdefault(session_id, set())
+        tasks.add(task)
+        task.add_done_callback(lambda done: self._untrack_task(session_id, done))
+
+    def _untrack_task(self, session_id: str, task: asyncio.Task):
+        tasks = self._tasks.get(session_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[session_id]
+
+    def on_teardown(self, listener: TeardownListener) -> TeardownListener:
+        """
+        Call `listener(session_id, reason)` whenever a session is torn down, before it is
+        removed from the store; async listeners are awaited.
+        """
+        self._teardown_listeners.append(listener)
+        return listener
+
+    # --- Teardown ---
+    async def leg_finished(self, session_id: str, call_sid: str) -> bool:
+        """
+        Record that a call leg reached a final status. Tears the session down and
+        returns True once every leg linked to it has finished.
+        """
+        finished = await call_store(self.call_manager.finish_call, session_id, call_sid)
+        # Legs are tracked in the store, since each status callback may reach a different worker
+        if finished and await call_store(self.call_manager.get_call_sids, session_id) <= finished:
+            logger.info(f"All call legs finished for session {session_id}")
+            await self.teardown(session_id, EvictionReason.COMPLETED)
+            return True
+        return False
+
+    async def teardown(self, session_id: str, reason: EvictionReason):
+        """Release everything attached to the session and remove it."""
+        closers = self._closers.pop(session_id, [])
+        tasks = self._tasks.pop(session_id, set())
+
+        current = asyncio.current_task()
+        for task in tasks:
+            if task is not current:
+                task.cancel()
+        for closer in closers:
+            try:
+                await closer()
+            except Exception as e:
+                logger.error(f"Error closing resource for session {session_id}: {e}")
+
+        for listener in self._teardown_listeners:
+            try:
+                result = listener(session_id, reason)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Error in teardown listener for session {session_id}: {e}")
+
+        if await call_store(self.call_manager.get_session_by_id, session_id) is not None:
+            await call_store(self.call_manager.delete_session, session_id)
+            self.evicted[reason.value] += 1
+            logger.info(f"Tore down session {session_id} ({reason.value})")
+
+    # --- Sweeper ---
+    def eviction_reason(self, session_data: SessionData, now: datetime) -> Optional[EvictionReason]:
+        if (now - session_data.time_created).total_seconds() > self.max_age_seconds:
+            return EvictionReason.EXPIRED
+        # An open media stream means the call is live even if nobody is talking
+        if session_data.session_id in self._closers:
+            return None
+        if (now - session_data.get_last_activity()).total_seconds() > self.idle_seconds:
+            return EvictionReason.IDLE
+        return None
+
+    async def sweep(self, now: Optional[datetime] = None) -> int:
+        """Evict expired and idle sessions; returns how many were removed."""
+        now = now or datetime.now()
+        evicted = 0
+        live = {'live_sessions': 0, 'live_chat_messages': 0, 'live_session_bytes': 0}
+        for session_data in await call_store(self.call_manager.list_sessions):
+            reason = self.eviction_reason(session_data, now)
+            if reason:
+                await self.teardown(session_data.session_id, reason)
+                evicted += 1
+                continue
+            live['live_sessions'] += 1
+            live['live_chat_messages'] += len(session_data.get_chat_history())
+            live['live_session_bytes'] += session_data.approx_bytes()
+        self._swept = live
+        return evicted
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                evicted = await self.sweep()
+                if evicted:
+                    logger.info(f"Session sweep evicted {evicted}: {self.snapshot()}")
+            except Exception as e:
+                logger.error(f"Error sweeping sessions: {e}")
+
+    def start(self):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    # --- Gauges ---
+    def snapshot(self) -> dict:
+        """
+        Chat message and byte totals are as of the last sweep, so a scrape never walks
+        every session. The session count is current unless the store is a networked one.
+        """
+        return {
+            **self._swept,
+            **({} if self.call_manager.blocking else {'live_sessions': self.call_manager.session_count()}),
+            'attached_resources': sum(len(closers) for closers in self._closers.values()),
+            'tracked_tasks': sum(len(tasks) for tasks in self._tasks.values()),
+            'evicted_sessions': dict(self.evicted),
+            'evicted_total': sum(self.evicted.values()),
+        }
+
+
+# Singleton
+session_lifecycle = SessionLifecycle(call_manager)
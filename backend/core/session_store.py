@@ -0,0 +1,101 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import AsyncContextManager, Callable, List, Optional, Set, TypeVar
+
+from backend.core.constants import CallType
+from backend.models.session_data import SessionData
+
+
+T = TypeVar('T')
+
+class SessionStore(ABC):
+    """
+    Where sessions and their call/number indexes live. The routes only talk to this
+    interface through the `call_manager` singleton, so the in-memory store and a
+    shared networked store are interchangeable.
+
+    Sessions returned by a shared store are copies: after changing one, pass it to
+    `save_session` with the attributes that changed so other workers see it.
+
+    Methods are synchronous. Async code calls them through `call_store`, which moves
+    a networked store's round trips off the event loop.
+    """
+
+    # Whether calls do network I/O, and so have to run off the event loop
+    blocking = False
+
+    @abstractmethod
+    def create_new_session(self, session_id: Optional[str] = None) -> str:
+        """Create a new session (with a fresh id unless one is given) and store it empty."""
+
+    @abstractmethod
+    def check_session_exists(self, call_numbers: list[str]) -> Optional[tuple]:
+        """Returns (number, [(session_id, call_sid), ...]) for the first number in use."""
+
+    @abstractmethod
+    def link_call_to_session(self, call_sid: str, call_number: str, session_id: str, call_type: CallType, is_outbound: Optional[bool] = None):
+        """Associate a callSid with an existing session."""
+
+    @abstractmethod
+    def get_session_by_call_sid(self, call_sid: str) -> Optional[SessionData]:
+        """Given a callSid, return the session it belongs to, or None."""
+
+    @abstractmethod
+    def get_session_by_id(self, session_id: str) -> Optional[SessionData]:
+        """Return the session, or None."""
+
+    @abstractmethod
+    def get_session_by_number(self, bot_number: str) -> Optional[SessionData]:
+        """Return the only session linked on the number, or None."""
+
+    @abstractmethod
+    def get_sessions_by_user_number(self, user_number: str) -> List[str]:
+        """Ids of the sessions calling for this user, indexed when `user_number` is saved."""
+
+    @abstractmethod
+    def get_call_sids(self, session_id: str) -> Set[str]:
+        """Every call SID linked to the session."""
+
+    @abstractmethod
+    def finish_call(self, session_id: str, call_sid: str) -> Set[str]:
+        """Record that a linked call reached a final status; returns all finished SIDs."""
+
+    @abstractmethod
+    def list_sessions(self) -> List[SessionData]:
+        """Snapshot of all live sessions."""
+
+    @abstractmethod
+    def session_count(self) -> int:
+        """Number of live sessions."""
+
+    @abstractmethod
+    def delete_session(self, session_id: str):
+        """Remove the session and every index entry pointing at it."""
+
+    def save_session(self, session_data: SessionData, *fields: str):
+        """
+        Persist changes to the given attributes (all of them if none are named).
+        Stores that hand out live objects have nothing to do.
+        """
+
+    def restore(self) -> int:
+        """Reload state kept across restarts; returns the records applied."""
+        return 0
+
+    def close(self):
+        """Flush anything still buffered on shutdown."""
+
+    @abstractmethod
+    def session_lock(self, session_id: str) -> AsyncContextManager:
+        """Async lock serializing the turns of one session, across every worker sharing the store."""
+
+
+async def call_store(method: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Call a session store method from async code, e.g.
+    `await call_store(call_manager.get_session_by_id, session_id)`. Blocking stores run
+    it on a worker thread; the in-memory store is called directly.
+    """
+    if getattr(getattr(method, '__self__', None), 'blocking', False):
+        return await asyncio.to_thread(method, *args, **kwargs)
+    return method(*args, **kwargs)
@@ -0,0 +1,179 @@
+"""
+Per-turn latency tracing.
+
+A turn runs from the last inbound frame of the caller's utterance to the last
+outbound frame of the bot's reply. The STT handler starts each turn with run_turn(),
+which puts a TurnTrace in the `current_turn` context variable; everything the turn
+awaits can then mark() the moments it reaches without the trace being passed down.
+When the turn's handler returns, the spans between marks are observed into the
+`turn_stage_seconds` histogram.
+
+Marks are perf_counter() times. Only the first mark of a name counts, except for the
+ones set with mark_last(), like the last outbound frame, where the latest one does.
+"""
+import bisect
+import contextvars
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from backend.core.metrics import metrics
+from backend.utils.utils import logger
+
+
+LAST_INBOUND_FRAME = 'last_inbound_frame'
+TRANSCRIPT_FINAL = 'transcript_final'
+LLM_FIRST_TOKEN = 'llm_first_token'
+LLM_COMPLETE = 'llm_complete'
+FIRST_TTS_COMPLETE = 'first_tts_complete'
+TTS_COMPLETE = 'tts_complete'
+TRANSCODE_START = 'transcode_start'
+TRANSCODE_COMPLETE = 'transcode_complete'
+FIRST_OUTBOUND_FRAME = 'first_outbound_frame'
+LAST_OUTBOUND_FRAME = 'last_outbound_frame'
+
+# stage -> (from mark, to mark)
+STAGES = {
+    'stt': (LAST_INBOUND_FRAME, TRANSCRIPT_FINAL),
+    'llm_first_token': (TRANSCRIPT_FINAL, LLM_FIRST_TOKEN),
+    'llm': (TRANSCRIPT_FINAL, LLM_COMPLETE),
+    'first_tts_complete': (TRANSCRIPT_FINAL, FIRST_TTS_COMPLETE),  # TTS returns whole clips, so there is no first byte to time
+    'tts': (TRANSCRIPT_FINAL, TTS_COMPLETE),
+    'transcode': (TRANSCODE_START, TRANSCODE_COMPLETE),  # The first sentence's, which is on the critical path
+    'first_outbound_frame': (TRANSCRIPT_FINAL, FIRST_OUTBOUND_FRAME),
+    'last_outbound_frame': (TRANSCRIPT_FINAL, LAST_OUTBOUND_FRAME),
+    'turn': (LAST_INBOUND_FRAME, FIRST_OUTBOUND_FRAME),
+}
+
+# Audio kept per stream to map STT timestamps back to arrival times
+INBOUND_CLOCK_SECONDS = 30
+FRAME_SECONDS = 0.02
+
+turn_stage_seconds = metrics.histogram(
+    'turn_stage_seconds', 'Time from the start of a turn stage to its end', labelnames=('stage',)
+)
+media_operation_seconds = metrics.histogram(
+    'media_operation_seconds', 'Duration of each TTS request and transcode', labelnames=('operation',)
+)
+turns_total = metrics.counter('turns', 'Transcripts handled as turns')
+
+FinishListener = Callable[["TurnTrace"], None]
+_finish_listeners: List[FinishListener] = []
+
+
+class TurnTrace:
+    __slots__ = ('session_id', 'marks', 'audio_end')
+
+    def __init__(self, session_id: Optional[str] = None, audio_end: Optional[float] = None):
+        self.session_id = session_id
+        self.marks: Dict[str, float] = {}
+        # Offset of the end of the utterance in the stream's audio, when STT reports it
+        self.audio_end = audio_end
+
+    def mark(self, name: str, at: Optional[float] = None):
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() if at is None else at
+
+    def mark_last(self, name: str, at: Optional[float] = None):
+        self.marks[name] = time.perf_counter() if at is None else at
+
+    def seconds(self, stage: str) -> Optional[float]:
+        start, end = STAGES[stage]
+        if start in self.marks and end in self.marks:
+            return self.marks[end] - self.marks[start]
+        return None
+
+    def stages(self) -> Dict[str, float]:
+        return {stage: seconds for stage in STAGES if (seconds := self.seconds(stage)) is not None}
+
+    def finish(self):
+        stages = self.stages()
+        for stage, seconds in stages.items():
+            turn_stage_seconds.observe(seconds, stage)
+        turns_total.inc()
+        if stages:
+            logger.debug(f"Turn for session {self.session_id}: " +
+                         ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in stages.items()))
+        for listener in _finish_listeners:
+            listener(self)
+
+
+current_turn: contextvars.ContextVar[Optional[TurnTrace]] = contextvars.ContextVar('current_turn', default=None)
+
+
+def on_finish(listener: FinishListener) -> FinishListener:
+    """Call `listener(trace)` with every turn once its handler returns."""
+    _finish_listeners.append(listener)
+    return listener
+
+
+def remove_finish_listener(listener: FinishListener):
+    if listener in _finish_listeners:
+        _finish_listeners.remove(listener)
+
+
+async def run_turn(on_transcript: Callable[[str], Awaitable[None]], transcript: str, final_at: Optional[float] = None,
+                   audio_end: Optional[float] = None, speech_end: Optional[float] = None):
+    """
+    Handle a transcript as a traced turn. STT backends that know the audio offset of
+    the end of the utterance pass `audio_end`; ones that saw the audio arrive pass
+    `speech_end` as a perf_counter() time.
+    """
+    trace = TurnTrace(audio_end=audio_end)
+    trace.mark(TRANSCRIPT_FINAL, final_at)
+    if speech_end is not None:
+        trace.mark(LAST_INBOUND_FRAME, speech_end)
+    current_turn.set(trace)
+    try:
+        await on_transcript(transcript)
+    finally:
+        trace.finish()
+
+
+def mark(name: str):
+    """Mark `name` on the current turn, if there is one."""
+    trace = current_turn.get()
+    if trace is not None:
+        trace.mark(name)
+
+
+def mark_last(name: str):
+    trace = current_turn.get()
+    if trace is not None:
+        trace.mark_last(name)
+
+
+@contextmanager
+def timed(operation: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        media_operation_seconds.observe(time.perf_counter() - start, operation)
+
+
+class InboundClock:
+    """
+    When each stretch of a stream's inbound audio arrived. STT reports where in the
+    audio an utterance ends; this turns that back into the time the frame carrying
+    it was received.
+    """
+
+    def __init__(self, sample_rate: int = 8000, max_frames: int = int(INBOUND_CLOCK_SECONDS / FRAME_SECONDS)):
+        self.sample_rate = sample_rate
+        self._samples = 0
+        # (audio offset at the end of the frame, arrival time), oldest first
+        self._ends: Deque[float] = deque(maxlen=max_frames)
+        self._arrivals: Deque[float] = deque(maxlen=max_frames)
+
+    def frame(self, size: int, at: Optional[float] = None):
+        self._samples += size  # μ-law is one byte per sample
+        self._ends.append(self._samples / self.sample_rate)
+        self._arrivals.append(time.perf_counter() if at is None else at)
+
+    def wall_time(self, audio_seconds: float) -> Optional[float]:
+        if not self._ends:
+            return None
+        index = bisect.bisect_left(self._ends, audio_seconds)
+        return self._arrivals[min(index, len(self._arrivals) - 1)]
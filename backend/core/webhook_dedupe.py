@@ -0,0 +1,94 @@
+"""
+Drops Twilio's retried status and conference callbacks.
+
+Twilio resends a callback when our reply is slow. A retry carries the same
+I-Twilio-Idempotency-Token header and the same form. Each callback is keyed on that
+token when it is present, and otherwise on (SID, event, SequenceNumber or
+Timestamp). The key is remembered in a bounded LRU for WEBHOOK_DEDUPE_WINDOW
+seconds. A repeat inside the window is acknowledged without touching the session
+store, and counted as a retry. A callback the route then refuses (e.g. with a 503
+while the event pipeline is full) is forgotten, so Twilio's retry is let through.
+
+Session affinity sends every callback for a call to the same worker, so a
+per-worker LRU sees all of a call's retries.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Mapping, Optional
+
+from backend.utils.utils import logger
+
+
+WEBHOOK_DEDUPE_CAPACITY = int(os.getenv('WEBHOOK_DEDUPE_CAPACITY', 50000))
+WEBHOOK_DEDUPE_WINDOW = float(os.getenv('WEBHOOK_DEDUPE_WINDOW', 600))
+IDEMPOTENCY_HEADER = 'i-twilio-idempotency-token'
+
+
+def webhook_key(headers: Mapping[str, str], form: Mapping[str, str], *fields: str) -> Optional[tuple]:
+    """
+    Identity of one callback: Twilio's idempotency token, or the given form fields plus
+    its sequence number (or timestamp). None if there is nothing to tell retries apart by.
+    """
+    token = headers.get(IDEMPOTENCY_HEADER)
+    if token:
+        return ('token', token)
+    order = form.get('SequenceNumber') or form.get('Timestamp')
+    if not order:
+        return None
+    return tuple(form.get(field) for field in fields) + (order,)
+
+
+class WebhookDeduper:
+    def __init__(self, capacity: int = WEBHOOK_DEDUPE_CAPACITY, window: float = WEBHOOK_DEDUPE_WINDOW,
+                 clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.window = window
+        self._clock = clock
+        # key -> first seen; insertion order is time order, so the oldest are in front
+        self._seen: "OrderedDict[Hashable, float]" = OrderedDict()
+        self.received: Dict[str, int] = {}
+        self.duplicates: Dict[str, int] = {}
+
+    def seen(self, kind: str, key: Optional[Hashable]) -> bool:
+        """Record a callback of `kind`; True if it is a retry of one already seen."""
+        now = self._clock()
+        seen = self._seen
+        while seen:
+            oldest_key, first_seen = next(iter(seen.items()))
+            if len(seen) < self.capacity and now - first_seen < self.window:
+                break
+            del seen[oldest_key]
+
+        if key is not None:
+            key = (kind, key)
+            if key in seen:
+                self.duplicates[kind] = self.duplicates.get(kind, 0) + 1
+                logger.info(f"Dropped retried {kind} callback {key[1]}")
+                return True
+            seen[key] = now
+        self.received[kind] = self.received.get(kind, 0) + 1
+        return False
+
+    def forget(self, kind: str, key: Optional[Hashable]):
+        """Undo `seen` for a callback that was refused, so its retry is accepted."""
+        if key is not None and self._seen.pop((kind, key), None) is not None:
+            self.received[kind] -= 1
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def snapshot(self) -> dict:
+        return {
+            'tracked': len(self._seen),
+            'received': dict(self.received),
+            'duplicates': dict(self.duplicates),
+            'retry_rate': {
+                kind: self.duplicates.get(kind, 0) / (count + self.duplicates.get(kind, 0))
+                for kind, count in self.received.items()
+            },
+        }
+
+
+# Singleton
+webhook_deduper = WebhookDeduper()
@@ -0,0 +1,226 @@
+"""
+Front proxy and launcher for running several workers.
+
+`WORKERS=N python run.py` starts N uvicorn workers on PORT+1..PORT+N, each with its
+own WORKER_ID (w0..wN-1), the full WORKER_IDS list and its own share of BOT_NUMBERS,
+and serves this proxy on PORT in front of them. The proxy routes:
+
+    /w/<worker_id>/...             to that worker (session webhooks and media streams)
+    webhooks to a bot number           to the worker holding that number (incoming-call)
+    initiate-call for a bot_number     likewise
+    everything else                    round robin (initiate-call, health checks)
+
+A number in BOT_NUMBERS is held by the worker it was dealt to. Any other number is
+held by its owner on the workers' consistent-hash ring, so an initiate-call naming it
+and the inbound leg it dials always reach the same worker and its number pool.
+
+Twilio only ever talks to the proxy, so ngrok points at PORT as before. Behind
+another proxy (nginx, a load balancer), give each worker the same environment and
+route the /w/<worker_id> prefix and each worker's bot numbers the same way.
+"""
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+import httpx
+from starlette.responses import JSONResponse, Response
+from starlette.websockets import WebSocketClose
+
+from backend.core.session_affinity import WORKER_PREFIX, HashRing
+from backend.utils.utils import logger
+
+
+# Hop-by-hop headers, which only apply to one connection
+_HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'upgrade', 'te', 'trailer',
+                'proxy-authorization', 'proxy-authenticate', 'content-length'}
+# Form and JSON fields that name the bot number a request belongs to, in order of precedence
+NUMBER_FIELDS = ('To', 'From', 'bot_number')
+
+
+class WorkerProxy:
+    """ASGI app forwarding each request to the worker that owns it."""
+
+    def __init__(self, upstreams: Dict[str, str], number_owners: Optional[Dict[str, str]] = None,
+                 client: Optional[httpx.AsyncClient] = None):
+        # worker id -> base URL, e.g. http://127.0.0.1:5051
+        self.upstreams = upstreams
+        self.number_owners = number_owners or {}
+        self.ring = HashRing(list(upstreams))
+        self._next_worker = itertools.cycle(list(upstreams))
+        self._client = client or httpx.AsyncClient(timeout=None)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            await self._websocket(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+
+    def pick(self, path: str, body: bytes = b'', content_type: str = '') -> Optional[str]:
+        """Worker for a request, or None for a prefix naming no known worker."""
+        if path.startswith(WORKER_PREFIX):
+            worker_id = path[len(WORKER_PREFIX):].partition('/')[0]
+            return worker_id if worker_id in self.upstreams else None
+        numbers = self._numbers(body, content_type)
+        if numbers:
+            return self.owner(numbers[0])
+        return next(self._next_worker)
+
+    def owner(self, number: str) -> str:
+        """Worker holding a bot number: the one it was dealt to, else its place on the ring."""
+        return self.number_owners.get(number) or self.ring.owner(number)
+
+    @staticmethod
+    def _numbers(body: bytes, content_type: str) -> List[str]:
+        if not body:
+            return []
+        try:
+            if content_type.startswith('application/x-www-form-urlencoded'):
+                fields = {name: values[0] for name, values in parse_qs(body.decode()).items()}
+            elif content_type.startswith('application/json'):
+                fields = json.loads(body)
+            else:
+                return []
+        except ValueError:
+            return []
+        if not isinstance(fields, dict):
+            return []
+        return [fields[name] for name in NUMBER_FIELDS if isinstance(fields.get(name), str)]
+
+    # --- HTTP ---
+    async def _http(self, scope, receive, send):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        # Host is kept, so workers build callback URLs for the public hostname
+        headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']
+                   if name.decode('latin-1').lower() not in _HOP_HEADERS]
+        content_type = next((value for name, value in headers if name.lower() == 'content-type'), '')
+
+        worker_id = self.pick(scope['path'], body, content_type)
+        if worker_id is None:
+            await JSONResponse(status_code=404, content={"error": "Unknown worker"})(scope, receive, send)
+            return
+        url = self.upstreams[worker_id] + scope['raw_path'].decode('latin-1')
+        if scope['query_string']:
+            url += '?' + scope['query_string'].decode('latin-1')
+        try:
+            upstream = await self._client.request(scope['method'], url, headers=headers, content=body)
+        except httpx.HTTPError as e:
+            logger.error(f"Worker {worker_id} unreachable: {e}")
+            await JSONResponse(status_code=502, content={"error": f"Worker {worker_id} unreachable"})(scope, receive, send)
+            return
+        response = Response(upstream.content, status_code=upstream.status_code)
+        response.raw_headers = [
+            (name.encode('latin-1'), value.encode('latin-1'))
+            for name, value in upstream.headers.multi_items() if name.lower() not in _HOP_HEADERS
+        ] + [(b'content-length', str(len(upstream.content)).encode())]
+        await response(scope, receive, send)
+
+    # --- WebSocket ---
+    async def _websocket(self, scope, receive, send):
+        from websockets.asyncio.client import connect
+
+        worker_id = self.pick(scope['path'])
+        if worker_id is None:
+            await WebSocketClose(code=1008)(scope, receive, send)
+            return
+        await receive()  # websocket.connect
+        url = self.upstreams[worker_id].replace('http', 'ws', 1) + scope['raw_path'].decode('latin-1')
+        if scope['query_string']:
+            url += '?' + scope['query_string'].decode('latin-1')
+        try:
+            upstream = await connect(url, subprotocols=scope.get('subprotocols') or None, max_size=None,
+                                     ping_interval=None)
+        except Exception as e:
+            logger.error(f"Worker {worker_id} refused websocket {scope['path']}: {e}")
+            await send({'type': 'websocket.close', 'code': 1011})
+            return
+        await send({'type': 'websocket.accept', 'subprotocol': upstream.subprotocol})
+
+        async def client_to_worker():
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    await upstream.close()
+                    return
+                await upstream.send(message['text'] if message.get('text') is not None else message['bytes'])
+
+        async def worker_to_client():
+            async for data in upstream:
+                await send({'type': 'websocket.send', **({'text': data} if isinstance(data, str) else {'bytes': data})})
+            await send({'type': 'websocket.close', 'code': upstream.close_code or 1000})
+
+        pumps = [asyncio.create_task(client_to_worker()), asyncio.create_task(worker_to_client())]
+        try:
+            await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for pump in pumps:
+                pump.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
+            await upstream.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self._client.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def worker_ids(workers: int) -> List[str]:
+    return [f"w{index}" for index in range(workers)]
+
+
+def assign_numbers(numbers: List[str], workers: List[str]) -> Dict[str, List[str]]:
+    """Deal the bot numbers out to the workers, since each worker's number pool is its own."""
+    return {worker: numbers[index::len(workers)] for index, worker in enumerate(workers)}
+
+
+def worker_env(worker_id: str, workers: List[str], numbers: List[str], env: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    env = dict(os.environ if env is None else env)
+    env.update(WORKER_ID=worker_id, WORKER_IDS=','.join(workers), BOT_NUMBERS=','.join(numbers))
+    # Journals are per process; two workers appending to one would interleave
+    if env.get('SESSION_JOURNAL_DIR'):
+        env['SESSION_JOURNAL_DIR'] = os.path.join(env['SESSION_JOURNAL_DIR'], worker_id)
+    return env
+
+
+def launch(workers: int, port: int, host: str = '0.0.0.0'):
+    """Start the workers and serve the proxy in front of them until interrupted."""
+    import uvicorn
+
+    from backend.core.number_pool import BOT_NUMBERS
+
+    ids = worker_ids(workers)
+    numbers = assign_numbers(BOT_NUMBERS, ids)
+    processes = []
+    upstreams = {}
+    for index, worker_id in enumerate(ids):
+        worker_port = port + 1 + index
+        upstreams[worker_id] = f"http://127.0.0.1:{worker_port}"
+        processes.append(subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'backend.app:app', '--host', '127.0.0.1', '--port', str(worker_port)],
+            env=worker_env(worker_id, ids, numbers[worker_id]),
+        ))
+        logger.info(f"Worker {worker_id} on port {worker_port} with bot numbers {numbers[worker_id] or 'none'}")
+    owners = {number: worker_id for worker_id, owned in numbers.items() for number in owned}
+    try:
+        uvicorn.run(WorkerProxy(upstreams, owners), host=host, port=port)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
@@ -1,4 +1,4 @@
-from typing import Dict, Optional, Tuple
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
 from pydantic import BaseModel, Field
 from backend.core.constants import ResponseMethod, CallType, CallDirection
 from dataclasses import dataclass, field
@@ -13,51 +13,82 @@ class UserInformation(BaseModel):
     additional_info: Dict[str, str] = Field(default_factory=dict)
 
 
-@dataclass
-class BotCall:
-    call_sid: str
-    call_type: CallType  # This will only contain bot call types
-
-@dataclass
 class CallSids:
-    # Key can be (CallType, bool) if we need inbound/outbound, or just CallType
-    # if inbound/outbound is only relevant for BOT calls.
-    storage: Dict[Tuple[CallType, Optional[bool]], str] = None
-    call_type_to_direction: Dict[CallType, CallDirection] = None
+    """
+    Call SID per call type. One slot per CallType (named after its value) and the
+    directions packed two bits per type into an int, instead of two dicts.
+    """
+    __slots__ = tuple(call_type.value for call_type in CallType) + ('directions',)
 
-    def __post_init__(self):
-        if self.storage is None:
-            self.storage = {}
-        if self.call_type_to_direction is None:
-            self.call_type_to_direction = {}
+    def __init__(self):
+        for call_type in CallType:
+            setattr(self, call_type.value, None)
+        self.directions = 0
 
     def set_sid(self, call_type: CallType, call_sid: str, is_outbound: Optional[bool] = None):
-        self.storage[call_type] = call_sid
+        setattr(self, call_type.value, call_sid)
         if is_outbound is not None:
-            self.call_type_to_direction[call_type] = CallDirection.OUTBOUND if is_outbound else CallDirection.INBOUND
+            shift = 2 * _CALL_TYPE_INDEX[call_type]
+            self.directions = (self.directions & ~(3 << shift)) | ((2 if is_outbound else 1) << shift)
 
     def get_sid(self, call_type: CallType) -> Optional[str]:
-        key = call_type
-        return self.storage.get(key)
-    
+        return getattr(self, call_type.value)
+
     def get_direction(self, call_type: CallType) -> Optional[CallDirection]:
-        return self.call_type_to_direction.get(call_type)
+        bits = (self.directions >> (2 * _CALL_TYPE_INDEX[call_type])) & 3
+        return _DIRECTION_BITS.get(bits)
+
+    def items(self) -> Iterator[Tuple[CallType, str]]:
+        """(call type, SID) for every call type with a SID set."""
+        for call_type in CallType:
+            call_sid = getattr(self, call_type.value)
+            if call_sid is not None:
+                yield call_type, call_sid
+
+
+_CALL_TYPE_INDEX = {call_type: index for index, call_type in enumerate(CallType)}
+_DIRECTION_BITS = {1: CallDirection.INBOUND, 2: CallDirection.OUTBOUND}
+
 
-@dataclass
+@dataclass(slots=True)
 class MetaCallSids:
     twilio_stream: Optional[str] = None
     conference: Optional[str] = None
 
 
-class ChatMessage(BaseModel):
-    """Chat message for a session"""
+class ChatMessage(NamedTuple):
+    """Chat message for a session. A tuple, since a session may hold many of them."""
     role: str
     content: str
 
+    def model_dump(self) -> Dict[str, str]:
+        return {'role': self.role, 'content': self.content}
+
+
+@dataclass(slots=True)
+class CallStatusEvent:
+    """A call status callback, queued for its session's event consumer."""
+    call_sid: str
+    status: str
+    from_: Optional[str] = None
+    to: Optional[str] = None
+    session_id: Optional[str] = None
+
+
+@dataclass(slots=True)
+class ConferenceEvent:
+    """A conference status callback, queued for its session's event consumer."""
+    session_id: str
+    event: str
+    conference_sid: Optional[str] = None
+    call_sid: Optional[str] = None
+    reason: Optional[str] = None
+
 
 class InitiateCallRequest(BaseModel):
     """Main request model for initiating a call"""
-    bot_number: str = Field(..., pattern=r'^\+\d{11}$')  # Enforce E.164 format
+    # Enforce E.164 format. Left out, a number is taken from the bot number pool
+    bot_number: Optional[str] = Field(None, pattern=r'^\+\d{11}$')
     cs_number: str = Field(..., pattern=r'^\+\d{11}$')
     user_number: str = Field(..., pattern=r'^\+\d{11}$')
     user_info: UserInformation 
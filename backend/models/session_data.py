@@ -1,14 +1,41 @@
-from typing import Optional, List
+import json
+import sys
+from typing import Dict, Iterable, Optional, List
 from datetime import datetime
 
 from backend.models.models import CallSids, UserInformation, ChatMessage, CallType,  MetaCallSids
-from backend.core.constants import CallInfo
+from backend.core.constants import CallInfo, CallDirection
+
+# Attribute name -> short record key used when a session is serialized
+RECORD_KEYS = {
+    'session_id': 'id',
+    'conference_name': 'conf',
+    'user_info': 'user',
+    'meta_call_sids': 'meta',
+    'bot_number': 'bot',
+    'cs_number': 'cs',
+    'user_number': 'usr',
+    'ready_for_stream': 'ready',
+    'chat_history': 'chat',
+    'time_created': 'created',
+    'last_activity': 'active',
+}
+_DIRECTIONS = {CallDirection.OUTBOUND: 'o', CallDirection.INBOUND: 'i'}
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(',', ':'))
 
 class SessionData:
     """
     All data associated with a call session.
     A regular class with an explicit constructor, plus getters/setters.
+    Slotted, since a worker holds many live and recently finished sessions.
     """
+    __slots__ = (
+        'session_id', 'conference_name', 'user_info', 'meta_call_sids', 'bot_number', 'cs_number',
+        'user_number', 'ready_for_stream', 'call_sids', 'chat_history', 'time_created', 'last_activity',
+    )
 
     def __init__(self, session_id: str, conference_name: str, user_info: Optional[UserInformation] = None):
         # Required fields
@@ -17,7 +44,7 @@ class SessionData:
         self.user_info: Optional[UserInformation] = user_info
 
         # Optional fields
-        self.meta_call_sids: Optional[MetaCallSids] = None
+        self.meta_call_sids = MetaCallSids()
         self.bot_number: Optional[str] = None
         self.cs_number: Optional[str] = None
         self.user_number: Optional[str] = None
@@ -28,6 +55,7 @@ class SessionData:
         self.chat_history: List[ChatMessage] = []
 
         self.time_created: datetime = datetime.now()
+        self.last_activity: datetime = self.time_created
 
     # --- Conference SID ---
     def set_call_sid(self, call_type: CallType, call_sid: str, is_outbound: Optional[bool] = None):
@@ -97,9 +125,119 @@ class SessionData:
     def is_ready_for_stream(self) -> bool:
         return self.ready_for_stream
 
+    # --- Activity ---
+    def touch(self):
+        self.last_activity = datetime.now()
+
+    def get_last_activity(self) -> datetime:
+        return self.last_activity
+
     # --- Chat History ---
     def add_to_chat_history(self, role: str, content: str):
         self.chat_history.append(ChatMessage(role=role, content=content))
+        self.touch()
 
     def get_chat_history(self) -> List[ChatMessage]:
         return self.chat_history
+
+    # --- Memory ---
+    def approx_bytes(self) -> int:
+        """
+        Approximate memory held by this session: the object, its call SIDs, chat
+        history and user info. Strings shared with other sessions are counted too.
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self.call_sids) + sys.getsizeof(self.meta_call_sids)
+        size += sys.getsizeof(self.time_created) + sys.getsizeof(self.last_activity)
+        for name in ('session_id', 'conference_name', 'bot_number', 'cs_number', 'user_number'):
+            value = getattr(self, name)
+            if value is not None:
+                size += sys.getsizeof(value)
+        size += sum(sys.getsizeof(call_sid) for _, call_sid in self.call_sids.items())
+        size += sum(sys.getsizeof(value) for value in (self.meta_call_sids.twilio_stream, self.meta_call_sids.conference) if value)
+        size += sys.getsizeof(self.chat_history)
+        size += sum(sys.getsizeof(message) + sys.getsizeof(message.content) for message in self.chat_history)
+        if self.user_info is not None:
+            size += sys.getsizeof(self.user_info) + sys.getsizeof(self.user_info.__dict__)
+            size += sum(sys.getsizeof(value) for value in self.user_info.__dict__.values())
+        return size
+
+    # --- Serialization ---
+    def to_record(self, fields: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """
+        Flat, compact string mapping of the session, suitable for a hash in a shared
+        store. `fields` limits it to the given attribute names; an empty value means
+        the attribute is unset. Each call SID is its own key so legs linked by
+        different workers never overwrite each other.
+        """
+        record = {}
+        for name in (RECORD_KEYS if fields is None else fields):
+            if name == 'call_sids':
+                record.update(self._call_sid_record())
+            elif name in RECORD_KEYS:
+                record[RECORD_KEYS[name]] = self._encode_field(name)
+        if fields is None:
+            record.update(self._call_sid_record())
+        return record
+
+    def _encode_field(self, name: str) -> str:
+        value = getattr(self, name)
+        if value is None:
+            return ''
+        if name == 'user_info':
+            return _dumps(value.model_dump())
+        if name == 'meta_call_sids':
+            return _dumps([value.twilio_stream, value.conference]) if value.twilio_stream or value.conference else ''
+        if name == 'ready_for_stream':
+            return '1' if value else ''
+        if name == 'chat_history':
+            return _dumps([[message.role, message.content] for message in value])
+        if isinstance(value, datetime):
+            return repr(value.timestamp())
+        return value
+
+    def _call_sid_record(self) -> Dict[str, str]:
+        record = {}
+        for call_type, call_sid in self.call_sids.items():
+            direction = self.call_sids.get_direction(call_type)
+            record[f'sid:{call_type.value}'] = call_sid + (f'|{_DIRECTIONS[direction]}' if direction else '')
+        return record
+
+    @classmethod
+    def from_record(cls, record: Dict[str, str]) -> "SessionData":
+        session_data = cls(session_id=record['id'], conference_name=record.get('conf', ''))
+        session_data.apply_record(record)
+        return session_data
+
+    def apply_record(self, record: Dict[str, str]):
+        """Overwrite the attributes present in a (possibly partial) record."""
+        for name, key in RECORD_KEYS.items():
+            if key not in record or name == 'session_id':
+                continue
+            value = record[key]
+            if name == 'user_info':
+                value = UserInformation(**json.loads(value)) if value else None
+            elif name == 'meta_call_sids':
+                value = MetaCallSids(*json.loads(value)) if value else MetaCallSids()
+            elif name == 'ready_for_stream':
+                value = value == '1'
+            elif name == 'chat_history':
+                value = [ChatMessage(role, content) for role, content in json.loads(value)] if value else []
+            elif name in ('time_created', 'last_activity'):
+                value = datetime.fromtimestamp(float(value))
+            else:
+                value = value or None
+            setattr(self, name, value)
+
+        for key, value in record.items():
+            if key.startswith('sid:'):
+                call_sid, _, direction = value.partition('|')
+                is_outbound = direction == 'o' if direction else None
+                self.call_sids.set_sid(CallType(key[4:]), call_sid or None, is_outbound)
+
+    def to_bytes(self) -> bytes:
+        """Whole session as compact JSON, leaving out unset fields."""
+        return _dumps({key: value for key, value in self.to_record().items() if value}).encode()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SessionData":
+        return cls.from_record(json.loads(data))
@@ -1,91 +1,147 @@
+import asyncio
+
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, JSONResponse
-from twilio.twiml.voice_response import Connect, VoiceResponse
 
+from backend.core.active_calls import active_calls
 from backend.core.call_manager import call_manager
-from backend.core.constants import CallType
+from backend.core.session_store import call_store
+from backend.core.number_pool import NumberPoolExhausted, bot_number_pool
+from backend.core.session_affinity import session_affinity
+from backend.core.constants import CallType, EvictionReason, TwilioCallStatus
+from backend.core.session_lifecycle import session_lifecycle
 from backend.models.models import InitiateCallRequest
-from backend.services.twilio_utils import create_call, create_conference, end_call
-from backend.utils.utils import logger, twilio_client
+from backend.services.twilio_rest import twilio_rest
+from backend.services.twilio_utils import create_call, end_call
+from backend.services.twiml_templates import INCOMING_CALL
+from backend.utils.utils import logger
 
 
 bot_call_router = APIRouter()
+session_lifecycle.on_teardown(lambda session_id, _: bot_number_pool.release(session_id))
+
+
+@session_lifecycle.on_teardown
+async def hang_up_legs(session_id: str, reason: EvictionReason):
+    """End a session's calls when it is torn down before they finished on their own."""
+    if reason == EvictionReason.COMPLETED:
+        return
+    call_sids = sorted(await call_store(call_manager.get_call_sids, session_id))
+    results = await asyncio.gather(*(end_call(twilio_rest, call_sid) for call_sid in call_sids), return_exceptions=True)
+    for call_sid, result in zip(call_sids, results):
+        if isinstance(result, Exception):
+            # Still recorded in the pool, so the next session on the number retries it
+            logger.error(f"Error ending call {call_sid} of session {session_id}: {result}")
+        else:
+            active_calls.update(call_sid, TwilioCallStatus.COMPLETED.value)
+            logger.info(f"Ended call {call_sid} of session {session_id} ({reason.value})")
 
 
 @bot_call_router.post("/initiate-call")
 async def initiate_call(request: InitiateCallRequest, req: Request):
     """
     1. Create a new session via CallManager.
-    2. Retrieve SessionData from the manager.
+    2. Reserve a bot number for it from the pool.
     3. Set phone numbers and user info in SessionData.
     4. Create calls to bot_number and cs_number, link them to the session.
     """
+    session_id = None
     try:
-        # End any active calls from the same CS number
-        active_calls = twilio_client.calls.list(from_=request.bot_number, status="in-progress")
-        if active_calls:
-            for call in active_calls:
-                twilio_client.calls(call.sid).update(status="completed")
-                logger.info(f"Ended existing in-progress call with SID: {call.sid}")
         host = req.url.hostname
-        # Garuntee that no existing session for the given numbers
-        existing_sessions_tuple = call_manager.check_session_exists([request.cs_number, request.bot_number, request.user_number])
-        if existing_sessions_tuple:
-            number, existing_sessions = existing_sessions_tuple
-            for session in existing_sessions:
-                logger.error(f"Session already exists for {number}. Cleaning up")
-                call_manager.delete_session(session)
-
-        session_id = call_manager.create_new_session()
-        session_data = call_manager.get_session_by_id(session_id)
+        # A user starting over replaces their previous session. Other sessions on the
+        # same bot or CS number are separate calls and are left alone.
+        for existing_session_id in await call_store(call_manager.get_sessions_by_user_number, request.user_number):
+            logger.info(f"Replacing session {existing_session_id} for {request.user_number}")
+            await session_lifecycle.teardown(existing_session_id, EvictionReason.REPLACED)
+
+        # Owned by this worker, so the webhooks below route back here
+        session_id = await call_store(call_manager.create_new_session, session_affinity.new_session_id())
+        try:
+            bot_number = bot_number_pool.reserve(session_id, request.bot_number)
+        except NumberPoolExhausted as e:
+            logger.warning(f"No bot number for session {session_id}: {e}")
+            await call_store(call_manager.delete_session, session_id)
+            return JSONResponse(status_code=503, content={"error": str(e)})
+        session_data = await call_store(call_manager.get_session_by_id, session_id)
 
         # Set phone numbers, user info (assuming request.user_info is already a valid object)
-        session_data.set_bot_number(request.bot_number)
+        session_data.set_bot_number(bot_number)
         session_data.set_cs_number(request.cs_number)
         session_data.set_user_number(request.user_number)
         session_data.set_user_info(request.user_info)
+        await call_store(call_manager.save_session, session_data, 'bot_number', 'cs_number', 'user_number', 'user_info')
 
         # Build TwiML endpoints
-        join_conference_url = f"https://{host}/conference/caller_join_conference/{session_id}"
-        call_events_url = f"https://{host}/conference/call_events"
-
-        # Create a call from the bot number to the "bot number" (not typical, but presumably bridging)
-        outgoing_conf_bot_call = create_call(
-            twilio_client,
-            to=request.bot_number,
-            from_=request.bot_number,
-            url=join_conference_url,
-            status_callback=call_events_url
-        )
-        # Link this "conference" type call into the manager
-        call_manager.link_call_to_session(
-            call_sid=outgoing_conf_bot_call.sid,
-            call_number=request.bot_number,
-            session_id=session_id,
-            call_type=CallType.CONFERENCE,
-            is_outbound=True
-        )
-
-        # Create a call to the customer service number
-        cs_call = create_call(
-            twilio_client,
-            to=request.cs_number,
-            from_=request.bot_number,
-            url=join_conference_url,
-            status_callback=call_events_url
-        )
-        call_manager.link_call_to_session(
-            call_sid=cs_call.sid,
-            call_number=request.cs_number,
-            session_id=session_id,
-            call_type=CallType.CUSTOMER_SERVICE,
+        join_conference_url = session_affinity.url(host, session_id, f"/conference/caller_join_conference/{session_id}")
+        call_events_url = session_affinity.url(host, session_id, f"/conference/call_events/{session_id}")
+
+        # Calls earlier sessions on this number left behind and that are still live;
+        # they are hung up alongside the dialing below. Calls the pool didn't record may
+        # belong to another worker, so they are left alone.
+        stale_sids = bot_number_pool.take_leaked(bot_number) & active_calls.active(bot_number)
+
+        # The bot calls its number, from a caller unique among that number's sessions; the
+        # inbound leg (see incoming_call) opens the media stream. Registered first, since
+        # that webhook can arrive before create_call returns.
+        bot_number_pool.expect_inbound(bot_number, session_id)
+        # Both legs are dialed at once, so this costs one Twilio round trip instead of two
+        outgoing_conf_bot_call, cs_call, *hangups = await asyncio.gather(
+            create_call(
+                twilio_rest,
+                to=bot_number,
+                from_=bot_number_pool.caller_for(session_id),
+                url=join_conference_url,
+                status_callback=call_events_url
+            ),
+            # Create a call to the customer service number
+            create_call(
+                twilio_rest,
+                to=request.cs_number,
+                from_=bot_number,
+                url=join_conference_url,
+                status_callback=call_events_url
+            ),
+            *(end_call(twilio_rest, call_sid) for call_sid in stale_sids),
+            return_exceptions=True
         )
+        for call_sid, result in zip(stale_sids, hangups):
+            if isinstance(result, Exception):
+                logger.error(f"Error ending stale call {call_sid}: {result}")
+            else:
+                logger.info(f"Ended stale call {call_sid} on {bot_number}")
 
-        return {"message": "Calls initiated", "session_id": session_id, "outgoing_bot_conference_sid": outgoing_conf_bot_call.sid, "cs_call_sid": cs_call.sid}
+        # Link this "conference" type call into the manager
+        if not isinstance(outgoing_conf_bot_call, Exception):
+            bot_number_pool.record_call(session_id, outgoing_conf_bot_call.sid)
+            await call_store(call_manager.link_call_to_session,
+                call_sid=outgoing_conf_bot_call.sid,
+                call_number=bot_number,
+                session_id=session_id,
+                call_type=CallType.CONFERENCE,
+                is_outbound=True
+            )
+        if not isinstance(cs_call, Exception):
+            bot_number_pool.record_call(session_id, cs_call.sid)
+            await call_store(call_manager.link_call_to_session,
+                call_sid=cs_call.sid,
+                call_number=request.cs_number,
+                session_id=session_id,
+                call_type=CallType.CUSTOMER_SERVICE,
+            )
+        failed = [result for result in (outgoing_conf_bot_call, cs_call) if isinstance(result, Exception)]
+        if failed:
+            # A lone leg is useless; the FAILED teardown below hangs up whichever one did connect
+            raise failed[0]
+
+        return {"message": "Calls initiated", "session_id": session_id, "bot_number": bot_number,
+                "outgoing_bot_conference_sid": outgoing_conf_bot_call.sid, "cs_call_sid": cs_call.sid}
     except Exception as e:
         logger.error(f"Error initiating call: {e}")
+        if session_id:
+            await session_lifecycle.teardown(session_id, EvictionReason.FAILED)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+
 @bot_call_router.post("/incoming-call")
 async def incoming_call(request: Request):
     """
@@ -97,9 +153,16 @@ async def incoming_call(request: Request):
     host = request.url.hostname
     form_data = await request.form()
     incoming_call_sid = form_data.get('CallSid')
-    incoming_number = form_data.get('From')
-
-    session_data = call_manager.get_session_by_number(incoming_number)
+    caller = form_data.get('From')
+    incoming_number = form_data.get('To') or caller
+
+    # Keyed by the From/To pair and CallSid, since a pooled number can carry several sessions
+    session_id = bot_number_pool.claim_inbound(incoming_number, incoming_call_sid, caller)
+    if session_id:
+        session_data = await call_store(call_manager.get_session_by_id, session_id)
+    else:
+        # Numbers this worker didn't reserve, e.g. sessions restored from the journal
+        session_data = await call_store(call_manager.get_session_by_number, incoming_number)
     if not session_data:
         # TODO: Needs to be able to handle being called directly instead of having to initiate
         # for now kept as returning a 404 if it gets called
@@ -107,7 +170,7 @@ async def incoming_call(request: Request):
         return JSONResponse(status_code=404, content={"error": "Session not found"})
 
     # Link the new call SID into the session as a STREAM call (or however you designate it)
-    call_manager.link_call_to_session(
+    await call_store(call_manager.link_call_to_session,
         call_sid=incoming_call_sid,
         call_number=incoming_number,
         session_id=session_data.session_id,
@@ -115,9 +178,6 @@ async def incoming_call(request: Request):
         is_outbound=False
     )
 
-    response = VoiceResponse()
-    response.pause(length=1)
-
     # Retrieve user info from the session
     user_info = session_data.get_user_info()
     # TODO: Needs to be able to handle being called directly instead of having to initiate
@@ -126,11 +186,8 @@ async def incoming_call(request: Request):
         logger.error(f"No user info found for session {incoming_call_sid}")
         return HTMLResponse(content="", media_type="application/xml")
 
-    user_name = user_info.user_name
-    response.say(f"Hi, I'm a helpful agent working for {user_name}")
-
-    connect = Connect()
-    connect.stream(url=f'wss://{host}/media/media-stream/{session_data.session_id}')
-    response.append(connect)
-
-    return HTMLResponse(content=str(response), media_type="application/xml")
+    response = INCOMING_CALL.render(
+        name=user_info.user_name,
+        stream_url=session_affinity.url(host, session_data.session_id, f'/media/media-stream/{session_data.session_id}', scheme='wss')
+    )
+    return HTMLResponse(content=response, media_type="application/xml")
@@ -1,11 +1,19 @@
+from typing import Optional
+
 from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse
-from twilio.twiml.voice_response import VoiceResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 
+from backend.core.active_calls import active_calls
 from backend.core.call_manager import call_manager
-from backend.services.twilio_utils import create_conference
+from backend.core.session_store import call_store
+from backend.core.event_pipeline import event_pipeline
+from backend.core.session_affinity import session_affinity
+from backend.core.session_lifecycle import session_lifecycle
+from backend.core.webhook_dedupe import webhook_deduper, webhook_key
+from backend.services.twiml_templates import JOIN_CONFERENCE
 from backend.utils.utils import logger
 from backend.core.constants import TwilioCallStatus, CallType
+from backend.models.models import CallStatusEvent, ConferenceEvent
 
 
 conference_router = APIRouter()
@@ -17,89 +25,120 @@ async def caller_join_conference(request: Request, session_id: str):
     1. Lookup SessionData to get the conference name.
     2. Create a <Dial><Conference> TwiML.
     """
-    response = VoiceResponse()
     host = request.url.hostname
 
-    session_data = call_manager.get_session_by_id(session_id)
+    session_data = await call_store(call_manager.get_session_by_id, session_id)
     if not session_data:
         logger.error(f"No session found with ID: {session_id}")
         return HTMLResponse(content="", media_type="application/xml")
 
     conference_name = session_data.get_conference_name()
 
-    conference_events_url = f"https://{host}/conference/conference_events/{session_id}"
-    response.append(create_conference(conference_name, host, conference_events_url))
+    conference_events_url = session_affinity.url(host, session_id, f"/conference/conference_events/{session_id}")
+    response = JOIN_CONFERENCE.render(conference_name=conference_name, events_url=conference_events_url)
 
-    return HTMLResponse(content=str(response), media_type="application/xml")
+    return HTMLResponse(content=response, media_type="application/xml")
 
 @conference_router.post("/conference_events/{session_id}")
 async def conference_events(request: Request, session_id: str):
     """
     Twilio calls this webhook on various conference events: participant join/leave, etc.
-    We'll store the ConferenceSid in SessionData (if we want).
+    The event is queued for the session and applied by `apply_conference_event`.
     """
-    try:
-        form_data = await request.form()
-        event_type = form_data.get('StatusCallbackEvent')
-        conference_sid = form_data.get('ConferenceSid')
-        call_sid = form_data.get('CallSid')
+    form_data = await request.form()
+    key = webhook_key(request.headers, form_data, 'ConferenceSid', 'StatusCallbackEvent', 'CallSid')
+    if webhook_deduper.seen('conference_events', key):
+        return '', 200
+
+    event = ConferenceEvent(
+        session_id=session_id,
+        event=form_data.get('StatusCallbackEvent'),
+        conference_sid=form_data.get('ConferenceSid'),
+        call_sid=form_data.get('CallSid'),
+        reason=form_data.get('ReasonParticipantLeft'),
+    )
+    if not event_pipeline.submit(session_id, apply_conference_event, event):
+        webhook_deduper.forget('conference_events', key)
+        return JSONResponse(status_code=503, content={"error": "Event pipeline is full"})
+    return '', 200
+
+
+async def apply_conference_event(event: ConferenceEvent):
+    """We'll store the ConferenceSid in SessionData (if we want)."""
+    session_data = await call_store(call_manager.get_session_by_id, event.session_id)
+    if not session_data:
+        logger.error(f"Conference events: session {event.session_id} not found")
+        return
 
-        session_data = call_manager.get_session_by_id(session_id)
-        if not session_data:
-            logger.error(f"Conference events: session {session_id} not found")
-            return '', 200
+    session_data.set_conference_sid(event.conference_sid)
+    await call_store(call_manager.save_session, session_data, 'meta_call_sids')
 
-        session_data.set_conference_sid(conference_sid)
+    logger.info(f"Conference Event: {event.event} for conference {event.conference_sid} call_sid={event.call_sid}")
 
-        logger.info(f"Conference Event: {event_type} for conference {conference_sid} call_sid={call_sid}")
+    if event.event == 'participant-join':
+        logger.debug(f"Participant joined conference. CallSid: {event.call_sid}")
+        # Possibly check if it's the user or CS and do something
+    elif event.event == 'participant-leave':
+        logger.debug(f"Participant left conference. Reason: {event.reason or 'unknown'}")
 
-        if event_type == 'participant-join':
-            logger.debug(f"Participant joined conference. CallSid: {call_sid}")
-            # Possibly check if it's the user or CS and do something
-        elif event_type == 'participant-leave':
-            reason = form_data.get('ReasonParticipantLeft', 'unknown')
-            logger.debug(f"Participant left conference. Reason: {reason}")
 
+@conference_router.post("/call_events")
+@conference_router.post("/call_events/{session_id}")
+async def call_events(request: Request, session_id: Optional[str] = None):
+    """
+    Status changes for any call. The session id in the path, which new calls are given,
+    orders the event behind the session's others; older calls fall back to their SID.
+    """
+    form_data = await request.form()
+    key = webhook_key(request.headers, form_data, 'CallSid', 'CallStatus')
+    if webhook_deduper.seen('call_events', key):
         return '', 200
-    except Exception as e:
-        logger.error(f"Error handling conference event: {e}")
-        return str(e), 500
+    call_sid = form_data.get('CallSid')
+    status = form_data.get('CallStatus')  # e.g. "in-progress", "completed"
+    if not call_sid or not status:
+        return JSONResponse(status_code=400, content={"error": "Missing CallSid or CallStatus"})
 
+    event = CallStatusEvent(call_sid, status, form_data.get('From'), form_data.get('To'), session_id)
+    if not event_pipeline.submit(session_id or call_sid, apply_call_event, event):
+        webhook_deduper.forget('call_events', key)
+        return JSONResponse(status_code=503, content={"error": "Event pipeline is full"})
+    return '', 200
 
-@conference_router.post("/call_events")
-async def call_events(request: Request):
+
+async def apply_call_event(event: CallStatusEvent):
     """
-    Handle status changes for any active call. If the CS call is in-progress, we set session ready.
+    If the CS call is in-progress, we set session ready.
     If the CS call ends, we unset the stream-ready.
     """
-    try:
-        form_data = await request.form()
-        event_type = form_data.get('CallStatus')  # e.g. "in-progress", "completed"
-        call_sid = form_data.get('CallSid')
-
-        session_data = call_manager.get_session_by_call_sid(call_sid)
-        if not session_data:
-            logger.error(f"No session found for call {call_sid}")
-            return '', 200
-
-        # Compare the callSid to session_data's known call SIDs
-        cs_sid = session_data.call_sids.get_sid(CallType.CUSTOMER_SERVICE)
-        if not cs_sid:
-            logger.error(f"No customer service call SID found for session {session_data.session_id}")
-            return '', 404
-
-        if event_type == TwilioCallStatus.IN_PROGRESS.value:
-            logger.debug(f"Call in progress: {call_sid}")
-            if call_sid == cs_sid:
-                logger.info("Customer service agent connected. Setting stream ready.")
-                session_data.set_ready_for_stream()
-                
-        elif event_type == TwilioCallStatus.COMPLETED.value:
-            logger.debug(f"Call completed: {call_sid}")
-            if call_sid == cs_sid:
-                logger.info("Customer service disconnected. Unsetting stream ready.")
-                session_data.unset_ready_for_stream()
-
-    except Exception as e:
-        logger.error(f"Error handling call event: {e}")
-    return '', 200
\ No newline at end of file
+    call_sid = event.call_sid
+    event_type = event.status
+    active_calls.update(call_sid, event_type, event.from_, event.to)
+
+    session_data = await call_store(call_manager.get_session_by_call_sid, call_sid)
+    if not session_data:
+        logger.error(f"No session found for call {call_sid}")
+        return
+    session_data.touch()
+
+    # Compare the callSid to session_data's known call SIDs
+    cs_sid = session_data.call_sids.get_sid(CallType.CUSTOMER_SERVICE)
+    if not cs_sid:
+        logger.error(f"No customer service call SID found for session {session_data.session_id}")
+        return
+
+    if event_type == TwilioCallStatus.IN_PROGRESS.value:
+        logger.debug(f"Call in progress: {call_sid}")
+        if call_sid == cs_sid:
+            logger.info("Customer service agent connected. Setting stream ready.")
+            session_data.set_ready_for_stream()
+
+    elif event_type == TwilioCallStatus.COMPLETED.value:
+        logger.debug(f"Call completed: {call_sid}")
+        if call_sid == cs_sid:
+            logger.info("Customer service disconnected. Unsetting stream ready.")
+            session_data.unset_ready_for_stream()
+
+    await call_store(call_manager.save_session, session_data, 'ready_for_stream', 'last_activity')
+
+    if event_type in {status.value for status in TwilioCallStatus if status.is_final}:
+        await session_lifecycle.leg_finished(session_data.session_id, call_sid)
@@ -8,21 +8,48 @@ from fastapi.websockets import WebSocketDisconnect
 
 from backend.core.constants import ResponseMethod
 from backend.core.call_manager import call_manager
+from backend.core.session_store import call_store
+from backend.core.session_affinity import session_affinity
+from backend.core.session_lifecycle import session_lifecycle
+from backend.core.turn_trace import (
+    FIRST_OUTBOUND_FRAME,
+    FIRST_TTS_COMPLETE,
+    LAST_INBOUND_FRAME,
+    LAST_OUTBOUND_FRAME,
+    TRANSCODE_COMPLETE,
+    TRANSCODE_START,
+    TTS_COMPLETE,
+    InboundClock,
+    current_turn,
+    mark,
+    mark_last,
+    timed
+)
 from backend.services.deepgram_handler import (
+    SpeechChunker,
     close_deepgram_stt_connection,
     convert_mp3_to_mulaw,
     create_deepgram_stt_connection,
     synthesize_speech
 )
-from backend.services.openai_utils import invoke_gpt
+from backend.services.openai_utils import stream_gpt
+from backend.services.response_parser import ResponseEventType
+from backend.services.twilio_rest import twilio_rest
 from backend.services.twilio_utils import create_call
-from backend.utils.utils import logger, twilio_client
+from backend.services.twiml_templates import PHONE_TREE
+from backend.utils.utils import LogRateLimiter, log_enabled, logger
 from backend.core.constants import CallType
 from fastapi.websockets import WebSocketState
 from fastapi import APIRouter
 
 media_router = APIRouter()
 
+# Open media streams and the STT connections behind them, for /metrics
+media_stats = {'streams': 0, 'stt_connections': 0}
+# Media goes out many times a second per stream; log a sample of it
+media_log_limiter = LogRateLimiter(interval=5.0)
+
+
 async def send_websocket_message(websocket: WebSocket, stream_sid: str, event_type: str, payload: Any):
     """Send a message through the websocket with the specified event type and payload."""
     if not websocket or not stream_sid:
@@ -42,7 +69,15 @@ async def send_websocket_message(websocket: WebSocket, stream_sid: str, event_ty
         }
 
     await websocket.send_json(message)
-    logger.info(f"Sent {event_type} message through websocket")
+    if event_type == "media":
+        mark(FIRST_OUTBOUND_FRAME)
+        mark_last(LAST_OUTBOUND_FRAME)
+        if log_enabled("DEBUG"):
+            skipped = media_log_limiter.allow(stream_sid)
+            if skipped is not None:
+                logger.debug(f"Sent media message through websocket ({skipped} more since the last logged)")
+    else:
+        logger.info(f"Sent {event_type} message through websocket")
 
 
 async def handle_voice_response(gpt_reply, stream_sid, websocket):
@@ -56,8 +91,14 @@ async def handle_voice_response(gpt_reply, stream_sid, websocket):
         logger.error("No response content provided in voice response")
         return ""
     
-    tts_mp3 = await synthesize_speech(response_content)
-    tts_mulaw = convert_mp3_to_mulaw(tts_mp3)
+    with timed('tts'):
+        tts_mp3 = await synthesize_speech(response_content)
+    mark(FIRST_TTS_COMPLETE)
+    mark_last(TTS_COMPLETE)
+    mark(TRANSCODE_START)
+    with timed('transcode'):
+        tts_mulaw = convert_mp3_to_mulaw(tts_mp3)
+    mark(TRANSCODE_COMPLETE)
     payload_b64 = base64.b64encode(tts_mulaw).decode("ascii")
     return payload_b64
 
@@ -69,18 +110,15 @@ async def handle_phone_tree(gpt_reply):
         logger.error("No extension provided in phone tree response")
         return ""
 
-    from twilio.twiml.voice_response import VoiceResponse
-    response = VoiceResponse()
-    response.play(digits=extension)
-    return str(response)
+    return PHONE_TREE.render(digits=extension)
 
 
-def handle_dial_user(call_url: str, session_id: str):
+async def handle_dial_user(call_url: str, session_id: str):
     """
     Dial the user number when we get a 'redirect' scenario.
     """
     try:
-        session_data = call_manager.get_session_by_id(session_id)
+        session_data = await call_store(call_manager.get_session_by_id, session_id)
         if not session_data:
             logger.error(f"Session not found: {session_id}")
             return None
@@ -88,15 +126,16 @@ def handle_dial_user(call_url: str, session_id: str):
         user_number = session_data.get_user_number()
         bot_number = session_data.get_bot_number()
 
-        call = create_call(
-            twilio_client,
+        call = await create_call(
+            twilio_rest,
             to=user_number,
             from_=bot_number,
-            url=f"https://{call_url}/calls/handle_user_call",
-            status_callback=f"https://{call_url}/conference/call_events"
+            url=session_affinity.url(call_url, session_id, "/user_calls/handle_user_call"),
+            status_callback=session_affinity.url(call_url, session_id, f"/conference/call_events/{session_id}")
         )
         # For a user call, we can do:
         session_data.set_call_sid(CallType.USER, call.sid)
+        await call_store(call_manager.save_session, session_data, 'call_sids')
 
         logger.info(f"Initiated call to user with SID: {call.sid}")
         return call.sid
@@ -106,28 +145,50 @@ def handle_dial_user(call_url: str, session_id: str):
 
 
 async def handle_stt_transcript(transcript: str, session_id: str, stream_sid: Optional[str], websocket: Optional[WebSocket]):
-    """Pass transcript to GPT, parse the response, and act accordingly."""
+    """
+    Stream the transcript through GPT and act on the reply as it is parsed: noop and
+    phone-tree replies fire as soon as their fields close, and voice replies are
+    synthesized sentence by sentence while the rest of the reply is still generating.
+    """
     try:
-        gpt_reply = await invoke_gpt(transcript, session_id, call_manager)
-        match gpt_reply["response_method"]:
-            case ResponseMethod.NOOP.value:
-                logger.info("No operation needed, skipping TTS. Sleeping for 5 seconds")
-                await asyncio.sleep(5)
-            case ResponseMethod.CALL_BACK.value:
-                # TODO: make the callback work
-                # TODO: Have it give a summary of what happened
-                if False:
-                    handle_dial_user(websocket.url.hostname, session_id)
-            case ResponseMethod.PHONE_TREE.value:
-                twiml_response = await handle_phone_tree(gpt_reply)
-                await send_websocket_message(websocket, stream_sid, "mark", twiml_response)
-            case ResponseMethod.VOICE.value:
-                response = await handle_voice_response(gpt_reply, stream_sid, websocket)
-                await send_websocket_message(websocket, stream_sid, "media", response)
-            case _:
-                logger.error(f"Unknown response method: {gpt_reply['response_method']}")
+        response_method = None
+        speech_chunker = SpeechChunker()
+        async for event in stream_gpt(transcript, session_id, call_manager):
+            match event.type:
+                case ResponseEventType.METHOD:
+                    response_method = event.value
+                    if response_method == ResponseMethod.NOOP:
+                        logger.info("No operation needed, skipping TTS")
+                case ResponseEventType.CONTENT if response_method == ResponseMethod.VOICE:
+                    for sentence in speech_chunker.feed(event.value):
+                        await send_voice_chunk(sentence, stream_sid, websocket)
+                case ResponseEventType.CONTENT_END:
+                    if response_method == ResponseMethod.VOICE:
+                        remaining = speech_chunker.flush()
+                        if remaining:
+                            await send_voice_chunk(remaining, stream_sid, websocket)
+                    elif response_method == ResponseMethod.PHONE_TREE:
+                        twiml_response = await handle_phone_tree({'response_content': event.value})
+                        await send_websocket_message(websocket, stream_sid, "mark", twiml_response)
+                    elif response_method == ResponseMethod.CALL_BACK:
+                        # TODO: make the callback work
+                        # TODO: Have it give a summary of what happened
+                        if False:
+                            await handle_dial_user(websocket.url.hostname, session_id)
+                case ResponseEventType.DONE if not event.value:
+                    logger.error(f"Unusable GPT response for transcript: {transcript}")
+
+        if response_method == ResponseMethod.NOOP:
+            logger.info("Sleeping for 5 seconds after noop")
+            await asyncio.sleep(5)
     except Exception as e:
         logger.error(f"Error handling voice response: {e}")
+
+
+async def send_voice_chunk(text: str, stream_sid: Optional[str], websocket: Optional[WebSocket]):
+    response = await handle_voice_response({'response_content': text}, stream_sid, websocket)
+    if response:
+        await send_websocket_message(websocket, stream_sid, "media", response)
     
 
 async def close_websocket(websocket: WebSocket):
@@ -137,6 +198,11 @@ async def close_websocket(websocket: WebSocket):
 
 @media_router.websocket("/media-stream/{session_id}")
 async def handle_media_stream(twilio_websocket: WebSocket, session_id: str):
+    with logger.contextualize(session_id=session_id):
+        await _handle_media_stream(twilio_websocket, session_id)
+
+
+async def _handle_media_stream(twilio_websocket: WebSocket, session_id: str):
     """
     1. Wait for session to be 'ready for stream' or time out.
     2. Accept inbound media from Twilio, pass to Deepgram STT.
@@ -149,7 +215,7 @@ async def handle_media_stream(twilio_websocket: WebSocket, session_id: str):
     timeout = 30
     start_time = asyncio.get_event_loop().time()
 
-    session_data = call_manager.get_session_by_id(session_id)
+    session_data = await call_store(call_manager.get_session_by_id, session_id)
     if not session_data:
         logger.error(f"Session {session_id} not found")
         await close_websocket(twilio_websocket)
@@ -161,6 +227,11 @@ async def handle_media_stream(twilio_websocket: WebSocket, session_id: str):
             await close_websocket(twilio_websocket)
             return
         await asyncio.sleep(1)
+        # Another worker may have handled the call event that marks it ready
+        session_data = await call_store(call_manager.get_session_by_id, session_id)
+        if not session_data:
+            await close_websocket(twilio_websocket)
+            return
 
     # Pause briefly
     await asyncio.sleep(1)
@@ -168,9 +239,21 @@ async def handle_media_stream(twilio_websocket: WebSocket, session_id: str):
     logger.info("Session ready, proceeding with media stream handling")
 
     twilio_stream_sid = None
+    stream_call_sid = None
+    inbound_clock = InboundClock()
 
     async def on_transcript(transcript: str):
-        await handle_stt_transcript(transcript, session_id, twilio_stream_sid, twilio_websocket)
+        session_lifecycle.track_task(session_id, asyncio.current_task())
+        trace = current_turn.get()
+        if trace is not None:
+            trace.session_id = session_id
+            if trace.audio_end is not None:
+                received_at = inbound_clock.wall_time(trace.audio_end)
+                if received_at is not None:
+                    trace.mark(LAST_INBOUND_FRAME, received_at)
+        # STT callbacks don't run in the stream's context, so set the fields again
+        with logger.contextualize(session_id=session_id, call_sid=stream_call_sid, stream_sid=twilio_stream_sid):
+            await handle_stt_transcript(transcript, session_id, twilio_stream_sid, twilio_websocket)
 
     # Create Deepgram STT connection
     stt_dg_connection = await create_deepgram_stt_connection(on_transcript)
@@ -178,6 +261,12 @@ async def handle_media_stream(twilio_websocket: WebSocket, session_id: str):
         logger.error("Failed to open Deepgram STT. Closing Twilio WS.")
         await close_websocket(twilio_websocket)
         return
+    media_stats['streams'] += 1
+    media_stats['stt_connections'] += 1
+
+    # Let session teardown close the stream if the call ends elsewhere
+    close_stt = session_lifecycle.attach(session_id, lambda: close_deepgram_stt_connection(stt_dg_connection))
+    close_twilio = session_lifecycle.attach(session_id, lambda: close_websocket(twilio_websocket))
 
     try:
         while True:
@@ -187,15 +276,16 @@ async def handle_media_stream(twilio_websocket: WebSocket, session_id: str):
             event_type = data.get("event", "")
             if event_type == "start":
                 twilio_stream_sid = data["start"]["streamSid"]
+                stream_call_sid = data["start"].get("callSid")
+                session_data.touch()
                 logger.info(f"Twilio stream started: {twilio_stream_sid}")
-                # Store in SessionData if needed
-                # If you have `session_data.set_twilio_stream_sid(twilio_stream_sid)`:
-                if session_data.meta_call_sids:  # or ensure it's not None
-                    session_data.set_twilio_stream_sid(twilio_stream_sid)
+                session_data.set_twilio_stream_sid(twilio_stream_sid)
+                await call_store(call_manager.save_session, session_data, 'meta_call_sids', 'last_activity')
 
             elif event_type == "media":
                 audio_b64 = data["media"]["payload"]
                 audio_bytes = base64.b64decode(audio_b64)
+                inbound_clock.frame(len(audio_bytes))
                 stt_dg_connection.send(audio_bytes)
 
             elif event_type == "stop":
@@ -207,6 +297,14 @@ async def handle_media_stream(twilio_websocket: WebSocket, session_id: str):
     except Exception as e:
         logger.error(f"Error reading Twilio WS: {e}")
     finally:
+        session_lifecycle.detach(session_id, close_stt)
+        session_lifecycle.detach(session_id, close_twilio)
         await close_deepgram_stt_connection(stt_dg_connection)
         await close_websocket(twilio_websocket)
-        logger.info("Closed Twilio WS and Deepgram STT connection.")
\ No newline at end of file
+        media_stats['streams'] -= 1
+        media_stats['stt_connections'] -= 1
+        media_log_limiter.forget(twilio_stream_sid)
+        logger.info("Closed Twilio WS and Deepgram STT connection.")
+        if stream_call_sid:
+            # The streaming leg ends with its stream
+            await session_lifecycle.leg_finished(session_id, stream_call_sid)
\ No newline at end of file
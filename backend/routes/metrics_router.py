@@ -0,0 +1,141 @@
+import asyncio
+import os
+import resource
+import threading
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from backend.core.active_calls import active_calls
+from backend.core.call_manager import CallManager, call_manager
+from backend.core.event_pipeline import event_pipeline
+from backend.core.metrics import CONTENT_TYPE, MetricFamily, counter, gauge, metrics
+from backend.core.number_pool import bot_number_pool
+from backend.core.session_lifecycle import session_lifecycle
+from backend.core.webhook_dedupe import webhook_deduper
+from backend.routes.media_router import media_stats
+from backend.services.llm_backend import llm_backends
+from backend.services.llm_scheduler import llm_scheduler
+from backend.services.openai_utils import route_stats
+from backend.services.response_parser import response_parser_stats
+from backend.services.twilio_rest import twilio_rest
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics")
+async def scrape_metrics():
+    """Prometheus scrape endpoint: turn latency histograms plus gauges read from current state."""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+
+@metrics.collector
+def session_metrics():
+    snapshot = session_lifecycle.snapshot()
+    yield gauge('live_sessions', 'Sessions in memory', snapshot['live_sessions'])
+    yield gauge('live_chat_messages', 'Chat messages held by live sessions, as of the last sweep', snapshot['live_chat_messages'])
+    yield gauge('live_session_bytes', 'Approximate memory held by live sessions, as of the last sweep', snapshot['live_session_bytes'])
+    yield gauge('attached_resources', 'STT connections and websockets attached to sessions', snapshot['attached_resources'])
+    yield gauge('tracked_tasks', 'Transcript tasks running for sessions', snapshot['tracked_tasks'])
+    yield counter('evicted_sessions_total', 'Sessions torn down, by reason', snapshot['evicted_sessions'], label='reason')
+    yield gauge('media_streams', 'Open Twilio media streams', media_stats['streams'])
+    yield gauge('stt_connections', 'Open STT connections', media_stats['stt_connections'])
+
+
+@metrics.collector
+def call_metrics():
+    pool = bot_number_pool.snapshot()
+    yield gauge('bot_numbers', 'Bot numbers in the pool', pool['numbers'])
+    yield gauge('bot_number_capacity', 'Concurrent sessions the pool can hold', pool['capacity'])
+    yield gauge('bot_numbers_reserved', 'Sessions holding a bot number', pool['reserved'])
+    yield gauge('bot_numbers_awaiting_inbound', 'Bot legs dialed but not yet rung in', pool['awaiting_inbound'])
+    yield counter('bot_number_pool_exhausted_total', 'Reservations refused for lack of a number', pool['exhausted'])
+
+    calls = active_calls.snapshot()
+    yield gauge('active_calls', 'Calls the index believes are live', calls['active_calls'])
+    yield counter('active_call_reconciles_total', 'Reconciliations against Twilio', calls['reconciles'])
+    yield counter('active_call_drift_total', 'Calls found out of sync when reconciling', calls['drift'])
+    yield counter('orphaned_calls_ended_total', 'Live calls with no session that were hung up', calls['orphans_ended'])
+
+    yield counter('webhooks_received_total', 'Webhooks handled, by kind', webhook_deduper.received, label='kind')
+    yield counter('webhook_duplicates_total', 'Retried webhooks dropped, by kind', webhook_deduper.duplicates, label='kind')
+
+
+@metrics.collector
+def queue_metrics():
+    pipeline = event_pipeline.snapshot()
+    yield gauge('event_pipeline_pending', 'Status events waiting to be applied', pipeline['pending'])
+    yield counter('event_pipeline_processed_total', 'Status events applied', pipeline['processed'])
+    yield counter('event_pipeline_failed_total', 'Status events that failed to apply', pipeline['failed'])
+    yield counter('event_pipeline_rejected_total', 'Status events refused with the queue full', pipeline['rejected'])
+
+    depth = {priority.name.lower(): queued for priority, queued in llm_scheduler.queue_depth().items()}
+    yield gauge('llm_queue_depth', 'LLM requests waiting for a slot, by priority', depth, label='priority')
+    yield gauge('llm_in_flight', 'LLM requests running', llm_scheduler.in_flight)
+    queues = llm_scheduler.snapshot()
+    yield counter('llm_granted_total', 'LLM requests admitted, by priority',
+                  {priority: stats['granted'] for priority, stats in queues.items()}, label='priority')
+    yield counter('llm_queue_seconds_total', 'Time LLM requests spent queued, by priority',
+                  {priority: stats['queue_seconds_total'] for priority, stats in queues.items()}, label='priority')
+    yield gauge('llm_queue_seconds_p95', 'p95 queue time of recent LLM requests, by priority',
+                {priority: stats['queue_seconds_p95'] for priority, stats in queues.items()}, label='priority')
+    yield gauge('llm_queue_seconds_max', 'Longest queue time of any LLM request, by priority',
+                {priority: stats['queue_seconds_max'] for priority, stats in queues.items()}, label='priority')
+
+    rest = twilio_rest.metrics
+    yield gauge('twilio_requests_in_flight', 'Twilio REST requests running', rest.in_flight)
+    yield counter('twilio_requests_total', 'Twilio REST requests, by operation', rest.requests, label='operation')
+    yield counter('twilio_retries_total', 'Twilio REST requests retried', rest.retries)
+    yield counter('twilio_errors_total', 'Twilio REST requests that failed', rest.errors)
+
+    if isinstance(call_manager, CallManager) and call_manager.journal is not None:
+        journal = call_manager.journal.stats()
+        yield gauge('journal_pending_records', 'Session journal records not yet written', journal['pending'])
+        yield gauge('journal_segment_bytes', 'Size of the current journal segment', journal['segment_bytes'])
+        yield counter('journal_records_total', 'Session journal records written', journal['records'])
+
+
+@metrics.collector
+def llm_metrics():
+    yield counter('llm_hedges_fired_total', 'Hedged LLM requests fired after the first token was late', llm_backends.hedges_fired)
+    yield counter('llm_hedges_won_total', 'Hedged LLM requests that answered first', llm_backends.hedges_won)
+
+    routes = {route.value: stats for route, stats in route_stats.items()}
+    yield counter('llm_route_turns_total', 'Turns answered, by model route', {route: stats.turns for route, stats in routes.items()},
+                  label='route')
+    yield gauge('llm_route_seconds_p50', 'Median latency of recent turns, by model route',
+                {route: stats.percentile(0.5) for route, stats in routes.items()}, label='route')
+    yield gauge('llm_route_seconds_p95', 'p95 latency of recent turns, by model route',
+                {route: stats.percentile(0.95) for route, stats in routes.items()}, label='route')
+    yield MetricFamily('llm_route_outcomes_total', 'counter', 'Turn outcomes (response method, or unparsed), by model route', [
+        ('', {'route': route, 'outcome': outcome}, count)
+        for route, stats in routes.items() for outcome, count in sorted(stats.outcomes.items())
+    ])
+
+    parser = response_parser_stats
+    yield counter('llm_replies_parsed_total', 'LLM replies by how they were parsed: streamed, fallback or failed',
+                  {'streamed': parser.streamed, 'fallback': parser.fallback, 'failed': parser.failed}, label='path')
+    yield counter('llm_reply_fallback_seconds_total', 'Time spent re-parsing replies that did not stream cleanly',
+                  parser.fallback_seconds)
+
+
+def _resident_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Peak rather than current, but the best there is without /proc
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@metrics.collector
+def process_metrics():
+    yield counter('process_cpu_seconds_total', 'CPU time used by this worker', time.process_time())
+    yield gauge('process_resident_memory_bytes', 'Resident memory of this worker', _resident_bytes())
+    yield gauge('process_threads', 'Threads in this worker', threading.active_count())
+    try:
+        yield gauge('event_loop_tasks', 'Tasks on the event loop', len(asyncio.all_tasks()))
+    except RuntimeError:
+        pass  # Scraped off the loop
@@ -1,10 +1,15 @@
+import asyncio
+
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, JSONResponse
-from twilio.twiml.voice_response import VoiceResponse
 
 from backend.core.call_manager import call_manager
-from backend.services.twilio_utils import create_conference, end_call
-from backend.utils.utils import logger, twilio_client
+from backend.core.session_store import call_store
+from backend.core.session_affinity import session_affinity
+from backend.services.twilio_rest import twilio_rest
+from backend.services.twilio_utils import end_call
+from backend.services.twiml_templates import USER_JOINS_CONFERENCE
+from backend.utils.utils import logger
 
 
 user_call_router = APIRouter()
@@ -21,36 +26,29 @@ async def handle_user_call(request: Request):
     # Twilio sets the "CallSid" of the new inbound call in form_data
     user_call_sid = form_data.get('CallSid')
     # We might not know the session_id directly from user_call_sid. We can look it up:
-    session_data = call_manager.get_session_by_call_sid(user_call_sid)
+    session_data = await call_store(call_manager.get_session_by_call_sid, user_call_sid)
     if not session_data:
         logger.error(f"No session found for user call SID {user_call_sid}")
         return HTMLResponse("", media_type="application/xml")
 
-    response = VoiceResponse()
     user_info = session_data.get_user_info()
     if not user_info:
         logger.error(f"No user info found for session {session_data.session_id}")
         return HTMLResponse("", media_type="application/xml")
 
-    name = user_info.user_name
-    # TODO: Use deepgram to say this stuff here
-    response.say(f"Connecting you with {name} now. Thank you!")
-
     # kill all bot calls
-    outbots = session_data.call_sids.outbound_bots
-    inbots = session_data.call_sids.inbound_bots
-    for bot_sid in outbots.extend(inbots):
-        end_call(twilio_client, bot_sid)
+    bot_sids = [call_sid for call_type, call_sid in session_data.call_sids.items() if call_type.is_bot_call]
+    results = await asyncio.gather(*(end_call(twilio_rest, bot_sid) for bot_sid in bot_sids), return_exceptions=True)
+    for bot_sid, result in zip(bot_sids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error ending bot call {bot_sid}: {result}")
 
     # Join the user to the conference
-    conference_name = session_data.get_conference_name()
-    response.append(
-        create_conference(
-            conference_name=conference_name,
-            call_events_url=f"https://{host}/conference/conference_events/{session_data.session_id}",
-            start_conference_on_enter=False, # TODO: Check
-            end_conference_on_exit=True
-        )
+    # TODO: Use deepgram to say the greeting
+    response = USER_JOINS_CONFERENCE.render(
+        name=user_info.user_name,
+        conference_name=session_data.get_conference_name(),
+        events_url=session_affinity.url(host, session_data.session_id, f"/conference/conference_events/{session_data.session_id}")
     )
 
-    return HTMLResponse(content=str(response), media_type="application/xml")
\ No newline at end of file
+    return HTMLResponse(content=response, media_type="application/xml")
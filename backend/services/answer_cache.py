@@ -0,0 +1,225 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.core.constants import ResponseMethod
+from backend.models.session_data import SessionData
+from backend.utils.utils import logger
+
+
+# Unset keeps the cache in memory only
+ANSWER_CACHE_PATH = os.getenv('ANSWER_CACHE_PATH')
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 5000))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+# How many calls must produce the same template before it is served from cache
+ANSWER_CACHE_MIN_CONFIRMATIONS = int(os.getenv('ANSWER_CACHE_MIN_CONFIRMATIONS', 2))
+ANSWER_CACHE_SAVE_INTERVAL = float(os.getenv('ANSWER_CACHE_SAVE_INTERVAL', 5))
+
+FILLER_WORDS = {'okay', 'ok', 'alright', 'so', 'um', 'uh', 'great', 'thanks', 'thank', 'you', 'perfect', 'sure', 'please'}
+MIN_PLACEHOLDER_VALUE_LENGTH = 3
+_PLACEHOLDER = re.compile(r'\{([A-Za-z0-9_.]+)\}')
+
+
+def normalize_question(transcript: str) -> str:
+    """
+    Reduce an agent turn to the question being asked: keep the last sentence with a
+    question mark (greetings and names before it vary per agent), lowercase it and
+    drop punctuation and filler words.
+    """
+    sentences = [s for s in re.split(r'(?<=[.!?])\s+', transcript.strip()) if s]
+    questions = [s for s in sentences if s.endswith('?')]
+    text = (questions[-1] if questions else transcript).lower()
+    words = [word for word in re.findall(r"[a-z0-9']+", text) if word not in FILLER_WORDS]
+    return " ".join(words)
+
+
+def _user_fields(session_data: SessionData) -> Dict[str, str]:
+    """Flatten the session's user info into placeholder name -> value."""
+    user_info = session_data.get_user_info()
+    if not user_info:
+        return {}
+    fields = {key: value for key, value in user_info.model_dump().items() if isinstance(value, str)}
+    for key, value in (user_info.additional_info or {}).items():
+        fields[f'additional_info.{key}'] = str(value)
+    return {key: value for key, value in fields.items() if value and len(value) >= MIN_PLACEHOLDER_VALUE_LENGTH}
+
+
+@dataclass
+class CachedAnswer:
+    response_method: str
+    template: str
+    fields: List[str]
+    stored_at: float
+    confirmations: int = 1
+    hits: int = 0
+
+
+class AnswerCache:
+    """
+    Replies to recurring agent questions, shared across calls to the same company.
+
+    Entries are keyed by (cs_number, normalized question) and hold the structured reply
+    with the caller's details replaced by placeholders, plus the user-info fields the
+    template needs. A hit fills the placeholders from the current session. Bounded by
+    LRU eviction and a TTL. With a path, a writer thread saves it there when it has
+    changed, so it survives restarts without a turn ever waiting on the disk.
+    """
+
+    def __init__(self, path: Optional[str] = ANSWER_CACHE_PATH, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS, min_confirmations: int = ANSWER_CACHE_MIN_CONFIRMATIONS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_confirmations = min_confirmations
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._dirty = False
+        self._save_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    @staticmethod
+    def make_key(cs_number: str, question: str) -> str:
+        return f"{cs_number}|{question}"
+
+    def lookup(self, session_data: SessionData, transcript: str) -> Optional[Dict[str, str]]:
+        """Return the filled-in reply for this session, or None on a miss."""
+        cs_number = session_data.get_cs_number()
+        if not cs_number:
+            return None
+        key = self.make_key(cs_number, normalize_question(transcript))
+        fields = _user_fields(session_data)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.confirmations < self.min_confirmations:
+                self.misses += 1
+                return None
+            if time.time() - entry.stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._dirty = True
+                self.misses += 1
+                return None
+            if any(field not in fields for field in entry.fields):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self.hits += 1
+
+        content = _PLACEHOLDER.sub(lambda match: fields.get(match.group(1), match.group(0)), entry.template)
+        return {"response_method": entry.response_method, "response_content": content}
+
+    def store(self, session_data: SessionData, transcript: str, reply: Dict[str, Any]):
+        """Remember a model reply if it can be safely reused on other calls."""
+        cs_number = session_data.get_cs_number()
+        question = normalize_question(transcript)
+        if not cs_number or not question or not reply:
+            return
+        template = self._templatize(reply, _user_fields(session_data))
+        if template is None:
+            return
+        method, text, fields = template
+        key = self.make_key(cs_number, question)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.response_method == method and entry.template == text:
+                entry.confirmations += 1
+                entry.stored_at = time.time()
+            else:
+                entry = CachedAnswer(method, text, fields, time.time())
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    @staticmethod
+    def _templatize(reply: Dict[str, Any], fields: Dict[str, str]) -> Optional[Tuple[str, str, List[str]]]:
+        """
+        Swap the caller's details for placeholders. Only noop replies and voice replies
+        built from user info are reusable; anything else may depend on this call.
+        """
+        method = reply.get('response_method')
+        content = reply.get('response_content') or ''
+        if method == ResponseMethod.NOOP.value:
+            return method, '', []
+        if method != ResponseMethod.VOICE.value:
+            return None
+
+        used = []
+        # Longest values first so e.g. an email isn't broken up by a name inside it
+        for name, value in sorted(fields.items(), key=lambda item: -len(item[1])):
+            if value in content:
+                content = content.replace(value, '{' + name + '}')
+                used.append(name)
+        if not used or any(char.isdigit() for char in _PLACEHOLDER.sub('', content)):
+            # Nothing personalized, or numbers that didn't come from user info
+            return None
+        return method, content, sorted(used)
+
+    # --- Persistence ---
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            now = time.time()
+            with self._lock:
+                for key, value in data.items():
+                    entry = CachedAnswer(**value)
+                    if now - entry.stored_at <= self.ttl_seconds:
+                        self._entries[key] = entry
+        except Exception as e:
+            logger.error(f"Error loading answer cache from {self.path}: {e}")
+
+    def save(self):
+        """Write the cache to its path if it changed since the last save."""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {key: asdict(entry) for key, entry in self._entries.items()}
+                self._dirty = False
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                with self._lock:
+                    self._dirty = True
+                logger.error(f"Error saving answer cache to {self.path}: {e}")
+
+    def _save_forever(self):
+        while not self._stop.wait(ANSWER_CACHE_SAVE_INTERVAL):
+            self.save()
+
+    def start(self):
+        if self.path and self._writer is None:
+            self._stop.clear()
+            self._writer = threading.Thread(target=self._save_forever, name='answer-cache-writer', daemon=True)
+            self._writer.start()
+
+    def close(self):
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        self.save()
+
+
+# Singleton
+answer_cache = AnswerCache()
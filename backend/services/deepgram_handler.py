@@ -1,13 +1,17 @@
 import os
 import asyncio
-from deepgram import DeepgramClient
-from deepgram import LiveTranscriptionEvents, LiveOptions, SpeakOptions
-from pydub import AudioSegment
 import io
+import time
 
+from backend.core.turn_trace import run_turn
 from backend.utils.utils import logger
 
+# The deepgram SDK and pydub are imported on first use (or by the app's warmup), not
+# with this module: together they are a large part of the app's import time.
+
 def get_deepgram_client():
+    from deepgram import DeepgramClient
+
     api_key = os.getenv("DEEPGRAM_API_KEY")
     if not api_key:
         logger.error("Missing DEEPGRAM_API_KEY.")
@@ -15,6 +19,8 @@ def get_deepgram_client():
     return DeepgramClient(api_key=api_key)
 
 async def create_deepgram_stt_connection(on_transcript):
+    from deepgram import LiveOptions, LiveTranscriptionEvents
+
     dg_client = get_deepgram_client()
     if not dg_client:
         # If client is None, return early
@@ -28,7 +34,9 @@ async def create_deepgram_stt_connection(on_transcript):
             return
         transcript = result.channel.alternatives[0].transcript
         if transcript:
-            asyncio.run_coroutine_threadsafe(on_transcript(transcript), loop)
+            final_at = time.perf_counter()
+            audio_end = result.start + result.duration
+            asyncio.run_coroutine_threadsafe(run_turn(on_transcript, transcript, final_at, audio_end=audio_end), loop)
 
     dg_connection.on(LiveTranscriptionEvents.Transcript, on_transcript_event)
 
@@ -54,6 +62,8 @@ async def synthesize_speech(text: str) -> bytes:
     """
     Use Deepgram TTS to synthesize text in memory.
     """
+    from deepgram import SpeakOptions
+
     tts_deepgram = get_deepgram_client()
     if tts_deepgram is None:
         logger.error("No Deepgram TTS client available.")
@@ -72,6 +82,8 @@ async def synthesize_speech(text: str) -> bytes:
         return b""
 
 def convert_mp3_to_mulaw(mp3_bytes: bytes) -> bytes:
+    from pydub import AudioSegment
+
     try:
         mp3_data = AudioSegment.from_file(io.BytesIO(mp3_bytes), format="mp3")
         mu_law_data = mp3_data.set_frame_rate(8000).set_channels(1).set_sample_width(1).export(
@@ -82,3 +94,32 @@ def convert_mp3_to_mulaw(mp3_bytes: bytes) -> bytes:
     except Exception as e:
         logger.error(f"Error converting MP3 to mu-law: {e}")
         return b""
+
+
+class SpeechChunker:
+    """
+    Buffers streamed reply text and releases it a sentence at a time, so TTS can
+    start on the first sentence while the rest of the reply is still generating.
+    """
+
+    SENTENCE_ENDINGS = '.!?'
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        self._buffer += text
+        chunks = []
+        start = 0
+        for i, char in enumerate(self._buffer):
+            if char in self.SENTENCE_ENDINGS and i + 1 < len(self._buffer) and self._buffer[i + 1].isspace():
+                if i + 1 - start >= self.min_chars:
+                    chunks.append(self._buffer[start:i + 1].strip())
+                    start = i + 1
+        self._buffer = self._buffer[start:]
+        return chunks
+
+    def flush(self) -> str:
+        remaining, self._buffer = self._buffer.strip(), ""
+        return remaining
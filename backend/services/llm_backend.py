@@ -0,0 +1,301 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from backend.core.constants import LLMPriority
+from backend.services.llm_scheduler import LLMGrant, LLMScheduler, estimate_tokens, llm_scheduler
+from backend.utils.utils import logger
+
+
+DEFAULT_PROVIDER = os.getenv('LLM_PROVIDER', 'openai')
+DEFAULT_DEADLINE = float(os.getenv('LLM_DEADLINE_SECONDS', 10))
+# Used until a model has enough samples for a real p95
+DEFAULT_HEDGE_DELAY = float(os.getenv('LLM_HEDGE_DELAY_SECONDS', 1.5))
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """Raised when a completion does not finish before its deadline."""
+
+
+@dataclass
+class LLMRequest:
+    """A single chat completion request, independent of the provider."""
+    messages: List[Dict[str, str]]
+    model: str
+    provider: str = DEFAULT_PROVIDER
+    temperature: float = 0.7
+    max_tokens: int = 150
+    response_format: Optional[Dict[str, Any]] = None
+    # Seconds allowed for the whole completion, None for no deadline
+    deadline: Optional[float] = DEFAULT_DEADLINE
+    priority: LLMPriority = LLMPriority.LIVE_TURN
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+    @property
+    def estimated_tokens(self) -> int:
+        return estimate_tokens(self.messages, self.max_tokens)
+
+
+def parse_model_spec(spec: str, default_provider: str = DEFAULT_PROVIDER) -> Tuple[str, str]:
+    """Split a "provider:model" spec. A bare model name uses the default provider."""
+    provider, sep, model = spec.partition(':')
+    if not sep:
+        return default_provider, spec
+    return provider, model
+
+
+class LLMBackend(ABC):
+    """A provider that can stream chat completions."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @abstractmethod
+    def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        """Yield content deltas for the request as they arrive."""
+
+    async def complete(self, request: LLMRequest) -> str:
+        return "".join([chunk async for chunk in self.stream(request)])
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    Any OpenAI-compatible chat completions endpoint. The client is built on first use
+    so that registering a backend never needs credentials or network.
+    """
+
+    def __init__(self, name: str, client_factory: Callable[[], Any]):
+        super().__init__(name)
+        self._client_factory = client_factory
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        kwargs = dict(
+            model=request.model,
+            messages=request.messages,
+            temperature=request.temperature,
+            max_tokens=request.max_tokens,
+            stream=True,
+        )
+        if request.response_format:
+            kwargs['response_format'] = request.response_format
+
+        response = await self.client.chat.completions.create(**kwargs)
+        async for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if getattr(delta, 'refusal', None):
+                logger.info(f"{self.name} refused request: {delta.refusal}")
+                return
+            if delta.content:
+                yield delta.content
+
+
+class LatencyTracker:
+    """Rolling window of first-token latencies per provider:model."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float):
+        if key not in self._samples:
+            self._samples[key] = deque(maxlen=self._window)
+        self._samples[key].append(seconds)
+
+    def percentile(self, key: str, pct: float) -> Optional[float]:
+        samples = self._samples.get(key)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(pct * len(ordered)))
+        return ordered[index]
+
+
+@dataclass
+class _Lease:
+    """Scheduler grant held by one in-flight request, if any."""
+    grant: Optional[LLMGrant] = None
+    chars: int = 0
+
+
+def _remaining(deadline_at: Optional[float], loop: asyncio.AbstractEventLoop) -> Optional[float]:
+    if deadline_at is None:
+        return None
+    return max(0.0, deadline_at - loop.time())
+
+
+class LLMBackendRegistry:
+    """
+    Routes requests to registered backends, enforces per-request deadlines and hedges
+    slow requests: if no first token has arrived by the p95 first-token latency for the
+    model, a second request is fired and whichever answers first wins.
+
+    With a scheduler, every request (hedges included) is admitted through it first.
+    Time spent queued counts against the deadline but not towards the hedge delay.
+    """
+
+    def __init__(self, hedging: bool = True, scheduler: Optional[LLMScheduler] = None):
+        self._backends: Dict[str, LLMBackend] = {}
+        self.hedging = hedging
+        self.scheduler = scheduler
+        self.latency = LatencyTracker()
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self._discarding: Set[asyncio.Task] = set()
+
+    def register(self, backend: LLMBackend):
+        self._backends[backend.name] = backend
+
+    def get(self, provider: str) -> LLMBackend:
+        if provider not in self._backends:
+            raise KeyError(f"No LLM backend registered for provider '{provider}'")
+        return self._backends[provider]
+
+    def hedge_delay(self, key: str) -> float:
+        p95 = self.latency.percentile(key, HEDGE_PERCENTILE)
+        return p95 if p95 is not None else DEFAULT_HEDGE_DELAY
+
+    async def complete(self, request: LLMRequest, hedge_request: Optional[LLMRequest] = None) -> str:
+        return "".join([chunk async for chunk in self.stream(request, hedge_request)])
+
+    async def stream(self, request: LLMRequest, hedge_request: Optional[LLMRequest] = None) -> AsyncIterator[str]:
+        """
+        Stream a completion. `hedge_request` lets the hedge go to another provider or model;
+        by default the same request is duplicated.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline_at = start + request.deadline if request.deadline else None
+        if hedge_request is None and self.hedging:
+            hedge_request = request
+
+        lease = _Lease()
+        if self.scheduler is not None:
+            try:
+                lease.grant = await asyncio.wait_for(
+                    self.scheduler.acquire(request.priority, request.estimated_tokens), _remaining(deadline_at, loop)
+                )
+            except asyncio.TimeoutError:
+                raise LLMDeadlineExceeded(f"{request.key} was still queued at its deadline of {request.deadline}s")
+
+        generator, first_chunk, lease = await self._first_chunk(request, hedge_request, deadline_at, lease)
+        if generator is None:
+            return
+        try:
+            lease.chars += len(first_chunk)
+            yield first_chunk
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(generator.__anext__(), _remaining(deadline_at, loop))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise LLMDeadlineExceeded(f"{request.key} exceeded deadline of {request.deadline}s")
+                lease.chars += len(chunk)
+                yield chunk
+        finally:
+            await generator.aclose()
+            self._release(lease, request)
+
+    async def _first_chunk(self, request: LLMRequest, hedge_request: Optional[LLMRequest],
+                           deadline_at: Optional[float], lease: _Lease):
+        """Race the primary (and, after the hedge delay, the hedge) for the first chunk."""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        primary = self.get(request.provider).stream(request)
+        candidates = {asyncio.ensure_future(self._first(request, primary, lease)): (primary, request, lease)}
+        pending = set(candidates)
+        hedge_delay = self.hedge_delay(request.key)
+        hedged = hedge_request is None
+        error: Optional[BaseException] = None
+        winner = None
+
+        try:
+            while pending:
+                timeout = _remaining(deadline_at, loop)
+                if not hedged:
+                    wait_left = max(0.0, start + hedge_delay - loop.time())
+                    timeout = wait_left if timeout is None else min(timeout, wait_left)
+
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    if not isinstance(task.exception(), StopAsyncIteration):
+                        error = task.exception()
+                if winner:
+                    break
+
+                remaining = _remaining(deadline_at, loop)
+                if remaining is not None and remaining <= 0:
+                    raise LLMDeadlineExceeded(f"{request.key} produced no tokens before deadline of {request.deadline}s")
+                if not hedged:
+                    hedged = True
+                    self.hedges_fired += 1
+                    logger.info(f"Hedging {request.key} -> {hedge_request.key} after {loop.time() - start:.2f}s")
+                    hedge = self.get(hedge_request.provider).stream(hedge_request)
+                    hedge_lease = _Lease()
+                    task = asyncio.ensure_future(self._first(hedge_request, hedge, hedge_lease))
+                    candidates[task] = (hedge, hedge_request, hedge_lease)
+                    pending.add(task)
+        finally:
+            for task, (generator, _, candidate_lease) in candidates.items():
+                if task is not winner:
+                    self._discard(task, generator, candidate_lease, request)
+
+        if winner is None:
+            if error is not None:
+                raise error
+            # Every candidate finished without producing a chunk
+            return None, None, lease
+
+        generator, winning_request, winning_lease = candidates[winner]
+        if winning_request is not request:
+            self.hedges_won += 1
+        self.latency.record(winning_request.key, loop.time() - start)
+        return generator, winner.result(), winning_lease
+
+    async def _first(self, request: LLMRequest, generator: AsyncIterator[str], lease: _Lease) -> str:
+        if self.scheduler is not None and lease.grant is None:
+            lease.grant = await self.scheduler.acquire(request.priority, request.estimated_tokens)
+        return await generator.__anext__()
+
+    def _release(self, lease: _Lease, request: LLMRequest):
+        if lease.grant is not None:
+            used = estimate_tokens(request.messages, 0) + lease.chars // 4
+            self.scheduler.release(lease.grant, used)
+            lease.grant = None
+
+    def _discard(self, task: asyncio.Future, generator: AsyncIterator[str], lease: _Lease, request: LLMRequest):
+        """Cancel a losing request in the background so the winner isn't held up."""
+        async def discard():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await generator.aclose()
+            self._release(lease, request)
+
+        cleanup = asyncio.ensure_future(discard())
+        self._discarding.add(cleanup)
+        cleanup.add_done_callback(self._discarding.discard)
+
+
+# Singleton
+llm_backends = LLMBackendRegistry(scheduler=llm_scheduler)
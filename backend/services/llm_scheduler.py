@@ -0,0 +1,236 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+from backend.core.constants import LLMPriority
+from backend.utils.utils import logger
+
+
+REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', 500))
+TOKENS_PER_MINUTE = float(os.getenv('LLM_TOKENS_PER_MINUTE', 200000))
+MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 64))
+# Share of every limit that only live turns may use
+LIVE_RESERVE = float(os.getenv('LLM_LIVE_RESERVE', 0.2))
+QUEUE_TIME_WINDOW = 500
+
+
+class TokenBucket:
+    """Continuously refilling bucket sized to one minute of budget."""
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.level
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def refund(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def seconds_until(self, amount: float) -> float:
+        missing = amount - self.available()
+        return max(0.0, missing / self.rate) if self.rate else float('inf')
+
+
+@dataclass
+class LLMGrant:
+    """Permission to run one request. Hand it back with `LLMScheduler.release`."""
+    priority: LLMPriority
+    tokens: int
+    queued_seconds: float
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    enqueued: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+@dataclass
+class QueueStats:
+    granted: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    recent: Deque[float] = field(default_factory=lambda: deque(maxlen=QUEUE_TIME_WINDOW))
+
+    def record(self, seconds: float):
+        self.granted += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.recent.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM requests.
+
+    Requests are admitted in priority order (live turn > speculative > background)
+    against requests-per-minute and tokens-per-minute buckets and a concurrency cap.
+    A share of every limit is reserved for live turns, and nothing is admitted ahead
+    of a waiting higher-priority request, so housekeeping never delays a live turn.
+    """
+
+    def __init__(self, requests_per_minute: float = REQUESTS_PER_MINUTE, tokens_per_minute: float = TOKENS_PER_MINUTE,
+                 max_concurrency: int = MAX_CONCURRENCY, live_reserve: float = LIVE_RESERVE,
+                 clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._requests = TokenBucket(requests_per_minute, clock)
+        self._tokens = TokenBucket(tokens_per_minute, clock)
+        self.max_concurrency = max_concurrency
+        self.live_reserve = live_reserve
+        self.in_flight = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.queue_stats: Dict[LLMPriority, QueueStats] = {priority: QueueStats() for priority in LLMPriority}
+
+    @asynccontextmanager
+    async def slot(self, priority: LLMPriority, tokens: int):
+        grant = await self.acquire(priority, tokens)
+        try:
+            yield grant
+        finally:
+            self.release(grant)
+
+    async def acquire(self, priority: LLMPriority, tokens: int) -> LLMGrant:
+        # Capped at what the priority may ever hold, or an oversized estimate would wait
+        # forever at the head of its level and block everything queued behind it
+        tokens = int(min(tokens, self._tokens.capacity * (1 - self._headroom(priority))))
+        enqueued = self._clock()
+        if not self._has_waiters_at_or_above(priority) and self._can_start(priority, tokens):
+            return self._start(priority, tokens, enqueued)
+
+        waiter = _Waiter(priority.value, next(self._seq), tokens, enqueued, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, waiter)
+        self._dispatch()
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we were cancelled
+                self.release(waiter.future.result())
+            else:
+                waiter.future.cancel()
+                self._dispatch()
+            raise
+
+    def release(self, grant: LLMGrant, tokens_used: Optional[int] = None):
+        """Free the concurrency slot, refunding any over-estimate of the tokens used."""
+        self.in_flight -= 1
+        if tokens_used is not None and tokens_used < grant.tokens:
+            self._tokens.refund(grant.tokens - tokens_used)
+        self._dispatch()
+
+    def queue_depth(self) -> Dict[LLMPriority, int]:
+        depth = {priority: 0 for priority in LLMPriority}
+        for waiter in self._waiters:
+            if not waiter.future.done():
+                depth[LLMPriority(waiter.priority)] += 1
+        return depth
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        depth = self.queue_depth()
+        return {
+            priority.name.lower(): {
+                'queued': depth[priority],
+                'granted': stats.granted,
+                'queue_seconds_total': stats.total_seconds,
+                'queue_seconds_max': stats.max_seconds,
+                'queue_seconds_p95': stats.percentile(0.95),
+            }
+            for priority, stats in self.queue_stats.items()
+        }
+
+    # --- Internals ---
+    def _has_waiters_at_or_above(self, priority: LLMPriority) -> bool:
+        return any(w.priority <= priority.value and not w.future.done() for w in self._waiters)
+
+    def _headroom(self, priority: LLMPriority) -> float:
+        return 0.0 if priority == LLMPriority.LIVE_TURN else self.live_reserve
+
+    def _can_start(self, priority: LLMPriority, tokens: int) -> bool:
+        headroom = self._headroom(priority)
+        concurrency_limit = self.max_concurrency - int(self.max_concurrency * headroom)
+        return (
+            self.in_flight < max(1, concurrency_limit)
+            and self._requests.available() >= 1 + headroom * self._requests.capacity
+            and self._tokens.available() >= tokens + headroom * self._tokens.capacity
+        )
+
+    def _start(self, priority: LLMPriority, tokens: int, enqueued: float) -> LLMGrant:
+        self.in_flight += 1
+        self._requests.take(1)
+        self._tokens.take(tokens)
+        queued = self._clock() - enqueued
+        self.queue_stats[priority].record(queued)
+        return LLMGrant(priority, tokens, queued)
+
+    def _dispatch(self):
+        while self._waiters:
+            head = self._waiters[0]
+            if head.future.done():
+                heapq.heappop(self._waiters)
+                continue
+            priority = LLMPriority(head.priority)
+            if not self._can_start(priority, head.tokens):
+                self._schedule_retry(priority, head.tokens)
+                return
+            heapq.heappop(self._waiters)
+            head.future.set_result(self._start(priority, head.tokens, head.enqueued))
+
+    def _schedule_retry(self, priority: LLMPriority, tokens: int):
+        """Wake up once the buckets have refilled enough for the head of the queue."""
+        if self.in_flight >= self.max_concurrency or self._timer is not None:
+            return  # A release will dispatch again
+        headroom = self._headroom(priority)
+        wait = max(
+            self._requests.seconds_until(1 + headroom * self._requests.capacity),
+            self._tokens.seconds_until(tokens + headroom * self._tokens.capacity),
+        )
+        if wait == 0:
+            return  # Blocked on concurrency only
+        logger.debug(f"LLM queue rate limited, retrying in {wait:.2f}s")
+
+        def retry():
+            self._timer = None
+            self._dispatch()
+
+        self._timer = asyncio.get_running_loop().call_later(wait, retry)
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Rough prompt size (4 characters per token) plus the completion budget."""
+    return sum(len(message.get('content') or '') for message in messages) // 4 + max_tokens
+
+
+# Singleton
+llm_scheduler = LLMScheduler()
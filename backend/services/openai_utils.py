@@ -1,74 +1,281 @@
-from openai import OpenAI
 import os
 from backend.utils.utils import logger
-from typing import List, Dict
-from backend.core.constants import CallInfo
+from typing import AsyncIterator, Deque, List, Dict, Optional, Tuple
+from backend.core.constants import CallInfo, ModelRoute, ResponseMethod
+from backend.core.session_store import call_store
+from backend.core.turn_trace import LLM_COMPLETE, LLM_FIRST_TOKEN, mark
+from backend.services.answer_cache import answer_cache
+from backend.services.llm_backend import LLMRequest, OpenAIBackend, llm_backends, parse_model_spec
 from backend.services.prompts import generate_system_prompt
+from backend.services.response_parser import ResponseEvent, ResponseEventType, StreamingResponseParser
 from backend.models.models import OpenAIResponseFormat
 import json
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
 
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# "provider:model" specs, e.g. "openai:gpt-4o-mini" or "stub:gpt-4o-mini"
+DEFAULT_MODEL = os.getenv('LLM_MODEL', 'gpt-4o-mini')
+# Optional different target for hedged requests; defaults to duplicating the primary
+HEDGE_MODEL = os.getenv('LLM_HEDGE_MODEL')
+LLM_STUB_URL = os.getenv('LLM_STUB_URL', 'http://127.0.0.1:8090/v1')
 
-def get_openai_response(system_prompt: str, user_message: str, chat_history: List[Dict[str, str]] = None) -> str:
-    """Get response from OpenAI API."""
+RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema':
+        {
+            "name":"TwilioResponse",
+            "schema": OpenAIResponseFormat.model_json_schema()
+        }
+}
+
+
+@dataclass
+class RouteConfig:
+    model: str
+    max_tokens: int
+
+
+# Trivial turns go to a small, fast model; hard ones to a stronger model with more room
+ROUTES = {
+    ModelRoute.FAST: RouteConfig(
+        model=os.getenv('LLM_FAST_MODEL', DEFAULT_MODEL),
+        # Same budget as before routing: less can cut the JSON reply short
+        max_tokens=int(os.getenv('LLM_FAST_MAX_TOKENS', 150)),
+    ),
+    ModelRoute.STRONG: RouteConfig(
+        model=os.getenv('LLM_STRONG_MODEL', 'gpt-4o'),
+        max_tokens=int(os.getenv('LLM_STRONG_MAX_TOKENS', 250)),
+    ),
+}
+HARD_INTENT_PATTERN = re.compile(
+    r"\b(disput\w*|refund\w*|chargeback|charged twice|double charge\w*|cancel\w*|escalat\w*|supervisor|manager"
+    r"|complain\w*|fraud\w*|unauthori[sz]ed|negotiat\w*|against (?:our|the) policy|make an exception)\b",
+    re.IGNORECASE,
+)
+HOLD_PATTERN = re.compile(r"\b(hold|wait|one moment|bear with me|transferring)\b", re.IGNORECASE)
+LONG_TURN_WORDS = 30
+# A deep history lowers the length at which a turn counts as hard, by up to this share
+# of LONG_TURN_WORDS, reached at DEEP_HISTORY_MESSAGES. Short turns stay fast however long the call.
+DEEP_HISTORY_MESSAGES = 16
+HISTORY_WEIGHT = 0.5
+
+
+@dataclass
+class RouteStats:
+    """Latency and outcome (response method, or unparsed) of the turns sent down a route."""
+    turns: int = 0
+    latency_seconds: Deque[float] = field(default_factory=lambda: deque(maxlen=500))
+    outcomes: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, seconds: float, outcome: str):
+        self.turns += 1
+        self.latency_seconds.append(seconds)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def percentile(self, pct: float) -> float:
+        if not self.latency_seconds:
+            return 0.0
+        ordered = sorted(self.latency_seconds)
+        return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+route_stats: Dict[ModelRoute, RouteStats] = {route: RouteStats() for route in ModelRoute}
+
+
+def classify_turn(transcript: str, chat_history: List[Dict[str, str]]) -> Tuple[ModelRoute, str]:
+    """
+    Cheaply decide which model a turn needs. Returns the route and the reason for it.
+    """
+    last_reply = next((m['content'] for m in reversed(chat_history[:-1]) if m['role'] == 'assistant'), '')
+    on_hold = f'"{ResponseMethod.NOOP.value}"' in last_reply
+
+    if HARD_INTENT_PATTERN.search(transcript):
+        return ModelRoute.STRONG, 'intent'
+    if HOLD_PATTERN.search(transcript) or on_hold:
+        return ModelRoute.FAST, 'hold'
+    words = len(transcript.split())
+    if words >= LONG_TURN_WORDS:
+        return ModelRoute.STRONG, 'length'
+    depth = min(1.0, len(chat_history) / DEEP_HISTORY_MESSAGES)
+    if words >= LONG_TURN_WORDS * (1 - HISTORY_WEIGHT * depth):
+        return ModelRoute.STRONG, 'history'
+    return ModelRoute.FAST, 'simple'
+
+
+def record_route_outcome(route: ModelRoute, started: float, reply: Dict[str, any]):
+    outcome = reply.get('response_method', 'unparsed') if reply else 'unparsed'
+    route_stats[route].record(time.perf_counter() - started, outcome)
+
+
+def _openai_client(**kwargs):
+    # The openai package takes longer to import than the rest of the app together
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(**kwargs)
+
+
+llm_backends.register(OpenAIBackend('openai', lambda: _openai_client(api_key=os.getenv('OPENAI_API_KEY'))))
+llm_backends.register(OpenAIBackend('stub', lambda: _openai_client(base_url=LLM_STUB_URL, api_key='stub')))
+
+
+def build_llm_request(system_prompt: str, user_message: str, chat_history: List[Dict[str, str]] = None,
+                      model: Optional[str] = None, max_tokens: int = 150) -> LLMRequest:
+    messages = [{"role": "system", "content": system_prompt}]
+
+    # Add chat history if provided
+    if chat_history:
+        messages.extend(chat_history)
+    else:
+        messages.append({"role": "user", "content": user_message})
+
+    provider, model_name = parse_model_spec(model or DEFAULT_MODEL)
+    return LLMRequest(
+        messages=messages,
+        model=model_name,
+        provider=provider,
+        temperature=0.7,
+        max_tokens=max_tokens,
+        response_format=RESPONSE_FORMAT,
+    )
+
+
+def _hedge_request(request: LLMRequest) -> Optional[LLMRequest]:
+    if not HEDGE_MODEL:
+        return None
+    provider, model_name = parse_model_spec(HEDGE_MODEL)
+    return LLMRequest(**{**request.__dict__, 'provider': provider, 'model': model_name})
+
+
+async def get_openai_response(system_prompt: str, user_message: str, chat_history: List[Dict[str, str]] = None,
+                              model: Optional[str] = None, max_tokens: int = 150) -> str:
+    """Get response from the configured LLM backend."""
     try:
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add chat history if provided
-        if chat_history:
-            messages.extend(chat_history)
-        else:
-            messages.append({"role": "user", "content": user_message})
-
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=150,
-            response_format={
-                'type': 'json_schema',
-                'json_schema': 
-                    {
-                        "name":"TwilioResponse", 
-                        "schema": OpenAIResponseFormat.model_json_schema()
-                    }
-            } 
-        )
-
-        assistant_reply = response.choices[0].message
-        if assistant_reply.refusal:
-            # handle refusal
-            print(assistant_reply.refusal)
-            return "" 
-        return assistant_reply.content.strip()
+        request = build_llm_request(system_prompt, user_message, chat_history, model, max_tokens)
+        assistant_reply = await llm_backends.complete(request, _hedge_request(request))
+        return assistant_reply.strip()
 
     except Exception as e:
         logger.error(f"OpenAI error: {e}")
         return "I encountered an error. Please hold."
 
-async def invoke_gpt(transcript, session_id, call_manager) -> Dict[str, any]:
-    """Handle transcript from either websocket or test"""
+async def _start_turn(transcript, session_id, call_manager):
+    """Record the transcript and build the prompt for this turn."""
     logger.info(f"[STT Transcript] {transcript}")
 
     # Get user info and generate prompt
-    session_data = call_manager.get_session_by_id(session_id)
+    session_data = await call_store(call_manager.get_session_by_id, session_id)
     user_info = session_data.get_user_info().model_dump()
     system_prompt = generate_system_prompt(user_info)
-    # Add user message to history
+    # Add user message to history. It is saved with the reply, so a turn that fails
+    # can take it back out without the stores ever having seen it.
     session_data.add_to_chat_history("user", transcript)
-    
+    await call_store(call_manager.save_session, session_data, 'last_activity')
+
     # Get chat history
-    chat_history = session_data.get_chat_history()
-    
+    chat_history = [message.model_dump() for message in session_data.get_chat_history()]
+
+    route, reason = classify_turn(transcript, chat_history)
+    logger.info(f"[Route] {route.value} ({reason})")
+    return session_data, system_prompt, chat_history, route
+
+
+async def _cached_reply(session_data, transcript, started, call_manager) -> Optional[Dict[str, str]]:
+    """Answer a recurring question from the cross-call cache, skipping the model."""
+    cached_reply = answer_cache.lookup(session_data, transcript)
+    if cached_reply:
+        logger.info(f"[Cached Response] {cached_reply}")
+        session_data.add_to_chat_history("assistant", json.dumps(cached_reply))
+        await call_store(call_manager.save_session, session_data, 'chat_history', 'last_activity')
+        record_route_outcome(ModelRoute.CACHED, started, cached_reply)
+    return cached_reply
+
+
+async def invoke_gpt(transcript, session_id, call_manager) -> Dict[str, any]:
+    """Handle transcript from either websocket or test"""
+    # One turn at a time per session so each reply follows its own user message
+    async with call_manager.session_lock(session_id):
+        return await _invoke_turn(transcript, session_id, call_manager)
+
+
+async def _invoke_turn(transcript, session_id, call_manager) -> Dict[str, any]:
+    session_data, system_prompt, chat_history, route = await _start_turn(transcript, session_id, call_manager)
+    started = time.perf_counter()
+
+    cached_reply = await _cached_reply(session_data, transcript, started, call_manager)
+    if cached_reply:
+        return cached_reply
+
     # Get GPT response
-    gpt_reply = get_openai_response(system_prompt, transcript, chat_history)
+    config = ROUTES[route]
+    gpt_reply = await get_openai_response(system_prompt, transcript, chat_history, config.model, config.max_tokens)
     try:
         session_data.add_to_chat_history("assistant", gpt_reply)
+        await call_store(call_manager.save_session, session_data, 'chat_history', 'last_activity')
 
         gpt_reply_json = json.loads(gpt_reply)
         logger.info(f"[GPT Response] {gpt_reply_json}")
     except Exception as e:
         logger.error(f"Error parsing GPT response: {e}")
+        record_route_outcome(route, started, {})
         return {}
 
-    return gpt_reply_json
\ No newline at end of file
+    record_route_outcome(route, started, gpt_reply_json)
+    answer_cache.store(session_data, transcript, gpt_reply_json)
+    return gpt_reply_json
+
+
+async def stream_gpt(transcript, session_id, call_manager) -> AsyncIterator[ResponseEvent]:
+    """
+    Streaming counterpart of invoke_gpt. Yields parser events as the completion arrives:
+    the response method as soon as it is known, then response_content deltas, then DONE.
+    """
+    async with call_manager.session_lock(session_id):
+        async for event in _stream_turn(transcript, session_id, call_manager):
+            yield event
+
+
+async def _stream_turn(transcript, session_id, call_manager) -> AsyncIterator[ResponseEvent]:
+    session_data, system_prompt, chat_history, route = await _start_turn(transcript, session_id, call_manager)
+    started = time.perf_counter()
+
+    cached_reply = await _cached_reply(session_data, transcript, started, call_manager)
+    if cached_reply:
+        content = cached_reply['response_content']
+        mark(LLM_FIRST_TOKEN)
+        mark(LLM_COMPLETE)
+        yield ResponseEvent(ResponseEventType.METHOD, ResponseMethod(cached_reply['response_method']))
+        if content:
+            yield ResponseEvent(ResponseEventType.CONTENT, content)
+        yield ResponseEvent(ResponseEventType.CONTENT_END, content)
+        yield ResponseEvent(ResponseEventType.DONE, cached_reply)
+        return
+
+    config = ROUTES[route]
+    request = build_llm_request(system_prompt, transcript, chat_history, config.model, config.max_tokens)
+    parser = StreamingResponseParser()
+    failed = False
+    try:
+        async for chunk in llm_backends.stream(request, _hedge_request(request)):
+            mark(LLM_FIRST_TOKEN)
+            for event in parser.feed(chunk):
+                yield event
+    except Exception as e:
+        logger.error(f"OpenAI error: {e}")
+        failed = True
+    mark(LLM_COMPLETE)
+
+    events = list(parser.close())
+    reply = next(event.value for event in events if event.type == ResponseEventType.DONE)
+    if failed or not reply:
+        # A cut-off or unusable reply would poison the next prompt; drop the whole turn
+        session_data.chat_history.pop()
+        logger.warning(f"Dropped turn for session {session_id}: no usable reply")
+    else:
+        # The parsed reply rather than the raw text, which may be cut off after what was spoken
+        session_data.add_to_chat_history("assistant", json.dumps(reply))
+        await call_store(call_manager.save_session, session_data, 'chat_history', 'last_activity')
+        answer_cache.store(session_data, transcript, reply)
+    record_route_outcome(route, started, reply)
+    for event in events:
+        yield event
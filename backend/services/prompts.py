@@ -27,8 +27,7 @@ def generate_system_prompt(user_info: Dict[str, Any] = None) -> str:
     """Generate system prompt based on provided information"""
     if not user_info:
         raise ValueError("User information is required")
-    
-    print(user_info)
+
     # Ensure all required keys exist with defaults if missing
     for key in UserInformationKeys:
         if key.value not in user_info and key.value != UserInformationKeys.ADDITIONAL_INFO:
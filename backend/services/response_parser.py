@@ -0,0 +1,264 @@
+import json
+import re
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from backend.core.constants import ResponseMethod
+from backend.utils.utils import logger
+
+
+METHOD_KEY = 'response_method'
+CONTENT_KEY = 'response_content'
+_CODE_FENCE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+_END_OF_STRING = object()
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class ResponseEventType(Enum):
+    METHOD = 'method'            # value: ResponseMethod
+    CONTENT = 'content'          # value: str delta of response_content
+    CONTENT_END = 'content_end'  # value: full response_content
+    DONE = 'done'                # value: parsed reply dict ({} if unusable)
+
+
+@dataclass
+class ResponseEvent:
+    type: ResponseEventType
+    value: Any = None
+
+
+@dataclass
+class ParserStats:
+    """How often replies streamed cleanly versus needed the fallback path."""
+    streamed: int = 0
+    fallback: int = 0
+    failed: int = 0
+    fallback_seconds: float = 0.0
+
+
+# Singleton
+response_parser_stats = ParserStats()
+
+
+class _State(Enum):
+    BEFORE_OBJECT = 0
+    BEFORE_KEY = 1
+    IN_KEY = 2
+    BEFORE_COLON = 3
+    BEFORE_VALUE = 4
+    IN_VALUE = 5
+    AFTER_VALUE = 6
+    DONE = 7
+    ERROR = 8
+
+
+class StreamingResponseParser:
+    """
+    Incremental parser for the OpenAIResponseFormat JSON object.
+
+    Feed it completion deltas as they arrive. It emits METHOD as soon as the
+    response_method string closes, streams response_content character by character
+    (held back until the method is known), and emits DONE once the object closes.
+    Anything it can't follow is left to `close()`, which falls back to a full parse.
+    """
+
+    def __init__(self):
+        self._raw: List[str] = []
+        self._state = _State.BEFORE_OBJECT
+        self._key: List[str] = []
+        self._value: List[str] = []
+        self._escape = False
+        self._unicode: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._method: Optional[ResponseMethod] = None
+        self._content: List[str] = []
+        self._content_done = False
+        self._held: List[str] = []
+        self._reply: Dict[str, str] = {}
+
+    @property
+    def method(self) -> Optional[ResponseMethod]:
+        return self._method
+
+    @property
+    def failed(self) -> bool:
+        return self._state == _State.ERROR
+
+    def feed(self, chunk: str) -> List[ResponseEvent]:
+        self._raw.append(chunk)
+        events: List[ResponseEvent] = []
+        for char in chunk:
+            if self._state in (_State.DONE, _State.ERROR):
+                break
+            self._step(char, events)
+        return events
+
+    def close(self) -> List[ResponseEvent]:
+        """Finish the stream, falling back to a full parse if streaming didn't complete."""
+        if self._state == _State.DONE:
+            response_parser_stats.streamed += 1
+            return [ResponseEvent(ResponseEventType.DONE, self._reply)]
+
+        start = time.perf_counter()
+        events = self._fallback()
+        response_parser_stats.fallback_seconds += time.perf_counter() - start
+        return events
+
+    # --- Character state machine ---
+    def _step(self, char: str, events: List[ResponseEvent]):
+        state = self._state
+        if state == _State.IN_KEY or state == _State.IN_VALUE:
+            decoded = self._decode(char)
+            if decoded is None:
+                return
+            if decoded is _END_OF_STRING:
+                if state == _State.IN_KEY:
+                    self._current_key = "".join(self._key)
+                    self._state = _State.BEFORE_COLON
+                else:
+                    self._end_value(events)
+                return
+            if state == _State.IN_KEY:
+                self._key.append(decoded)
+            else:
+                self._value.append(decoded)
+                if self._current_key == CONTENT_KEY:
+                    self._emit_content(decoded, events)
+            return
+
+        if char.isspace():
+            return
+        if state == _State.BEFORE_OBJECT and char == '{':
+            self._state = _State.BEFORE_KEY
+        elif state == _State.BEFORE_KEY and char == '"':
+            self._key = []
+            self._state = _State.IN_KEY
+        elif state == _State.BEFORE_KEY and char == '}' and not self._reply:
+            self._finish(events)
+        elif state == _State.BEFORE_COLON and char == ':':
+            self._state = _State.BEFORE_VALUE
+        elif state == _State.BEFORE_VALUE and char == '"':
+            self._value = []
+            self._state = _State.IN_VALUE
+        elif state == _State.AFTER_VALUE and char == ',':
+            self._state = _State.BEFORE_KEY
+        elif state == _State.AFTER_VALUE and char == '}':
+            self._finish(events)
+        else:
+            # Non-string values, nesting or stray text aren't part of the schema
+            self._state = _State.ERROR
+
+    def _decode(self, char: str):
+        """Decode one character inside a JSON string. Returns None while mid-escape."""
+        if self._unicode is not None:
+            self._unicode += char
+            if len(self._unicode) < 4:
+                return None
+            try:
+                decoded = chr(int(self._unicode, 16))
+            except ValueError:
+                self._state = _State.ERROR
+                return None
+            self._unicode = None
+            return decoded
+        if self._escape:
+            self._escape = False
+            if char == 'u':
+                self._unicode = ""
+                return None
+            if char not in _ESCAPES:
+                self._state = _State.ERROR
+                return None
+            return _ESCAPES[char]
+        if char == '\\':
+            self._escape = True
+            return None
+        if char == '"':
+            return _END_OF_STRING
+        return char
+
+    def _end_value(self, events: List[ResponseEvent]):
+        value = "".join(self._value)
+        self._reply[self._current_key] = value
+        self._state = _State.AFTER_VALUE
+
+        if self._current_key == METHOD_KEY:
+            try:
+                self._method = ResponseMethod(value)
+            except ValueError:
+                self._state = _State.ERROR
+                return
+            events.append(ResponseEvent(ResponseEventType.METHOD, self._method))
+            if self._held:
+                events.append(ResponseEvent(ResponseEventType.CONTENT, "".join(self._held)))
+                self._held = []
+            if self._content_done:
+                events.append(ResponseEvent(ResponseEventType.CONTENT_END, "".join(self._content)))
+        elif self._current_key == CONTENT_KEY:
+            self._content_done = True
+            if self._method is not None:
+                events.append(ResponseEvent(ResponseEventType.CONTENT_END, value))
+
+    def _emit_content(self, char: str, events: List[ResponseEvent]):
+        self._content.append(char)
+        if self._method is None:
+            self._held.append(char)
+        elif events and events[-1].type == ResponseEventType.CONTENT:
+            # Coalesce characters from the same chunk into one event
+            events[-1].value += char
+        else:
+            events.append(ResponseEvent(ResponseEventType.CONTENT, char))
+
+    def _finish(self, events: List[ResponseEvent]):
+        if self._method is None or not self._content_done:
+            self._state = _State.ERROR
+            return
+        self._state = _State.DONE
+
+    # --- Fallback ---
+    def _fallback(self) -> List[ResponseEvent]:
+        """
+        Parse the whole completion at once. Only emits what streaming hasn't already,
+        so consumers can keep acting on partial results.
+        """
+        raw = "".join(self._raw)
+        try:
+            reply = json.loads(_CODE_FENCE.sub('', raw))
+            method = ResponseMethod(reply[METHOD_KEY])
+            content = str(reply.get(CONTENT_KEY) or '')
+        except Exception as e:
+            if self._method is not None:
+                # Keep what we streamed before the output went bad
+                logger.error(f"Truncated response, using partial content: {e}")
+                response_parser_stats.fallback += 1
+                reply = {METHOD_KEY: self._method.value, CONTENT_KEY: "".join(self._content)}
+                events = []
+                if not self._content_done:
+                    events.append(ResponseEvent(ResponseEventType.CONTENT_END, reply[CONTENT_KEY]))
+                return events + [ResponseEvent(ResponseEventType.DONE, reply)]
+
+            logger.error(f"Error parsing GPT response: {e}")
+            response_parser_stats.failed += 1
+            return [ResponseEvent(ResponseEventType.DONE, {})]
+
+        response_parser_stats.fallback += 1
+        events = []
+        if self._method is None:
+            events.append(ResponseEvent(ResponseEventType.METHOD, method))
+        streamed = "".join(self._content) if self._method is not None else ""
+        if content.startswith(streamed) and len(content) > len(streamed):
+            events.append(ResponseEvent(ResponseEventType.CONTENT, content[len(streamed):]))
+        if not (self._content_done and self._method is not None):
+            events.append(ResponseEvent(ResponseEventType.CONTENT_END, content))
+        events.append(ResponseEvent(ResponseEventType.DONE, reply))
+        return events
+
+
+
+def parse_response(text: str) -> Dict[str, Any]:
+    """Parse a complete reply with the same rules as the streaming path."""
+    parser = StreamingResponseParser()
+    parser.feed(text)
+    return parser.close()[-1].value
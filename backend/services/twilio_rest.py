@@ -0,0 +1,230 @@
+"""
+Async Twilio REST client for call control.
+
+The Twilio SDK's `Client` is synchronous, so every `calls.create` in a route blocked
+the event loop for a full HTTPS round trip. This client speaks the same REST API over
+one pooled, keep-alive httpx connection pool and mirrors the SDK's call surface:
+
+    call = await twilio_rest.calls.create(to=..., from_=..., url=...)
+    await twilio_rest.calls(call.sid).update(status="completed")
+    calls = await twilio_rest.calls.list(from_=number, status="in-progress")
+
+At most TWILIO_MAX_CONCURRENCY requests are in flight. 429s, 5xxs and connection
+errors are retried with full-jitter exponential backoff (honouring Retry-After), and
+every request is timed per operation.
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+import httpx
+
+from backend.utils.utils import logger
+
+
+TWILIO_API_URL = os.getenv('TWILIO_API_URL', 'https://api.twilio.com')
+TWILIO_MAX_CONCURRENCY = int(os.getenv('TWILIO_MAX_CONCURRENCY', 16))
+TWILIO_MAX_RETRIES = int(os.getenv('TWILIO_MAX_RETRIES', 3))
+TWILIO_BACKOFF_BASE = float(os.getenv('TWILIO_BACKOFF_BASE', 0.2))
+TWILIO_BACKOFF_MAX = float(os.getenv('TWILIO_BACKOFF_MAX', 5.0))
+TWILIO_TIMEOUT = float(os.getenv('TWILIO_TIMEOUT', 10.0))
+API_VERSION = '2010-04-01'
+TIMING_WINDOW = 500
+
+
+class TwilioRestError(Exception):
+    """A Twilio API error response, after any retries."""
+
+    def __init__(self, status: int, message: str, code: Optional[int] = None):
+        super().__init__(f"Twilio API error {status}{f' ({code})' if code else ''}: {message}")
+        self.status = status
+        self.code = code
+
+
+@dataclass(slots=True)
+class TwilioCall:
+    """The fields of a Call resource the app uses."""
+    sid: str
+    status: Optional[str] = None
+    to: Optional[str] = None
+    from_: Optional[str] = None
+    parent_call_sid: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "TwilioCall":
+        return cls(sid=data['sid'], status=data.get('status'), to=data.get('to'),
+                   from_=data.get('from'), parent_call_sid=data.get('parent_call_sid'))
+
+
+def _params(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """SDK-style keyword arguments (from_, status_callback) to Twilio's parameter names."""
+    return {
+        ''.join(part.capitalize() for part in name.rstrip('_').split('_')): value
+        for name, value in kwargs.items() if value is not None
+    }
+
+
+class TwilioRestMetrics:
+    """Request counts, retries, errors and a rolling window of latencies per operation."""
+
+    def __init__(self, window: int = TIMING_WINDOW):
+        self._window = window
+        self._seconds: Dict[str, Deque[float]] = {}
+        self.requests: Dict[str, int] = {}
+        self.retries = 0
+        self.errors = 0
+        self.in_flight = 0
+
+    def record(self, operation: str, seconds: float):
+        if operation not in self._seconds:
+            self._seconds[operation] = deque(maxlen=self._window)
+        self._seconds[operation].append(seconds)
+        self.requests[operation] = self.requests.get(operation, 0) + 1
+
+    def snapshot(self) -> dict:
+        timings = {}
+        for operation, samples in self._seconds.items():
+            ordered = sorted(samples)
+            timings[operation] = {
+                'count': self.requests[operation],
+                'p50': ordered[len(ordered) // 2],
+                'p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+                'max': ordered[-1],
+            }
+        return {'timings': timings, 'retries': self.retries, 'errors': self.errors, 'in_flight': self.in_flight}
+
+
+class AsyncTwilioClient:
+    def __init__(self, account_sid: Optional[str], auth_token: Optional[str], base_url: str = TWILIO_API_URL,
+                 max_concurrency: int = TWILIO_MAX_CONCURRENCY, max_retries: int = TWILIO_MAX_RETRIES,
+                 backoff_base: float = TWILIO_BACKOFF_BASE, backoff_max: float = TWILIO_BACKOFF_MAX,
+                 timeout: float = TWILIO_TIMEOUT, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.account_sid = account_sid
+        self._auth_token = auth_token
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.metrics = TwilioRestMetrics()
+        self.calls = _CallList(self)
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # Built on first use, inside the running loop, so importing never opens anything
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=f"{self.base_url}/{API_VERSION}/Accounts/{self.account_sid}",
+                auth=(self.account_sid or '', self._auth_token or ''),
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def request(self, operation: str, method: str, path: str, data: Optional[dict] = None,
+                      params: Optional[dict] = None) -> Dict[str, Any]:
+        """One API call, retried on 429, 5xx and connection errors; returns the JSON body."""
+        http = self.http
+        attempt = 0
+        while True:
+            response, error = None, None
+            async with self._semaphore:
+                self.metrics.in_flight += 1
+                start = time.perf_counter()
+                try:
+                    response = await http.request(method, path, data=data, params=params)
+                except httpx.TransportError as e:
+                    error = e
+                finally:
+                    self.metrics.in_flight -= 1
+                    self.metrics.record(operation, time.perf_counter() - start)
+
+            if response is not None and response.status_code < 400:
+                return response.json()
+
+            if response is None:
+                # A POST that may have reached Twilio is not repeated: it could place a call twice
+                retryable = method == 'GET' or isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+            else:
+                retryable = response.status_code == 429 or response.status_code >= 500
+            if not retryable or attempt >= self.max_retries:
+                self.metrics.errors += 1
+                if response is None:
+                    raise error
+                body = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
+                raise TwilioRestError(response.status_code, body.get('message', response.text), body.get('code'))
+
+            delay = self._backoff(attempt, response.headers.get('Retry-After') if response is not None else None)
+            self.metrics.retries += 1
+            attempt += 1
+            reason = error if response is None else response.status_code
+            logger.warning(f"Twilio {operation} failed ({reason}), retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+class _CallList:
+    """`client.calls`: create and list calls, or `client.calls(sid)` for one call."""
+
+    def __init__(self, client: AsyncTwilioClient):
+        self._client = client
+
+    def __call__(self, sid: str) -> "_CallContext":
+        return _CallContext(self._client, sid)
+
+    async def create(self, **kwargs) -> TwilioCall:
+        return TwilioCall.from_json(await self._client.request('calls.create', 'POST', '/Calls.json', data=_params(kwargs)))
+
+    async def list(self, **kwargs) -> List[TwilioCall]:
+        """Every matching call, following the API's pages."""
+        calls = []
+        params = _params(kwargs)
+        path = '/Calls.json'
+        while path:
+            page = await self._client.request('calls.list', 'GET', path, params=params)
+            calls.extend(TwilioCall.from_json(call) for call in page.get('calls', []))
+            next_page = page.get('next_page_uri')
+            # Next page URIs are absolute from the API root and carry the filters
+            path = f"{self._client.base_url}{next_page}" if next_page else None
+            params = None
+        return calls
+
+
+class _CallContext:
+    def __init__(self, client: AsyncTwilioClient, sid: str):
+        self._client = client
+        self.sid = sid
+
+    async def fetch(self) -> TwilioCall:
+        return TwilioCall.from_json(await self._client.request('calls.fetch', 'GET', f'/Calls/{self.sid}.json'))
+
+    async def update(self, **kwargs) -> TwilioCall:
+        return TwilioCall.from_json(
+            await self._client.request('calls.update', 'POST', f'/Calls/{self.sid}.json', data=_params(kwargs))
+        )
+
+
+# Singleton
+twilio_rest = AsyncTwilioClient(os.environ.get('TWILIO_ACCOUNT_SID'), os.environ.get('TWILIO_AUTH_TOKEN'))
@@ -1,12 +1,13 @@
 from twilio.twiml.voice_response import Dial
-from twilio.rest import Client
 
+from backend.services.twilio_rest import AsyncTwilioClient
 
-def create_call(twilio_client, to, from_, url, status_callback, 
-                status_callback_event=None, status_callback_method='POST'):
+
+async def create_call(twilio_client: AsyncTwilioClient, to, from_, url, status_callback,
+                      status_callback_event=None, status_callback_method='POST'):
     if status_callback_event is None:
         status_callback_event = ['initiated', 'ringing', 'answered', 'completed']
-    bot_call = twilio_client.calls.create(
+    bot_call = await twilio_client.calls.create(
         to=to,
         from_=from_,
         url=url,
@@ -44,5 +45,5 @@ def is_redirect(transcript):
     print(f"Is redirect: {is_redirect}")
     return is_redirect
 
-def end_call(twilio_client: Client, call_sid: str):
-    twilio_client.calls(call_sid).update(status="completed")
\ No newline at end of file
+async def end_call(twilio_client: AsyncTwilioClient, call_sid: str):
+    await twilio_client.calls(call_sid).update(status="completed")
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+Precompiled TwiML for the hot webhooks.
+
+Building a `VoiceResponse` tree and serializing it costs far more than the handful
+of values that change per call. Each template here is built once, at import, by
+running its builder (plain twilio library code) with placeholder values. The XML is
+then split around the placeholders. Rendering escapes the values for the spot each
+one lands in (element text or attribute) and joins the fragments, so the output is
+byte-for-byte what the builder would produce.
+
+    INCOMING_CALL.render(name="John", stream_url="wss://...")
+
+The builders stay the reference implementation; the tests compare the two.
+"""
+import inspect
+import re
+from typing import Callable, Dict, List, Tuple
+
+from twilio.twiml.voice_response import Connect, VoiceResponse
+
+from backend.services.twilio_utils import create_conference
+
+
+# Same escaping as xml.etree.ElementTree, which the twilio library serializes with
+_TEXT_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+_ATTRIBUTE_ESCAPES = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', '\r': '&#13;', '\n': '&#10;', '\t': '&#09;',
+})
+_PLACEHOLDER = 'TwimlField{}X'
+
+
+class TwimlTemplate:
+    def __init__(self, builder: Callable[..., VoiceResponse]):
+        self.builder = builder
+        self.fields = tuple(inspect.signature(builder).parameters)
+        placeholders = {_PLACEHOLDER.format(index): field for index, field in enumerate(self.fields)}
+        xml = str(builder(**{field: placeholder for placeholder, field in placeholders.items()}))
+
+        self._fragments: List[str] = []
+        self._slots: List[Tuple[str, dict, int]] = []
+        position = 0
+        for match in re.finditer('|'.join(placeholders), xml):
+            self._fragments.append(xml[position:match.start()])
+            # Inside a tag if the last '<' before the value is after the last '>'
+            in_attribute = xml.rfind('<', 0, match.start()) > xml.rfind('>', 0, match.start())
+            # An element whose only content is the value closes itself when the value is empty
+            rest = xml[match.end():]
+            sole_content = not in_attribute and xml[match.start() - 1] == '>' and rest.startswith('</')
+            close_length = rest.index('>') + 1 if sole_content else 0
+            self._slots.append((placeholders[match.group()], _ATTRIBUTE_ESCAPES if in_attribute else _TEXT_ESCAPES, close_length))
+            position = match.end()
+        self._fragments.append(xml[position:])
+
+        missing = set(self.fields) - {field for field, _, _ in self._slots}
+        if missing:
+            raise ValueError(f"{builder.__name__} does not use {sorted(missing)} in its output")
+
+    def render(self, **values: str) -> str:
+        parts = [self._fragments[0]]
+        for index, (field, escapes, close_length) in enumerate(self._slots):
+            value = str(values[field]).translate(escapes)
+            fragment = self._fragments[index + 1]
+            if value or not close_length:
+                parts.append(value)
+            else:
+                parts[-1] = parts[-1][:-1] + ' />'
+                fragment = fragment[close_length:]
+            parts.append(fragment)
+        return ''.join(parts)
+
+
+def incoming_call(name: str, stream_url: str) -> VoiceResponse:
+    """Greet the agent and open the media stream."""
+    response = VoiceResponse()
+    response.pause(length=1)
+    response.say(f"Hi, I'm a helpful agent working for {name}")
+    connect = Connect()
+    connect.stream(url=stream_url)
+    response.append(connect)
+    return response
+
+
+def join_conference(conference_name: str, events_url: str) -> VoiceResponse:
+    response = VoiceResponse()
+    response.append(create_conference(conference_name, events_url))
+    return response
+
+
+def user_joins_conference(name: str, conference_name: str, events_url: str) -> VoiceResponse:
+    """Tell the user who they're being connected to and bring them into the conference."""
+    response = VoiceResponse()
+    response.say(f"Connecting you with {name} now. Thank you!")
+    response.append(create_conference(
+        conference_name=conference_name,
+        call_events_url=events_url,
+        start_conference_on_enter=False,  # TODO: Check
+        end_conference_on_exit=True
+    ))
+    return response
+
+
+def phone_tree(digits: str) -> VoiceResponse:
+    response = VoiceResponse()
+    response.play(digits=digits)
+    return response
+
+
+INCOMING_CALL = TwimlTemplate(incoming_call)
+JOIN_CONFERENCE = TwimlTemplate(join_conference)
+USER_JOINS_CONFERENCE = TwimlTemplate(user_joins_conference)
+PHONE_TREE = TwimlTemplate(phone_tree)
+
+TEMPLATES: Dict[str, TwimlTemplate] = {
+    template.builder.__name__: template for template in (INCOMING_CALL, JOIN_CONFERENCE, USER_JOINS_CONFERENCE, PHONE_TREE)
+}
@@ -0,0 +1 @@
+"""Local stand-ins for external services, used for offline benchmarking."""
\ No newline at end of file
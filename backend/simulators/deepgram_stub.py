@@ -0,0 +1,147 @@
+"""
+Stand-in for Deepgram's live STT and TTS, for offline load testing.
+
+STT connections take μ-law audio through a synchronous send(), like the SDK's live
+client. Each one detects the end of an utterance by energy (speech followed by
+`endpointing` seconds of silence) and, after a sampled latency, hands the next line
+of its script to on_transcript as a traced turn, like the real handler, with the
+last voiced frame as the turn's last inbound frame.
+
+TTS sleeps for a sampled time to first byte plus a per-character cost, and returns
+audio whose length follows the text: MP3, like Deepgram, or μ-law when ffmpeg is not
+around to encode (and decode) MP3.
+
+    stub = DeepgramStub(transcripts=["How can I help you?"], stt_latency=LatencyDistribution.parse('fixed:0.15'))
+    connection = await stub.create_stt_connection(on_transcript)
+"""
+import asyncio
+import audioop
+import io
+import math
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional, Sequence
+
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+from backend.core.turn_trace import run_turn
+from backend.simulators.llm_stub_server import LatencyDistribution
+
+
+SAMPLE_RATE = 8000
+SPEECH_RMS = 500
+CHARS_PER_SECOND = 15  # Roughly how fast TTS voices speak
+DEFAULT_TRANSCRIPTS = (
+    "Thank you for calling support, my name is Alex. Who am I speaking with?",
+    "Thanks. Can I get the email address on the account?",
+    "Okay, and what's the account number?",
+    "How can I help you today?",
+)
+
+
+def tone(seconds: float, frequency: float = 440.0) -> bytes:
+    """A μ-law tone, loud enough to count as speech."""
+    segment = Sine(frequency, sample_rate=SAMPLE_RATE).to_audio_segment(duration=seconds * 1000, volume=-6)
+    return audioop.lin2ulaw(segment.set_sample_width(2).raw_data, 2)
+
+
+class StubSTTConnection:
+    def __init__(self, stub: "DeepgramStub", on_transcript: Callable[[str], Awaitable[None]]):
+        self._stub = stub
+        self._on_transcript = on_transcript
+        self._loop = asyncio.get_running_loop()
+        self._voiced = False
+        self._silence = 0.0
+        self._speech_end = 0.0
+        self._next = 0
+        self.finished = False
+
+    def send(self, audio: bytes):
+        if self.finished or not audio:
+            return
+        voiced = audioop.rms(audioop.ulaw2lin(audio, 2), 2) >= self._stub.speech_rms
+        if voiced:
+            self._voiced = True
+            self._silence = 0.0
+            self._speech_end = time.perf_counter()
+        elif self._voiced:
+            self._silence += len(audio) / SAMPLE_RATE
+            if self._silence >= self._stub.endpointing:
+                self._voiced = False
+                self._loop.call_later(self._stub.sample(self._stub.stt_latency), self._final, self._speech_end)
+
+    def _final(self, speech_end: float):
+        if self.finished:
+            return
+        transcripts = self._stub.transcripts
+        transcript = transcripts[self._next % len(transcripts)]
+        self._next += 1
+        self._stub.transcripts_sent += 1
+        self._loop.create_task(run_turn(self._on_transcript, transcript, time.perf_counter(), speech_end=speech_end))
+
+    def finish(self):
+        if not self.finished:
+            self.finished = True
+            self._stub.open_connections -= 1
+
+
+class DeepgramStub:
+    def __init__(self, transcripts: Sequence[str] = DEFAULT_TRANSCRIPTS, stt_latency: LatencyDistribution = None,
+                 endpointing: float = 0.3, tts_ttfb: LatencyDistribution = None, tts_seconds_per_char: float = 0.0,
+                 audio_format: str = 'mp3', speech_rms: int = SPEECH_RMS, seed: int = 0):
+        if audio_format not in ('mp3', 'mulaw'):
+            raise ValueError(f"Unknown TTS audio format: {audio_format}")
+        self.transcripts = list(transcripts)
+        self.stt_latency = stt_latency or LatencyDistribution('fixed', (0.15,))
+        self.endpointing = endpointing
+        self.tts_ttfb = tts_ttfb or LatencyDistribution('fixed', (0.2,))
+        self.tts_seconds_per_char = tts_seconds_per_char
+        self.audio_format = audio_format
+        self.speech_rms = speech_rms
+        self._rng = random.Random(seed)
+        # Speech, by whole seconds, so encoding doesn't count against TTS latency
+        self._audio: Dict[int, bytes] = {}
+        self.open_connections = 0
+        self.transcripts_sent = 0
+        self.tts_requests = 0
+
+    def sample(self, distribution: LatencyDistribution) -> float:
+        return distribution.sample(self._rng)
+
+    async def create_stt_connection(self, on_transcript: Callable[[str], Awaitable[None]]) -> StubSTTConnection:
+        self.open_connections += 1
+        return StubSTTConnection(self, on_transcript)
+
+    async def close_stt_connection(self, connection: Optional[StubSTTConnection]):
+        if connection:
+            connection.finish()
+
+    def _speech(self, seconds: int) -> bytes:
+        audio = self._audio.get(seconds)
+        if audio is None:
+            mulaw = tone(seconds)
+            if self.audio_format == 'mulaw':
+                audio = mulaw
+            else:
+                segment = AudioSegment(audioop.ulaw2lin(mulaw, 2), sample_width=2, frame_rate=SAMPLE_RATE, channels=1)
+                audio = segment.export(io.BytesIO(), format='mp3').getvalue()
+            self._audio[seconds] = audio
+        return audio
+
+    def warm(self, max_seconds: int = 10):
+        """Encode the speech up front, so the first replies aren't slowed by it."""
+        for seconds in range(1, max_seconds + 1):
+            self._speech(seconds)
+
+    async def synthesize_speech(self, text: str) -> bytes:
+        self.tts_requests += 1
+        await asyncio.sleep(self.sample(self.tts_ttfb) + self.tts_seconds_per_char * len(text))
+        return self._speech(max(1, math.ceil(len(text) / CHARS_PER_SECOND)))
+
+    def snapshot(self) -> dict:
+        return {
+            'open_connections': self.open_connections,
+            'transcripts_sent': self.transcripts_sent,
+            'tts_requests': self.tts_requests,
+        }
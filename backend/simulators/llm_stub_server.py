@@ -0,0 +1,149 @@
+"""
+Deterministic OpenAI-compatible chat completions server for offline benchmarking.
+
+Run it and point the "stub" LLM provider at it:
+
+    python -m backend.simulators.llm_stub_server --port 8090 --ttft lognormal:-1.2,0.4 --inter-token fixed:0.015
+    LLM_MODEL=stub:gpt-4o-mini LLM_STUB_URL=http://127.0.0.1:8090/v1 python run.py
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from backend.core.constants import ResponseMethod
+
+
+CHUNK_SIZE = 4
+
+
+@dataclass
+class LatencyDistribution:
+    """
+    Latency in seconds drawn from a named distribution:
+    fixed:s, uniform:low,high, normal:mean,stddev or lognormal:mu,sigma.
+    """
+    kind: str = 'fixed'
+    params: Tuple[float, ...] = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        kind, _, raw = spec.partition(':')
+        params = tuple(float(value) for value in raw.split(',')) if raw else (0.0,)
+        distribution = cls(kind, params)
+        distribution.sample(random.Random(0))  # Validate eagerly
+        return distribution
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'fixed':
+            value = self.params[0]
+        elif self.kind == 'uniform':
+            value = rng.uniform(*self.params)
+        elif self.kind == 'normal':
+            value = rng.gauss(*self.params)
+        elif self.kind == 'lognormal':
+            value = math.exp(rng.gauss(*self.params))
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.kind}")
+        return max(0.0, value)
+
+
+def canned_reply(messages: List[Dict[str, str]]) -> str:
+    """Pick a structured reply from the last user message so runs are repeatable."""
+    last_user = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+    text = last_user.lower()
+    if 'hold' in text or 'wait' in text:
+        method, content = ResponseMethod.NOOP, ''
+    elif 'press' in text or 'menu' in text:
+        method, content = ResponseMethod.PHONE_TREE, '1'
+    elif 'speak to' in text or 'call back' in text:
+        method, content = ResponseMethod.CALL_BACK, ''
+    else:
+        method, content = ResponseMethod.VOICE, "Thanks, I'm calling about the account holder's recent charge."
+    return json.dumps({"response_method": method.value, "response_content": content})
+
+
+def create_stub_app(ttft: LatencyDistribution = None, inter_token: LatencyDistribution = None, seed: int = 0) -> FastAPI:
+    """
+    Build the stub app. Each request gets its own RNG derived from the seed and the
+    request number, so the same request sequence always sees the same latencies.
+    """
+    ttft = ttft or LatencyDistribution()
+    inter_token = inter_token or LatencyDistribution()
+    app = FastAPI()
+    app.state.requests_served = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        request_number = app.state.requests_served
+        app.state.requests_served += 1
+        rng = random.Random(f"{seed}:{request_number}")
+
+        completion_id = f"chatcmpl-stub-{request_number}"
+        model = body.get('model', 'stub')
+        reply = canned_reply(body.get('messages', []))
+        created = int(time.time())
+
+        def chunk(delta, finish_reason=None):
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        if not body.get('stream'):
+            await asyncio.sleep(ttft.sample(rng) + inter_token.sample(rng) * (len(reply) // CHUNK_SIZE))
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply, "refusal": None},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+        async def events():
+            await asyncio.sleep(ttft.sample(rng))
+            yield f"data: {json.dumps(chunk({'role': 'assistant', 'content': ''}))}\n\n"
+            for start in range(0, len(reply), CHUNK_SIZE):
+                if start:
+                    await asyncio.sleep(inter_token.sample(rng))
+                yield f"data: {json.dumps(chunk({'content': reply[start:start + CHUNK_SIZE]}))}\n\n"
+            yield f"data: {json.dumps(chunk({}, 'stop'))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--ttft', default='fixed:0.3', help='Time to first token distribution')
+    parser.add_argument('--inter-token', default='fixed:0.01', help='Delay between streamed chunks')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_stub_app(LatencyDistribution.parse(args.ttft), LatencyDistribution.parse(args.inter_token), args.seed),
+        host=args.host,
+        port=args.port,
+    )
@@ -0,0 +1,207 @@
+"""
+In-process stand-in for the subset of the redis-py client (decode_responses=True)
+that RedisSessionStore uses. Several store instances sharing one LocalRedis behave
+like workers sharing one Redis server.
+"""
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Union
+
+
+class LocalRedis:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data: Dict[str, Union[str, Dict[str, str], Set[str], List[str]]] = {}
+        self._in_pipeline = False
+        # Requests a real client would send; a pipeline counts once
+        self.round_trips = 0
+
+    def _typed(self, name: str, kind: type, create: bool = False):
+        value = self._data.get(name)
+        if value is None:
+            if not create:
+                return kind()
+            value = self._data[name] = kind()
+        if not isinstance(value, kind):
+            raise TypeError(f"WRONGTYPE Operation against a key holding the wrong kind of value: {name}")
+        return value
+
+    def _drop_if_empty(self, name: str):
+        if not self._data.get(name):
+            self._data.pop(name, None)
+
+    def _count(self):
+        if not self._in_pipeline:
+            self.round_trips += 1
+
+    # --- Strings ---
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            self._count()
+            value = self._data.get(name)
+            return value if isinstance(value, str) or value is None else None
+
+    def set(self, name: str, value) -> bool:
+        with self._lock:
+            self._count()
+            self._data[name] = str(value)
+            return True
+
+    def exists(self, *names: str) -> int:
+        with self._lock:
+            self._count()
+            return sum(name in self._data for name in names)
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            self._count()
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+    # --- Hashes ---
+    def hset(self, name: str, key: Optional[str] = None, value=None, mapping: Optional[dict] = None) -> int:
+        with self._lock:
+            self._count()
+            items = dict(mapping or {})
+            if key is not None:
+                items[key] = value
+            fields = self._typed(name, dict, create=True)
+            added = sum(field not in fields for field in items)
+            fields.update({field: str(item) for field, item in items.items()})
+            return added
+
+    def hdel(self, name: str, *keys: str) -> int:
+        with self._lock:
+            self._count()
+            fields = self._typed(name, dict)
+            removed = sum(fields.pop(key, None) is not None for key in keys)
+            self._drop_if_empty(name)
+            return removed
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        with self._lock:
+            self._count()
+            return self._typed(name, dict).get(key)
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            self._count()
+            return dict(self._typed(name, dict))
+
+    # --- Sets ---
+    def sadd(self, name: str, *values) -> int:
+        with self._lock:
+            self._count()
+            members = self._typed(name, set, create=True)
+            added = sum(str(value) not in members for value in values)
+            members.update(str(value) for value in values)
+            return added
+
+    def srem(self, name: str, *values) -> int:
+        with self._lock:
+            self._count()
+            members = self._typed(name, set)
+            removed = sum(str(value) in members for value in values)
+            members.difference_update(str(value) for value in values)
+            self._drop_if_empty(name)
+            return removed
+
+    def smembers(self, name: str) -> Set[str]:
+        with self._lock:
+            self._count()
+            return set(self._typed(name, set))
+
+    def scard(self, name: str) -> int:
+        with self._lock:
+            self._count()
+            return len(self._typed(name, set))
+
+    # --- Lists ---
+    def rpush(self, name: str, *values) -> int:
+        with self._lock:
+            self._count()
+            items = self._typed(name, list, create=True)
+            items.extend(str(value) for value in values)
+            return len(items)
+
+    def lrange(self, name: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            self._count()
+            items = self._typed(name, list)
+            return items[start:] if end == -1 else items[start:end + 1]
+
+    def pipeline(self, transaction: bool = True) -> "LocalPipeline":
+        return LocalPipeline(self)
+
+    # --- Locks ---
+    def lock(self, name: str, timeout: Optional[float] = None, sleep: float = 0.01,
+             blocking_timeout: Optional[float] = None, thread_local: bool = True) -> "LocalLock":
+        return LocalLock(self, name, timeout, sleep, blocking_timeout)
+
+
+class LocalLock:
+    """Like redis-py's Lock: the key holds the owner's token and expires after `timeout`."""
+
+    def __init__(self, server: LocalRedis, name: str, timeout: Optional[float], sleep: float, blocking_timeout: Optional[float]):
+        self._server = server
+        self.name = name
+        self.timeout = timeout
+        self.sleep = sleep
+        self.blocking_timeout = blocking_timeout
+        self._token = uuid.uuid4().hex
+
+    def _try_acquire(self) -> bool:
+        with self._server._lock:
+            self._server._count()
+            held = self._server._data.get(self.name)
+            if held is not None and held[1] is not None and held[1] <= time.monotonic():
+                held = None
+            if held is not None:
+                return False
+            expires = time.monotonic() + self.timeout if self.timeout is not None else None
+            self._server._data[self.name] = (self._token, expires)
+            return True
+
+    def acquire(self, blocking: bool = True, blocking_timeout: Optional[float] = None) -> bool:
+        blocking_timeout = self.blocking_timeout if blocking_timeout is None else blocking_timeout
+        deadline = time.monotonic() + blocking_timeout if blocking_timeout is not None else None
+        while not self._try_acquire():
+            if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                return False
+            time.sleep(self.sleep)
+        return True
+
+    def release(self):
+        with self._server._lock:
+            self._server._count()
+            held = self._server._data.get(self.name)
+            if held is None or held[0] != self._token or (held[1] is not None and held[1] <= time.monotonic()):
+                raise RuntimeError(f"Cannot release a lock that's no longer owned: {self.name}")
+            del self._server._data[self.name]
+
+
+class LocalPipeline:
+    """Queues commands and runs them atomically on execute(), like a MULTI/EXEC pipeline."""
+
+    def __init__(self, server: LocalRedis):
+        self._server = server
+        self._commands = []
+
+    def __getattr__(self, name: str):
+        command = getattr(self._server, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> list:
+        with self._server._lock:
+            self._server.round_trips += 1
+            self._server._in_pipeline = True
+            try:
+                results = [command(*args, **kwargs) for command, args, kwargs in self._commands]
+            finally:
+                self._server._in_pipeline = False
+        self._commands = []
+        return results
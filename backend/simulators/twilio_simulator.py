@@ -0,0 +1,646 @@
+"""
+Local stand-in for Twilio Voice: the REST API plus the calls it places, so the app
+can be exercised end to end without ngrok or live numbers.
+
+Built on the REST stub in twilio_stub_server. A call created through the API goes
+through Twilio's lifecycle against the app. First come the status callbacks for
+initiated, ringing and answered, with sampled delays between them. The `url` webhook
+is requested on answer and the returned TwiML is executed:
+
+- <Dial><Conference> joins a conference that reports to its statusCallback
+  (participant-join, participant-leave, conference-start and conference-end).
+- <Connect><Stream> opens the media WebSocket and streams μ-law audio into it with
+  Twilio's framing: connected, start, media every 20ms, and stop. Marks the app sends
+  are echoed back once the audio sent before them has "played".
+- <Pause>, <Say> and <Play> take time; <Hangup> and running out of TwiML end the call.
+
+Hanging up through the API sends the completed callback. Dialing one of the
+simulator's own numbers (the bot calling itself) also rings that number's voice URL
+as an inbound call, the way a Twilio phone number would.
+
+In process, as the tests and load harness use it, webhooks and streams go to the app
+over ASGI:
+
+    simulator = TwilioSimulator(app=app, numbers={'+15550100': 'https://bot.example.com/calls/incoming-call'},
+                                audio=[load_mulaw('agent.wav')])
+    client = AsyncTwilioClient('AC1', 'token', transport=httpx.ASGITransport(app=simulator.rest_app))
+
+Against a running app:
+
+    python -m backend.simulators.twilio_simulator --port 8091 --app-url http://127.0.0.1:5050 \\
+        --number +15550100 --audio agent.wav
+    TWILIO_API_URL=http://127.0.0.1:8091 BOT_NUMBERS=+15550100 python run.py
+"""
+import argparse
+import asyncio
+import audioop
+import base64
+import itertools
+import json
+import random
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from email.utils import formatdate
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+from pydub import AudioSegment
+
+from backend.services.twilio_rest import API_VERSION
+from backend.simulators.llm_stub_server import LatencyDistribution
+from backend.simulators.twilio_stub_server import create_twilio_stub_app
+from backend.utils.utils import logger
+
+
+SAMPLE_RATE = 8000
+FRAME_SECONDS = 0.02
+FRAME_BYTES = int(SAMPLE_RATE * FRAME_SECONDS)  # One byte per μ-law sample
+MULAW_SILENCE = b'\xff'
+RAW_MULAW_SUFFIXES = ('.ulaw', '.mulaw', '.raw')
+SAY_SECONDS_PER_WORD = 0.4
+PLAY_SECONDS_PER_DIGIT = 0.5
+FINAL_STATUSES = ('completed', 'busy', 'failed', 'no-answer', 'canceled')
+# CallStatus -> the StatusCallbackEvent that asks for it
+STATUS_EVENTS = {'initiated': 'initiated', 'ringing': 'ringing', 'in-progress': 'answered',
+                 **{status: 'completed' for status in FINAL_STATUSES}}
+CONFERENCE_EVENTS = {'start': 'conference-start', 'end': 'conference-end',
+                     'join': 'participant-join', 'leave': 'participant-leave'}
+
+
+def load_mulaw(path) -> bytes:
+    """
+    8kHz mono μ-law from an audio file. .ulaw/.mulaw/.raw files are taken as already
+    encoded; anything else is decoded with pydub (WAV needs no ffmpeg) and converted.
+    """
+    path = Path(path)
+    if path.suffix.lower() in RAW_MULAW_SUFFIXES:
+        return path.read_bytes()
+    audio = AudioSegment.from_file(path).set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+    return audioop.lin2ulaw(audio.raw_data, 2)
+
+
+@dataclass
+class CallTiming:
+    """Delays, in seconds, between the steps of a simulated call."""
+    initiated: LatencyDistribution = field(default_factory=lambda: LatencyDistribution('fixed', (0.05,)))
+    ringing: LatencyDistribution = field(default_factory=lambda: LatencyDistribution('fixed', (0.2,)))
+    # Ringing until an outside number (not one of ours) picks up
+    answer: LatencyDistribution = field(default_factory=lambda: LatencyDistribution('uniform', (1.0, 3.0)))
+    # How long an outside party stays on before hanging up; None stays until hung up
+    hangup: Optional[LatencyDistribution] = None
+    # Silence between the utterances streamed to the app
+    gap: LatencyDistribution = field(default_factory=lambda: LatencyDistribution('fixed', (1.0,)))
+
+
+@dataclass
+class WebhookRecord:
+    kind: str
+    url: str
+    status: Optional[int]
+    seconds: float
+
+
+@dataclass
+class MediaStreamRecord:
+    """What passed over one media stream, timed with time.perf_counter()."""
+    stream_sid: str
+    call_sid: str
+    url: str
+    started_at: Optional[float] = None
+    # When the last frame of each utterance was sent
+    utterances_sent: List[float] = field(default_factory=list)
+    # Audio the app sent back: (arrival, bytes)
+    media_received: List[Tuple[float, int]] = field(default_factory=list)
+    marks: List[str] = field(default_factory=list)
+    frames_sent: int = 0
+    stopped_at: Optional[float] = None
+
+
+class SimulatedCall:
+    def __init__(self, info: dict, direction: str):
+        self.info = info
+        self.sid: str = info['sid']
+        self.direction = direction
+        self.events: List[str] = info.get('status_callback_event') or []
+        self.sequence = itertools.count()
+        # The inbound leg of a call to one of our numbers, and the other way round
+        self.bridge: Optional["SimulatedCall"] = None
+        self.answered_at: Optional[float] = None
+        self.ended = asyncio.Event()
+        self.twiml: Optional[asyncio.Task] = None
+
+    @property
+    def status(self) -> str:
+        return self.info['status']
+
+
+class SimulatedConference:
+    def __init__(self, name: str):
+        self.name = name
+        self.sid = f"CF{uuid.uuid4().hex}"
+        self.sequence = itertools.count(1)
+        self.participants: Dict[str, SimulatedCall] = {}
+        self.status_callback: Optional[str] = None
+        self.events: Set[str] = set()
+        self.ended = False
+
+
+class AsgiWebSocket:
+    """A WebSocket client for an in-process ASGI app, so streams need no server."""
+
+    def __init__(self, app, url: str):
+        parts = urlsplit(url)
+        self.app = app
+        self.scope = {
+            'type': 'websocket', 'asgi': {'version': '3.0'}, 'scheme': parts.scheme or 'ws',
+            'path': parts.path, 'raw_path': parts.path.encode(), 'root_path': '',
+            'query_string': parts.query.encode(), 'headers': [(b'host', parts.netloc.encode())],
+            'server': (parts.hostname, parts.port or (443 if parts.scheme == 'wss' else 80)),
+            'client': ('127.0.0.1', 0), 'subprotocols': [],
+        }
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self._from_app: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+
+    async def connect(self) -> "AsgiWebSocket":
+        self._to_app.put_nowait({'type': 'websocket.connect'})
+        self._task = asyncio.create_task(self._run())
+        message = await self._from_app.get()
+        if message['type'] != 'websocket.accept':
+            self.closed = True
+            raise ConnectionError(f"WebSocket to {self.scope['path']} was rejected")
+        return self
+
+    async def _run(self):
+        try:
+            await self.app(self.scope, self._to_app.get, self._from_app.put)
+        except Exception as e:
+            logger.error(f"App failed on WebSocket {self.scope['path']}: {e}")
+        finally:
+            self._from_app.put_nowait({'type': 'websocket.close', 'code': 1006})
+
+    async def send(self, text: str):
+        if not self.closed:
+            self._to_app.put_nowait({'type': 'websocket.receive', 'text': text})
+
+    async def recv(self) -> Optional[str]:
+        """The next text message, or None once the app has closed the socket."""
+        while not self.closed:
+            message = await self._from_app.get()
+            if message['type'] == 'websocket.close':
+                self.closed = True
+            elif message['type'] == 'websocket.send':
+                return message.get('text') or message.get('bytes', b'').decode()
+        return None
+
+    async def close(self, timeout: float = 1.0):
+        if not self.closed:
+            self.closed = True
+            self._to_app.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+        if self._task:
+            # A handler that isn't reading yet won't see the disconnect; don't hang on it
+            await asyncio.wait({self._task}, timeout=timeout)
+
+
+class NetworkWebSocket:
+    """The same interface over a real connection, for an app running as a server."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._connection = None
+
+    async def connect(self) -> "NetworkWebSocket":
+        import websockets
+
+        self._connection = await websockets.connect(self.url)
+        return self
+
+    async def send(self, text: str):
+        try:
+            await self._connection.send(text)
+        except Exception:
+            pass  # Closed by the app; recv reports it
+
+    async def recv(self) -> Optional[str]:
+        try:
+            return await self._connection.recv()
+        except Exception:
+            return None
+
+    async def close(self):
+        await self._connection.close()
+
+
+class TwilioSimulator:
+    def __init__(self, app=None, numbers: Optional[Mapping[str, str]] = None, audio: Sequence[bytes] = (),
+                 timing: Optional[CallTiming] = None, time_scale: float = 1.0, app_url: Optional[str] = None,
+                 latency: Optional[LatencyDistribution] = None, seed: int = 0, account_sid: str = f"AC{'0' * 32}"):
+        """
+        app: ASGI app to deliver webhooks and streams to in process. Without it they
+            go over the network to the URLs the app handed out, or to app_url.
+        numbers: our phone numbers and their voice URLs, for inbound calls.
+        audio: μ-law utterances streamed, in order, into every media stream.
+        time_scale: multiplies every simulated delay and the audio pacing; 0 runs as
+            fast as possible.
+        """
+        self.app = app
+        self.numbers = dict(numbers or {})
+        self.audio = list(audio)
+        self.timing = timing or CallTiming()
+        self.time_scale = time_scale
+        self.app_url = app_url
+        self.account_sid = account_sid
+        self._rng = random.Random(seed)
+        self.rest_app = create_twilio_stub_app(latency, seed, simulator=self)
+        self.state = self.rest_app.state.twilio
+        self._http: Optional[httpx.AsyncClient] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.calls: Dict[str, SimulatedCall] = {}
+        self.conferences: Dict[str, SimulatedConference] = {}
+        self.webhooks: List[WebhookRecord] = []
+        self.streams: List[MediaStreamRecord] = []
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            transport = httpx.ASGITransport(app=self.app) if self.app is not None else None
+            self._http = httpx.AsyncClient(transport=transport, timeout=30)
+        return self._http
+
+    async def aclose(self):
+        """Hang up every live call, wait for them to wind down and close the client."""
+        await asyncio.gather(*(self.hangup(call) for call in list(self.calls.values())))
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _sample(self, distribution: LatencyDistribution) -> float:
+        return distribution.sample(self._rng)
+
+    def _target(self, url: str) -> str:
+        """Send a URL the app handed out to app_url instead, like a tunnel would."""
+        if not self.app_url:
+            return url
+        base = urlsplit(self.app_url)
+        parts = urlsplit(url)
+        scheme = base.scheme
+        if parts.scheme in ('ws', 'wss'):
+            scheme = 'wss' if base.scheme == 'https' else 'ws'
+        return urlunsplit((scheme, base.netloc, parts.path, parts.query, ''))
+
+    # Called by the REST stub
+
+    def dial(self, info: dict):
+        call = self.calls[info['sid']] = SimulatedCall(info, 'outbound-api')
+        self._spawn(self._run_outbound(call))
+
+    def update(self, info: dict, form: Mapping[str, str]):
+        call = self.calls.get(info['sid'])
+        status = form.get('Status')
+        if call is not None and status in ('completed', 'canceled'):
+            self._spawn(self.hangup(call))
+        elif form.get('Url'):
+            logger.warning(f"Redirecting call {info['sid']} is not simulated")
+
+    # Call lifecycle
+
+    async def _run_outbound(self, call: SimulatedCall):
+        await self._wait(call, self._sample(self.timing.initiated))
+        await self._set_status(call, 'initiated')
+        await self._wait(call, self._sample(self.timing.ringing))
+        if call.ended.is_set():
+            return
+        await self._set_status(call, 'ringing')
+
+        voice_url = self.numbers.get(call.info['to'])
+        if voice_url:
+            # One of our numbers: it rings as an inbound call, and answering that answers this
+            inbound = self._new_inbound(call, voice_url)
+            twiml = await self._fetch_twiml(inbound, voice_url)
+            if twiml is None:
+                await asyncio.gather(self.hangup(inbound, 'failed'), self.hangup(call, 'failed'))
+                return
+            await self._answer(inbound, twiml)
+        else:
+            await self._wait(call, self._sample(self.timing.answer))
+            if self.timing.hangup is not None:
+                self._spawn(self._hang_up_after(call, self._sample(self.timing.hangup)))
+
+        if call.ended.is_set():
+            return
+        await self._set_status(call, 'in-progress')
+        twiml = await self._fetch_twiml(call, call.info['url'])
+        if twiml is None:
+            await self.hangup(call, 'failed')
+            return
+        await self._answer(call, twiml)
+
+    def _new_inbound(self, outbound: SimulatedCall, voice_url: str) -> SimulatedCall:
+        sid = f"CA{uuid.uuid4().hex}"
+        info = self.state.calls[sid] = {
+            'sid': sid, 'account_sid': self.account_sid, 'status': 'ringing', 'to': outbound.info['to'],
+            'from': outbound.info['from'], 'url': voice_url, 'status_callback': None, 'status_callback_event': [],
+        }
+        inbound = self.calls[sid] = SimulatedCall(info, 'inbound')
+        inbound.bridge, outbound.bridge = outbound, inbound
+        return inbound
+
+    async def _hang_up_after(self, call: SimulatedCall, seconds: float):
+        await self._wait(call, seconds)
+        await self.hangup(call)
+
+    async def _answer(self, call: SimulatedCall, twiml: ET.Element):
+        if call.ended.is_set():
+            return
+        call.answered_at = time.perf_counter()
+        call.info['status'] = 'in-progress'
+        call.twiml = self._spawn(self._run_twiml(call, twiml))
+
+    async def hangup(self, call: SimulatedCall, status: str = 'completed'):
+        """End the call, and whatever it is bridged to, once its verbs have wound down."""
+        if call.ended.is_set():
+            return
+        call.ended.set()
+        if call.twiml and call.twiml is not asyncio.current_task():
+            await asyncio.gather(call.twiml, return_exceptions=True)
+        if call.answered_at is None and status == 'completed':
+            status = 'canceled'
+        await self._set_status(call, status)
+        if call.bridge is not None:
+            await self.hangup(call.bridge)
+
+    async def _set_status(self, call: SimulatedCall, status: str):
+        call.info['status'] = status
+        callback = call.info.get('status_callback')
+        event = STATUS_EVENTS[status]
+        if not callback or not (event in call.events or (event == 'completed' and not call.events)):
+            return
+        params = {**self._call_params(call), 'SequenceNumber': str(next(call.sequence)),
+                  'Timestamp': formatdate(usegmt=True), 'CallbackSource': 'call-progress-events'}
+        if status in FINAL_STATUSES:
+            duration = time.perf_counter() - call.answered_at if call.answered_at else 0
+            params['CallDuration'] = str(int(duration))
+        await self._webhook('status_callback', callback, params)
+
+    def _call_params(self, call: SimulatedCall) -> Dict[str, str]:
+        return {
+            'AccountSid': self.account_sid, 'ApiVersion': API_VERSION, 'CallSid': call.sid,
+            'CallStatus': call.status, 'Direction': call.direction,
+            'From': call.info['from'], 'To': call.info['to'],
+        }
+
+    async def _webhook(self, kind: str, url: str, params: Dict[str, str]) -> Optional[str]:
+        """POST a webhook; the body if the app answered with a 2xx, else None."""
+        url = self._target(url)
+        start = time.perf_counter()
+        try:
+            response = await self.http.post(url, data=params)
+        except httpx.HTTPError as e:
+            self.webhooks.append(WebhookRecord(kind, url, None, time.perf_counter() - start))
+            logger.warning(f"{kind} webhook to {url} failed: {e}")
+            return None
+        self.webhooks.append(WebhookRecord(kind, url, response.status_code, time.perf_counter() - start))
+        if response.status_code >= 400:
+            logger.warning(f"{kind} webhook to {url} returned {response.status_code}")
+            return None
+        return response.text
+
+    # TwiML
+
+    async def _fetch_twiml(self, call: SimulatedCall, url: str) -> Optional[ET.Element]:
+        body = await self._webhook('voice', url, self._call_params(call))
+        if body is None:
+            return None
+        try:
+            return ET.fromstring(body)
+        except ET.ParseError:
+            # What Twilio reads out as "an application error has occurred"
+            logger.warning(f"Call {call.sid} got invalid TwiML from {url}: {body[:100]!r}")
+            return None
+
+    async def _run_twiml(self, call: SimulatedCall, twiml: ET.Element):
+        for verb in twiml:
+            if call.ended.is_set():
+                break
+            if verb.tag == 'Pause':
+                await self._wait(call, float(verb.get('length', 1)))
+            elif verb.tag == 'Say':
+                await self._wait(call, SAY_SECONDS_PER_WORD * len((verb.text or '').split()))
+            elif verb.tag == 'Play':
+                await self._wait(call, PLAY_SECONDS_PER_DIGIT * len(verb.get('digits', '')))
+            elif verb.tag == 'Dial' and verb.find('Conference') is not None:
+                await self._conference(call, verb.find('Conference'))
+            elif verb.tag == 'Connect' and verb.find('Stream') is not None:
+                await self._stream(call, verb.find('Stream').get('url'))
+            elif verb.tag == 'Hangup':
+                break
+            else:
+                logger.warning(f"TwiML <{verb.tag}> is not simulated, skipping it")
+        # Out of TwiML, so the call ends
+        await self.hangup(call)
+
+    async def _wait(self, call: SimulatedCall, seconds: float):
+        """Sleep for a simulated delay, cut short if the call ends."""
+        try:
+            await asyncio.wait_for(call.ended.wait(), seconds * self.time_scale)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _conference(self, call: SimulatedCall, noun: ET.Element):
+        name = noun.text or ''
+        conference = self.conferences.get(name)
+        if conference is None:
+            conference = self.conferences[name] = SimulatedConference(name)
+        if conference.status_callback is None and noun.get('statusCallback'):
+            conference.status_callback = noun.get('statusCallback')
+            conference.events = set(noun.get('statusCallbackEvent', '').split())
+
+        conference.participants[call.sid] = call
+        if len(conference.participants) == 1:
+            await self._conference_event(conference, 'start', call)
+        await self._conference_event(conference, 'join', call)
+        try:
+            await call.ended.wait()
+        finally:
+            del conference.participants[call.sid]
+            await self._conference_event(conference, 'leave', call, ReasonParticipantLeft='participant_hung_up')
+            if not conference.ended and (noun.get('endConferenceOnExit') == 'true' or not conference.participants):
+                conference.ended = True
+                self.conferences.pop(name, None)
+                await self._conference_event(conference, 'end', call)
+                for other in list(conference.participants.values()):
+                    self._spawn(self.hangup(other))
+
+    async def _conference_event(self, conference: SimulatedConference, event: str, call: SimulatedCall, **extra: str):
+        if not conference.status_callback or event not in conference.events:
+            return
+        params = {
+            'AccountSid': self.account_sid, 'ConferenceSid': conference.sid, 'FriendlyName': conference.name,
+            'StatusCallbackEvent': CONFERENCE_EVENTS[event], 'CallSid': call.sid,
+            'SequenceNumber': str(next(conference.sequence)), 'Timestamp': formatdate(usegmt=True), **extra,
+        }
+        await self._webhook('conference_callback', conference.status_callback, params)
+
+    # Media streams
+
+    async def _connect(self, url: str):
+        url = self._target(url)
+        if self.app is not None:
+            return await AsgiWebSocket(self.app, url).connect()
+        return await NetworkWebSocket(url).connect()
+
+    async def _stream(self, call: SimulatedCall, url: str):
+        record = MediaStreamRecord(stream_sid=f"MZ{uuid.uuid4().hex}", call_sid=call.sid, url=url)
+        self.streams.append(record)
+        try:
+            websocket = await self._connect(url)
+        except Exception as e:
+            # Twilio moves on to the next verb when a stream can't connect
+            logger.warning(f"Media stream {url} for call {call.sid} failed to connect: {e}")
+            return
+
+        sequence = itertools.count(1)
+
+        async def send(event: str, **body: Any):
+            await websocket.send(json.dumps({
+                'event': event, 'sequenceNumber': str(next(sequence)), **body, 'streamSid': record.stream_sid,
+            }))
+
+        await websocket.send(json.dumps({'event': 'connected', 'protocol': 'Call', 'version': '1.0.0'}))
+        await send('start', start={
+            'accountSid': self.account_sid, 'streamSid': record.stream_sid, 'callSid': call.sid,
+            'tracks': ['inbound'], 'customParameters': {},
+            'mediaFormat': {'encoding': 'audio/x-mulaw', 'sampleRate': SAMPLE_RATE, 'channels': 1},
+        })
+        record.started_at = time.perf_counter()
+
+        listener = asyncio.create_task(self._listen(websocket, record, send))
+        speaker = asyncio.create_task(self._speak(record, send))
+        hung_up = asyncio.create_task(call.ended.wait())
+        try:
+            # Until the call ends or the app closes the stream
+            await asyncio.wait({listener, hung_up}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            speaker.cancel()
+            hung_up.cancel()
+            if not listener.done():
+                await send('stop', stop={'accountSid': self.account_sid, 'callSid': call.sid})
+                listener.cancel()
+            await asyncio.gather(speaker, hung_up, listener, return_exceptions=True)
+            await websocket.close()
+            record.stopped_at = time.perf_counter()
+
+    async def _speak(self, record: MediaStreamRecord, send):
+        """Stream the utterances, paced in 20ms frames with silence between them."""
+        start = asyncio.get_running_loop().time()
+        frames = itertools.count()
+
+        async def frame(payload: bytes):
+            number = next(frames)
+            # Scheduled from the start, so send delays don't accumulate
+            await asyncio.sleep(max(0.0, start + number * FRAME_SECONDS * self.time_scale - asyncio.get_running_loop().time()))
+            await send('media', media={
+                'track': 'inbound', 'chunk': str(number + 1), 'timestamp': str(int(number * FRAME_SECONDS * 1000)),
+                'payload': base64.b64encode(payload.ljust(FRAME_BYTES, MULAW_SILENCE)).decode('ascii'),
+            })
+            record.frames_sent += 1
+
+        silence = MULAW_SILENCE * FRAME_BYTES
+        for index, utterance in enumerate(self.audio):
+            if index:
+                for _ in range(int(self._sample(self.timing.gap) / FRAME_SECONDS)):
+                    await frame(silence)
+            for offset in range(0, len(utterance), FRAME_BYTES):
+                await frame(utterance[offset:offset + FRAME_BYTES])
+            record.utterances_sent.append(time.perf_counter())
+        # A live line carries silence until the call ends
+        while self.time_scale:
+            await frame(silence)
+
+    async def _listen(self, websocket, record: MediaStreamRecord, send):
+        """Take the app's audio, echoing its marks when the audio queued before them has played."""
+        loop = asyncio.get_running_loop()
+        played_at = loop.time()
+        marks: Dict[asyncio.Task, str] = {}
+
+        async def echo(name: str, delay: float):
+            await asyncio.sleep(delay)
+            record.marks.append(name)
+            await send('mark', mark={'name': name})
+
+        try:
+            while (text := await websocket.recv()) is not None:
+                message = json.loads(text)
+                event = message.get('event')
+                now = loop.time()
+                if event == 'media':
+                    audio = base64.b64decode(message['media']['payload'])
+                    record.media_received.append((time.perf_counter(), len(audio)))
+                    played_at = max(played_at, now) + len(audio) / SAMPLE_RATE * self.time_scale
+                elif event == 'mark':
+                    task = asyncio.create_task(echo(message['mark']['name'], max(0.0, played_at - now)))
+                    marks[task] = message['mark']['name']
+                    task.add_done_callback(lambda done: marks.pop(done, None))
+                elif event == 'clear':
+                    # Buffered audio is dropped and its marks come back straight away
+                    played_at = now
+                    for task, name in list(marks.items()):
+                        task.cancel()
+                        record.marks.append(name)
+                        await send('mark', mark={'name': name})
+        finally:
+            for task in marks:
+                task.cancel()
+
+    def snapshot(self) -> dict:
+        statuses: Dict[str, int] = {}
+        for call in self.calls.values():
+            statuses[call.status] = statuses.get(call.status, 0) + 1
+        return {
+            'calls': statuses,
+            'conferences': len(self.conferences),
+            'webhooks': len(self.webhooks),
+            'webhook_errors': sum(1 for webhook in self.webhooks if not webhook.status or webhook.status >= 400),
+            'streams': len(self.streams),
+            'frames_sent': sum(stream.frames_sent for stream in self.streams),
+            'frames_received': sum(len(stream.media_received) for stream in self.streams),
+        }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8091)
+    parser.add_argument('--app-url', required=True, help='Where the app listens; webhooks and streams go here')
+    parser.add_argument('--number', action='append', default=[], help='A bot number; its calls ring the app')
+    parser.add_argument('--incoming-path', default='/calls/incoming-call')
+    parser.add_argument('--audio', nargs='*', default=[], help='Audio files streamed into each media stream')
+    parser.add_argument('--latency', default='fixed:0.1', help='Latency added to every REST request')
+    parser.add_argument('--time-scale', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    simulator = TwilioSimulator(
+        numbers={number: f"{args.app_url.rstrip('/')}{args.incoming_path}" for number in args.number},
+        audio=[load_mulaw(path) for path in args.audio],
+        time_scale=args.time_scale,
+        app_url=args.app_url,
+        latency=LatencyDistribution.parse(args.latency),
+        seed=args.seed,
+    )
+    uvicorn.run(simulator.rest_app, host=args.host, port=args.port)
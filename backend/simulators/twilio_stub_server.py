@@ -0,0 +1,152 @@
+"""
+Fake Twilio REST API (the Calls resource) for tests and offline benchmarking.
+
+Calls are kept in memory. Latency comes from a `LatencyDistribution`, and failures
+can be queued with `fail_next` to exercise retries. On its own the stub only records
+calls; `TwilioSimulator` (twilio_simulator.py) plugs in to also place them. Point the
+app at it with:
+
+    python -m backend.simulators.twilio_stub_server --port 8091 --latency lognormal:-2.3,0.3
+    TWILIO_API_URL=http://127.0.0.1:8091 python run.py
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from backend.simulators.llm_stub_server import LatencyDistribution
+from backend.services.twilio_rest import API_VERSION
+
+if TYPE_CHECKING:
+    from backend.simulators.twilio_simulator import TwilioSimulator
+
+
+class TwilioStubState:
+    """What the stub has seen and the failures it still has to serve."""
+
+    def __init__(self):
+        self.calls: Dict[str, dict] = {}
+        self.requests: List[Tuple[str, str]] = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._failures: Deque[Tuple[int, Optional[float]]] = deque()
+
+    def fail_next(self, status: int, times: int = 1, retry_after: Optional[float] = None):
+        self._failures.extend([(status, retry_after)] * times)
+
+    def next_failure(self) -> Optional[Tuple[int, Optional[float]]]:
+        return self._failures.popleft() if self._failures else None
+
+
+def _call_json(call: dict) -> dict:
+    return {
+        'sid': call['sid'],
+        'status': call['status'],
+        'to': call['to'],
+        'from': call['from'],
+        'parent_call_sid': None,
+        'uri': f"/{API_VERSION}/Accounts/{call['account_sid']}/Calls/{call['sid']}.json",
+    }
+
+
+def create_twilio_stub_app(latency: LatencyDistribution = None, seed: int = 0, page_size: int = 50,
+                           simulator: Optional["TwilioSimulator"] = None) -> FastAPI:
+    latency = latency or LatencyDistribution()
+    rng = random.Random(seed)
+    app = FastAPI()
+    state = app.state.twilio = TwilioStubState()
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        state.requests.append((request.method, request.url.path))
+        state.in_flight += 1
+        state.peak_in_flight = max(state.peak_in_flight, state.in_flight)
+        try:
+            await asyncio.sleep(latency.sample(rng))
+            failure = state.next_failure()
+            if failure:
+                status, retry_after = failure
+                headers = {'Retry-After': str(retry_after)} if retry_after is not None else {}
+                return JSONResponse({'code': 20429 if status == 429 else 20500, 'message': 'Injected failure',
+                                     'status': status}, status_code=status, headers=headers)
+            return await call_next(request)
+        finally:
+            state.in_flight -= 1
+
+    base = f"/{API_VERSION}/Accounts/{{account_sid}}"
+
+    @app.post(f"{base}/Calls.json")
+    async def create_call(account_sid: str, request: Request):
+        form = await request.form()
+        if not form.get('To') or not form.get('From') or not (form.get('Url') or form.get('Twiml')):
+            return JSONResponse({'code': 21201, 'message': 'To, From and Url are required', 'status': 400}, status_code=400)
+        sid = f"CA{uuid.uuid4().hex}"
+        state.calls[sid] = {
+            'sid': sid, 'account_sid': account_sid, 'status': 'queued', 'to': form['To'], 'from': form['From'],
+            'url': form.get('Url'), 'status_callback': form.get('StatusCallback'),
+            'status_callback_event': form.getlist('StatusCallbackEvent'),
+        }
+        if simulator is not None:
+            simulator.dial(state.calls[sid])
+        return JSONResponse(_call_json(state.calls[sid]), status_code=201)
+
+    @app.get(f"{base}/Calls.json")
+    async def list_calls(account_sid: str, request: Request):
+        query = request.query_params
+        page = int(query.get('Page', 0))
+        size = int(query.get('PageSize', page_size))
+        matching = [
+            call for call in state.calls.values()
+            if all(not query.get(param) or call[field] == query[param]
+                   for param, field in (('From', 'from'), ('To', 'to'), ('Status', 'status')))
+        ]
+        calls = matching[page * size:(page + 1) * size]
+        next_page_uri = None
+        if (page + 1) * size < len(matching):
+            params = {key: value for key, value in query.items() if key not in ('Page', 'PageSize')}
+            params.update(Page=page + 1, PageSize=size)
+            next_page_uri = f"/{API_VERSION}/Accounts/{account_sid}/Calls.json?{urlencode(params)}"
+        return {'calls': [_call_json(call) for call in calls], 'page': page, 'page_size': size,
+                'next_page_uri': next_page_uri}
+
+    @app.get(f"{base}/Calls/{{sid}}.json")
+    async def fetch_call(account_sid: str, sid: str):
+        call = state.calls.get(sid)
+        if call is None:
+            return JSONResponse({'code': 20404, 'message': f'Call {sid} not found', 'status': 404}, status_code=404)
+        return _call_json(call)
+
+    @app.post(f"{base}/Calls/{{sid}}.json")
+    async def update_call(account_sid: str, sid: str, request: Request):
+        call = state.calls.get(sid)
+        if call is None:
+            return JSONResponse({'code': 20404, 'message': f'Call {sid} not found', 'status': 404}, status_code=404)
+        form = await request.form()
+        if simulator is not None:
+            simulator.update(call, form)
+        if form.get('Status'):
+            call['status'] = form['Status']
+        if form.get('Url'):
+            call['url'] = form['Url']
+        return _call_json(call)
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8091)
+    parser.add_argument('--latency', default='fixed:0.1', help='Latency added to every request')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    uvicorn.run(create_twilio_stub_app(LatencyDistribution.parse(args.latency), args.seed), host=args.host, port=args.port)
@@ -0,0 +1,88 @@
+"""
+Compare adaptive model routing against always using the fast or the strong model.
+
+Replays the agent turns of every case in test_cases.json three times (fast only,
+strong only, adaptive) and prints per-route latency and how often each mode picked
+the same response method as the strong model, and how many replies didn't parse
+(usually cut off by max_tokens), as JSON:
+
+    python -m backend.test.evaluate_routing
+"""
+import asyncio
+import json
+import os
+import time
+from unittest.mock import patch
+
+from backend.core.call_manager import CallManager
+from backend.core.constants import ModelRoute
+from backend.models.models import UserInformation
+from backend.services import openai_utils
+
+MODES = {
+    'fast': lambda transcript, history: (ModelRoute.FAST, 'forced'),
+    'strong': lambda transcript, history: (ModelRoute.STRONG, 'forced'),
+    'adaptive': openai_utils.classify_turn,
+}
+
+
+async def run_case(case, classify):
+    """Replay one case's agent turns; returns (route, latency, response_method) per turn."""
+    call_manager = CallManager()
+    session_id = call_manager.create_new_session()
+    call_manager.get_session_by_id(session_id).set_user_info(UserInformation(**case['user_info']))
+
+    chosen = []
+
+    def recording_classify(transcript, history):
+        route, reason = classify(transcript, history)
+        chosen.append(route)
+        return route, reason
+
+    results = []
+    with patch.object(openai_utils, 'classify_turn', recording_classify):
+        for transcript in case['agent_turns']:
+            start = time.perf_counter()
+            reply = await openai_utils.invoke_gpt(transcript, session_id, call_manager)
+            results.append((chosen[-1].value, time.perf_counter() - start, reply.get('response_method')))
+    return results
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+async def evaluate():
+    test_cases_path = os.path.join(os.path.dirname(__file__), 'test_cases.json')
+    with open(test_cases_path, 'r') as f:
+        test_cases = json.load(f)
+    cases = {name: case for name, case in test_cases.items() if case.get('agent_turns')}
+
+    turns = {mode: [] for mode in MODES}
+    for name, case in cases.items():
+        for mode, classify in MODES.items():
+            turns[mode].extend(await run_case(case, classify))
+
+    baseline = [method for _, _, method in turns['strong']]
+    report = {}
+    for mode, results in turns.items():
+        latencies = [latency for _, latency, _ in results]
+        by_route = {}
+        for route, latency, _ in results:
+            by_route.setdefault(route, []).append(latency)
+        report[mode] = {
+            'turns': len(results),
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p95': percentile(latencies, 0.95),
+            'unparsed': sum(method is None for _, _, method in results),
+            'agreement_with_strong': sum(a == b for (_, _, a), b in zip(results, baseline)) / max(1, len(results)),
+            'routes': {route: {'turns': len(values), 'latency_p50': percentile(values, 0.5)} for route, values in by_route.items()},
+        }
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(evaluate()), indent=2))
@@ -1,15 +1,12 @@
 import asyncio
 import json
 import os
-from dotenv import load_dotenv
 
 from backend.core.constants import CallInfo
 from backend.core.call_manager import CallManager
 from backend.models.models import UserInformation
 from backend.services.openai_utils import invoke_gpt
 
-load_dotenv('../env/.env')
-
 async def simulate_conversation(test_case="spotify_double_charge"):
     """Simulate a conversation with the AI assistant"""
     
@@ -0,0 +1,77 @@
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from backend.core.active_calls import ActiveCallIndex
+from backend.services.twilio_rest import AsyncTwilioClient
+from backend.simulators.twilio_stub_server import create_twilio_stub_app
+
+
+BOT = "+15550000001"
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.core.active_calls.logger"), patch("backend.services.twilio_rest.logger"):
+        yield
+
+
+def test_status_callbacks_maintain_the_index():
+    index = ActiveCallIndex()
+    index.update("CA1", "queued", BOT, "+18005550100")
+    index.update("CA2", "in-progress", BOT, BOT)
+    index.update("CA1", "ringing", BOT, "+18005550100")
+    assert index.active(BOT) == {"CA1", "CA2"}
+    assert index.active("+18005550100") == {"CA1"}
+
+    index.update("CA1", "completed", BOT, "+18005550100")
+    index.update("CA3", "not-a-status", BOT)
+    assert index.active(BOT) == {"CA2"}
+    assert index.active("+18005550100") == set()
+    assert len(index) == 1
+
+
+@pytest.mark.asyncio
+async def test_reconcile_fixes_drift_and_ends_orphans_after_a_grace_round():
+    app = create_twilio_stub_app()
+    client = AsyncTwilioClient("AC123", "token", base_url="http://twilio.test", transport=httpx.ASGITransport(app=app))
+    owned_call = await client.calls.create(to="+18005550100", from_=BOT, url="http://example.com/voice")
+    orphan = await client.calls.create(to=BOT, from_=BOT, url="http://example.com/voice")
+    await client.calls(orphan.sid).update(status="in-progress")
+
+    index = ActiveCallIndex(end_orphans=True)
+    index.update("CA_lost", "in-progress", BOT, "+18005550100")  # Its completed callback never came
+
+    async def owned(call_sid):
+        return call_sid == owned_call.sid
+
+    assert await index.reconcile(client, [BOT], owned) == 3
+    assert index.active(BOT) == {owned_call.sid, orphan.sid}
+    assert app.state.twilio.calls[orphan.sid]['status'] == "in-progress"
+
+    assert await index.reconcile(client, [BOT], owned) == 0
+    assert app.state.twilio.calls[orphan.sid]['status'] == "completed"
+    assert index.active(BOT) == {owned_call.sid}
+    assert index.snapshot() == {'active_calls': 1, 'reconciles': 2, 'drift': 3, 'orphans_ended': 1}
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_unowned_calls_are_left_alone_by_default():
+    app = create_twilio_stub_app()
+    client = AsyncTwilioClient("AC123", "token", base_url="http://twilio.test", transport=httpx.ASGITransport(app=app))
+    # Another worker's call on a shared number, or a leg nobody linked
+    other = await client.calls.create(to=BOT, from_=BOT, url="http://example.com/voice")
+    await client.calls(other.sid).update(status="in-progress")
+
+    async def owned(call_sid):
+        return False
+
+    index = ActiveCallIndex()
+    for _ in range(3):
+        await index.reconcile(client, [BOT], owned)
+    assert app.state.twilio.calls[other.sid]['status'] == "in-progress"
+    assert index.active(BOT) == {other.sid}
+    assert index.snapshot()['orphans_ended'] == 0
+    await client.aclose()
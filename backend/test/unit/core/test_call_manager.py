@@ -1,3 +1,6 @@
+import asyncio
+import threading
+
 import pytest
 from unittest.mock import patch
 from backend.core.call_manager import CallManager
@@ -108,10 +111,10 @@ def test_link_call_to_session_user(call_manager):
         "USER call SID should match the callSid used in link_call_to_session."
 
     # Check _number_to_session mapping is updated
-    # The internal structure is a list of (session_id, call_sid) tuples.
-    stored_entries = call_manager._number_to_session.get(call_number, [])
-    assert len(stored_entries) == 1, "Expected exactly one (session_id, call_sid) entry."
-    assert stored_entries[0] == (session_id, call_sid), "The stored entry should match the linked session/call."
+    # The internal structure maps session_id -> call SIDs linked on that number.
+    stored_entries = call_manager._number_to_session.get(call_number, {})
+    assert len(stored_entries) == 1, "Expected exactly one session entry."
+    assert stored_entries[session_id] == [call_sid], "The stored entry should match the linked session/call."
 
 
 def test_get_session_by_call_sid_invalid(call_manager):
@@ -257,8 +260,97 @@ def test_delete_session(call_manager):
     # (or accept that it's not cleared automatically). We'll just verify the session_id 
     # is no longer there.
     if bot_number in call_manager._number_to_session:
-        for sid_tuple in call_manager._number_to_session[bot_number]:
-            assert sid_tuple[0] != session_id, "Deleted session should not be referenced."
+        assert session_id not in call_manager._number_to_session[bot_number], "Deleted session should not be referenced."
     if user_number in call_manager._number_to_session:
-        for sid_tuple in call_manager._number_to_session[user_number]:
-            assert sid_tuple[0] != session_id, "Deleted session should not be referenced."
\ No newline at end of file
+        assert session_id not in call_manager._number_to_session[user_number], "Deleted session should not be referenced."
+    shard = call_manager._shard(session_id)
+    assert session_id not in shard.session_calls
+    assert session_id not in shard.session_numbers
+
+
+def test_delete_session_keeps_other_sessions_on_shared_number(call_manager):
+    """
+    Deleting one session must leave other sessions linked on the same number intact.
+    """
+    bot_number = "+18880001111"
+    session_1 = call_manager.create_new_session()
+    session_2 = call_manager.create_new_session()
+    call_manager.link_call_to_session("sid_1", bot_number, session_1, CallType.CONFERENCE, is_outbound=True)
+    call_manager.link_call_to_session("sid_2", bot_number, session_2, CallType.CONFERENCE, is_outbound=True)
+
+    call_manager.delete_session(session_1)
+
+    assert call_manager.get_session_by_number(bot_number).session_id == session_2
+    assert call_manager.get_session_by_call_sid("sid_2").session_id == session_2
+    assert call_manager.check_session_exists([bot_number]) == (bot_number, [(session_2, "sid_2")])
+
+
+def test_concurrent_threads_lose_no_updates(mock_logger):
+    """
+    Threads creating, linking and deleting sessions on shared numbers must leave every
+    index consistent with the sessions that survive.
+    """
+    call_manager = CallManager(shards=4)
+    survivors = [[] for _ in range(8)]
+
+    def worker(index):
+        for i in range(200):
+            session_id = call_manager.create_new_session()
+            # Numbers are shared across threads so the number index sees contention
+            call_manager.link_call_to_session(f"bot_{index}_{i}", f"+1555000{i % 7:04d}", session_id, CallType.CONFERENCE, is_outbound=True)
+            call_manager.link_call_to_session(f"cs_{index}_{i}", f"+1666000{i % 5:04d}", session_id, CallType.CUSTOMER_SERVICE)
+            call_manager.get_session_by_id(session_id).add_to_chat_history("user", str(i))
+            if i % 2:
+                call_manager.delete_session(session_id)
+            else:
+                survivors[index].append(session_id)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected = {session_id for ids in survivors for session_id in ids}
+    assert call_manager.session_count() == len(expected) == 800
+    assert set(call_manager._call_to_session.values()) == expected
+    assert len(call_manager._call_to_session) == 2 * len(expected)
+    indexed = {session_id for sessions in call_manager._number_to_session.values() for session_id in sessions}
+    assert indexed == expected
+    for session_id in expected:
+        session_data = call_manager.get_session_by_id(session_id)
+        assert call_manager.get_session_by_call_sid(session_data.get_call_sid(CallType.CONFERENCE)) is session_data
+        assert len(session_data.get_chat_history()) == 1
+
+
+@pytest.mark.asyncio
+async def test_session_lock_keeps_concurrent_turns_together(call_manager):
+    """
+    Turns that await between writing the user message and the reply must not interleave.
+    """
+    session_id = call_manager.create_new_session()
+    other_id = call_manager.create_new_session()
+    session_data = call_manager.get_session_by_id(session_id)
+
+    async def turn(i):
+        async with call_manager.session_lock(session_id):
+            session_data.add_to_chat_history("user", str(i))
+            await asyncio.sleep(0)
+            session_data.add_to_chat_history("assistant", str(i))
+
+    async def other_turn():
+        # A different session is never blocked by the busy one
+        async with call_manager.session_lock(other_id):
+            return True
+
+    results = await asyncio.gather(*(turn(i) for i in range(50)), asyncio.wait_for(other_turn(), 1))
+    assert results[-1] is True
+
+    history = session_data.get_chat_history()
+    assert len(history) == 100
+    for user, assistant in zip(history[::2], history[1::2]):
+        assert (user.role, assistant.role) == ("user", "assistant")
+        assert user.content == assistant.content
+
+    call_manager.delete_session(session_id)
+    assert session_id not in call_manager._shard(session_id).turn_locks
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.core.event_pipeline import EventPipeline
+from backend.models.models import CallStatusEvent
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.core.event_pipeline.logger") as mock_log:
+        yield mock_log
+
+
+@pytest.mark.asyncio
+async def test_events_for_a_session_apply_in_order_and_sessions_run_concurrently():
+    pipeline = EventPipeline()
+    applied = []
+    running = set()
+    overlap = []
+
+    async def handler(event):
+        key, n = event
+        running.add(key)
+        overlap.append(len(running))
+        await asyncio.sleep(0.01 * (3 - n))  # Later events finish faster if run out of order
+        applied.append(event)
+        running.discard(key)
+
+    for n in range(3):
+        for key in ("a", "b"):
+            assert pipeline.submit(key, handler, (key, n))
+    await pipeline.drain()
+
+    assert [n for key, n in applied if key == "a"] == [0, 1, 2]
+    assert [n for key, n in applied if key == "b"] == [0, 1, 2]
+    assert max(overlap) == 2
+    snapshot = pipeline.snapshot()
+    assert (snapshot['pending'], snapshot['consumers'], snapshot['processed']) == (0, 0, 6)
+    assert snapshot['lag_seconds']['max'] >= 0.02
+
+
+@pytest.mark.asyncio
+async def test_a_failing_event_does_not_stop_the_session(mock_logger):
+    pipeline = EventPipeline()
+    applied = []
+
+    async def handler(event):
+        if event == "bad":
+            raise ValueError("bad event")
+        applied.append(event)
+
+    for event in ("first", "bad", "last"):
+        pipeline.submit("a", handler, event)
+    await pipeline.drain()
+
+    assert applied == ["first", "last"]
+    assert pipeline.failed == 1
+    mock_logger.error.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_rejects_events_when_full():
+    pipeline = EventPipeline(max_pending=2)
+
+    async def handler(event):
+        pass
+
+    assert pipeline.submit("a", handler, 1)
+    assert pipeline.submit("b", handler, 2)
+    assert not pipeline.submit("c", handler, 3)
+    await pipeline.drain()
+    assert pipeline.submit("c", handler, 3)
+    await pipeline.drain()
+    assert (pipeline.processed, pipeline.rejected) == (3, 1)
+
+
+def test_webhook_replies_before_the_event_is_applied():
+    from backend.routes import conference_router as router
+
+    pipeline = EventPipeline()
+    applied = []
+
+    async def slow_apply(event: CallStatusEvent):
+        await asyncio.sleep(0.2)
+        applied.append(event)
+
+    app = FastAPI()
+    app.include_router(router.conference_router, prefix="/conference")
+    with patch.object(router, "event_pipeline", pipeline), patch.object(router, "apply_call_event", slow_apply), \
+            patch("backend.core.webhook_dedupe.logger"), TestClient(app) as client:
+        start = time.perf_counter()
+        for n in range(5):
+            response = client.post("/conference/call_events/s1", data={'CallSid': 'CA1', 'CallStatus': 'ringing', 'SequenceNumber': str(n)})
+            assert response.status_code == 200
+        assert time.perf_counter() - start < 0.2
+        assert not applied
+
+        assert client.post("/conference/call_events/s1", data={'CallSid': 'CA1'}).status_code == 400
+        client.portal.call(pipeline.drain)
+        assert [event.session_id for event in applied] == ["s1"] * 5
@@ -0,0 +1,68 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from backend.core import loop_watchdog as watchdog_module
+from backend.core.loop_watchdog import LoopWatchdog
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.core.loop_watchdog.logger") as mock_log:
+        yield mock_log
+
+
+async def blocking_turn(session_id: str, seconds: float):
+    call_sid = "CA123"
+    time.sleep(seconds)  # The kind of call that should have been awaited
+    return call_sid
+
+
+@pytest.mark.asyncio
+async def test_a_blocked_loop_is_reported_with_its_stack_and_session(mock_logger):
+    watchdog = LoopWatchdog(interval=0.02, threshold=0.1)
+    watchdog.start()
+    try:
+        await asyncio.sleep(0.05)
+        await asyncio.create_task(blocking_turn("session-1", 0.3), name="turn-1")
+        await asyncio.sleep(0.05)
+    finally:
+        await watchdog.stop()
+
+    assert watchdog.stalls == 1
+    assert 0.2 < watchdog.max_lag < 0.5
+    mock_logger.bind.assert_called_once_with(session_id="session-1", call_sid="CA123")
+    message = mock_logger.bind.return_value.warning.call_args.args[0]
+    assert message.startswith("Event loop blocked for ")
+    assert "test_loop_watchdog.blocking_turn (task turn-1)" in message
+    assert "time.sleep(seconds)" in message
+    assert watchdog_module.loop_stalls_total._values[("test_loop_watchdog.blocking_turn",)] >= 1
+
+
+@pytest.mark.asyncio
+async def test_an_idle_loop_reports_nothing(mock_logger):
+    watchdog = LoopWatchdog(interval=0.02, threshold=0.1)
+    watchdog.start()
+    await asyncio.sleep(0.2)
+    await watchdog.stop()
+
+    assert watchdog.stalls == 0
+    assert watchdog.snapshot()['running'] is False
+    mock_logger.warning.assert_not_called()
+    mock_logger.bind.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_a_loop_that_stays_blocked_is_reported_while_still_blocked(mock_logger):
+    watchdog = LoopWatchdog(interval=0.02, threshold=0.05, stuck_seconds=0.15)
+    watchdog.start()
+    try:
+        await asyncio.sleep(0.05)
+        time.sleep(0.4)
+        # The watchdog thread already reported it, before the loop came back
+        mock_logger.bind.return_value.error.assert_called_once()
+        assert "Event loop still blocked after" in mock_logger.bind.return_value.error.call_args.args[0]
+    finally:
+        await watchdog.stop()
@@ -0,0 +1,53 @@
+from unittest.mock import patch
+
+from backend.core.metrics import MetricsRegistry, gauge
+
+
+def test_histogram_buckets_are_cumulative_per_label():
+    registry = MetricsRegistry(prefix='test_')
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 0.5), labelnames=('stage',))
+    latency.observe(0.05, 'stt')
+    latency.observe(0.1, 'stt')  # Bucket bounds are inclusive
+    latency.observe(0.3, 'stt')
+    latency.observe(2.0, 'stt')
+    latency.observe(0.2, 'llm')
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ['# HELP test_latency_seconds Latency', '# TYPE test_latency_seconds histogram']
+    assert 'test_latency_seconds_bucket{stage="stt",le="0.1"} 2' in lines
+    assert 'test_latency_seconds_bucket{stage="stt",le="0.5"} 3' in lines
+    assert 'test_latency_seconds_bucket{stage="stt",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_sum{stage="stt"} 2.45' in lines
+    assert 'test_latency_seconds_count{stage="stt"} 4' in lines
+    assert 'test_latency_seconds_bucket{stage="llm",le="0.1"} 0' in lines
+    assert 'test_latency_seconds_count{stage="llm"} 1' in lines
+
+
+def test_counters_and_collected_gauges():
+    registry = MetricsRegistry(prefix='test_')
+    turns = registry.counter('turns', 'Turns')
+    sent = registry.counter('sent', 'Messages sent', labelnames=('event',))
+    sent.inc('media')
+    sent.inc('media', amount=2)
+
+    @registry.collector
+    def queues():
+        yield gauge('queue_depth', 'Queued "work"\nby kind', {'high': 1, 'low': 0}, label='priority')
+
+    @registry.collector
+    def broken():
+        raise RuntimeError("unavailable")
+        yield
+
+    with patch("backend.core.metrics.logger") as mock_log:
+        text = registry.render()
+    mock_log.error.assert_called_once()
+
+    assert text.endswith('\n')
+    lines = text.splitlines()
+    assert '# TYPE test_turns_total counter' in lines
+    assert 'test_turns_total 0' in lines  # Exposed before the first increment
+    assert 'test_sent_total{event="media"} 3' in lines
+    assert '# HELP test_queue_depth Queued "work"\\nby kind' in lines
+    assert 'test_queue_depth{priority="high"} 1' in lines
+    assert 'test_queue_depth{priority="low"} 0' in lines
@@ -0,0 +1,154 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.core.call_manager import CallManager
+from backend.core.constants import EvictionReason
+from backend.core.number_pool import NumberPool, NumberPoolExhausted
+from backend.core.session_lifecycle import SessionLifecycle
+
+
+USER_INFO = {"user_name": "John", "user_email": "j@example.com", "reason_for_call": "Refund", "account_number": "1"}
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.core.number_pool.logger"), patch("backend.core.call_manager.logger"), \
+            patch("backend.core.session_lifecycle.logger"), patch("backend.routes.bot_call_router.logger"):
+        yield
+
+
+def test_reserves_least_loaded_then_least_recently_used():
+    pool = NumberPool(["+1", "+2", "+3"], capacity=2)
+
+    assert [pool.reserve(f"s{i}") for i in range(3)] == ["+1", "+2", "+3"]
+    pool.release("s1")  # +2 is idle again, but most recently used of the idle ones
+    pool.release("s0")
+    assert pool.reserve("s3") == "+2"
+    assert pool.reserve("s4") == "+1"
+    # Every number now carries one call; the second round starts with the oldest load
+    assert [pool.reserve(f"s{i}") for i in range(5, 8)] == ["+3", "+2", "+1"]
+    with pytest.raises(NumberPoolExhausted):
+        pool.reserve("s8")
+    assert pool.snapshot() == {'numbers': 3, 'capacity': 6, 'reserved': 6, 'awaiting_inbound': 0, 'exhausted': 1}
+
+
+def test_requested_number_joins_the_pool_and_respects_capacity():
+    pool = NumberPool([], capacity=1)
+
+    assert pool.reserve("s0", "+15550001111") == "+15550001111"
+    assert "+15550001111" in pool
+    assert pool.reserve("s0") == "+15550001111"  # Idempotent per session
+    with pytest.raises(NumberPoolExhausted):
+        pool.reserve("s1", "+15550001111")
+
+    assert pool.release("s0") == "+15550001111"
+    assert pool.release("s0") is None
+    assert pool.reserve("s1") == "+15550001111"
+
+
+def test_inbound_calls_are_keyed_by_caller_number_and_sid():
+    pool = NumberPool(["+1", "+2"], capacity=2)
+    pool.reserve("s0", "+1")
+    pool.reserve("s1", "+1")
+    assert (pool.caller_for("s0"), pool.caller_for("s1")) == ("+1", "+2")
+    pool.expect_inbound("+1", "s0")
+    pool.expect_inbound("+1", "s1")
+
+    # The second session's leg arrives first and still finds its own session
+    assert pool.claim_inbound("+1", "CA_b", caller="+2") == "s1"
+    assert pool.claim_inbound("+1", "CA_a", caller="+1") == "s0"
+    assert pool.claim_inbound("+1", "CA_a", caller="+1") == "s0"  # Webhook retry
+    assert pool.claim_inbound("+1", "CA_c", caller="+2") is None
+
+    pool.release("s0")
+    assert pool.claim_inbound("+1", "CA_a") is None
+    # The released caller is free for the next session on the number
+    pool.reserve("s2", "+1")
+    assert pool.caller_for("s2") == "+1"
+
+
+def test_capacity_is_bounded_by_distinct_callers():
+    pool = NumberPool(["+1"], capacity=2)
+    pool.reserve("s0")
+    with pytest.raises(NumberPoolExhausted):
+        pool.reserve("s1")
+    assert pool.snapshot()['reserved'] == 1
+
+
+@pytest.mark.asyncio
+async def test_teardown_releases_the_number():
+    pool = NumberPool(["+1"])
+    call_manager = CallManager()
+    lifecycle = SessionLifecycle(call_manager)
+    lifecycle.on_teardown(lambda session_id, _: pool.release(session_id))
+
+    session_id = call_manager.create_new_session()
+    pool.reserve(session_id)
+    with pytest.raises(NumberPoolExhausted):
+        pool.reserve("other")
+
+    await lifecycle.teardown(session_id, EvictionReason.COMPLETED)
+    assert pool.reserve("other") == "+1"
+
+
+def test_concurrent_calls_scale_with_the_pool():
+    from backend.routes import bot_call_router as router
+
+    pool = NumberPool(["+15550000001", "+15550000002"])
+    sids = iter(f"CA{i}" for i in range(100))
+    create_call = AsyncMock(side_effect=lambda *args, **kwargs: SimpleNamespace(sid=next(sids)))
+    call_manager = CallManager()
+    app = FastAPI()
+    app.include_router(router.bot_call_router, prefix="/calls")
+
+    with patch.object(router, "bot_number_pool", pool), patch.object(router, "call_manager", call_manager), \
+            patch.object(router, "create_call", create_call):
+        client = TestClient(app)
+        sessions = []
+        for i in range(3):
+            response = client.post("/calls/initiate-call", json={
+                "cs_number": "+18005550100", "user_number": f"+1777000000{i}", "user_info": USER_INFO})
+            sessions.append(response)
+
+        assert [response.status_code for response in sessions] == [200, 200, 503]
+        first, second = (response.json() for response in sessions[:2])
+        assert {first["bot_number"], second["bot_number"]} == {"+15550000001", "+15550000002"}
+
+        # Each number's inbound stream leg finds its own session
+        for body in (second, first):
+            response = client.post("/calls/incoming-call", data={
+                "CallSid": f"IN_{body['session_id']}", "From": body["bot_number"], "To": body["bot_number"]})
+            assert response.status_code == 200
+            assert call_manager.get_session_by_call_sid(f"IN_{body['session_id']}").session_id == body["session_id"]
+
+
+def test_sessions_sharing_a_number_are_matched_by_caller():
+    from backend.routes import bot_call_router as router
+
+    pool = NumberPool(["+15550000001", "+15550000002"], capacity=2)
+    call_manager = CallManager()
+    app = FastAPI()
+    app.include_router(router.bot_call_router, prefix="/calls")
+    sids = iter(f"CA{i}" for i in range(100))
+    create_call = AsyncMock(side_effect=lambda *args, **kwargs: SimpleNamespace(sid=next(sids)))
+
+    with patch.object(router, "bot_number_pool", pool), patch.object(router, "call_manager", call_manager), \
+            patch.object(router, "create_call", create_call):
+        client = TestClient(app)
+        sessions = [client.post("/calls/initiate-call", json={
+            "cs_number": "+18005550100", "user_number": f"+1777000000{i}", "user_info": USER_INFO,
+            "bot_number": "+15550000001"}).json() for i in range(2)]
+
+        bot_legs = [call.kwargs for call in create_call.call_args_list if call.kwargs["to"] == "+15550000001"]
+        assert [leg["from_"] for leg in bot_legs] == ["+15550000001", "+15550000002"]
+
+        # Legs come in out of order; each still reaches the session that dialled it
+        for body, caller in ((sessions[1], "+15550000002"), (sessions[0], "+15550000001")):
+            response = client.post("/calls/incoming-call", data={
+                "CallSid": f"IN_{body['session_id']}", "From": caller, "To": "+15550000001"})
+            assert response.status_code == 200
+            assert call_manager.get_session_by_call_sid(f"IN_{body['session_id']}").session_id == body["session_id"]
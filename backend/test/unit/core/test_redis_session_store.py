@@ -0,0 +1,188 @@
+import asyncio
+import threading
+
+import pytest
+from unittest.mock import patch
+
+from backend.core.constants import CallType
+from backend.core.redis_session_store import RedisSessionStore
+from backend.core.session_store import call_store
+from backend.models.models import UserInformation
+from backend.simulators.local_redis import LocalRedis
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.core.redis_session_store.logger") as mock_log:
+        yield mock_log
+
+
+@pytest.fixture
+def server():
+    return LocalRedis()
+
+
+@pytest.fixture
+def workers(server):
+    """Two stores sharing one server, as two worker processes would."""
+    return RedisSessionStore(server), RedisSessionStore(server)
+
+
+def start_call(store):
+    session_id = store.create_new_session()
+    store.link_call_to_session("bot_sid", "+15550001111", session_id, CallType.CONFERENCE, is_outbound=True)
+    store.link_call_to_session("cs_sid", "+15550002222", session_id, CallType.CUSTOMER_SERVICE)
+    return session_id
+
+
+def test_any_worker_finds_the_session(workers):
+    first, second = workers
+    session_id = start_call(first)
+
+    by_sid = second.get_session_by_call_sid("cs_sid")
+    assert by_sid.session_id == session_id
+    assert by_sid.get_call_sid(CallType.CONFERENCE) == "bot_sid"
+    assert by_sid.call_sids.get_direction(CallType.CONFERENCE).value == "outbound"
+    assert second.get_session_by_number("+15550001111").session_id == session_id
+    assert second.check_session_exists(["+19990000000", "+15550002222"]) == ("+15550002222", [(session_id, "cs_sid")])
+    assert second.get_call_sids(session_id) == {"bot_sid", "cs_sid"}
+
+
+def test_saved_fields_are_visible_to_other_workers(workers):
+    first, second = workers
+    session_id = start_call(first)
+
+    session_data = first.get_session_by_id(session_id)
+    session_data.set_user_info(UserInformation(user_name="John", user_email="j@example.com", reason_for_call="Refund", account_number="42"))
+    session_data.add_to_chat_history("user", "Hello")
+    first.save_session(session_data, 'user_info', 'chat_history')
+
+    # A save of one field never clobbers another worker's save of a different one
+    stale = second.get_session_by_id(session_id)
+    stale.set_ready_for_stream()
+    second.save_session(stale, 'ready_for_stream')
+
+    merged = first.get_session_by_id(session_id)
+    assert merged.is_ready_for_stream()
+    assert merged.get_user_info().user_name == "John"
+    assert [(message.role, message.content) for message in merged.get_chat_history()] == [("user", "Hello")]
+
+    merged.unset_ready_for_stream()
+    first.save_session(merged, 'ready_for_stream')
+    assert not second.get_session_by_id(session_id).is_ready_for_stream()
+
+
+def test_link_and_lookup_are_single_round_trips(server, workers):
+    store, _ = workers
+    session_id = store.create_new_session()
+    before = server.round_trips
+    store.link_call_to_session("cs_sid", "+15550002222", session_id, CallType.CUSTOMER_SERVICE)
+    assert server.round_trips - before == 2, "Existence check plus one pipeline"
+
+    before = server.round_trips
+    store.get_session_by_id(session_id)
+    assert server.round_trips - before == 1
+
+
+def test_delete_clears_every_key(server, workers):
+    first, second = workers
+    session_id = start_call(first)
+    other_id = second.create_new_session()
+    second.link_call_to_session("other_sid", "+15550001111", other_id, CallType.CONFERENCE, is_outbound=True)
+    assert second.get_session_by_number("+15550001111") is None, "Two sessions share the bot number"
+
+    second.finish_call(session_id, "cs_sid")
+    second.delete_session(session_id)
+
+    assert first.get_session_by_id(session_id) is None
+    assert first.get_session_by_call_sid("cs_sid") is None
+    assert first.get_session_by_number("+15550001111").session_id == other_id
+    assert first.session_count() == 1
+    assert not [key for key in server._data if session_id in key]
+
+
+def test_finish_call_is_shared(workers):
+    first, second = workers
+    session_id = start_call(first)
+    assert first.finish_call(session_id, "bot_sid") == {"bot_sid"}
+    assert second.finish_call(session_id, "unknown_sid") == set()
+    assert second.finish_call(session_id, "cs_sid") == {"bot_sid", "cs_sid"}
+
+
+def test_chat_history_is_appended(server, workers):
+    first, second = workers
+    session_id = start_call(first)
+
+    session_data = first.get_session_by_id(session_id)
+    session_data.add_to_chat_history("user", "Hello")
+    first.save_session(session_data, 'chat_history')
+    session_data = second.get_session_by_id(session_id)
+    session_data.add_to_chat_history("assistant", "Hi")
+    second.save_session(session_data, 'chat_history')
+    second.save_session(session_data, 'chat_history')
+
+    assert server.lrange(f"callbot:chat:{session_id}", 0, -1) == ['["user","Hello"]', '["assistant","Hi"]']
+    assert "chat" not in server.hgetall(f"callbot:session:{session_id}")
+    assert [message.content for message in first.list_sessions()[0].get_chat_history()] == ["Hello", "Hi"]
+
+
+def test_changing_the_user_number_moves_the_session(workers):
+    first, second = workers
+    session_id = start_call(first)
+    session_data = first.get_session_by_id(session_id)
+    session_data.set_user_number("+17770000000")
+    first.save_session(session_data, 'user_number')
+
+    session_data.set_user_number("+17770000001")
+    first.save_session(session_data, 'user_number')
+    assert second.get_sessions_by_user_number("+17770000000") == []
+    assert second.get_sessions_by_user_number("+17770000001") == [session_id]
+
+
+def test_state_for_sessions_deleted_elsewhere_is_dropped(workers):
+    first, second = workers
+    session_id = start_call(first)
+    first.session_lock(session_id)
+    first.get_session_by_id(session_id)
+    other_id = start_call(first)
+    first.session_lock(other_id)
+    first.get_session_by_id(other_id)
+
+    second.delete_session(session_id)
+    second.delete_session(other_id)
+    assert first.get_session_by_id(session_id) is None  # A miss drops it
+    first.list_sessions()  # So does the sweep
+    assert first._turn_locks == {} and first._saved_chat == {}
+
+
+@pytest.mark.asyncio
+async def test_turn_lock_is_shared_across_workers(workers):
+    first, second = workers
+    session_id = start_call(first)
+    entered = asyncio.Event()
+
+    async def other_worker_turn():
+        async with second.session_lock(session_id):
+            entered.set()
+
+    async with first.session_lock(session_id):
+        waiting = asyncio.create_task(other_worker_turn())
+        await asyncio.sleep(0.1)
+        assert not entered.is_set(), "The other worker waits for this turn"
+    await asyncio.wait_for(waiting, 1)
+    assert entered.is_set()
+
+
+class RecordingStore(RedisSessionStore):
+    def get_session_by_id(self, session_id):
+        self.thread = threading.get_ident()
+        return super().get_session_by_id(session_id)
+
+
+@pytest.mark.asyncio
+async def test_call_store_runs_off_the_event_loop(server):
+    store = RecordingStore(server)
+    session_id = store.create_new_session()
+    session_data = await call_store(store.get_session_by_id, session_id)
+    assert session_data.session_id == session_id
+    assert store.thread != threading.get_ident()
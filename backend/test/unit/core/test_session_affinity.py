@@ -0,0 +1,77 @@
+import uuid
+from collections import Counter
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from backend.core.session_affinity import HashRing, SessionAffinity, SessionAffinityMiddleware
+
+
+WORKERS = ["w0", "w1", "w2", "w3"]
+
+
+@pytest.fixture
+def affinity():
+    return SessionAffinity("w1", WORKERS)
+
+
+def test_ring_spreads_sessions_evenly():
+    ring = HashRing(WORKERS)
+    counts = Counter(ring.owner(str(uuid.uuid4())) for _ in range(8000))
+    assert set(counts) == set(WORKERS)
+    assert max(counts.values()) < 1.4 * min(counts.values())
+
+
+def test_adding_a_worker_only_moves_its_share():
+    before, after = HashRing(WORKERS), HashRing(WORKERS + ["w4"])
+    session_ids = [str(uuid.uuid4()) for _ in range(5000)]
+    moved = [session_id for session_id in session_ids if before.owner(session_id) != after.owner(session_id)]
+    assert all(after.owner(session_id) == "w4" for session_id in moved)
+    assert len(moved) < 0.3 * len(session_ids)
+
+
+def test_new_sessions_are_owned_locally(affinity):
+    for _ in range(50):
+        assert affinity.owner(affinity.new_session_id()) == "w1"
+
+
+def test_urls_carry_the_owner(affinity):
+    session_id = affinity.new_session_id()
+    assert affinity.url("example.com", session_id, f"/media/media-stream/{session_id}", scheme="wss") == \
+        f"wss://example.com/w/w1/media/media-stream/{session_id}"
+    assert affinity.split(f"/w/w1/conference/call_events") == ("w1", "/conference/call_events")
+    assert affinity.split("/calls/incoming-call") == (None, "/calls/incoming-call")
+
+    single = SessionAffinity("w0", ["w0"])
+    assert single.url("example.com", session_id, "/conference/call_events") == "https://example.com/conference/call_events"
+
+
+def test_middleware_strips_prefix_and_refuses_misroutes(affinity):
+    app = FastAPI()
+
+    @app.post("/conference/call_events")
+    async def call_events():
+        return {"ok": True}
+
+    @app.websocket("/media/media-stream/{session_id}")
+    async def media_stream(websocket: WebSocket, session_id: str):
+        await websocket.accept()
+        await websocket.send_text(session_id)
+        await websocket.close()
+
+    with patch("backend.core.session_affinity.logger"):
+        client = TestClient(SessionAffinityMiddleware(app, affinity))
+        assert client.post("/w/w1/conference/call_events").json() == {"ok": True}
+        assert affinity.misrouted == 0
+        assert client.post("/w/w3/conference/call_events").status_code == 409
+        assert affinity.misrouted == 1
+        with client.websocket_connect("/w/w1/media/media-stream/abc") as websocket:
+            assert websocket.receive_text() == "abc"
+        with pytest.raises(WebSocketDisconnect) as refused:
+            with client.websocket_connect("/w/w2/media/media-stream/abc"):
+                pass
+        assert refused.value.code == 1008
+        assert affinity.misrouted == 2
@@ -0,0 +1,125 @@
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from backend.core.call_manager import CallManager
+from backend.core.constants import CallType
+from backend.core.session_journal import SessionJournal
+from backend.models.models import UserInformation
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.core.call_manager.logger"), patch("backend.core.session_journal.logger") as mock_log:
+        yield mock_log
+
+
+def state(call_manager):
+    """Everything a restart has to bring back."""
+    sessions = {session_data.session_id: session_data.to_record() for session_data in call_manager.list_sessions()}
+    finished = {session_id: shard.finished_calls.get(session_id) for shard in call_manager._shards for session_id in shard.sessions}
+    return sessions, dict(call_manager._call_to_session), call_manager._number_to_session, finished
+
+
+def run_call(call_manager, i):
+    session_id = call_manager.create_new_session()
+    call_manager.link_call_to_session(f"bot_{i}", "+15550001111", session_id, CallType.CONFERENCE, is_outbound=True)
+    call_manager.link_call_to_session(f"cs_{i}", f"+1666{i:07d}", session_id, CallType.CUSTOMER_SERVICE)
+
+    session_data = call_manager.get_session_by_id(session_id)
+    session_data.set_user_info(UserInformation(user_name="John", user_email="j@example.com", reason_for_call="Refund", account_number=str(i)))
+    session_data.set_cs_number(f"+1666{i:07d}")
+    call_manager.save_session(session_data, 'user_info', 'cs_number')
+    session_data.set_ready_for_stream()
+    session_data.set_twilio_stream_sid(f"MZ{i}")
+    call_manager.save_session(session_data, 'ready_for_stream', 'meta_call_sids')
+    for turn in range(3):
+        session_data.add_to_chat_history("user", f"Question {turn}")
+        call_manager.save_session(session_data, 'chat_history', 'last_activity')
+        session_data.add_to_chat_history("assistant", '{"response_method": "noop", "response_content": ""}')
+        call_manager.save_session(session_data, 'chat_history', 'last_activity')
+    call_manager.finish_call(session_id, f"bot_{i}")
+    return session_id
+
+
+def test_sessions_survive_a_crash(tmp_path):
+    journal = SessionJournal(str(tmp_path))
+    call_manager = CallManager(journal=journal)
+    session_ids = [run_call(call_manager, i) for i in range(5)]
+    call_manager.delete_session(session_ids[0])
+    journal.flush()  # The writer thread's last batch; no clean close
+
+    restored = CallManager(journal=SessionJournal(str(tmp_path)))
+    assert restored.restore() > 0
+    assert state(restored) == state(call_manager)
+    assert restored.get_session_by_call_sid("cs_3").get_chat_history()[-1].role == "assistant"
+    assert restored.get_session_by_id(session_ids[0]) is None
+
+    # Chat saves after the restore only journal new messages
+    session_data = restored.get_session_by_id(session_ids[1])
+    session_data.add_to_chat_history("user", "After restart")
+    restored.save_session(session_data, 'chat_history')
+    restored.close()
+
+    again = CallManager(journal=SessionJournal(str(tmp_path)))
+    again.restore()
+    assert [message.content for message in again.get_session_by_id(session_ids[1]).get_chat_history()][-2:] == \
+        ['{"response_method": "noop", "response_content": ""}', "After restart"]
+    again.close()
+
+
+def test_compaction_folds_segments_into_a_snapshot(tmp_path):
+    journal = SessionJournal(str(tmp_path), fsync='never', compact_bytes=4000)
+    call_manager = CallManager(journal=journal)
+    session_ids = [run_call(call_manager, i) for i in range(20)]
+    for session_id in session_ids[:10]:
+        call_manager.delete_session(session_id)
+        journal.flush()
+    journal.close()
+
+    assert journal.snapshots >= 1
+    assert os.path.exists(tmp_path / "snapshot.jsonl")
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("journal.")]) < journal.batches
+
+    restored = CallManager(journal=SessionJournal(str(tmp_path)))
+    restored.restore()
+    assert state(restored) == state(call_manager)
+    restored.close()
+
+
+def test_torn_last_line_is_skipped(tmp_path, mock_logger):
+    journal = SessionJournal(str(tmp_path), fsync='always')
+    call_manager = CallManager(journal=journal)
+    session_id = run_call(call_manager, 0)
+    journal.close()
+    with open(journal._segment_path(journal._segment), 'ab') as f:
+        f.write(b'["m","' + session_id.encode() + b'","user","Hal')
+
+    restored = CallManager(journal=SessionJournal(str(tmp_path)))
+    restored.restore()
+    assert state(restored) == state(call_manager)
+    mock_logger.error.assert_called_once()
+    restored.close()
+
+
+def test_replays_thousands_of_sessions_quickly(tmp_path):
+    journal = SessionJournal(str(tmp_path), fsync='never')
+    call_manager = CallManager(journal=journal)
+    for i in range(2000):
+        run_call(call_manager, i)
+    journal.close()
+
+    restored = CallManager(journal=SessionJournal(str(tmp_path)))
+    start = time.perf_counter()
+    restored.restore()
+    elapsed = time.perf_counter() - start
+    assert restored.session_count() == 2000
+    assert elapsed < 1.0
+    restored.close()
+
+
+def test_rejects_unknown_fsync_mode(tmp_path):
+    with pytest.raises(ValueError):
+        SessionJournal(str(tmp_path), fsync='sometimes')
@@ -0,0 +1,131 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.core.call_manager import CallManager
+from backend.core.constants import CallType, EvictionReason
+from backend.core.session_lifecycle import SessionLifecycle
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.core.session_lifecycle.logger"), patch("backend.core.call_manager.logger") as mock_log:
+        yield mock_log
+
+
+@pytest.fixture
+def call_manager():
+    return CallManager()
+
+
+@pytest.fixture
+def lifecycle(call_manager):
+    return SessionLifecycle(call_manager, idle_seconds=60, max_age_seconds=3600)
+
+
+def make_call(call_manager):
+    session_id = call_manager.create_new_session()
+    call_manager.link_call_to_session("bot_sid", "+15550001111", session_id, CallType.CONFERENCE, is_outbound=True)
+    call_manager.link_call_to_session("cs_sid", "+15550002222", session_id, CallType.CUSTOMER_SERVICE)
+    return session_id
+
+
+@pytest.mark.asyncio
+async def test_teardown_once_every_leg_finishes(call_manager, lifecycle):
+    session_id = make_call(call_manager)
+    close_stt = lifecycle.attach(session_id, AsyncMock())
+    transcript_task = asyncio.create_task(asyncio.sleep(60))
+    lifecycle.track_task(session_id, transcript_task)
+
+    assert not await lifecycle.leg_finished(session_id, "bot_sid")
+    assert call_manager.get_session_by_id(session_id) is not None
+    assert not await lifecycle.leg_finished(session_id, "unknown_sid")
+
+    assert await lifecycle.leg_finished(session_id, "cs_sid")
+    assert call_manager.get_session_by_id(session_id) is None
+    assert call_manager.get_session_by_call_sid("cs_sid") is None
+    close_stt.assert_awaited_once()
+    await asyncio.gather(transcript_task, return_exceptions=True)
+    assert transcript_task.cancelled()
+
+    snapshot = lifecycle.snapshot()
+    assert snapshot['live_sessions'] == 0
+    assert snapshot['attached_resources'] == 0
+    assert snapshot['tracked_tasks'] == 0
+    assert snapshot['evicted_sessions'][EvictionReason.COMPLETED.value] == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_closer_does_not_block_teardown(call_manager, lifecycle):
+    session_id = make_call(call_manager)
+    lifecycle.attach(session_id, AsyncMock(side_effect=RuntimeError("already closed")))
+    second = lifecycle.attach(session_id, AsyncMock())
+
+    await lifecycle.teardown(session_id, EvictionReason.REPLACED)
+    second.assert_awaited_once()
+    assert call_manager.session_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_sweep_evicts_idle_and_expired_sessions(call_manager, lifecycle):
+    idle_id, streaming_id, expired_id, active_id = (call_manager.create_new_session() for _ in range(4))
+    now = datetime.now()
+    for session_id in (idle_id, streaming_id):
+        call_manager.get_session_by_id(session_id).last_activity = now - timedelta(minutes=5)
+    call_manager.get_session_by_id(expired_id).time_created = now - timedelta(hours=2)
+    # An open media stream keeps an otherwise quiet session alive
+    lifecycle.attach(streaming_id, AsyncMock())
+
+    assert await lifecycle.sweep(now) == 2
+    assert {session_data.session_id for session_data in call_manager.list_sessions()} == {streaming_id, active_id}
+    assert lifecycle.evicted[EvictionReason.IDLE.value] == 1
+    assert lifecycle.evicted[EvictionReason.EXPIRED.value] == 1
+
+
+@pytest.mark.asyncio
+async def test_snapshot_reads_totals_from_the_last_sweep(call_manager, lifecycle):
+    session_id = call_manager.create_new_session()
+    call_manager.get_session_by_id(session_id).add_to_chat_history("user", "Hello")
+    await lifecycle.sweep()
+
+    with patch.object(call_manager, "list_sessions", side_effect=AssertionError("scrape listed every session")):
+        snapshot = lifecycle.snapshot()
+    assert snapshot['live_sessions'] == 1
+    assert snapshot['live_chat_messages'] == 1
+    assert snapshot['live_session_bytes'] == call_manager.get_session_by_id(session_id).approx_bytes()
+
+
+@pytest.mark.asyncio
+async def test_sweeper_runs_in_background(call_manager):
+    lifecycle = SessionLifecycle(call_manager, idle_seconds=-1, sweep_interval=0.01)
+    call_manager.create_new_session()
+    lifecycle.start()
+    for _ in range(100):
+        if call_manager.session_count() == 0:
+            break
+        await asyncio.sleep(0.01)
+    await lifecycle.stop()
+    assert call_manager.session_count() == 0
+
+
+def test_call_events_tear_down_completed_call(call_manager):
+    from backend.routes import conference_router as module
+
+    lifecycle = SessionLifecycle(call_manager)
+    session_id = make_call(call_manager)
+    app = FastAPI()
+    app.include_router(module.conference_router, prefix="/conference")
+
+    with patch.object(module, "call_manager", call_manager), patch.object(module, "session_lifecycle", lifecycle):
+        client = TestClient(app)
+        client.post("/conference/call_events", data={"CallSid": "cs_sid", "CallStatus": "in-progress"})
+        assert call_manager.get_session_by_id(session_id).is_ready_for_stream()
+
+        client.post("/conference/call_events", data={"CallSid": "bot_sid", "CallStatus": "completed"})
+        client.post("/conference/call_events", data={"CallSid": "cs_sid", "CallStatus": "no-answer"})
+
+    assert call_manager.get_session_by_id(session_id) is None
@@ -0,0 +1,69 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from backend.core import turn_trace
+from backend.core.turn_trace import InboundClock, TurnTrace, current_turn, mark, mark_last, on_finish, remove_finish_listener, run_turn
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.core.turn_trace.logger") as mock_log:
+        yield mock_log
+
+
+def test_stages_are_measured_between_marks():
+    trace = TurnTrace()
+    trace.mark('last_inbound_frame', 10.0)
+    trace.mark('transcript_final', 10.3)
+    trace.mark('llm_first_token', 10.5)
+    trace.mark('llm_first_token', 10.9)  # Only the first one counts
+    trace.mark('first_outbound_frame', 11.0)
+    trace.mark_last('last_outbound_frame', 11.5)
+    trace.mark_last('last_outbound_frame', 12.3)
+
+    assert trace.stages() == pytest.approx({
+        'stt': 0.3, 'llm_first_token': 0.2, 'first_outbound_frame': 0.7, 'last_outbound_frame': 2.0, 'turn': 1.0,
+    })
+    assert trace.seconds('tts') is None
+
+
+@pytest.mark.asyncio
+async def test_run_turn_traces_the_handler_and_observes_its_stages():
+    finished = []
+    listener = on_finish(finished.append)
+
+    async def on_transcript(transcript):
+        mark('llm_first_token')
+        await asyncio.sleep(0.01)
+        mark_last('last_outbound_frame')
+
+    before = turn_trace.turns_total._values[()]
+    try:
+        await asyncio.create_task(run_turn(on_transcript, "hello", speech_end=0.0, final_at=0.0))
+        mark('llm_first_token')  # Outside a turn this does nothing
+    finally:
+        remove_finish_listener(listener)
+
+    trace, = finished
+    assert current_turn.get() is None
+    assert trace.seconds('last_outbound_frame') > trace.seconds('llm_first_token')
+    assert trace.seconds('stt') == 0.0
+    assert turn_trace.turns_total._values[()] == before + 1
+    assert 'callbot_turn_stage_seconds_count{stage="stt"}' in turn_trace.metrics.render()
+
+
+def test_inbound_clock_maps_audio_offsets_to_arrival_times():
+    clock = InboundClock(max_frames=3)
+    assert clock.wall_time(0.0) is None
+    for second in range(5):
+        clock.frame(160, at=float(second))  # 20ms of audio each
+
+    assert clock.wall_time(0.09) == 4.0
+    assert clock.wall_time(0.08) == 3.0
+    assert clock.wall_time(0.061) == 3.0
+    # Older than the window: the oldest arrival still known
+    assert clock.wall_time(0.01) == 2.0
+    # Past the end: the latest frame
+    assert clock.wall_time(5.0) == 4.0
@@ -0,0 +1,105 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.core.call_manager import CallManager
+from backend.core.constants import CallType
+from backend.core.event_pipeline import EventPipeline
+from backend.core.webhook_dedupe import WebhookDeduper, webhook_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.core.webhook_dedupe.logger"), patch("backend.core.call_manager.logger"), \
+            patch("backend.routes.conference_router.logger"):
+        yield
+
+
+def test_webhook_key_prefers_the_idempotency_token():
+    form = {'CallSid': 'CA1', 'CallStatus': 'ringing', 'SequenceNumber': '2', 'Timestamp': 'Mon, 1 Jan'}
+    assert webhook_key({'i-twilio-idempotency-token': 'tok'}, form, 'CallSid') == ('token', 'tok')
+    assert webhook_key({}, form, 'CallSid', 'CallStatus') == ('CA1', 'ringing', '2')
+    assert webhook_key({}, {'CallSid': 'CA1', 'Timestamp': 'Mon, 1 Jan'}, 'CallSid') == ('CA1', 'Mon, 1 Jan')
+    assert webhook_key({}, {'CallSid': 'CA1'}, 'CallSid') is None
+
+
+def test_duplicates_inside_the_window_are_dropped():
+    clock = Clock()
+    deduper = WebhookDeduper(capacity=100, window=10, clock=clock)
+
+    assert not deduper.seen('call_events', ('CA1', 'ringing', '1'))
+    assert deduper.seen('call_events', ('CA1', 'ringing', '1'))
+    assert not deduper.seen('call_events', ('CA1', 'in-progress', '2'))
+    assert not deduper.seen('conference_events', ('CA1', 'ringing', '1'))  # Kinds don't collide
+    assert not deduper.seen('call_events', None)
+    assert not deduper.seen('call_events', None)
+
+    clock.now = 10
+    assert not deduper.seen('call_events', ('CA1', 'ringing', '1'))
+    assert deduper.snapshot()['duplicates'] == {'call_events': 1}
+    assert deduper.snapshot()['received'] == {'call_events': 5, 'conference_events': 1}
+
+
+def test_lru_is_bounded():
+    deduper = WebhookDeduper(capacity=3, window=60, clock=Clock())
+    for i in range(10):
+        deduper.seen('call_events', i)
+    assert len(deduper) == 3
+    assert deduper.seen('call_events', 9)
+    assert not deduper.seen('call_events', 0)
+
+
+def test_retried_call_event_does_not_touch_the_session():
+    from backend.routes import conference_router as router
+
+    call_manager = CallManager()
+    session_id = call_manager.create_new_session()
+    call_manager.link_call_to_session("CA_cs", "+18005550100", session_id, CallType.CUSTOMER_SERVICE)
+    app = FastAPI()
+    app.include_router(router.conference_router, prefix="/conference")
+
+    with patch.object(router, "call_manager", call_manager), patch.object(router, "webhook_deduper", WebhookDeduper()), \
+            patch.object(call_manager, "get_session_by_call_sid", wraps=call_manager.get_session_by_call_sid) as lookup, \
+            TestClient(app) as client:
+        event = {'CallSid': 'CA_cs', 'CallStatus': 'in-progress', 'SequenceNumber': '3'}
+        for _ in range(3):
+            assert client.post(f"/conference/call_events/{session_id}", data=event).status_code == 200
+        client.portal.call(router.event_pipeline.drain)
+
+        assert lookup.call_count == 1
+        assert call_manager.get_session_by_id(session_id).is_ready_for_stream()
+        assert router.webhook_deduper.duplicates == {'call_events': 2}
+
+
+def test_retry_of_a_refused_callback_is_accepted():
+    from backend.routes import conference_router as router
+
+    call_manager = CallManager()
+    session_id = call_manager.create_new_session()
+    call_manager.link_call_to_session("CA_cs", "+18005550100", session_id, CallType.CUSTOMER_SERVICE)
+    app = FastAPI()
+    app.include_router(router.conference_router, prefix="/conference")
+    pipeline = EventPipeline(max_pending=0)
+
+    with patch.object(router, "call_manager", call_manager), patch.object(router, "webhook_deduper", WebhookDeduper()), \
+            patch.object(router, "event_pipeline", pipeline), TestClient(app) as client:
+        event = {'CallSid': 'CA_cs', 'CallStatus': 'in-progress', 'SequenceNumber': '3'}
+        assert client.post(f"/conference/call_events/{session_id}", data=event).status_code == 503
+
+        pipeline.max_pending = 1
+        assert client.post(f"/conference/call_events/{session_id}", data=event).status_code == 200
+        client.portal.call(pipeline.drain)
+
+        assert call_manager.get_session_by_id(session_id).is_ready_for_stream()
+        assert router.webhook_deduper.snapshot()['received'] == {'call_events': 1}
+        assert router.webhook_deduper.duplicates == {}
@@ -0,0 +1,153 @@
+import json
+import socket
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+import pytest
+import uvicorn
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from backend.core.number_pool import NumberPool
+from backend.core.worker_proxy import WorkerProxy, assign_numbers, worker_env, worker_ids
+
+
+UPSTREAMS = {"w0": "http://127.0.0.1:5051", "w1": "http://127.0.0.1:5052"}
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.core.worker_proxy.logger") as mock_log, patch("backend.core.number_pool.logger"):
+        yield mock_log
+
+
+def test_routes_by_prefix_then_bot_number_then_round_robin():
+    proxy = WorkerProxy(UPSTREAMS, {"+15550000001": "w1"})
+    form = "application/x-www-form-urlencoded"
+
+    assert proxy.pick("/w/w1/conference/call_events/abc") == "w1"
+    assert proxy.pick("/w/w9/conference/call_events/abc") is None
+    assert proxy.pick("/calls/incoming-call", b"CallSid=CA1&From=%2B15550000001", form) == "w1"
+    assert proxy.pick("/calls/initiate-call", b'{"bot_number": "+15550000001"}', "application/json") == "w1"
+    assert {proxy.pick("/calls/initiate-call", b'{"cs_number": "+18005550100"}', "application/json")
+            for _ in range(4)} == {"w0", "w1"}
+
+
+def test_numbers_nobody_was_dealt_are_placed_on_the_ring():
+    proxy = WorkerProxy(UPSTREAMS, {"+15550000001": "w1"})
+    form = "application/x-www-form-urlencoded"
+    numbers = [f"+1555000{i:04d}" for i in range(10, 30)]
+
+    owners = {number: proxy.pick("/calls/initiate-call", f'{{"bot_number": "{number}"}}'.encode(), "application/json")
+              for number in numbers}
+    assert set(owners.values()) == {"w0", "w1"}
+    for number, owner in owners.items():
+        # The inbound leg, from the number itself or from another of the owner's numbers
+        leg = {"CallSid": "CA1", "From": number, "To": number}
+        assert proxy.pick("/calls/incoming-call", urlencode(leg).encode(), form) == owner
+        leg = {"CallSid": "CA2", "From": "+15550000001", "To": number}
+        assert proxy.pick("/calls/incoming-call", urlencode(leg).encode(), form) == owner
+
+
+def test_forwards_http_with_the_public_host():
+    seen = []
+
+    def worker(request: httpx.Request):
+        seen.append(request)
+        return httpx.Response(200, text="<Response/>", headers={"content-type": "application/xml"})
+
+    proxy = WorkerProxy(UPSTREAMS, client=httpx.AsyncClient(transport=httpx.MockTransport(worker)))
+    client = TestClient(proxy, base_url="https://calls.example.com")
+    response = client.post("/w/w1/conference/call_events/abc?retry=1", data={"CallSid": "CA1", "CallStatus": "ringing"})
+
+    assert response.status_code == 200
+    assert response.text == "<Response/>"
+    assert response.headers["content-type"] == "application/xml"
+    assert str(seen[0].url) == "http://127.0.0.1:5052/w/w1/conference/call_events/abc?retry=1"
+    assert seen[0].headers["host"] == "calls.example.com"
+    assert seen[0].content == b"CallSid=CA1&CallStatus=ringing"
+    assert client.post("/w/w7/conference/call_events/abc").status_code == 404
+
+
+def test_unreachable_worker_is_a_502():
+    def down(request: httpx.Request):
+        raise httpx.ConnectError("refused")
+
+    proxy = WorkerProxy(UPSTREAMS, client=httpx.AsyncClient(transport=httpx.MockTransport(down)))
+    assert TestClient(proxy).post("/w/w0/calls/incoming-call").status_code == 502
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_proxies_media_websockets():
+    worker = FastAPI()
+
+    @worker.websocket("/w/w0/media/media-stream/{session_id}")
+    async def echo(websocket: WebSocket, session_id: str):
+        await websocket.accept()
+        await websocket.send_text(session_id)
+        await websocket.send_text(await websocket.receive_text())
+        await websocket.close()
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(worker, host="127.0.0.1", port=port, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            time.sleep(0.01)
+        client = TestClient(WorkerProxy({"w0": f"http://127.0.0.1:{port}"}))
+        with client.websocket_connect("/w/w0/media/media-stream/abc") as websocket:
+            assert websocket.receive_text() == "abc"
+            websocket.send_text('{"event": "media"}')
+            assert websocket.receive_text() == '{"event": "media"}'
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def test_each_worker_gets_its_own_identity_and_numbers():
+    ids = worker_ids(3)
+    numbers = assign_numbers(["+1", "+2", "+3", "+4"], ids)
+    assert numbers == {"w0": ["+1", "+4"], "w1": ["+2"], "w2": ["+3"]}
+
+    env = worker_env("w1", ids, numbers["w1"], {"SESSION_JOURNAL_DIR": "/var/lib/callbot"})
+    assert env["WORKER_ID"] == "w1"
+    assert env["WORKER_IDS"] == "w0,w1,w2"
+    assert env["BOT_NUMBERS"] == "+2"
+    assert env["SESSION_JOURNAL_DIR"] == "/var/lib/callbot/w1"
+
+
+def test_inbound_legs_reach_the_worker_holding_an_unlisted_bot_number():
+    # Each worker has its own number pool, and BOT_NUMBERS is empty
+    pools = {worker_id: NumberPool([]) for worker_id in UPSTREAMS}
+    by_port = {httpx.URL(url).port: worker_id for worker_id, url in UPSTREAMS.items()}
+
+    def worker(request: httpx.Request):
+        pool = pools[by_port[request.url.port]]
+        if request.url.path == "/calls/initiate-call":
+            bot_number = json.loads(request.content)["bot_number"]
+            session_id = f"s{bot_number}"
+            pool.reserve(session_id, bot_number)
+            pool.expect_inbound(bot_number, session_id)
+            return httpx.Response(200, json={"session_id": session_id, "caller": pool.caller_for(session_id)})
+        leg = dict(parse_qsl(request.content.decode()))
+        session_id = pool.claim_inbound(leg["To"], leg["CallSid"], leg["From"])
+        return httpx.Response(200 if session_id else 404, json={"session_id": session_id})
+
+    proxy = WorkerProxy(UPSTREAMS, {}, client=httpx.AsyncClient(transport=httpx.MockTransport(worker)))
+    client = TestClient(proxy)
+    for i in range(10):
+        bot_number = f"+1555000{i:04d}"
+        session = client.post("/calls/initiate-call", json={"bot_number": bot_number}).json()
+        leg = client.post("/calls/incoming-call", data={"CallSid": f"CA{i}", "From": session["caller"], "To": bot_number})
+        assert leg.status_code == 200
+        assert leg.json()["session_id"] == session["session_id"]
+    assert all(pool.snapshot()['reserved'] for pool in pools.values()), "The numbers are spread over both workers"
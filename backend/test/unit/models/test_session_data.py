@@ -19,7 +19,7 @@ def test_constructor_defaults(session_data):
     """
     assert session_data.session_id == "test_session_id"
     assert session_data.conference_name == "test_conference"
-    assert session_data.meta_call_sids is None, "Should default to None unless set."
+    assert session_data.meta_call_sids == MetaCallSids(), "Should default to empty SIDs so the setters work."
     assert session_data.bot_number is None
     assert session_data.cs_number is None
     assert session_data.user_number is None
@@ -120,9 +120,9 @@ def test_meta_call_sids(session_data):
     Test setting/getting twilio_stream and conference sid 
     in the session's meta_call_sids.
     """
-    # By default, meta_call_sids is None, so let's explicitly set it first
-    session_data.meta_call_sids = MetaCallSids()
-    
+    assert session_data.get_twilio_stream_sid() is None
+    assert session_data.get_conference_sid() is None
+
     # Now test set/get twilio_stream_sid
     test_stream_sid = "stream123"
     session_data.set_twilio_stream_sid(test_stream_sid)
@@ -161,3 +161,54 @@ def test_add_chat_message_and_get_chat_history(session_data):
     assert history[0].content == "Hello"
     assert history[1].role == "assistant"
     assert history[1].content == "Hi there!"
+
+
+def test_record_round_trip(session_data):
+    """
+    Test that a session survives serialization, and that unset fields are left out.
+    """
+    empty_size = len(session_data.to_bytes())
+    session_data.set_conference_sid("CF123")
+    session_data.set_cs_number("+16660002222")
+    session_data.set_user_info(UserInformation(user_name="John", user_email="j@example.com", reason_for_call="Refund", account_number="42"))
+    session_data.set_call_sid(CallType.STREAM, "CA1", is_outbound=False)
+    session_data.set_call_sid(CallType.USER, "CA2")
+    session_data.set_ready_for_stream()
+    session_data.add_to_chat_history("user", "Hi")
+
+    restored = SessionData.from_bytes(session_data.to_bytes())
+    assert restored.to_record() == session_data.to_record()
+    assert restored.get_conference_sid() == "CF123"
+    assert restored.get_call_sid(CallType.STREAM) == "CA1"
+    assert restored.call_sids.get_direction(CallType.STREAM).value == "inbound"
+    assert restored.call_sids.get_direction(CallType.USER) is None
+    assert restored.get_chat_history()[0].content == "Hi"
+    assert restored.time_created == session_data.time_created
+    assert empty_size < 150, "Unset fields are omitted"
+
+
+def test_partial_record(session_data):
+    """
+    Test that to_record limits itself to the named attributes.
+    """
+    session_data.set_call_sid(CallType.CUSTOMER_SERVICE, "CA3")
+    assert session_data.to_record(['ready_for_stream', 'call_sids']) == {'ready': '', 'sid:customer_service': 'CA3'}
+
+
+def test_compact_layout(session_data):
+    """
+    Test that sessions carry no per-instance dict and report their approximate size.
+    """
+    for value in (session_data, session_data.call_sids, session_data.meta_call_sids):
+        assert not hasattr(value, '__dict__')
+    with pytest.raises(AttributeError):
+        session_data.unknown_field = 1
+
+    empty = session_data.approx_bytes()
+    session_data.set_call_sid(CallType.CONFERENCE, "CA" + "0" * 32, is_outbound=True)
+    session_data.add_to_chat_history("user", "x" * 1000)
+    assert session_data.approx_bytes() > empty + 1000
+    assert session_data.call_sids.get_direction(CallType.CONFERENCE).value == "outbound"
+    session_data.set_call_sid(CallType.CONFERENCE, "CA1", is_outbound=False)
+    assert session_data.call_sids.get_direction(CallType.CONFERENCE).value == "inbound"
+    assert list(session_data.call_sids.items()) == [(CallType.CONFERENCE, "CA1")]
@@ -0,0 +1,131 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.core.active_calls import ActiveCallIndex
+from backend.core.call_manager import CallManager
+from backend.core.constants import CallType, EvictionReason
+from backend.core.number_pool import NumberPool
+from backend.core.session_lifecycle import SessionLifecycle
+from backend.routes import bot_call_router as router
+from backend.services.twilio_rest import AsyncTwilioClient
+from backend.simulators.llm_stub_server import LatencyDistribution
+from backend.simulators.twilio_stub_server import create_twilio_stub_app
+
+
+BOT = "+15550000001"
+CS = "+18005550100"
+USER_INFO = {"user_name": "John", "user_email": "j@example.com", "reason_for_call": "Refund", "account_number": "1"}
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.routes.bot_call_router.logger"), patch("backend.core.call_manager.logger"), \
+            patch("backend.core.number_pool.logger"), patch("backend.core.session_lifecycle.logger"), \
+            patch("backend.services.twilio_rest.logger"):
+        yield
+
+
+@pytest.fixture
+def twilio_stub():
+    return create_twilio_stub_app(LatencyDistribution('fixed', (0.05,)))
+
+
+@pytest.fixture
+def client(twilio_stub):
+    twilio_rest = AsyncTwilioClient("AC123", "token", base_url="http://twilio.test", max_retries=0,
+                                    transport=httpx.ASGITransport(app=twilio_stub))
+    call_manager = CallManager()
+    pool = NumberPool([BOT])
+    lifecycle = SessionLifecycle(call_manager)
+    lifecycle.on_teardown(lambda session_id, _: pool.release(session_id))
+    lifecycle.on_teardown(router.hang_up_legs)
+    app = FastAPI()
+    app.include_router(router.bot_call_router, prefix="/calls")
+    with patch.object(router, "twilio_rest", twilio_rest), patch.object(router, "call_manager", call_manager), \
+            patch.object(router, "bot_number_pool", pool), patch.object(router, "session_lifecycle", lifecycle), \
+            patch.object(router, "active_calls", ActiveCallIndex()):
+        yield TestClient(app), call_manager
+
+
+def initiate(test_client):
+    return test_client.post("/calls/initiate-call", json={"cs_number": CS, "user_number": "+17770000000", "user_info": USER_INFO})
+
+
+def test_legs_are_dialed_concurrently(client, twilio_stub):
+    test_client, call_manager = client
+    response = initiate(test_client)
+
+    assert response.status_code == 200
+    body = response.json()
+    # One create per leg, overlapping, and no calls.list lookup
+    assert twilio_stub.state.twilio.requests == [("POST", "/2010-04-01/Accounts/AC123/Calls.json")] * 2
+    assert twilio_stub.state.twilio.peak_in_flight == 2
+    session_data = call_manager.get_session_by_id(body["session_id"])
+    assert session_data.call_sids.get_sid(CallType.CONFERENCE) == body["outgoing_bot_conference_sid"]
+    assert session_data.call_sids.get_sid(CallType.CUSTOMER_SERVICE) == body["cs_call_sid"]
+
+
+def test_calls_left_by_an_earlier_session_are_hung_up(client, twilio_stub):
+    test_client, call_manager = client
+    first = initiate(test_client).json()
+    leaked = twilio_stub.state.twilio.calls[first["outgoing_bot_conference_sid"]]
+    leaked['status'] = "in-progress"
+    router.active_calls.update(leaked['sid'], "in-progress", BOT, BOT)
+    # Torn down, but Twilio refused to hang up its calls
+    twilio_stub.state.twilio.fail_next(500, times=2)
+    asyncio.run(router.session_lifecycle.teardown(first["session_id"], EvictionReason.IDLE))
+    assert leaked['status'] == "in-progress"
+
+    assert initiate(test_client).status_code == 200
+    assert leaked['status'] == "completed"
+
+
+def test_calls_the_pool_did_not_place_are_left_alone(client, twilio_stub):
+    test_client, _ = client
+    # e.g. another worker's call on a shared number
+    other = twilio_stub.state.twilio.calls["CA_other"] = {
+        'sid': "CA_other", 'account_sid': "AC123", 'status': "in-progress", 'to': BOT, 'from': BOT,
+    }
+    router.active_calls.update("CA_other", "in-progress", BOT, BOT)
+
+    assert initiate(test_client).status_code == 200
+    assert other['status'] == "in-progress"
+
+
+def test_a_failed_leg_hangs_up_the_other(client, twilio_stub):
+    test_client, call_manager = client
+    twilio_stub.state.twilio.fail_next(400)
+
+    response = initiate(test_client)
+    assert response.status_code == 500
+    statuses = [call['status'] for call in twilio_stub.state.twilio.calls.values()]
+    assert statuses == ["completed"]
+    assert call_manager.session_count() == 0
+    assert router.bot_number_pool.reserve("next") == BOT
+
+
+def test_initiating_again_replaces_the_users_session(client):
+    test_client, call_manager = client
+    first = initiate(test_client).json()["session_id"]
+
+    # The pool holds one session per number, so this only succeeds if the first was torn down
+    response = initiate(test_client)
+    assert response.status_code == 200
+    assert call_manager.get_session_by_id(first) is None
+    assert call_manager.get_sessions_by_user_number("+17770000000") == [response.json()["session_id"]]
+
+
+def test_replacing_a_session_hangs_up_its_calls(client, twilio_stub):
+    test_client, _ = client
+    first = initiate(test_client).json()
+    calls = twilio_stub.state.twilio.calls
+    legs = [calls[first["outgoing_bot_conference_sid"]], calls[first["cs_call_sid"]]]
+    assert [leg['status'] for leg in legs] != ["completed"] * 2
+
+    assert initiate(test_client).status_code == 200
+    assert [leg['status'] for leg in legs] == ["completed"] * 2
@@ -0,0 +1,25 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.core.metrics import CONTENT_TYPE
+from backend.routes.metrics_router import metrics_router
+
+
+def test_metrics_endpoint_exposes_histograms_and_gauges():
+    app = FastAPI()
+    app.include_router(metrics_router)
+
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == CONTENT_TYPE
+    lines = response.text.splitlines()
+    assert '# TYPE callbot_turn_stage_seconds histogram' in lines
+    assert '# TYPE callbot_live_sessions gauge' in lines
+    assert 'callbot_media_streams 0' in lines
+    assert any(line.startswith('callbot_llm_queue_depth{priority=') for line in lines)
+    assert any(line.startswith('callbot_llm_hedges_fired_total ') for line in lines)
+    assert any(line.startswith('callbot_llm_route_seconds_p95{route="fast"}') for line in lines)
+    assert any(line.startswith('callbot_llm_queue_seconds_p95{priority="live_turn"}') for line in lines)
+    assert any(line.startswith('callbot_llm_replies_parsed_total{path="fallback"}') for line in lines)
+    assert any(line.startswith('callbot_process_resident_memory_bytes ') for line in lines)
@@ -0,0 +1,102 @@
+import pytest
+
+from backend.models.models import UserInformation
+from backend.models.session_data import SessionData
+from backend.services.answer_cache import AnswerCache, normalize_question
+
+
+def make_session(name="John Smith", email="john@example.com", cs_number="+14692105627"):
+    session_data = SessionData(session_id=name, conference_name="conf")
+    session_data.set_cs_number(cs_number)
+    session_data.set_user_info(UserInformation(
+        user_name=name,
+        user_email=email,
+        reason_for_call="Double charge",
+        account_number="4122563242",
+        additional_info={"plan": "Premium"},
+    ))
+    return session_data
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnswerCache(path=str(tmp_path / "cache.json"), min_confirmations=2)
+
+
+EMAIL_QUESTION = "Thanks. Can I get the email address on the account?"
+
+
+def email_reply(session_data):
+    return {"response_method": "voice", "response_content": f"Sure, it's {session_data.get_user_info().user_email}."}
+
+
+def test_normalize_question():
+    assert normalize_question("Thank you for calling, I'm Alex. Who am I speaking with?") == "who am i speaking with"
+    assert normalize_question("Okay, who am I speaking with?") == "who am i speaking with"
+    assert normalize_question("Please hold.") == "hold"
+
+
+def test_serves_confirmed_answer_personalized_per_session(cache):
+    first, second, third = make_session(), make_session("Jane Doe", "jane@example.com"), make_session("Al Roe", "al@example.com")
+    assert cache.lookup(first, EMAIL_QUESTION) is None
+    cache.store(first, EMAIL_QUESTION, email_reply(first))
+    assert cache.lookup(second, EMAIL_QUESTION) is None, "One call isn't enough to trust the template"
+
+    cache.store(second, EMAIL_QUESTION, email_reply(second))
+    reply = cache.lookup(third, "Alright, can I get the email address on the account?")
+    assert reply == {"response_method": "voice", "response_content": "Sure, it's al@example.com."}
+    assert cache.hits == 1
+
+
+def test_answers_are_per_company(cache):
+    for session_data in (make_session(), make_session("Jane Doe", "jane@example.com")):
+        cache.store(session_data, EMAIL_QUESTION, email_reply(session_data))
+    assert cache.lookup(make_session(cs_number="+10000000000"), EMAIL_QUESTION) is None
+
+
+@pytest.mark.parametrize("reply", [
+    {"response_method": "voice", "response_content": "Yes, that's right."},
+    {"response_method": "voice", "response_content": "John Smith, charged on the 15th."},
+    {"response_method": "phone_tree", "response_content": "1"},
+    {},
+])
+def test_call_specific_replies_are_not_cached(cache, reply):
+    session_data = make_session()
+    for _ in range(3):
+        cache.store(session_data, "Is that right?", reply)
+    assert cache.lookup(session_data, "Is that right?") is None
+
+
+def test_ttl_and_lru_eviction():
+    cache = AnswerCache(path=None, max_entries=2, min_confirmations=1)
+    session_data = make_session()
+    for question in ("What is your name?", "What is your email?", "What is your plan?"):
+        cache.store(session_data, question, {"response_method": "noop", "response_content": ""})
+    assert cache.lookup(session_data, "What is your name?") is None, "Oldest entry is evicted"
+    assert cache.lookup(session_data, "What is your plan?") is not None
+
+    cache.ttl_seconds = -1
+    assert cache.lookup(session_data, "What is your plan?") is None
+
+
+def test_persists_across_restarts(cache):
+    for session_data in (make_session(), make_session("Jane Doe", "jane@example.com")):
+        cache.store(session_data, EMAIL_QUESTION, email_reply(session_data))
+    cache.save()
+
+    restarted = AnswerCache(path=cache.path, min_confirmations=2)
+    assert restarted.lookup(make_session(), EMAIL_QUESTION)["response_content"] == "Sure, it's john@example.com."
+
+
+def test_saves_only_when_changed_and_configured(tmp_path):
+    AnswerCache(path=None).save()
+    cache = AnswerCache(path=str(tmp_path / "cache.json"))
+    cache.save()
+    assert not (tmp_path / "cache.json").exists(), "Nothing to save yet"
+
+    session_data = make_session()
+    cache.store(session_data, EMAIL_QUESTION, email_reply(session_data))
+    assert not (tmp_path / "cache.json").exists(), "A turn never writes the file itself"
+    cache.start()
+    cache.close()
+    assert (tmp_path / "cache.json").exists()
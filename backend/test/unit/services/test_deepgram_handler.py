@@ -5,6 +5,7 @@ from unittest.mock import patch, MagicMock, AsyncMock
 from pydub import AudioSegment
 
 from backend.services.deepgram_handler import (
+    SpeechChunker,
     get_deepgram_client,
     create_deepgram_stt_connection,
     close_deepgram_stt_connection,
@@ -31,7 +32,7 @@ async def test_get_deepgram_client_missing_key(mock_logger):
 @pytest.mark.asyncio
 async def test_get_deepgram_client_with_key(mock_logger):
     with patch.dict(os.environ, {"DEEPGRAM_API_KEY": "fake_key"}):
-        with patch("backend.services.deepgram_handler.DeepgramClient") as mock_client_cls:
+        with patch("deepgram.DeepgramClient") as mock_client_cls:
             mock_instance = MagicMock()
             mock_client_cls.return_value = mock_instance
 
@@ -166,3 +167,13 @@ def test_convert_mp3_to_mulaw_error(mock_logger):
         assert result == b""
         mock_logger.error.assert_called_once()
         assert "Conversion error" in mock_logger.error.call_args[0][0]
+
+def test_speech_chunker_splits_on_sentences():
+    chunker = SpeechChunker(min_chars=10)
+    chunks = []
+    for char in "Hi. My account number is 12345. Can you check the charge? Thanks":
+        chunks.extend(chunker.feed(char))
+    # "Hi." is too short to send on its own, so it rides along with the next sentence
+    assert chunks == ["Hi. My account number is 12345.", "Can you check the charge?"]
+    assert chunker.flush() == "Thanks"
+    assert chunker.flush() == ""
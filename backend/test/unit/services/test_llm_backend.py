@@ -0,0 +1,149 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from backend.services.llm_backend import (
+    HEDGE_MIN_SAMPLES,
+    LatencyTracker,
+    LLMBackend,
+    LLMBackendRegistry,
+    LLMDeadlineExceeded,
+    LLMRequest,
+    OpenAIBackend,
+    parse_model_spec,
+)
+from backend.services.llm_scheduler import LLMScheduler
+from backend.simulators.llm_stub_server import LatencyDistribution, create_stub_app
+
+
+class SlowBackend(LLMBackend):
+    """Backend whose first chunk arrives after `delays[n]` seconds on its n-th request."""
+
+    def __init__(self, name, delays, content="hello"):
+        super().__init__(name)
+        self.delays = list(delays)
+        self.content = content
+        self.calls = 0
+
+    async def stream(self, request):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        await asyncio.sleep(delay)
+        yield f"{self.content}-{self.calls}"
+
+
+def make_request(provider="primary", deadline=5.0):
+    return LLMRequest(messages=[{"role": "user", "content": "hi"}], model="m", provider=provider, deadline=deadline)
+
+
+def test_parse_model_spec():
+    assert parse_model_spec("stub:gpt-4o-mini") == ("stub", "gpt-4o-mini")
+    assert parse_model_spec("gpt-4o-mini", default_provider="openai") == ("openai", "gpt-4o-mini")
+
+
+def test_latency_tracker_needs_min_samples():
+    tracker = LatencyTracker()
+    for i in range(HEDGE_MIN_SAMPLES - 1):
+        tracker.record("k", 0.1)
+    assert tracker.percentile("k", 0.95) is None
+
+    for i in range(100):
+        tracker.record("k", i / 100)
+    assert 0.9 <= tracker.percentile("k", 0.95) <= 1.0
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    registry = LLMBackendRegistry()
+    backend = SlowBackend("primary", [0])
+    registry.register(backend)
+
+    result = await registry.complete(make_request())
+    assert result == "hello-1"
+    assert backend.calls == 1
+    assert registry.hedges_fired == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_hedge_wins(monkeypatch):
+    registry = LLMBackendRegistry()
+    monkeypatch.setattr(registry, "hedge_delay", lambda key: 0.05)
+    registry.register(SlowBackend("primary", [1.0]))
+    registry.register(SlowBackend("secondary", [0], content="hedge"))
+
+    result = await registry.complete(make_request(), hedge_request=make_request("secondary"))
+    assert result == "hedge-1"
+    assert registry.hedges_fired == 1
+    assert registry.hedges_won == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_primary_falls_back_to_hedge(monkeypatch):
+    class FailingBackend(LLMBackend):
+        async def stream(self, request):
+            raise RuntimeError("provider down")
+            yield
+
+    registry = LLMBackendRegistry()
+    monkeypatch.setattr(registry, "hedge_delay", lambda key: 10)
+    registry.register(FailingBackend("primary"))
+    registry.register(SlowBackend("secondary", [0], content="hedge"))
+
+    result = await registry.complete(make_request(), hedge_request=make_request("secondary"))
+    assert result == "hedge-1"
+
+
+@pytest.mark.asyncio
+async def test_scheduler_slots_are_returned_after_hedged_race(monkeypatch):
+    scheduler = LLMScheduler(max_concurrency=4, live_reserve=0)
+    registry = LLMBackendRegistry(scheduler=scheduler)
+    monkeypatch.setattr(registry, "hedge_delay", lambda key: 0.05)
+    registry.register(SlowBackend("primary", [1.0]))
+    registry.register(SlowBackend("secondary", [0], content="hedge"))
+
+    assert await registry.complete(make_request(), hedge_request=make_request("secondary")) == "hedge-1"
+    # Let the losing request's background cleanup run
+    await asyncio.sleep(0.01)
+    assert scheduler.in_flight == 0
+    assert scheduler.queue_stats[make_request().priority].granted == 2
+
+
+@pytest.mark.asyncio
+async def test_deadline_exceeded():
+    registry = LLMBackendRegistry(hedging=False)
+    registry.register(SlowBackend("primary", [1.0]))
+
+    with pytest.raises(LLMDeadlineExceeded):
+        await registry.complete(make_request(deadline=0.05))
+
+
+@pytest.mark.asyncio
+async def test_openai_backend_against_stub_server():
+    """
+    The stub server speaks the OpenAI wire format, so the real OpenAI backend can drive it.
+    """
+    app = create_stub_app(LatencyDistribution.parse("fixed:0"), LatencyDistribution.parse("fixed:0"))
+    transport = httpx.ASGITransport(app=app)
+    backend = OpenAIBackend("stub", lambda: AsyncOpenAI(
+        base_url="http://stub/v1", api_key="stub", http_client=httpx.AsyncClient(transport=transport)
+    ))
+    registry = LLMBackendRegistry(hedging=False)
+    registry.register(backend)
+
+    request = make_request("stub")
+    request.messages = [{"role": "user", "content": "Please hold while I check"}]
+    reply = json.loads(await registry.complete(request))
+    assert reply == {"response_method": "noop", "response_content": ""}
+
+
+def test_latency_distribution_is_seeded():
+    import random
+    distribution = LatencyDistribution.parse("lognormal:-1.2,0.4")
+    first = [distribution.sample(random.Random("0:1")) for _ in range(3)]
+    second = [distribution.sample(random.Random("0:1")) for _ in range(3)]
+    assert first == second
+    with pytest.raises(ValueError):
+        LatencyDistribution.parse("zipf:1")
@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.core.constants import LLMPriority
+from backend.services.llm_scheduler import LLMScheduler, TokenBucket, estimate_tokens
+
+
+def test_token_bucket_refills_over_time():
+    now = [0.0]
+    bucket = TokenBucket(60, clock=lambda: now[0])
+    bucket.take(60)
+    assert bucket.available() == 0
+    assert bucket.seconds_until(5) == pytest.approx(5)
+
+    now[0] = 2.0
+    assert bucket.available() == pytest.approx(2)
+    bucket.refund(1000)
+    assert bucket.available() == 60, "Refunds never overfill the bucket"
+
+
+def test_estimate_tokens():
+    messages = [{"role": "system", "content": "x" * 400}, {"role": "user", "content": "y" * 40}]
+    assert estimate_tokens(messages, 150) == 110 + 150
+
+
+@pytest.mark.asyncio
+async def test_live_turn_jumps_queued_background_work():
+    scheduler = LLMScheduler(max_concurrency=1, live_reserve=0)
+    held = await scheduler.acquire(LLMPriority.LIVE_TURN, 10)
+
+    order = []
+
+    async def run(priority):
+        grant = await scheduler.acquire(priority, 10)
+        order.append(priority)
+        scheduler.release(grant)
+
+    background = asyncio.create_task(run(LLMPriority.BACKGROUND))
+    speculative = asyncio.create_task(run(LLMPriority.SPECULATIVE))
+    await asyncio.sleep(0)
+    live = asyncio.create_task(run(LLMPriority.LIVE_TURN))
+    await asyncio.sleep(0)
+    assert scheduler.queue_depth()[LLMPriority.BACKGROUND] == 1
+
+    scheduler.release(held)
+    await asyncio.gather(background, speculative, live)
+    assert order == [LLMPriority.LIVE_TURN, LLMPriority.SPECULATIVE, LLMPriority.BACKGROUND]
+
+
+@pytest.mark.asyncio
+async def test_background_work_cannot_use_live_reserve():
+    scheduler = LLMScheduler(max_concurrency=5, live_reserve=0.2)
+    grants = [await scheduler.acquire(LLMPriority.BACKGROUND, 10) for _ in range(4)]
+
+    blocked = asyncio.create_task(scheduler.acquire(LLMPriority.BACKGROUND, 10))
+    await asyncio.sleep(0)
+    assert not blocked.done(), "The last slot is reserved for live turns"
+
+    live = await asyncio.wait_for(scheduler.acquire(LLMPriority.LIVE_TURN, 10), 1)
+    assert scheduler.in_flight == 5
+
+    # Background work stays capped at 4 while the live turn holds the fifth slot
+    scheduler.release(grants[0])
+    await asyncio.sleep(0)
+    assert not blocked.done()
+
+    scheduler.release(live)
+    await asyncio.wait_for(blocked, 1)
+    for grant in grants[1:] + [blocked.result()]:
+        scheduler.release(grant)
+    assert scheduler.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_tokens_per_minute_limit_delays_requests():
+    # 600 tokens per minute refills 10 tokens per second
+    scheduler = LLMScheduler(tokens_per_minute=600, live_reserve=0)
+    grant = await scheduler.acquire(LLMPriority.LIVE_TURN, 600)
+    scheduler.release(grant)
+
+    start = time.monotonic()
+    grant = await asyncio.wait_for(scheduler.acquire(LLMPriority.LIVE_TURN, 3), 2)
+    waited = time.monotonic() - start
+    assert 0.2 < waited < 1.0
+    assert grant.queued_seconds == pytest.approx(waited, abs=0.05)
+    scheduler.release(grant)
+
+    stats = scheduler.snapshot()["live_turn"]
+    assert stats["granted"] == 2
+    assert stats["queue_seconds_max"] > 0.2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_hold_a_slot():
+    scheduler = LLMScheduler(max_concurrency=1, live_reserve=0)
+    held = await scheduler.acquire(LLMPriority.LIVE_TURN, 10)
+    waiting = asyncio.create_task(scheduler.acquire(LLMPriority.LIVE_TURN, 10))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+
+    scheduler.release(held)
+    assert scheduler.in_flight == 0
+    assert scheduler.queue_depth()[LLMPriority.LIVE_TURN] == 0
+
+
+@pytest.mark.asyncio
+async def test_oversized_background_request_is_capped_below_the_live_reserve():
+    scheduler = LLMScheduler(tokens_per_minute=1000, live_reserve=0.2)
+
+    # More than the 800 tokens background work may ever hold at once
+    grant = await asyncio.wait_for(scheduler.acquire(LLMPriority.BACKGROUND, 900), 1)
+    assert grant.tokens == 800
+    scheduler.release(grant)
+    assert scheduler.in_flight == 0
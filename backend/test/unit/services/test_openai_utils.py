@@ -4,10 +4,17 @@ import json
 from unittest.mock import patch, MagicMock
 from backend.models.models import UserInformation
 from backend.models.session_data import SessionData
+from backend.services.llm_backend import LLMBackend, llm_backends
 
+from backend.core.call_manager import CallManager
+from backend.core.constants import ModelRoute
 from backend.services.openai_utils import (
+    ROUTES,
+    classify_turn,
     get_openai_response,
-    invoke_gpt
+    invoke_gpt,
+    route_stats,
+    stream_gpt
 )
 
 
@@ -20,71 +27,81 @@ def mock_logger():
         yield mock_log
 
 
+class FakeBackend(LLMBackend):
+    """
+    Stand-in for the OpenAI backend so we don't make real API calls.
+    Streams `content` in small chunks, then raises `error` if set.
+    """
+
+    def __init__(self):
+        super().__init__("openai")
+        self.content = ""
+        self.error = None
+        self.requests = []
+
+    async def stream(self, request):
+        self.requests.append(request)
+        for start in range(0, len(self.content), 5):
+            yield self.content[start:start + 5]
+        if self.error:
+            raise self.error
+
+
 @pytest.fixture
 def mock_openai_client():
     """
-    Patch the OpenAI client so we don't make real API calls.
+    Register a fake backend under the default provider for the duration of the test.
     """
-    with patch("backend.services.openai_utils.openai_client") as mock_client:
-        yield mock_client
+    backend = FakeBackend()
+    with patch.dict(llm_backends._backends, {"openai": backend}):
+        yield backend
 
 
-def test_get_openai_response_success(mock_logger, mock_openai_client):
+@pytest.mark.asyncio
+async def test_get_openai_response_success(mock_logger, mock_openai_client):
     """
     Test a successful call to get_openai_response.
     """
-    # Mock the response object from openai_client
-    mock_choice = MagicMock()
-    mock_choice.message = MagicMock()
-    mock_choice.message.refusal = None  # no refusal
-    mock_choice.message.content = "Test GPT content"
-
-    mock_response = MagicMock()
-    mock_response.choices = [mock_choice]
+    mock_openai_client.content = "Test GPT content"
 
-    mock_openai_client.chat.completions.create.return_value = mock_response
-
-    result = get_openai_response("system prompt", "hello user")
+    result = await get_openai_response("system prompt", "hello user")
     assert result == "Test GPT content"
     # Ensure no error log
     mock_logger.error.assert_not_called()
 
-    # Check that the correct arguments were passed to create(...)
-    mock_openai_client.chat.completions.create.assert_called_once()
-    create_args, create_kwargs = mock_openai_client.chat.completions.create.call_args
-    assert create_kwargs["model"] == "gpt-4o-mini"
-    assert create_kwargs["messages"][0]["role"] == "system"
-    assert create_kwargs["messages"][0]["content"] == "system prompt"
-    assert create_kwargs["messages"][1]["role"] == "user"
-    assert create_kwargs["messages"][1]["content"] == "hello user"
+    # Check that the correct request was sent to the backend
+    assert len(mock_openai_client.requests) == 1
+    request = mock_openai_client.requests[0]
+    assert request.model == "gpt-4o-mini"
+    assert request.max_tokens == 150
+    assert request.messages[0]["role"] == "system"
+    assert request.messages[0]["content"] == "system prompt"
+    assert request.messages[1]["role"] == "user"
+    assert request.messages[1]["content"] == "hello user"
 
 
-def test_get_openai_response_refusal(mock_logger, mock_openai_client):
+@pytest.mark.asyncio
+async def test_get_openai_response_refusal(mock_logger, mock_openai_client):
     """
     Test the scenario where the assistant replies with a refusal.
     """
-    mock_choice = MagicMock()
-    mock_choice.message = MagicMock()
-    mock_choice.message.refusal = "I refuse to comply."  # simulate refusal
-    mock_choice.message.content = "Some content"
+    # A refusal ends the stream without content
+    mock_openai_client.content = ""
 
-    mock_response = MagicMock()
-    mock_response.choices = [mock_choice]
-    mock_openai_client.chat.completions.create.return_value = mock_response
-
-    result = get_openai_response("system prompt", "hello user")
-    # The code prints the refusal and returns an empty string
+    result = await get_openai_response("system prompt", "hello user")
+    # The backend logs the refusal and we return an empty string
     assert result == ""
     mock_logger.error.assert_not_called()  # no error, just a refusal message
 
 
-def test_get_openai_response_exception(mock_logger, mock_openai_client):
+@pytest.mark.asyncio
+async def test_get_openai_response_exception(mock_logger, mock_openai_client):
     """
     Test error handling if an exception is raised.
     """
-    mock_openai_client.chat.completions.create.side_effect = Exception("OpenAI call failed")
+    mock_openai_client.error = Exception("OpenAI call failed")
 
-    result = get_openai_response("system prompt", "hello user")
+    result = await get_openai_response("system prompt", "hello user")
     assert result == "I encountered an error. Please hold."
     mock_logger.error.assert_called_once()
     assert "OpenAI error: OpenAI call failed" in mock_logger.error.call_args[0][0]
@@ -117,11 +134,9 @@ async def test_invoke_gpt_success(mock_logger, mock_openai_client):
 
     # 3. Mock generate_system_prompt if needed
     with patch("backend.services.openai_utils.generate_system_prompt", return_value="system prompt"):
-        # 4. Mock the openai_client response to be valid JSON
+        # 4. Mock the backend response to be valid JSON
         gpt_reply_dict = {"response_method": "voice", "response_content": "This is some TwilioResponse content"}
-        mock_openai_client.chat.completions.create.return_value = MagicMock(
-            choices=[MagicMock(message=MagicMock(refusal=None, content=json.dumps(gpt_reply_dict)))]
-        )
+        mock_openai_client.content = json.dumps(gpt_reply_dict)
 
         # 5. Invoke the function under test
         result = await invoke_gpt("Hello GPT!", "session123", call_manager)
@@ -167,10 +182,8 @@ async def test_invoke_gpt_json_parse_error(mock_logger, mock_openai_client):
     call_manager = MagicMock()
     call_manager.get_session_by_id.return_value = session_data
 
-    # Return non-JSON content from the mocked OpenAI call
-    mock_openai_client.chat.completions.create.return_value = MagicMock(
-        choices=[MagicMock(message=MagicMock(refusal=None, content="Invalid JSON"))]
-    )
+    # Return non-JSON content from the mocked backend
+    mock_openai_client.content = "Invalid JSON"
 
     with patch("backend.services.openai_utils.generate_system_prompt", return_value="system prompt"):
         result = await invoke_gpt("Some text", "session123", call_manager)
@@ -180,3 +193,77 @@ async def test_invoke_gpt_json_parse_error(mock_logger, mock_openai_client):
     # Confirm we logged an error
     mock_logger.error.assert_called_once()
     assert "Error parsing GPT response:" in mock_logger.error.call_args[0][0]
+
+
+@pytest.mark.parametrize("transcript,history,expected", [
+    ("Thanks, can I get your email?", [], (ModelRoute.FAST, "simple")),
+    ("Please hold while I look that up.", [], (ModelRoute.FAST, "hold")),
+    ("Our policy doesn't allow a refund on that charge.", [], (ModelRoute.STRONG, "intent")),
+    ("I'm afraid that's against our policy.", [], (ModelRoute.STRONG, "intent")),
+    # Ordinary questions stay on the fast model
+    ("Why are you calling today?", [], (ModelRoute.FAST, "simple")),
+    ("What's the policy number on the account?", [], (ModelRoute.FAST, "simple")),
+    (" ".join(["word"] * 40), [], (ModelRoute.STRONG, "length")),
+    # Deep into a call, a substantial turn needs the strong model but an acknowledgement doesn't
+    ("Okay, thank you.", [{"role": "user", "content": "x"}] * 20, (ModelRoute.FAST, "simple")),
+    (" ".join(["word"] * 20), [{"role": "user", "content": "x"}] * 20, (ModelRoute.STRONG, "history")),
+    (" ".join(["word"] * 20), [], (ModelRoute.FAST, "simple")),
+    # Still on hold after a noop reply
+    ("Okay.", [
+        {"role": "assistant", "content": '{"response_method": "noop", "response_content": ""}'},
+        {"role": "user", "content": "Okay."},
+    ], (ModelRoute.FAST, "hold")),
+])
+def test_classify_turn(transcript, history, expected):
+    assert classify_turn(transcript, history) == expected
+
+
+@pytest.mark.asyncio
+async def test_invoke_gpt_routes_hard_turns_to_strong_model(mock_logger, mock_openai_client):
+    session_data = SessionData(
+        session_id="session123",
+        conference_name="conference123",
+        user_info=UserInformation(
+            user_name="Alice",
+            user_email="alice@example.com",
+            account_number="1234567890",
+            reason_for_call="Disputed charge"
+        ),
+    )
+    call_manager = MagicMock()
+    call_manager.get_session_by_id.return_value = session_data
+    mock_openai_client.content = json.dumps({"response_method": "voice", "response_content": "Please escalate."})
+    turns_before = route_stats[ModelRoute.STRONG].turns
+
+    with patch("backend.services.openai_utils.generate_system_prompt", return_value="system prompt"):
+        await invoke_gpt("I can't refund that charge.", "session123", call_manager)
+
+    request = mock_openai_client.requests[0]
+    assert request.model == ROUTES[ModelRoute.STRONG].model
+    assert request.max_tokens == ROUTES[ModelRoute.STRONG].max_tokens
+    assert route_stats[ModelRoute.STRONG].turns == turns_before + 1
+    assert route_stats[ModelRoute.STRONG].outcomes["voice"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_stream_gpt_drops_a_turn_that_fails_midway(mock_logger, mock_openai_client):
+    call_manager = CallManager()
+    session_id = call_manager.create_new_session()
+    session_data = call_manager.get_session_by_id(session_id)
+    session_data.set_user_info(UserInformation(
+        user_name="Alice", user_email="alice@example.com", account_number="1234567890", reason_for_call="Help"))
+    reply = {"response_method": "voice", "response_content": "Sure, one second."}
+
+    with patch("backend.services.openai_utils.generate_system_prompt", return_value="system prompt"):
+        mock_openai_client.content = json.dumps(reply)[:30]
+        mock_openai_client.error = RuntimeError("connection reset")
+        [event async for event in stream_gpt("Hello?", session_id, call_manager)]
+        assert session_data.chat_history == []
+
+        mock_openai_client.error = None
+        mock_openai_client.content = json.dumps(reply)
+        events = [event async for event in stream_gpt("Hello again?", session_id, call_manager)]
+
+    assert events[-1].value == reply
+    assert [(message.role, message.content) for message in session_data.chat_history] == [
+        ("user", "Hello again?"), ("assistant", json.dumps(reply))]
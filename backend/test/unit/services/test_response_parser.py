@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from backend.core.constants import ResponseMethod
+from backend.services.response_parser import (
+    ResponseEventType,
+    StreamingResponseParser,
+    parse_response,
+    response_parser_stats,
+)
+
+
+def feed_in_chunks(text, size):
+    """Feed text through a fresh parser `size` characters at a time and collect every event."""
+    parser = StreamingResponseParser()
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    events.extend(parser.close())
+    return events
+
+
+def content_of(events):
+    return "".join(e.value for e in events if e.type == ResponseEventType.CONTENT)
+
+
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_streams_voice_reply(size):
+    reply = {"response_method": "voice", "response_content": "Sure, my account is 12345."}
+    events = feed_in_chunks(json.dumps(reply), size)
+
+    assert events[0].type == ResponseEventType.METHOD
+    assert events[0].value == ResponseMethod.VOICE
+    assert content_of(events) == reply["response_content"]
+    assert events[-2].type == ResponseEventType.CONTENT_END
+    assert events[-1].type == ResponseEventType.DONE
+    assert events[-1].value == reply
+
+
+def test_method_is_emitted_before_content_arrives():
+    """
+    The noop decision is available as soon as the method value closes.
+    """
+    parser = StreamingResponseParser()
+    events = parser.feed('{"response_method": "noop", "response_con')
+    assert [e.type for e in events] == [ResponseEventType.METHOD]
+    assert events[0].value == ResponseMethod.NOOP
+
+
+def test_content_before_method_is_held_back():
+    text = '{"response_content": "Hi there", "response_method": "voice"}'
+    events = feed_in_chunks(text, 1)
+    assert events[0].type == ResponseEventType.METHOD
+    assert content_of(events) == "Hi there"
+    assert events[-1].value == {"response_method": "voice", "response_content": "Hi there"}
+
+
+def test_decodes_escapes():
+    reply = {"response_method": "voice", "response_content": 'He said "hi"\nthen left é'}
+    events = feed_in_chunks(json.dumps(reply), 2)
+    assert content_of(events) == reply["response_content"]
+
+
+def test_code_fenced_reply_uses_fallback():
+    fallback_before = response_parser_stats.fallback
+    text = '```json\n{"response_method": "phone_tree", "response_content": "2"}\n```'
+    events = feed_in_chunks(text, 4)
+
+    assert response_parser_stats.fallback == fallback_before + 1
+    assert events[0].type == ResponseEventType.METHOD
+    assert events[0].value == ResponseMethod.PHONE_TREE
+    assert events[-1].value == {"response_method": "phone_tree", "response_content": "2"}
+
+
+def test_truncated_reply_keeps_streamed_content():
+    events = feed_in_chunks('{"response_method": "voice", "response_content": "Let me ch', 5)
+    assert content_of(events) == "Let me ch"
+    assert events[-2].type == ResponseEventType.CONTENT_END
+    assert events[-1].value == {"response_method": "voice", "response_content": "Let me ch"}
+
+
+def test_garbage_reply_returns_empty_dict():
+    failed_before = response_parser_stats.failed
+    assert parse_response("I encountered an error. Please hold.") == {}
+    assert parse_response('{"response_method": "shout", "response_content": "x"}') == {}
+    assert response_parser_stats.failed == failed_before + 2
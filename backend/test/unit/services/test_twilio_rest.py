@@ -0,0 +1,116 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from backend.services.twilio_rest import AsyncTwilioClient, TwilioRestError, _params
+from backend.simulators.llm_stub_server import LatencyDistribution
+from backend.simulators.twilio_stub_server import create_twilio_stub_app
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.services.twilio_rest.logger") as mock_log:
+        yield mock_log
+
+
+def make_client(app, **kwargs):
+    kwargs.setdefault('backoff_base', 0.001)
+    return AsyncTwilioClient("AC123", "token", base_url="http://twilio.test",
+                             transport=httpx.ASGITransport(app=app), **kwargs)
+
+
+def test_params_use_twilio_names():
+    assert _params({'to': '+1', 'from_': '+2', 'status_callback_event': ['a', 'b'], 'url': None}) == \
+        {'To': '+1', 'From': '+2', 'StatusCallbackEvent': ['a', 'b']}
+
+
+@pytest.mark.asyncio
+async def test_create_list_and_end_calls():
+    app = create_twilio_stub_app(page_size=2)
+    client = make_client(app)
+
+    call = await client.calls.create(to="+15551234567", from_="+15557654321", url="http://example.com/voice",
+                                     status_callback_event=['initiated', 'completed'])
+    assert call.sid.startswith("CA") and call.status == "queued" and call.from_ == "+15557654321"
+    assert app.state.twilio.calls[call.sid]['status_callback_event'] == ['initiated', 'completed']
+
+    for _ in range(4):
+        await client.calls.create(to="+15550000000", from_="+15557654321", url="http://example.com/voice")
+    await client.calls(call.sid).update(status="in-progress")
+
+    # Five calls from the number, two per page
+    assert len(await client.calls.list(from_="+15557654321")) == 5
+    assert [c.sid for c in await client.calls.list(from_="+15557654321", status="in-progress")] == [call.sid]
+
+    ended = await client.calls(call.sid).update(status="completed")
+    assert ended.status == "completed"
+    assert (await client.calls(call.sid).fetch()).status == "completed"
+    assert client.metrics.snapshot()['timings']['calls.list']['count'] == 4
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_retries_throttling_and_server_errors():
+    app = create_twilio_stub_app()
+    app.state.twilio.fail_next(429, retry_after=0)
+    app.state.twilio.fail_next(503)
+    client = make_client(app)
+
+    call = await client.calls.create(to="+1", from_="+2", url="http://example.com/voice")
+    assert call.sid in app.state.twilio.calls
+    assert len(app.state.twilio.calls) == 1
+    assert client.metrics.retries == 2
+    assert client.metrics.snapshot()['timings']['calls.create']['count'] == 3
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries_and_on_client_errors():
+    app = create_twilio_stub_app()
+    app.state.twilio.fail_next(500, times=3)
+    client = make_client(app, max_retries=2)
+
+    with pytest.raises(TwilioRestError) as error:
+        await client.calls.create(to="+1", from_="+2", url="http://example.com/voice")
+    assert error.value.status == 500
+
+    with pytest.raises(TwilioRestError) as error:
+        await client.calls.create(to="+1", from_="+2")
+    assert (error.value.status, error.value.code) == (400, 21201)
+    assert client.metrics.errors == 2
+    assert client.metrics.retries == 2
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_bounds_requests_in_flight():
+    app = create_twilio_stub_app(LatencyDistribution('fixed', (0.02,)))
+    client = make_client(app, max_concurrency=4)
+
+    calls = await asyncio.gather(*(
+        client.calls.create(to=f"+1{i}", from_="+2", url="http://example.com/voice") for i in range(20)
+    ))
+    assert len({call.sid for call in calls}) == 20
+    assert app.state.twilio.peak_in_flight == 4
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_posts_are_not_repeated_after_a_read_timeout():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    client = AsyncTwilioClient("AC123", "token", base_url="http://twilio.test", transport=httpx.MockTransport(handler))
+    with pytest.raises(httpx.ReadTimeout):
+        await client.calls.create(to="+1", from_="+2", url="http://example.com/voice")
+    assert len(attempts) == 1
+
+    with pytest.raises(httpx.ReadTimeout):
+        await client.calls.list()
+    assert len(attempts) == 1 + 1 + client.max_retries
+    await client.aclose()
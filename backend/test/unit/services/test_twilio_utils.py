@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from twilio.twiml.voice_response import VoiceResponse
 
 from backend.services.twilio_utils import (
@@ -15,10 +15,14 @@ def mock_twilio_client():
     """
     Provide a mocked Twilio client fixture for tests.
     """
-    return MagicMock()
+    client = MagicMock()
+    client.calls.create = AsyncMock()
+    client.calls.return_value.update = AsyncMock()
+    return client
 
 
-def test_create_call(mock_twilio_client):
+@pytest.mark.asyncio
+async def test_create_call(mock_twilio_client):
     """
     Test that create_call constructs the call with the correct parameters
     and returns the call object.
@@ -33,7 +37,7 @@ def test_create_call(mock_twilio_client):
     fake_call = MagicMock()
     mock_twilio_client.calls.create.return_value = fake_call
 
-    result = create_call(
+    result = await create_call(
         twilio_client=mock_twilio_client,
         to=to,
         from_=from_,
@@ -42,7 +46,7 @@ def test_create_call(mock_twilio_client):
     )
 
     # Assert call to Twilio's create method
-    mock_twilio_client.calls.create.assert_called_once_with(
+    mock_twilio_client.calls.create.assert_awaited_once_with(
         to=to,
         from_=from_,
         url=url,
@@ -55,12 +59,13 @@ def test_create_call(mock_twilio_client):
     assert result == fake_call
 
 
-def test_create_call_with_status_callback_event(mock_twilio_client):
+@pytest.mark.asyncio
+async def test_create_call_with_status_callback_event(mock_twilio_client):
     """
     Test create_call when a custom status_callback_event is provided.
     """
     custom_events = ["initiated", "answered"]
-    create_call(
+    await create_call(
         twilio_client=mock_twilio_client,
         to="+15551234567",
         from_="+15557654321",
@@ -69,7 +74,7 @@ def test_create_call_with_status_callback_event(mock_twilio_client):
         status_callback_event=custom_events,
         status_callback_method="GET"
     )
-    mock_twilio_client.calls.create.assert_called_once_with(
+    mock_twilio_client.calls.create.assert_awaited_once_with(
         to="+15551234567",
         from_="+15557654321",
         url="http://test.com/voice",
@@ -140,11 +145,12 @@ def test_is_redirect(transcript, expected, capsys):
     assert f"Is redirect: {expected}" in captured.out
 
 
-def test_end_call(mock_twilio_client):
+@pytest.mark.asyncio
+async def test_end_call(mock_twilio_client):
     """
     Test that end_call correctly updates a call's status to 'completed'.
     """
     call_sid = "CA12345"
-    end_call(mock_twilio_client, call_sid)
+    await end_call(mock_twilio_client, call_sid)
     mock_twilio_client.calls.assert_called_once_with(call_sid)
-    mock_twilio_client.calls(call_sid).update.assert_called_once_with(status="completed")
+    mock_twilio_client.calls(call_sid).update.assert_awaited_once_with(status="completed")
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+from twilio.twiml.voice_response import VoiceResponse
+
+from backend.services.twiml_templates import TEMPLATES, TwimlTemplate
+
+
+AWKWARD_VALUES = [
+    "John",
+    "",
+    "O'Brien & Sons <Ltd>",
+    'say "hi"',
+    "wss://example.com/w/w1/media/media-stream/abc?x=1&y=2",
+    "line\nbreak\ttab\rreturn",
+    "Zoë 山田 🙂",
+    "]]> <!-- --> &amp;",
+    "TwimlField0X",
+]
+
+
+@pytest.mark.parametrize("name", sorted(TEMPLATES))
+def test_templates_match_the_twilio_library(name):
+    template = TEMPLATES[name]
+    rng = random.Random(name)
+    for _ in range(50):
+        values = {field: rng.choice(AWKWARD_VALUES) for field in template.fields}
+        assert template.render(**values) == str(template.builder(**values))
+
+
+def test_attribute_and_text_values_are_escaped_differently():
+    def builder(url, text):
+        response = VoiceResponse()
+        response.redirect(url)
+        response.play(digits=url)
+        response.say(text)
+        return response
+
+    template = TwimlTemplate(builder)
+    rendered = template.render(url='a"b\n', text='a"b\n')
+    assert 'digits="a&quot;b&#10;"' in rendered
+    assert '<Say>a"b\n</Say>' in rendered
+    assert rendered == str(builder(url='a"b\n', text='a"b\n'))
+
+
+def test_builder_must_use_every_field():
+    def builder(name, unused):
+        response = VoiceResponse()
+        response.say(name)
+        return response
+
+    with pytest.raises(ValueError):
+        TwimlTemplate(builder)
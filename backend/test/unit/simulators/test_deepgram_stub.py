@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from backend.core.turn_trace import current_turn
+from backend.simulators.deepgram_stub import DeepgramStub, tone
+from backend.simulators.llm_stub_server import LatencyDistribution
+
+
+SILENCE = b'\xff' * 160
+
+
+@pytest.mark.asyncio
+async def test_each_utterance_gets_the_next_transcript_after_endpointing():
+    stub = DeepgramStub(transcripts=["first", "second"], stt_latency=LatencyDistribution('fixed', (0.01,)), endpointing=0.1)
+    received = []
+
+    async def on_transcript(transcript):
+        received.append((transcript, current_turn.get()))
+
+    connection = await stub.create_stt_connection(on_transcript)
+    speech = tone(0.2)
+    for utterance in range(3):
+        for offset in range(0, len(speech), 160):
+            connection.send(speech[offset:offset + 160])
+        for _ in range(4):  # 80ms: not yet the end of the utterance
+            connection.send(SILENCE)
+        await asyncio.sleep(0.03)
+        assert len(received) == utterance
+        connection.send(SILENCE)
+        await asyncio.sleep(0.03)
+        assert len(received) == utterance + 1
+
+    assert [transcript for transcript, _ in received] == ["first", "second", "first"]
+    assert 0.01 <= received[0][1].seconds('stt') < 0.05
+    assert current_turn.get() is None
+
+    # Silence alone, or audio after the connection closes, is never transcribed
+    await stub.close_stt_connection(connection)
+    connection.send(speech)
+    connection.send(SILENCE * 10)
+    await asyncio.sleep(0.03)
+    assert len(received) == 3
+    assert stub.snapshot() == {'open_connections': 0, 'transcripts_sent': 3, 'tts_requests': 0}
+
+
+@pytest.mark.asyncio
+async def test_speech_length_follows_the_text():
+    stub = DeepgramStub(tts_ttfb=LatencyDistribution('fixed', (0.0,)), audio_format='mulaw')
+    assert len(await stub.synthesize_speech("Hi")) == 8000
+    assert len(await stub.synthesize_speech("x" * 40)) == 3 * 8000
+    assert stub.tts_requests == 2
+
+    with pytest.raises(ValueError):
+        DeepgramStub(audio_format='wav')
@@ -0,0 +1,179 @@
+import asyncio
+import base64
+import json
+import wave
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import HTMLResponse
+from fastapi.websockets import WebSocketDisconnect
+
+from backend.services.twilio_rest import AsyncTwilioClient
+from backend.simulators.llm_stub_server import LatencyDistribution
+from backend.simulators.twilio_simulator import CallTiming, TwilioSimulator, load_mulaw
+
+
+BOT = "+15550100"
+CS = "+18005550100"
+CONFERENCE_TWIML = (
+    '<?xml version="1.0" encoding="UTF-8"?><Response><Dial><Conference endConferenceOnExit="false" '
+    'statusCallback="https://bot.test/conf" statusCallbackEvent="start end join leave">room</Conference></Dial></Response>'
+)
+STREAM_TWIML = (
+    '<?xml version="1.0" encoding="UTF-8"?><Response><Pause length="1" /><Say>Hello there</Say>'
+    '<Connect><Stream url="wss://bot.test/media/s1" /></Connect></Response>'
+)
+
+
+@pytest.fixture(autouse=True)
+def mock_logger():
+    with patch("backend.simulators.twilio_simulator.logger") as mock_log:
+        yield mock_log
+
+
+def fixed(seconds):
+    return LatencyDistribution('fixed', (seconds,))
+
+
+def create_target_app():
+    """Stands in for the bot: records every webhook and stream message it gets."""
+    app = FastAPI()
+    app.state.webhooks = []
+    app.state.stream = []
+
+    @app.post("/voice/{kind}")
+    async def voice(kind: str, request: Request):
+        form = dict(await request.form())
+        app.state.webhooks.append(('voice', form))
+        return HTMLResponse(STREAM_TWIML if kind == 'inbound' else CONFERENCE_TWIML, media_type="application/xml")
+
+    @app.post("/{kind}")
+    async def callback(kind: str, request: Request):
+        app.state.webhooks.append((kind, dict(await request.form())))
+        return ''
+
+    @app.websocket("/media/{session_id}")
+    async def media(websocket: WebSocket, session_id: str):
+        await websocket.accept()
+        try:
+            while True:
+                message = json.loads(await websocket.receive_text())
+                app.state.stream.append(message)
+                if message['event'] == 'start':
+                    reply = base64.b64encode(b'\x7f' * 800).decode()
+                    await websocket.send_json({'event': 'media', 'streamSid': message['streamSid'], 'media': {'payload': reply}})
+                    await websocket.send_json({'event': 'mark', 'streamSid': message['streamSid'], 'mark': {'name': 'greeting'}})
+                elif message['event'] == 'stop':
+                    break
+        except WebSocketDisconnect:
+            pass
+
+    return app
+
+
+async def wait_until(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Timed out waiting for the simulator")
+
+
+def make_client(simulator):
+    return AsyncTwilioClient("AC123", "token", base_url="http://twilio.test",
+                             transport=httpx.ASGITransport(app=simulator.rest_app))
+
+
+@pytest.mark.asyncio
+async def test_calling_our_own_number_rings_it_joins_the_conference_and_streams_audio():
+    app = create_target_app()
+    simulator = TwilioSimulator(
+        app=app, numbers={BOT: "https://bot.test/voice/inbound"}, audio=[b'\x00' * 400],
+        timing=CallTiming(initiated=fixed(0), ringing=fixed(0)), time_scale=0,
+    )
+    client = make_client(simulator)
+
+    call = await client.calls.create(to=BOT, from_=BOT, url="https://bot.test/voice/conference",
+                                     status_callback="https://bot.test/status",
+                                     status_callback_event=['initiated', 'ringing', 'answered', 'completed'])
+    await wait_until(lambda: simulator.streams and simulator.streams[0].marks)
+    await client.calls(call.sid).update(status="completed")
+    await wait_until(lambda: simulator.snapshot()['calls'] == {'completed': 2})
+
+    statuses = [form for kind, form in app.state.webhooks if kind == 'status']
+    assert [form['CallStatus'] for form in statuses] == ['initiated', 'ringing', 'in-progress', 'completed']
+    assert [form['SequenceNumber'] for form in statuses] == ['0', '1', '2', '3']
+    assert {form['CallSid'] for form in statuses} == {call.sid}
+    assert 'CallDuration' in statuses[-1]
+
+    # The inbound leg is answered before the outbound leg's TwiML is fetched
+    inbound, outbound = [form for kind, form in app.state.webhooks if kind == 'voice']
+    assert (inbound['Direction'], inbound['From'], inbound['To']) == ('inbound', BOT, BOT)
+    assert (outbound['Direction'], outbound['CallSid']) == ('outbound-api', call.sid)
+
+    conference = [form['StatusCallbackEvent'] for kind, form in app.state.webhooks if kind == 'conf']
+    assert conference == ['conference-start', 'participant-join', 'participant-leave', 'conference-end']
+
+    # The mark comes back once the app's audio has played, in between the frames here
+    events = [message['event'] for message in app.state.stream]
+    assert [event for event in events if event != 'mark'] == ['connected', 'start', 'media', 'media', 'media', 'stop']
+    assert events.count('mark') == 1
+    start = app.state.stream[1]
+    assert start['start']['callSid'] == inbound['CallSid']
+    assert start['start']['mediaFormat'] == {'encoding': 'audio/x-mulaw', 'sampleRate': 8000, 'channels': 1}
+    frames = [base64.b64decode(message['media']['payload']) for message in app.state.stream if message['event'] == 'media']
+    assert [len(frame) for frame in frames] == [160, 160, 160]
+    assert frames[-1] == b'\x00' * 80 + b'\xff' * 80  # Padded with silence
+    assert [int(message['sequenceNumber']) for message in app.state.stream[1:]] == list(range(1, 7))
+    assert next(message for message in app.state.stream if message['event'] == 'mark')['mark'] == {'name': 'greeting'}
+
+    record = simulator.streams[0]
+    assert record.frames_sent == 3 and len(record.utterances_sent) == 1
+    assert [size for _, size in record.media_received] == [800]
+    assert [c.status for c in await client.calls.list(from_=BOT)] == ['completed', 'completed']
+
+    await simulator.aclose()
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_outside_numbers_ring_until_answered():
+    app = create_target_app()
+    simulator = TwilioSimulator(app=app, timing=CallTiming(initiated=fixed(0), ringing=fixed(0), answer=fixed(5)))
+    client = make_client(simulator)
+
+    call = await client.calls.create(to=CS, from_=BOT, url="https://bot.test/voice/conference",
+                                     status_callback="https://bot.test/status")
+    await asyncio.sleep(0.05)
+    await client.calls(call.sid).update(status="completed")
+    await wait_until(lambda: simulator.calls[call.sid].status == 'canceled')
+
+    # Without StatusCallbackEvent only the final status is reported; no TwiML was fetched
+    assert [(kind, form['CallStatus']) for kind, form in app.state.webhooks] == [('status', 'canceled')]
+    await simulator.aclose()
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_app_url_redirects_webhooks():
+    simulator = TwilioSimulator(app_url="http://127.0.0.1:5050")
+    assert simulator._target("https://bot.example.com/w/w1/calls/incoming-call?x=1") == \
+        "http://127.0.0.1:5050/w/w1/calls/incoming-call?x=1"
+    assert simulator._target("wss://bot.example.com/media/media-stream/s1") == "ws://127.0.0.1:5050/media/media-stream/s1"
+
+
+def test_load_mulaw(tmp_path):
+    path = tmp_path / "silence.wav"
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(b'\x00' * (16000 * 2 * 2 // 10))  # 100ms of stereo silence
+
+    assert load_mulaw(path) == b'\xff' * 800
+
+    raw = tmp_path / "agent.ulaw"
+    raw.write_bytes(b'\x01\x02')
+    assert load_mulaw(raw) == b'\x01\x02'
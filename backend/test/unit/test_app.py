@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+from backend import app as app_module
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+# Measured about 0.3s on a laptop-class core; the budget leaves room for slower CI
+COLD_START_BUDGET_SECONDS = float(os.getenv('COLD_START_BUDGET_SECONDS', 1.0))
+DEFERRED = ('openai', 'deepgram', 'pydub', 'twilio.rest', 'requests')
+
+COLD_START = f"""
+import json, sys, time
+start = time.perf_counter()
+import backend.app
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [name for name in {DEFERRED!r} if name in sys.modules]}}))
+"""
+
+
+def cold_start() -> dict:
+    """Import the app in a fresh interpreter, as a new worker does."""
+    result = subprocess.run(
+        [sys.executable, "-c", COLD_START], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=60,
+        env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'},
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_importing_the_app_leaves_heavy_sdks_for_first_use():
+    assert cold_start()['loaded'] == []
+
+
+def test_cold_start_is_within_budget():
+    # Best of three, so one slow run on a busy machine doesn't fail it
+    seconds = min(cold_start()['seconds'] for _ in range(3))
+    assert seconds < COLD_START_BUDGET_SECONDS, f"Importing the app took {seconds:.2f}s"
+
+
+def test_deferred_modules_are_preloaded_by_name():
+    with patch.object(app_module, "importlib") as mock_importlib, patch.object(app_module, "logger"):
+        app_module.preload_deferred_modules()
+    assert [call.args[0] for call in mock_importlib.import_module.call_args_list] == list(app_module.DEFERRED_MODULES)
@@ -0,0 +1,52 @@
+from loguru import logger
+
+from backend.utils import utils
+from backend.utils.utils import LogRateLimiter, log_enabled
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_rate_limiter_lets_one_line_through_per_interval_per_key():
+    clock = FakeClock()
+    limiter = LogRateLimiter(interval=5.0, clock=clock)
+
+    assert limiter.allow("MZ1") == 0
+    assert limiter.allow("MZ1") is None
+    assert limiter.allow("MZ1") is None
+    assert limiter.allow("MZ2") == 0  # Keys are limited separately
+
+    clock.now = 5.0
+    assert limiter.allow("MZ1") == 2  # The lines held back since the last one
+    assert limiter.allow("MZ1") is None
+
+    limiter.forget("MZ1")
+    assert limiter.allow("MZ1") == 0
+
+
+def test_rate_limiter_stays_bounded():
+    limiter = LogRateLimiter(max_keys=2, clock=FakeClock())
+    for key in range(5):
+        limiter.allow(key)
+    assert len(limiter._keys) <= 2
+
+
+def test_log_lines_carry_context_fields_and_levels_below_the_threshold_are_off():
+    lines = []
+    sink = logger.add(lines.append, level="INFO", format=utils._formatter(utils.LOG_FORMAT))
+    try:
+        with logger.contextualize(session_id="s{1}", call_sid="CA1"):
+            logger.info("Joined {conference}")
+        logger.info("No context")
+    finally:
+        logger.remove(sink)
+
+    assert lines[0].endswith("| INFO | Joined {conference} | session_id=s{1} call_sid=CA1\n")
+    assert lines[1].endswith("| INFO | No context\n")
+    assert log_enabled(utils.LOG_LEVEL) and log_enabled("ERROR")
+    assert not log_enabled("TRACE")
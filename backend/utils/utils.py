@@ -1,48 +1,107 @@
 import os
-from twilio.rest import Client
-import logging
-import ssl
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
 import dotenv
-import requests
 import time
 import json
 from loguru import logger
 
-dotenv.load_dotenv('env/.env')
+# Loaded once, here, before any module reads its settings from the environment.
+# Relative to the repository, so it doesn't matter where the app is started from.
+ENV_FILE = os.getenv('ENV_FILE', str(Path(__file__).resolve().parents[2] / 'env' / '.env'))
+dotenv.load_dotenv(ENV_FILE)
 
 
 def setup_twilio():
+    """The twilio SDK's synchronous client, for scripts; the app uses twilio_rest."""
+    from twilio.rest import Client
+
     TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
     TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
 
     return Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
 
-def setup_logging():
-    log_file = 'app.log'
-
-    # Remove all existing handlers
-    logger.remove()
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+# One JSON object per line in the log file, with the structured fields as keys
+LOG_JSON = os.getenv('LOG_JSON', '').lower() in ('1', 'true', 'yes')
+# Context bound with logger.contextualize()/bind() and shown on every line that has it
+LOG_FIELDS = ('session_id', 'call_sid', 'stream_sid')
+LOG_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
+CONSOLE_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level}</level> | {message}"
 
-    # Add file handler
-    logger.add(log_file, level="INFO", format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}")
+_LEVELS = ('TRACE', 'DEBUG', 'INFO', 'SUCCESS', 'WARNING', 'ERROR', 'CRITICAL')
+_enabled_levels = frozenset()
 
-    # Add console handler
-    logger.add("stdout", level="INFO", format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level}</level> | {message}", colorize=True)
 
-    # Add terminal handler
-    logger.add(lambda msg: print(msg, end=''), level="INFO", format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}")
+def _formatter(base: str):
+    def format_record(record) -> str:
+        # Field values are referenced, not inlined, so braces in them aren't parsed
+        fields = ''.join(f" {key}={{extra[{key}]}}" for key in LOG_FIELDS if record['extra'].get(key))
+        return base + (" |" + fields if fields else "") + "\n{exception}"
+    return format_record
 
-    if __name__ == "__main__":
-        logger.debug("Debug message")
-        logger.info("Info message")
-        logger.error("Error message")
 
+def setup_logging():
+    """
+    One console sink and one file sink, both queued: a log call only formats the
+    record and puts it on a queue, and a background thread does the writing, so
+    the event loop never waits on the terminal or the disk.
+    """
+    global _enabled_levels
+    logger.remove()
+    logger.add(sys.stderr, level=LOG_LEVEL, format=_formatter(CONSOLE_FORMAT), colorize=True, enqueue=True)
+    logger.add(LOG_FILE, level=LOG_LEVEL, format=_formatter(LOG_FORMAT), serialize=LOG_JSON, enqueue=True)
+    threshold = logger.level(LOG_LEVEL).no
+    _enabled_levels = frozenset(level for level in _LEVELS if logger.level(level).no >= threshold)
     return logger
 
-    return logger
+
+def log_enabled(level: str) -> bool:
+    """Whether `level` is logged at all, so hot paths can skip building the message."""
+    return level in _enabled_levels
+
+
+class LogRateLimiter:
+    """
+    Lets a per-frame log line through at most once per `interval` seconds for each
+    key (a stream, say) and counts the ones it holds back.
+    """
+
+    def __init__(self, interval: float = 5.0, max_keys: int = 10000, clock=time.monotonic):
+        self.interval = interval
+        self.max_keys = max_keys
+        self._clock = clock
+        # key -> [time last let through, lines held back since]
+        self._keys = {}
+
+    def allow(self, key) -> Optional[int]:
+        """None to skip this line; otherwise how many were skipped since the last one."""
+        now = self._clock()
+        state = self._keys.get(key)
+        if state is None:
+            if len(self._keys) >= self.max_keys:
+                self._keys.clear()
+            self._keys[key] = [now, 0]
+            return 0
+        if now - state[0] < self.interval:
+            state[1] += 1
+            return None
+        suppressed = state[1]
+        state[0], state[1] = now, 0
+        return suppressed
+
+    def forget(self, key):
+        self._keys.pop(key, None)
+
 
 def get_ngrok_url():
+    import requests
+
     url = "http://127.0.0.1:4040/api/tunnels"
     max_retries = 5
     retries = 0
@@ -67,6 +126,7 @@ def get_ngrok_url():
     raise Exception("ngrok URL not found. Is ngrok running?")
 
 
+@lru_cache(maxsize=None)
 def load_ngrok_addresses():
     try:
         with open('ngrok_addresses.json', 'r') as f:
@@ -76,12 +136,11 @@ def load_ngrok_addresses():
 
     return ngrok_addresses
 
-ngrok_addresses = load_ngrok_addresses()
 def get_flask_address():
-    return ngrok_addresses['FLASK_ADDRESS']
+    return load_ngrok_addresses()['FLASK_ADDRESS']
 
 def get_websocket_address():
-    return ngrok_addresses['WEBSOCKET_ADDRESS'].replace('https', 'wss')
+    return load_ngrok_addresses()['WEBSOCKET_ADDRESS'].replace('https', 'wss')
 
 
 # Create an SSL context
@@ -89,5 +148,4 @@ def get_websocket_address():
 #ssl_context.load_cert_chain(certfile="path_to_your_certificate.pem", keyfile="path_to_your_private_key.pem")
 
 
-twilio_client = setup_twilio()
 logger = setup_logging()
@@ -1,4 +1,16 @@
+import os
+
 import uvicorn
 
+from backend.core.worker_proxy import launch
+
+PORT = int(os.getenv('PORT', 5050))
+# More than one starts that many worker processes behind a proxy that routes each
+# session's webhooks and media stream to its worker (see backend/core/worker_proxy.py)
+WORKERS = int(os.getenv('WORKERS', 1))
+
 if __name__ == "__main__":
-    uvicorn.run("backend.app:app", host="0.0.0.0", port=5050, reload=True) 
\ No newline at end of file
+    if WORKERS > 1:
+        launch(WORKERS, PORT)
+    else:
+        uvicorn.run("backend.app:app", host="0.0.0.0", port=PORT, reload=True)